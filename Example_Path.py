@@ -11,7 +11,12 @@
 from pathlib import Path
 from RsyncPath.RsyncPath import RsyncPath
 from RsyncPath.OSType import OSType
+from RsyncPath.CompressionMode import CompressionMode
+from RsyncPath.ProbeStrategy import ProbeStrategy
+from RsyncPath.SSHBackend import SSHBackend
+from RsyncPath.ThresholdStrategy import ThresholdStrategy
 from RsyncPath.TransferDirection import TransferDirection
+from RsyncPath.WatchBackend import WatchBackend
 import argparse
 import logging
 
@@ -77,7 +82,79 @@ def run_rsync_path_from_local_to_remote(parameter_argument_dict):
 
     threshold_dict = {
         "enable_copy_threshold": enable_copy_threshold,
-        "copy_threshold_limit": copy_threshold_limit
+        "copy_threshold_limit": copy_threshold_limit,
+        # Remember directory sizes between runs so that only directories that changed are walked again:
+        "enable_directory_size_cache": False,
+        # ThresholdStrategy.RSYNC_DELTA replaces the size comparison with a single rsync dry run, and refuses to
+        # copy a directory if more than max_deleted_file_percentage percent of its files would be deleted:
+        "threshold_strategy": ThresholdStrategy.DIRECTORY_SIZE,
+        "max_deleted_file_percentage": 10.0
+    }
+
+    # Optionally, define how an available machine is selected from the machine IP list. Each machine is checked by
+    # opening a connection to its SSH port (use ProbeStrategy.PING to send a ping request instead). With concurrent
+    # probing enabled, every machine is checked at the same time, and the machine closest to the front of the list
+    # that responds within the deadline is selected:
+    connection_dict = {
+        "host_probe_strategy": ProbeStrategy.TCP,
+        "enable_concurrent_host_probing": True,
+        "host_probe_timeout": 2,
+        "host_probe_deadline": 5,
+        "prefer_host_list_priority": True,
+        # Select the fastest machine instead, remembering the measured latencies between runs:
+        "enable_latency_ranked_host_selection": False,
+        "host_health_cache_ttl": 15 * 60,
+        # Run remote commands through the ssh program instead of fabric (requires key-based authentication):
+        "ssh_backend": SSHBackend.FABRIC
+    }
+
+    # Optionally, define how the directories are copied. max_parallel_transfers sets how many rsync processes can
+    # run at the same time, and enable_ssh_multiplexing lets every rsync process share a single SSH connection.
+    # enable_snapshot_mode copies each run into a new timestamped snapshot, hard-linked against the previous one,
+    # keeping the newest snapshot of the last snapshot_keep_daily days and snapshot_keep_weekly weeks.
+    # enable_file_manifest remembers the files of each directory after it is copied, so the next run skips
+    # directories that did not change and only copies the changed files of the others.
+    # enable_destination_fan_out copies to every remote machine in the list that responds instead of only the first
+    # one, at most max_parallel_destinations at a time (0 for all of them).
+    # bandwidth_limit and host_bandwidth_limit cap the bandwidth, in KiB per second, of all the rsync processes and
+    # of the processes copying to each machine (None for no limit). A window in bandwidth_window_list replaces both
+    # limits between its start and end, for example to copy faster at night.
+    # compression_mode chooses how rsync compresses the data. CompressionMode.AUTO measures the link and samples the
+    # files of each directory, and skips compression on fast links and on already-compressed media.
+    # With --watch, the directories are copied once and then again whenever they change, once no change arrived for
+    # watch_debounce_time seconds. watch_backend chooses inotify or walking the directories every watch_poll_interval
+    # seconds. enable_run_journal records the state of every directory, so a run interrupted by a crash or a lost
+    # connection continues where it stopped with --resume, and retries the directories that failed.
+    # enable_checksum_verification hashes every copied file on both machines and copies the files that differ again;
+    # hash_algorithm None picks the fastest hash both machines can compute:
+    transfer_dict = {
+        "max_parallel_transfers": 1,
+        "enable_ssh_multiplexing": True,
+        "enable_snapshot_mode": False,
+        "snapshot_keep_daily": 7,
+        "snapshot_keep_weekly": 4,
+        "enable_file_manifest": False,
+        "enable_destination_fan_out": False,
+        "max_parallel_destinations": 0,
+        "watch_backend": WatchBackend.AUTO,
+        "watch_debounce_time": 2.0,
+        "watch_poll_interval": 30.0,
+        "enable_run_journal": False,
+        "enable_checksum_verification": False,
+        "hash_algorithm": None,
+        "hash_workers": 4,
+        "bandwidth_limit": None,
+        "host_bandwidth_limit": None,
+        "bandwidth_window_list": [
+            # {"start": "22:00", "end": "06:00", "bandwidth_limit": None, "host_bandwidth_limit": None}
+        ],
+        "compression_mode": CompressionMode.AUTO
+    }
+
+    # Optionally, record the timings and counters of each run. Setting prometheus_textfile_path to a .prom file in
+    # the directory read by the node_exporter textfile collector lets you alert on slow or failed backups:
+    metrics_dict = {
+        "prometheus_textfile_path": None
     }
 
     # Now show the following log statements:
@@ -95,12 +172,17 @@ def run_rsync_path_from_local_to_remote(parameter_argument_dict):
                               destination_dict,
                               threshold_dict,
                               transfer_direction,
-                              DEBUG_MODE)
+                              DEBUG_MODE,
+                              connection_dict,
+                              transfer_dict,
+                              metrics_dict)
 
     if parameter_argument_dict['dry_run']:
         nameless_path.dry_run()
+    elif parameter_argument_dict['watch']:
+        nameless_path.watch()
     else:
-        nameless_path.run()
+        nameless_path.run(resume=parameter_argument_dict['resume'])
 
 
 def run_rsync_path_from_remote_to_local(parameter_argument_dict):
@@ -163,7 +245,72 @@ def run_rsync_path_from_remote_to_local(parameter_argument_dict):
 
     threshold_dict = {
         "enable_copy_threshold": enable_copy_threshold,
-        "copy_threshold_limit": copy_threshold_limit
+        "copy_threshold_limit": copy_threshold_limit,
+        # Remember directory sizes between runs so that only directories that changed are walked again:
+        "enable_directory_size_cache": False,
+        # ThresholdStrategy.RSYNC_DELTA replaces the size comparison with a single rsync dry run, and refuses to
+        # copy a directory if more than max_deleted_file_percentage percent of its files would be deleted:
+        "threshold_strategy": ThresholdStrategy.DIRECTORY_SIZE,
+        "max_deleted_file_percentage": 10.0
+    }
+
+    # Optionally, define how an available machine is selected from the machine IP list. Each machine is checked by
+    # opening a connection to its SSH port (use ProbeStrategy.PING to send a ping request instead). With concurrent
+    # probing enabled, every machine is checked at the same time, and the machine closest to the front of the list
+    # that responds within the deadline is selected:
+    connection_dict = {
+        "host_probe_strategy": ProbeStrategy.TCP,
+        "enable_concurrent_host_probing": True,
+        "host_probe_timeout": 2,
+        "host_probe_deadline": 5,
+        "prefer_host_list_priority": True,
+        # Select the fastest machine instead, remembering the measured latencies between runs:
+        "enable_latency_ranked_host_selection": False,
+        "host_health_cache_ttl": 15 * 60,
+        # Run remote commands through the ssh program instead of fabric (requires key-based authentication):
+        "ssh_backend": SSHBackend.FABRIC
+    }
+
+    # Optionally, define how the directories are copied. max_parallel_transfers sets how many rsync processes can
+    # run at the same time, and enable_ssh_multiplexing lets every rsync process share a single SSH connection.
+    # enable_snapshot_mode copies each run into a new timestamped snapshot, hard-linked against the previous one,
+    # keeping the newest snapshot of the last snapshot_keep_daily days and snapshot_keep_weekly weeks.
+    # enable_file_manifest remembers the files of each directory after it is copied, so the next run skips
+    # directories that did not change and only copies the changed files of the others.
+    # enable_striped_pull copies from every remote machine in the list that responds instead of only the first one,
+    # spreading the directories between them by their measured throughput.
+    # enable_directory_splitting copies a directory of at least split_directory_min_size bytes with split_shard_count
+    # rsync processes at the same time, each copying part of it, before a final pass over the whole directory.
+    # bandwidth_limit and host_bandwidth_limit cap the bandwidth, in KiB per second, of all the rsync processes and
+    # of the processes copying from each machine (None for no limit). A window in bandwidth_window_list replaces both
+    # limits between its start and end, for example to copy faster at night.
+    # compression_mode chooses how rsync compresses the data. CompressionMode.AUTO measures the link and samples the
+    # files of each directory, and skips compression on fast links and on already-compressed media.
+    # enable_checksum_verification hashes every copied file on both machines and copies the files that differ again:
+    transfer_dict = {
+        "max_parallel_transfers": 1,
+        "enable_ssh_multiplexing": True,
+        "enable_snapshot_mode": False,
+        "snapshot_keep_daily": 7,
+        "snapshot_keep_weekly": 4,
+        "enable_file_manifest": False,
+        "enable_checksum_verification": False,
+        "enable_striped_pull": False,
+        "enable_directory_splitting": False,
+        "split_directory_min_size": 16 << 30,
+        "split_shard_count": 4,
+        "bandwidth_limit": None,
+        "host_bandwidth_limit": None,
+        "bandwidth_window_list": [
+            # {"start": "22:00", "end": "06:00", "bandwidth_limit": None, "host_bandwidth_limit": None}
+        ],
+        "compression_mode": CompressionMode.AUTO
+    }
+
+    # Optionally, record the timings and counters of each run. Setting prometheus_textfile_path to a .prom file in
+    # the directory read by the node_exporter textfile collector lets you alert on slow or failed backups:
+    metrics_dict = {
+        "prometheus_textfile_path": None
     }
 
     # Now show the following log statements:
@@ -182,12 +329,15 @@ def run_rsync_path_from_remote_to_local(parameter_argument_dict):
                               destination_dict,
                               threshold_dict,
                               transfer_direction,
-                              DEBUG_MODE)
+                              DEBUG_MODE,
+                              connection_dict,
+                              transfer_dict,
+                              metrics_dict)
 
     if parameter_argument_dict['dry_run']:
         nameless_path.dry_run()
     else:
-        nameless_path.run()
+        nameless_path.run(resume=parameter_argument_dict['resume'])
 
 
 # Now run the damn thing.
@@ -195,9 +345,14 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--dry-run", help="Run the Rsync Path as a dry run.", action="store_true")
     parser.add_argument("--debug-mode", help="Enable Debug Mode.", action="store_true")
+    parser.add_argument("--watch", help="Keep copying the local directories to the remote machine as they change.",
+                        action="store_true")
+    parser.add_argument("--resume", help="Resume the last run if it was interrupted, skipping the directories it "
+                                         "completed.", action="store_true")
     args = parser.parse_args()
 
-    argument_dict = {'dry_run': args.dry_run, 'debug_mode': args.debug_mode}
+    argument_dict = {'dry_run': args.dry_run, 'debug_mode': args.debug_mode, 'watch': args.watch,
+                     'resume': args.resume}
 
     if argument_dict['debug_mode']:
         logging.basicConfig(level=logging.DEBUG)
@@ -0,0 +1,172 @@
+# -------------------------------------------------------------------------------
+# AsyncClient.py
+# asyncio counterparts of the Client functions, so that host selection and
+# remote metadata queries do not block an event loop.
+# -------------------------------------------------------------------------------
+
+from time import monotonic
+from logging import debug, error
+import asyncio
+
+from RsyncPath.Client import (Client, DEFAULT_SSH_PORT, DEFAULT_HOST_PROBE_TIMEOUT, DEFAULT_HOST_PROBE_DEADLINE,
+                              find_available_hostname_index, get_selected_hostname_index, record_host_probe)
+from RsyncPath.Metrics import Metrics, NULL_METRICS
+from RsyncPath.OSType import OSType
+from RsyncPath.ProbeStrategy import ProbeStrategy
+
+MAX_SSH_BANNER_LINES = 16
+
+
+async def probe_ssh_port_async(hostname: str, ssh_port=DEFAULT_SSH_PORT, timeout=DEFAULT_HOST_PROBE_TIMEOUT,
+                               read_banner=False):
+    """Open a TCP connection to the SSH port of a remote machine without blocking the event loop.
+
+    :returns A tuple containing whether the port is reachable, the connect latency in seconds (None if the
+    connection failed) and the SSH banner (None if it was not read), like Client.probe_ssh_port().
+    """
+    deadline = monotonic() + timeout
+    start_time = monotonic()
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(hostname, ssh_port), timeout)
+    except (OSError, asyncio.TimeoutError) as exception:
+        debug(f"AsyncClient.probe_ssh_port_async(): Connection to {hostname}:{ssh_port} failed: {exception!r}")
+        return False, None, None
+    latency = monotonic() - start_time
+
+    try:
+        if not read_banner:
+            return True, latency, None
+
+        # The server may send other lines before the identification string:
+        for _ in range(MAX_SSH_BANNER_LINES):
+            line = await asyncio.wait_for(reader.readline(), max(0.0, deadline - monotonic()))
+            if not line:
+                break
+            if line.startswith(b"SSH-"):
+                return True, latency, line.rstrip(b"\r\n").decode("ascii", errors="replace")
+        return False, None, None
+    except (OSError, asyncio.TimeoutError, ValueError) as exception:
+        debug(f"AsyncClient.probe_ssh_port_async(): {hostname}:{ssh_port} did not send an SSH banner: {exception!r}")
+        return False, None, None
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+
+
+async def can_ping_remote_machine_async(ip_address: str, remote_os_type: OSType, timeout=None):
+    """Verify that a remote machine responds to a single ping request without blocking the event loop."""
+    argument = "-n" if remote_os_type == OSType.WINDOWS else "-c"
+    command_list = ["ping", argument, "1"]
+    if timeout is not None:
+        command_list.extend(["-W", str(int(max(1, timeout)))])
+    command_list.append(ip_address)
+
+    debug(f"AsyncClient.can_ping_remote_machine_async(): Passing the following command list: {command_list}")
+    process = await asyncio.create_subprocess_exec(*command_list, stdout=asyncio.subprocess.DEVNULL,
+                                                   stderr=asyncio.subprocess.DEVNULL)
+    try:
+        return_code = await asyncio.wait_for(process.wait(), None if timeout is None else timeout + 1)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        return False
+    return return_code == 0
+
+
+async def can_connect_to_remote_machine_async(ip_address: str, remote_os_type: OSType, timeout=None,
+                                              ssh_port=DEFAULT_SSH_PORT, probe_strategy=ProbeStrategy.TCP):
+    """Verify that a connection to a remote machine can be made, like Client.can_connect_to_remote_machine()."""
+    if ip_address is None or len(ip_address) == 0:
+        error(f"AsyncClient.can_connect_to_remote_machine_async(): Cannot make a connection to {ip_address} using "
+              "an username that is empty or None.")
+        return False
+
+    if remote_os_type != OSType.POSIX:
+        error("AsyncClient.can_connect_to_remote_machine_async(): Cannot make a connection to an remote machine "
+              "using an unsupported OS Type.")
+        return False
+
+    if probe_strategy == ProbeStrategy.PING:
+        return await can_ping_remote_machine_async(ip_address, remote_os_type, timeout)
+
+    is_reachable, _, _ = await probe_ssh_port_async(ip_address, ssh_port,
+                                                    DEFAULT_HOST_PROBE_TIMEOUT if timeout is None else timeout,
+                                                    probe_strategy == ProbeStrategy.SSH_BANNER)
+    return is_reachable
+
+
+async def probe_host_async(hostname_dict: dict, probe_timeout=DEFAULT_HOST_PROBE_TIMEOUT,
+                           probe_strategy=ProbeStrategy.TCP, metrics: Metrics = NULL_METRICS):
+    """Check a host from a hostname list without blocking the event loop, recording the probe in metrics."""
+    start_time = monotonic()
+    is_reachable = await can_connect_to_remote_machine_async(hostname_dict.get("hostname", ""),
+                                                             hostname_dict.get("os_type", ""),
+                                                             probe_timeout,
+                                                             hostname_dict.get("ssh_port", DEFAULT_SSH_PORT),
+                                                             probe_strategy)
+    record_host_probe(metrics, hostname_dict, is_reachable, monotonic() - start_time)
+    return is_reachable
+
+
+async def find_available_hostname_index_async(hostname_list: list[dict],
+                                              probe_timeout=DEFAULT_HOST_PROBE_TIMEOUT,
+                                              probe_deadline=DEFAULT_HOST_PROBE_DEADLINE,
+                                              prefer_list_priority=True,
+                                              probe_strategy=ProbeStrategy.TCP,
+                                              rank_by_latency=False,
+                                              host_health_cache=None,
+                                              metrics: Metrics = NULL_METRICS):
+    """Probe every host in a hostname list at the same time and return the index of the selected host, or None if
+    no host responds. The selection rules are the same as Client.find_available_hostname_index() with
+    concurrent_probing enabled.
+    """
+    if rank_by_latency:
+        # Ranking reads and writes the host health cache, so it runs in a worker thread.
+        return await asyncio.to_thread(find_available_hostname_index, hostname_list, True, probe_timeout,
+                                       probe_deadline, prefer_list_priority, probe_strategy, True, host_health_cache,
+                                       metrics)
+
+    if len(hostname_list) == 0:
+        return None
+
+    task_dict = {
+        asyncio.ensure_future(probe_host_async(hostname_dict, probe_timeout, probe_strategy, metrics)): index
+        for index, hostname_dict in enumerate(hostname_list)
+    }
+
+    result_list = [None] * len(hostname_list)
+    pending_task_set = set(task_dict)
+    deadline = monotonic() + probe_deadline
+    selected_index = None
+    try:
+        while pending_task_set:
+            remaining_time = deadline - monotonic()
+            if remaining_time <= 0:
+                debug("AsyncClient.find_available_hostname_index_async(): Reached the probe deadline.")
+                break
+
+            done_task_set, pending_task_set = await asyncio.wait(pending_task_set, timeout=remaining_time,
+                                                                 return_when=asyncio.FIRST_COMPLETED)
+            for task in done_task_set:
+                result_list[task_dict[task]] = task.result()
+
+            selected_index = get_selected_hostname_index(result_list, prefer_list_priority)
+            if selected_index is not None:
+                break
+
+        if selected_index is None:
+            selected_index = get_selected_hostname_index(result_list, prefer_list_priority, True)
+    finally:
+        for task in pending_task_set:
+            task.cancel()
+
+    debug(f"AsyncClient.find_available_hostname_index_async(): Selected host index {selected_index}.")
+    return selected_index
+
+
+async def get_remote_directory_metadata_async(client: Client, directory_path_list: list, existence_only=False):
+    """Run Client.get_remote_directory_metadata() in a worker thread, since Fabric connections are blocking."""
+    return await asyncio.to_thread(client.get_remote_directory_metadata, directory_path_list, existence_only)
@@ -0,0 +1,140 @@
+# -------------------------------------------------------------------------------
+# BandwidthScheduler.py
+# Share a global and a per-host bandwidth budget between the rsync processes of
+# a run by giving each one a --bwlimit when it starts, with budgets that follow
+# time-of-day windows.
+# -------------------------------------------------------------------------------
+
+from datetime import datetime, time as datetime_time
+from threading import Lock
+from logging import debug
+
+MIN_BANDWIDTH_LIMIT = 1
+
+
+def parse_window_time(time_string: str) -> datetime_time:
+    """Convert an HH:MM string from a bandwidth window into a time."""
+    return datetime.strptime(time_string, "%H:%M").time()
+
+
+class BandwidthWindow(object):
+    """A time of day during which different bandwidth budgets apply.
+
+    The window starts at start and ends at end (HH:MM, local time); if end is earlier than start, the window runs
+    past midnight. If weekday_list is passed, the window only applies on those days (0 is Monday), counted from the
+    day the window starts. A limit set to None means no limit.
+    """
+
+    def __init__(self, start: str, end: str, bandwidth_limit=None, host_bandwidth_limit=None,
+                 weekday_list: list[int] = None):
+        """Construct the object."""
+        self.start = parse_window_time(start)
+        self.end = parse_window_time(end)
+        self.bandwidth_limit = bandwidth_limit
+        self.host_bandwidth_limit = host_bandwidth_limit
+        self.weekday_list = weekday_list
+
+    @classmethod
+    def from_dict(cls, window_dict: dict):
+        """Create a window from a dictionary with start, end, bandwidth_limit, host_bandwidth_limit and weekday_list
+        keys, as passed in the bandwidth_window_list key of transfer_dict.
+        """
+        return cls(window_dict["start"], window_dict["end"], window_dict.get("bandwidth_limit"),
+                   window_dict.get("host_bandwidth_limit"), window_dict.get("weekday_list"))
+
+    def contains(self, current_time: datetime) -> bool:
+        """Check whether the window applies at current_time."""
+        time_of_day = current_time.time()
+        weekday = current_time.weekday()
+        if self.start <= self.end:
+            is_inside = self.start <= time_of_day < self.end
+        elif time_of_day >= self.start:
+            is_inside = True
+        else:
+            # After midnight, the window started the day before:
+            is_inside = time_of_day < self.end
+            weekday = (weekday - 1) % 7
+        return is_inside and (self.weekday_list is None or weekday in self.weekday_list)
+
+
+class BandwidthScheduler(object):
+    """Give every rsync process of a run a --bwlimit, in KiB per second like rsync, so that together they stay within
+    a global budget and the processes copying to or from each host stay within a per-host budget.
+
+    Each process is given an equal share of the budget that is not already used by the running processes, split
+    between the slots that are still free. When a process finishes, its share is returned to the budget and given
+    to the processes that start after it. The budgets are taken from the first window in window_list that applies
+    when a process starts, or from bandwidth_limit and host_bandwidth_limit otherwise.
+    NOTE: rsync cannot change the limit of a running process, so a process keeps the share it started with, even if
+    a window starts or ends while it is running.
+    """
+
+    def __init__(self, bandwidth_limit=None, host_bandwidth_limit=None, window_list: list[BandwidthWindow] = None,
+                 clock=datetime.now):
+        """Construct the object. clock returns the current local time."""
+        self.bandwidth_limit = bandwidth_limit
+        self.host_bandwidth_limit = host_bandwidth_limit
+        self.window_list: list[BandwidthWindow] = window_list if window_list is not None else []
+        self.clock = clock
+        self.slot_count = 1
+        self.host_slot_count = 1
+        self.allocated_limit = 0
+        self.active_count = 0
+        self.host_allocated_dict: dict[str, int] = {}
+        self.host_active_dict: dict[str, int] = {}
+        self.lock = Lock()
+
+    def is_enabled(self) -> bool:
+        """Check whether any budget is set, so that processes have to be given a limit."""
+        return self.bandwidth_limit is not None or self.host_bandwidth_limit is not None or \
+            any(window.bandwidth_limit is not None or window.host_bandwidth_limit is not None
+                for window in self.window_list)
+
+    def set_slot_count(self, slot_count: int, host_slot_count: int):
+        """Set the number of rsync processes that can run at the same time in total and for each host."""
+        with self.lock:
+            self.slot_count = max(1, int(slot_count))
+            self.host_slot_count = max(1, int(host_slot_count))
+
+    def get_current_limits(self):
+        """Return the global and per-host budgets that apply now."""
+        current_time = self.clock()
+        for window in self.window_list:
+            if window.contains(current_time):
+                return window.bandwidth_limit, window.host_bandwidth_limit
+        return self.bandwidth_limit, self.host_bandwidth_limit
+
+    def acquire(self, host_key: str):
+        """Reserve a share of the budgets for an rsync process that is about to start.
+
+        :returns The --bwlimit of the process in KiB per second, or None if no budget applies. Every call must be
+        followed by release() with the same host_key and returned limit once the process exits.
+        """
+        with self.lock:
+            bandwidth_limit, host_bandwidth_limit = self.get_current_limits()
+            share_list = []
+            if bandwidth_limit is not None:
+                free_slot_count = max(1, self.slot_count - self.active_count)
+                share_list.append((bandwidth_limit - self.allocated_limit) / free_slot_count)
+            if host_bandwidth_limit is not None:
+                free_slot_count = max(1, self.host_slot_count - self.host_active_dict.get(host_key, 0))
+                share_list.append((host_bandwidth_limit - self.host_allocated_dict.get(host_key, 0)) / free_slot_count)
+
+            limit = max(MIN_BANDWIDTH_LIMIT, int(min(share_list))) if share_list else None
+            self.active_count += 1
+            self.host_active_dict[host_key] = self.host_active_dict.get(host_key, 0) + 1
+            if limit is not None:
+                self.allocated_limit += limit
+                self.host_allocated_dict[host_key] = self.host_allocated_dict.get(host_key, 0) + limit
+
+        debug(f"BandwidthScheduler.acquire(): Limiting a transfer with {host_key} to {limit} KiB/s.")
+        return limit
+
+    def release(self, host_key: str, limit):
+        """Return the share reserved by acquire() once its rsync process has exited."""
+        with self.lock:
+            self.active_count = max(0, self.active_count - 1)
+            self.host_active_dict[host_key] = max(0, self.host_active_dict.get(host_key, 0) - 1)
+            if limit is not None:
+                self.allocated_limit = max(0, self.allocated_limit - limit)
+                self.host_allocated_dict[host_key] = max(0, self.host_allocated_dict.get(host_key, 0) - limit)
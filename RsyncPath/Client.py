@@ -5,26 +5,60 @@
 # Simple SSH Client used to execute specific commands on a remote machine.
 # -------------------------------------------------------------------------------
 
-from fabric import Connection, Result
-from invoke.exceptions import UnexpectedExit
-from subprocess import run, DEVNULL
+from subprocess import run, DEVNULL, TimeoutExpired
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from time import monotonic
+from socket import socket, getaddrinfo, gaierror, SOCK_STREAM, SOL_SOCKET, SO_ERROR
+from select import select
+from errno import EINPROGRESS, EWOULDBLOCK
 from pathlib import Path, PureWindowsPath
-from shlex import split
+from shlex import split, quote
+from io import StringIO
+from threading import Lock
+import sqlite3
+import os
+import re
 
 from RsyncPath.OSType import OSType
+from RsyncPath.ProbeStrategy import ProbeStrategy
+from RsyncPath.HostHealthCache import HostHealthCache, get_host_key
+from RsyncPath.LocalDirectoryScanner import LocalDirectoryScanner, DEFAULT_SCAN_WORKERS
+from RsyncPath.DirectorySizeCache import DirectorySizeCache
+from RsyncPath.FileHashCache import FileHashCache
+from RsyncPath.FileHasher import ParallelFileHasher, DEFAULT_HASH_WORKERS
+from RsyncPath.HashAlgorithm import HashAlgorithm
+from RsyncPath.FileManifest import FileManifest, scan_local_directory, parse_find_mtime
+from RsyncPath.CompressionSelector import RsyncVersion, parse_rsync_version
+from RsyncPath.Metrics import Metrics, NULL_METRICS
+from RsyncPath.SSHBackend import SSHBackend
+from RsyncPath.RemoteConnection import RemoteConnection, RemoteCommandResult, RemoteCommandError, create_connection
+from RsyncPath.RemoteAgent import RemoteAgent, RemoteAgentError, DEFAULT_REMOTE_AGENT_PYTHON
 from logging import debug, error
 
 DEFAULT_SSH_PORT = 22
+DEFAULT_HOST_PROBE_TIMEOUT = 2
+DEFAULT_HOST_PROBE_DEADLINE = 5
+MAX_SSH_BANNER_LENGTH = 255
+LINK_PROBE_START_SIZE = 256 * 1024
+LINK_PROBE_MAX_SIZE = 16 << 20
+MIN_LINK_PROBE_DURATION = 0.2
+RSYNC_VERSION_TIMEOUT = 10
 
 
-def can_connect_to_remote_machine(ip_address: str, remote_os_type: OSType):
-    """Verify that a connection to a remote machine can be made by sending a ping request.
+def can_connect_to_remote_machine(ip_address: str, remote_os_type: OSType, timeout=None,
+                                  ssh_port=DEFAULT_SSH_PORT, probe_strategy=ProbeStrategy.TCP):
+    """Verify that a connection to a remote machine can be made.
+    By default, this opens a TCP connection to the SSH port of the remote machine. If probe_strategy is
+    ProbeStrategy.PING, a ping request is sent instead.
     NOTE: A host may not respond to a ping request even if the ip address is valid.
 
     :param: ip_address
-    :returns True if the remote address responds to the ping request. False otherwise.
+    :param: timeout Number of seconds to wait for a reply. None uses the default of the selected strategy.
+    :param: ssh_port Port the SSH server on the remote machine listens on.
+    :param: probe_strategy ProbeStrategy used to check the remote machine.
+    :returns True if the remote address responds to the probe. False otherwise.
     """
-    debug("Client.can_connect_to_remote_machine(): Starting ping call.")
+    debug(f"Client.can_connect_to_remote_machine(): Starting {probe_strategy.name} probe.")
     if ip_address is None or len(ip_address) == 0:
         error(f"Client.can_connect_to_remote_machine(): Cannot make a connection to {ip_address} using an "
               "username that is empty or None.")
@@ -35,69 +69,442 @@ def can_connect_to_remote_machine(ip_address: str, remote_os_type: OSType):
               "unsupported OS Type.")
         return False
 
+    if probe_strategy == ProbeStrategy.PING:
+        return can_ping_remote_machine(ip_address, remote_os_type, timeout)
+
+    is_reachable, _, _ = probe_ssh_port(ip_address, ssh_port,
+                                        DEFAULT_HOST_PROBE_TIMEOUT if timeout is None else timeout,
+                                        probe_strategy == ProbeStrategy.SSH_BANNER)
+    return is_reachable
+
+
+def can_ping_remote_machine(ip_address: str, remote_os_type: OSType, timeout=None):
+    """Verify that a remote machine responds to a single ping request.
+
+    :param: timeout Number of seconds to wait for a reply. None waits as long as ping does.
+    :returns True if the remote address responds to the ping request. False otherwise.
+    """
     argument = "-n" if remote_os_type == OSType.WINDOWS else "-c"
-    command = f"ping {argument} 1 {ip_address}"
+    timeout_string = "" if timeout is None else f"-W {int(max(1, timeout))}"
+    command = f"ping {argument} 1 {timeout_string} {ip_address}"
     command_list = split(command)
 
-    debug(f"Client.can_connect_to_remote_machine(): Passing the following command list: {command_list}")
-    result = run(command_list, stdout=DEVNULL, stderr=DEVNULL)
+    debug(f"Client.can_ping_remote_machine(): Passing the following command list: {command_list}")
+    try:
+        result = run(command_list, stdout=DEVNULL, stderr=DEVNULL, timeout=None if timeout is None else timeout + 1)
+    except TimeoutExpired:
+        debug(f"Client.can_ping_remote_machine(): {ip_address} did not respond within {timeout} second(s).")
+        return False
     return result.returncode is not None and result.returncode == 0
 
 
-def create_instance_from_available_hostnames(hostname_list: list[dict]):
-    """Select an available client from a hostname list and return a Client instance."""
+def probe_ssh_port(hostname: str, ssh_port=DEFAULT_SSH_PORT, timeout=DEFAULT_HOST_PROBE_TIMEOUT, read_banner=False):
+    """Open a non-blocking TCP connection to the SSH port of a remote machine.
+
+    :param: hostname
+    :param: ssh_port
+    :param: timeout Number of seconds to wait for the connection (and the banner, if requested).
+    :param: read_banner If True, the host is only considered reachable if it sends an SSH banner.
+    :returns A tuple containing whether the port is reachable, the connect latency in seconds (None if the
+    connection failed) and the SSH banner (None if it was not read).
+    """
+    deadline = monotonic() + timeout
+    try:
+        address_info_list = getaddrinfo(hostname, ssh_port, type=SOCK_STREAM)
+    except (gaierror, OSError) as exception:
+        debug(f"Client.probe_ssh_port(): Unable to resolve {hostname}: {exception}")
+        return False, None, None
+
+    for family, socket_type, protocol, _, address in address_info_list:
+        connection_socket = socket(family, socket_type, protocol)
+        connection_socket.setblocking(False)
+        try:
+            start_time = monotonic()
+            result_code = connection_socket.connect_ex(address)
+            if result_code not in (0, EINPROGRESS, EWOULDBLOCK):
+                debug(f"Client.probe_ssh_port(): Connection to {address} failed with error code {result_code}.")
+                continue
+
+            _, writable_list, _ = select([], [connection_socket], [], max(0.0, deadline - monotonic()))
+            if not writable_list:
+                debug(f"Client.probe_ssh_port(): Connection to {address} timed out.")
+                continue
+
+            result_code = connection_socket.getsockopt(SOL_SOCKET, SO_ERROR)
+            if result_code != 0:
+                debug(f"Client.probe_ssh_port(): Connection to {address} failed with error code {result_code}.")
+                continue
+            latency = monotonic() - start_time
+
+            if not read_banner:
+                debug(f"Client.probe_ssh_port(): Connected to {address} in {latency:.4f} second(s).")
+                return True, latency, None
+
+            banner = read_ssh_banner(connection_socket, deadline)
+            if banner is None:
+                debug(f"Client.probe_ssh_port(): {address} did not send an SSH banner.")
+                continue
+
+            debug(f"Client.probe_ssh_port(): Connected to {address} ({banner}) in {latency:.4f} second(s).")
+            return True, latency, banner
+        except OSError as exception:
+            debug(f"Client.probe_ssh_port(): Connection to {address} failed: {exception}")
+        finally:
+            connection_socket.close()
+
+    return False, None, None
+
+
+def read_ssh_banner(connection_socket: socket, deadline: float):
+    """Read the identification line sent by an SSH server from a connected non-blocking socket.
+
+    :returns The banner without the trailing newline, or None if no SSH banner arrived before the deadline.
+    """
+    received_bytes = b""
+    while b"\n" not in received_bytes and len(received_bytes) < MAX_SSH_BANNER_LENGTH:
+        readable_list, _, _ = select([connection_socket], [], [], max(0.0, deadline - monotonic()))
+        if not readable_list:
+            return None
+        chunk = connection_socket.recv(MAX_SSH_BANNER_LENGTH)
+        if not chunk:
+            break
+        received_bytes += chunk
+
+    # The server may send other lines before the identification string:
+    for line in received_bytes.split(b"\n"):
+        if line.startswith(b"SSH-"):
+            return line.rstrip(b"\r").decode("ascii", errors="replace")
+    return None
+
+
+def record_host_probe(metrics: Metrics, hostname_dict: dict, is_reachable: bool, duration: float):
+    """Record the outcome and duration of a probe of a host from a hostname list."""
+    label_dict = {"host": get_host_key(hostname_dict.get("hostname", ""),
+                                       hostname_dict.get("ssh_port", DEFAULT_SSH_PORT)),
+                  "reachable": str(bool(is_reachable)).lower()}
+    metrics.increment("host_probes_total", 1, label_dict)
+    metrics.observe("host_probe_duration_seconds", duration, label_dict)
+
+
+def probe_host(hostname_dict: dict, probe_timeout=DEFAULT_HOST_PROBE_TIMEOUT, probe_strategy=ProbeStrategy.TCP,
+               metrics: Metrics = NULL_METRICS):
+    """Check a host from a hostname list with can_connect_to_remote_machine(), recording the probe in metrics."""
+    start_time = monotonic()
+    is_reachable = can_connect_to_remote_machine(hostname_dict.get("hostname", ""),
+                                                 hostname_dict.get("os_type", ""),
+                                                 probe_timeout,
+                                                 hostname_dict.get("ssh_port", DEFAULT_SSH_PORT),
+                                                 probe_strategy)
+    record_host_probe(metrics, hostname_dict, is_reachable, monotonic() - start_time)
+    return is_reachable
+
+
+def measure_host_latency(hostname_dict: dict, probe_timeout=DEFAULT_HOST_PROBE_TIMEOUT,
+                         probe_strategy=ProbeStrategy.TCP, metrics: Metrics = NULL_METRICS):
+    """Measure how long a remote machine in a hostname list takes to respond.
+
+    :returns The latency in seconds, or None if the remote machine did not respond.
+    """
+    hostname = hostname_dict.get("hostname", "")
+    os_type = hostname_dict.get("os_type", "")
+    ssh_port = hostname_dict.get("ssh_port", DEFAULT_SSH_PORT)
+    if probe_strategy == ProbeStrategy.PING or os_type != OSType.POSIX or not hostname:
+        start_time = monotonic()
+        is_reachable = can_connect_to_remote_machine(hostname, os_type, probe_timeout, ssh_port, probe_strategy)
+        latency = monotonic() - start_time
+        record_host_probe(metrics, hostname_dict, is_reachable, latency)
+        return latency if is_reachable else None
+
+    start_time = monotonic()
+    is_reachable, latency, _ = probe_ssh_port(hostname, ssh_port, probe_timeout,
+                                              probe_strategy == ProbeStrategy.SSH_BANNER)
+    record_host_probe(metrics, hostname_dict, is_reachable, latency if is_reachable else monotonic() - start_time)
+    return latency if is_reachable else None
+
+
+def measure_host_latency_dict(hostname_list: list[dict], index_list: list[int],
+                              probe_timeout=DEFAULT_HOST_PROBE_TIMEOUT,
+                              probe_strategy=ProbeStrategy.TCP,
+                              host_health_cache: HostHealthCache = None,
+                              metrics: Metrics = NULL_METRICS):
+    """Measure the latency of the hosts at index_list in a hostname list at the same time, and record each outcome
+    in host_health_cache if one is passed.
+
+    :returns A dictionary mapping the index of each host that responded to its latency.
+    """
+    if not index_list:
+        return {}
+
+    debug(f"Client.measure_host_latency_dict(): Measuring the latency of {len(index_list)} host(s).")
+    with ThreadPoolExecutor(max_workers=len(index_list)) as executor:
+        latency_list = list(executor.map(lambda index: measure_host_latency(hostname_list[index], probe_timeout,
+                                                                            probe_strategy, metrics),
+                                         index_list))
+
+    latency_dict = {}
+    for index, latency in zip(index_list, latency_list):
+        hostname_dict = hostname_list[index]
+        host_key = get_host_key(hostname_dict.get("hostname", ""), hostname_dict.get("ssh_port", DEFAULT_SSH_PORT))
+        debug(f"Client.measure_host_latency_dict(): {host_key} latency is {latency}.")
+        if latency is None:
+            if host_health_cache is not None:
+                host_health_cache.record_failure(host_key)
+            continue
+        if host_health_cache is not None:
+            host_health_cache.record_success(host_key, latency)
+        latency_dict[index] = latency
+    return latency_dict
+
+
+def rank_available_hostnames(hostname_list: list[dict],
+                             probe_timeout=DEFAULT_HOST_PROBE_TIMEOUT,
+                             probe_strategy=ProbeStrategy.TCP,
+                             host_health_cache: HostHealthCache = None,
+                             metrics: Metrics = NULL_METRICS):
+    """Rank the hosts in a hostname list that respond by their measured latency, fastest first.
+
+    If a host_health_cache is passed, hosts with a recent latency in it are ranked by that latency without being
+    probed, except the one that would be ranked first: it may have gone down since, so it is probed along with every
+    host that has no recent latency and is not being backed off. If it does not respond, the next cached host that
+    would be ranked first is probed, and so on. The results are stored in the cache.
+
+    :returns A list of (index, latency) tuples sorted by latency, where index refers to the hostname list.
+    """
+    cached_latency_dict = {}
+    candidate_index_list = []
+    for index, hostname_dict in enumerate(hostname_list):
+        host_key = get_host_key(hostname_dict.get("hostname", ""), hostname_dict.get("ssh_port", DEFAULT_SSH_PORT))
+        latency = host_health_cache.get_fresh_latency(host_key) if host_health_cache is not None else None
+        if latency is not None:
+            cached_latency_dict[index] = latency
+        elif host_health_cache is None or not host_health_cache.is_backed_off(host_key):
+            candidate_index_list.append(index)
+    # Do not give up on every host just because they all failed recently:
+    if not cached_latency_dict and not candidate_index_list:
+        candidate_index_list = list(range(len(hostname_list)))
+    if cached_latency_dict:
+        debug(f"Client.rank_available_hostnames(): Using {len(cached_latency_dict)} cached latency value(s).")
+
+    def get_rank(index_latency):
+        return index_latency[1], index_latency[0]
+
+    measured_latency_dict = {}
+    ranked_list = []
+    while True:
+        index_list = candidate_index_list
+        candidate_index_list = []
+        if cached_latency_dict:
+            best_index = min(cached_latency_dict.items(), key=get_rank)[0]
+            del cached_latency_dict[best_index]
+            index_list = index_list + [best_index]
+        measured_latency_dict.update(measure_host_latency_dict(hostname_list, index_list, probe_timeout,
+                                                               probe_strategy, host_health_cache, metrics))
+        ranked_list = sorted([*measured_latency_dict.items(), *cached_latency_dict.items()], key=get_rank)
+        if not ranked_list or ranked_list[0][0] in measured_latency_dict:
+            break
+
+    if host_health_cache is not None:
+        try:
+            host_health_cache.save()
+        except OSError as exception:
+            error(f"Client.rank_available_hostnames(): Unable to save the host health cache: {exception}")
+
+    return ranked_list
+
+
+def find_available_hostname_index(hostname_list: list[dict],
+                                  concurrent_probing=False,
+                                  probe_timeout=DEFAULT_HOST_PROBE_TIMEOUT,
+                                  probe_deadline=DEFAULT_HOST_PROBE_DEADLINE,
+                                  prefer_list_priority=True,
+                                  probe_strategy=ProbeStrategy.TCP,
+                                  rank_by_latency=False,
+                                  host_health_cache: HostHealthCache = None,
+                                  metrics: Metrics = NULL_METRICS):
+    """Return the index of the host in the hostname list that should be connected to, or None if no host responds.
+
+    If rank_by_latency is True, the hosts are ranked with rank_available_hostnames() and the fastest one is
+    selected. In that case, concurrent_probing, probe_deadline and prefer_list_priority are ignored.
+
+    Each host is checked with can_connect_to_remote_machine() using the passed probe_strategy. When
+    concurrent_probing is disabled, each host is probed in list order and the first one to respond is selected.
+    Otherwise, every host is probed at the same time with a per-host timeout of probe_timeout seconds. If
+    prefer_list_priority is False, the first host to respond is selected. If it is True, the host closest to the
+    front of the list that responded before probe_deadline seconds is selected; hosts further down the list
+    only need to be waited on until every host in front of them has answered.
+
+    The outcome and duration of every probe is recorded in metrics.
+    """
+    if rank_by_latency:
+        ranked_list = rank_available_hostnames(hostname_list, probe_timeout, probe_strategy, host_health_cache,
+                                               metrics)
+        return ranked_list[0][0] if ranked_list else None
+
+    if not concurrent_probing:
+        for index, hostname_dict in enumerate(hostname_list):
+            hostname = hostname_dict.get("hostname", "")
+            os_type = hostname_dict.get("os_type", "")
+            debug("Client.find_available_hostname_index(): "
+                  f"Checking if host {index + 1} with address {hostname} and os_type {os_type} is "
+                  f"available to connect:")
+            if probe_host(hostname_dict, probe_timeout, probe_strategy, metrics):
+                return index
+        return None
+
+    if len(hostname_list) == 0:
+        return None
+
+    debug(f"Client.find_available_hostname_index(): Probing {len(hostname_list)} host(s) concurrently with a "
+          f"timeout of {probe_timeout} second(s).")
+    executor = ThreadPoolExecutor(max_workers=len(hostname_list))
+    future_dict = {
+        executor.submit(probe_host, hostname_dict, probe_timeout, probe_strategy, metrics): index
+        for index, hostname_dict in enumerate(hostname_list)
+    }
+
+    result_list = [None] * len(hostname_list)
+    pending_future_set = set(future_dict)
+    deadline = monotonic() + probe_deadline
+    selected_index = None
+    try:
+        while pending_future_set:
+            remaining_time = deadline - monotonic()
+            if remaining_time <= 0:
+                debug("Client.find_available_hostname_index(): Reached the probe deadline.")
+                break
+
+            done_future_set, pending_future_set = wait(pending_future_set, timeout=remaining_time,
+                                                       return_when=FIRST_COMPLETED)
+            for future in done_future_set:
+                result_list[future_dict[future]] = future.result()
+
+            selected_index = get_selected_hostname_index(result_list, prefer_list_priority)
+            if selected_index is not None:
+                break
+
+        if selected_index is None:
+            selected_index = get_selected_hostname_index(result_list, prefer_list_priority, True)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    debug(f"Client.find_available_hostname_index(): Selected host index {selected_index}.")
+    return selected_index
+
+
+def find_all_available_hostname_index_list(hostname_list: list[dict],
+                                           probe_timeout=DEFAULT_HOST_PROBE_TIMEOUT,
+                                           probe_strategy=ProbeStrategy.TCP,
+                                           metrics: Metrics = NULL_METRICS):
+    """Probe every host in a hostname list at the same time and return the indices of every host that responded
+    within probe_timeout seconds, in list order. The outcome and duration of every probe is recorded in metrics.
+    """
+    if len(hostname_list) == 0:
+        return []
+
+    debug(f"Client.find_all_available_hostname_index_list(): Probing {len(hostname_list)} host(s) concurrently with "
+          f"a timeout of {probe_timeout} second(s).")
+    with ThreadPoolExecutor(max_workers=len(hostname_list)) as executor:
+        result_list = list(executor.map(lambda hostname_dict: probe_host(hostname_dict, probe_timeout, probe_strategy,
+                                                                         metrics),
+                                        hostname_list))
+
+    index_list = [index for index, is_reachable in enumerate(result_list) if is_reachable]
+    debug(f"Client.find_all_available_hostname_index_list(): Selected host indices {index_list}.")
+    return index_list
+
+
+def get_selected_hostname_index(result_list: list, prefer_list_priority=True, is_final=False):
+    """Select a host from the probe results received so far, where each result is True if the host responded, False
+    if it did not, and None if it has not answered yet.
+
+    If prefer_list_priority is False, any host that responded is selected. Otherwise, a host is only selected once
+    every host in front of it has answered, unless is_final is True.
+
+    :returns The index of the selected host, or None if no host can be selected yet.
+    """
+    for index, has_responded in enumerate(result_list):
+        if has_responded is None and prefer_list_priority and not is_final:
+            return None
+        if has_responded:
+            return index
+    return None
+
+
+def create_instance_from_hostname_dict(hostname_dict: dict, username: str = None):
+    """Create a Client instance for a host from a hostname list. If username is None, the username of the host is
+    used.
+    """
+    return Client(username if username is not None else hostname_dict.get("username", ""),
+                  hostname_dict.get("hostname", ""),
+                  hostname_dict.get("ssh_port", DEFAULT_SSH_PORT),
+                  hostname_dict.get("os_type", ""))
+
+
+def create_instance_from_available_hostnames(hostname_list: list[dict], **probe_options):
+    """Select an available client from a hostname list and return a Client instance.
+
+    Any keyword arguments are passed on to find_available_hostname_index().
+    """
     debug("Client.create_client_instance_from_available_hostnames(): Searching for an available host.")
-    index = 1
-    for hostname_dict in hostname_list:
-        hostname = hostname_dict.get("hostname", "")
-        os_type = hostname_dict.get("os_type", "")
-        username = hostname_dict.get("username", "")
-        host_ssh_port = hostname_dict.get("ssh_port", DEFAULT_SSH_PORT)
-
-        debug("Client.create_instance_from_available_hostnames(): "
-              f"Checking if host {index} with username {username}, address {hostname} and os_type {os_type} is "
-              f"available to connect:")
-        if can_connect_to_remote_machine(hostname, os_type):
-            return Client(username, hostname, host_ssh_port, os_type)
-        index += 1
+    index = find_available_hostname_index(hostname_list, **probe_options)
+    if index is not None:
+        return create_instance_from_hostname_dict(hostname_list[index])
 
     error_message = """Could not establish any connection to any remote machine on the IP List. Please
      check your internet connection and make sure that at least one of the remote machines is available."""
     raise RuntimeError(error_message)
 
 
-def create_instance_from_username_and_available_hostnames(username: str, hostname_list: list[dict]):
-    """Select an available client from a specified username and hostname list and return a Client instance."""
+def create_instance_from_username_and_available_hostnames(username: str, hostname_list: list[dict], **probe_options):
+    """Select an available client from a specified username and hostname list and return a Client instance.
+
+    Any keyword arguments are passed on to find_available_hostname_index().
+    """
     debug("Client.create_client_instance_from_username_and_available_hostnames(): Searching for an available host.")
 
     if username is None or len(username) == 0:
         raise RuntimeError("Error: Cannot establish any connection to a machine on the IP List due to having a "
                            "username is that is either empty or None.")
 
-    index = 1
-    for hostname_dict in hostname_list:
-        hostname = hostname_dict.get("hostname", "")
-        os_type = hostname_dict.get("os_type", "")
-        debug("Client.create_instance_from_username_and_available_hostnames(): "
-              f"Checking if host {index} with username {username}, address {hostname} and os_type {os_type} is "
-              f"available to connect:")
-
-        host_ssh_port = hostname_dict.get("ssh_port", DEFAULT_SSH_PORT)
-        if can_connect_to_remote_machine(hostname, os_type):
-            return Client(username, hostname, host_ssh_port, os_type)
-        index += 1
+    index = find_available_hostname_index(hostname_list, **probe_options)
+    if index is not None:
+        return create_instance_from_hostname_dict(hostname_list[index], username)
 
     error_message = """Could not establish any connection to any remote machine on the IP List. Please check your
     internet connection and make sure that at least one of the remote machines is available."""
     raise RuntimeError(error_message)
 
 
+def parse_hash_program_output(output: str) -> dict:
+    """Parse the "<digest>  ./<path>" lines printed by sha256sum and the programs that copy its format into a
+    dictionary mapping each path (without ./) to its digest. A line starting with a backslash holds a path in which
+    backslashes, newlines and carriage returns were escaped.
+    """
+    hash_dict = {}
+    for line in output.split("\n"):
+        is_escaped = line.startswith("\\")
+        if is_escaped:
+            line = line[1:]
+        digest, separator, file_path = line.partition(" ")
+        if not separator or not file_path:
+            continue
+        # The separator is followed by a space in text mode, or an asterisk in binary mode:
+        file_path = file_path[1:]
+        if is_escaped:
+            file_path = re.sub(r"\\(.)", lambda match: {"n": "\n", "r": "\r"}.get(match.group(1), match.group(1)),
+                               file_path)
+        hash_dict[file_path[2:] if file_path.startswith("./") else file_path] = digest.lower()
+    return hash_dict
+
+
 class Client(object):
     """A simple Client class to execute specific commands on both your local and remote machines."""
 
-    def __init__(self, username, hostname, ssh_port=DEFAULT_SSH_PORT, remote_os_type=OSType.UNKNOWN):
-        """Construct the Client Object."""
-        self.ssh_connection = Connection(host=hostname, user=username, port=ssh_port)
+    def __init__(self, username, hostname, ssh_port=DEFAULT_SSH_PORT, remote_os_type=OSType.UNKNOWN,
+                 ssh_backend=SSHBackend.FABRIC):
+        """Construct the Client Object. No SSH connection is made until a remote command is run."""
+        self.ssh_backend = ssh_backend
+        self.ssh_connection: RemoteConnection = create_connection(ssh_backend, username, hostname, ssh_port)
 
         self.username = username
         self.hostname = hostname
@@ -107,20 +514,96 @@ class Client(object):
         self.remote_os_type = remote_os_type
         self.remote_shell_name = "/bin/bash" if self.remote_os_type == OSType.POSIX else "cmd.exe"
         self.local_shell_name = "/bin/bash" if self.local_os_type == OSType.POSIX else "cmd.exe"
+        self.local_scan_workers = DEFAULT_SCAN_WORKERS
+        self.directory_size_cache: DirectorySizeCache = None
+        self.hash_workers = DEFAULT_HASH_WORKERS
+        self.file_hash_cache: FileHashCache = None
+        self.metrics: Metrics = NULL_METRICS
+        self.enable_remote_agent = False
+        self.remote_agent_python_path = DEFAULT_REMOTE_AGENT_PYTHON
+        self.remote_agent: RemoteAgent = None
+        self.remote_agent_lock = Lock()
+        # The throughput measured by measure_link_throughput(), kept for the rest of the session:
+        self.link_throughput = None
 
     def change_connection(self, username, hostname, ssh_port, os_type=None):
         """Close the current SSH connection and create a new one using the passed username, hostname and port
         variables.
         """
-        if self.ssh_connection.is_connected():
-            self.ssh_connection.close()
-        self.ssh_connection = Connection(user=username, host=hostname, port=ssh_port)
+        self.stop_remote_agent()
+        self.ssh_connection.close()
+        self.ssh_connection = create_connection(self.ssh_backend, username, hostname, ssh_port)
         self.username = username
         self.hostname = hostname
         self.ssh_port = ssh_port
+        self.link_throughput = None
         if os_type is not None:
             self.remote_os_type = os_type
 
+    def change_ssh_backend(self, ssh_backend: SSHBackend):
+        """Close the current SSH connection and run every following remote command through the passed SSHBackend."""
+        if ssh_backend == self.ssh_backend:
+            return
+        self.ssh_backend = ssh_backend
+        self.change_connection(self.username, self.hostname, self.ssh_port)
+
+    def run_remote_command(self, command: str, operation: str, **kwargs):
+        """Run a command on the remote machine through the SSH connection, recording the number of commands and
+        their duration in metrics under the passed operation name. Any keyword arguments are passed on to
+        RemoteConnection.run(), which raises a RemoteCommandError on a non-zero exit code unless warn is True.
+        """
+        label_dict = {"host": get_host_key(self.hostname, self.ssh_port), "operation": operation}
+        start_time = monotonic()
+        status = "failed"
+        try:
+            result = self.ssh_connection.run(command, shell=self.remote_shell_name, hide=True, **kwargs)
+            status = "ok" if result.ok else "failed"
+            return result
+        finally:
+            self.metrics.increment("ssh_commands_total", 1, {**label_dict, "status": status})
+            self.metrics.observe("ssh_command_duration_seconds", monotonic() - start_time, label_dict)
+
+    def get_remote_agent(self):
+        """Return the remote agent, starting it the first time if enable_remote_agent is True.
+
+        :returns The RemoteAgent, or None if it is disabled or could not be started, in which case shell commands are
+        used instead for the rest of the session.
+        """
+        with self.remote_agent_lock:
+            if self.remote_agent is None and self.enable_remote_agent and self.remote_os_type == OSType.POSIX:
+                self.remote_agent = RemoteAgent(self.ssh_connection, self.remote_shell_name,
+                                                self.remote_agent_python_path, self.metrics,
+                                                {"host": get_host_key(self.hostname, self.ssh_port)})
+                if not self.remote_agent.start():
+                    error("Client.get_remote_agent(): Unable to start the remote agent; using shell commands instead.")
+                    self.remote_agent = None
+                    self.enable_remote_agent = False
+            return self.remote_agent
+
+    def stop_remote_agent(self):
+        """Stop the remote agent if it is running. It is started again by the next request."""
+        with self.remote_agent_lock:
+            if self.remote_agent is not None:
+                self.remote_agent.stop()
+                self.remote_agent = None
+
+    def run_remote_agent_request_list(self, request_list: list[dict]):
+        """Send a batch of requests to the remote agent.
+
+        :returns A list of the responses in the same order as the requests, or None if the remote agent is not used,
+        in which case the caller falls back to a shell command.
+        """
+        remote_agent = self.get_remote_agent()
+        if remote_agent is None:
+            return None
+        try:
+            return remote_agent.request_list(request_list)
+        except RemoteAgentError as exception:
+            error(f"Client.run_remote_agent_request_list(): {exception} Using shell commands instead.")
+            self.stop_remote_agent()
+            self.enable_remote_agent = False
+            return None
+
     def get_remote_directory_size_in_bytes(self, directory_path):
         """Retrieve the size of a specific directory on the remote machine."""
         debug("Client.get_remote_directory_size_in_bytes(): Starting function...")
@@ -130,6 +613,20 @@ class Client(object):
                   "OS.")
             return
 
+        if self.directory_size_cache is not None:
+            return self.get_cached_remote_directory_size_in_bytes(directory_path)
+
+        response_list = self.run_remote_agent_request_list([{"operation": "size", "path": str(directory_path)}])
+        if response_list is not None:
+            if not response_list[0]["ok"]:
+                debug(f"Client.get_remote_directory_size_in_bytes(): Received {response_list[0]['error']['code']} "
+                      f"for {str(directory_path)}. Returning None as the byte size.")
+                return None
+            size_in_bytes = response_list[0]["result"]["size_in_bytes"]
+            debug(f"Client.get_remote_directory_size_in_bytes(): Size of {str(directory_path)} is {size_in_bytes} "
+                  f"byte(s)")
+            return size_in_bytes
+
         command = ""
         if self.remote_os_type == OSType.POSIX:
             command = f"du -sLb \"{str(directory_path)}\""
@@ -138,11 +635,10 @@ class Client(object):
 
         # Now run the damn thing:
         try:
-            result: Result = self.ssh_connection.run(command, shell=self.remote_shell_name, hide=True)
-        except UnexpectedExit as exception:
-            exception_argument_list = exception.__str__().split("\n\n")
-            invalid_command = exception_argument_list[1].split(":")[1]
-            error_code = exception_argument_list[2].split(":")[1]
+            result: RemoteCommandResult = self.run_remote_command(command, "directory_size")
+        except RemoteCommandError as exception:
+            invalid_command = exception.result.command
+            error_code = exception.result.exited
 
             debug(f"Client.get_remote_directory_size_in_bytes(): Received Unexpected Exit Code {error_code} when "
                   f"executing {invalid_command}. Returning None as the byte size.")
@@ -156,14 +652,424 @@ class Client(object):
               f"Size of {str(directory_path)} is {size_in_bytes} byte(s)")
         return int(size_in_bytes)
 
+    def get_cached_remote_directory_size_in_bytes(self, directory_path):
+        """Retrieve the size of a directory on the remote machine, only summing the files of the directories that
+        changed since they were stored in the directory size cache.
+
+        The directories of the remote tree are listed with a single command, and the files directly inside any
+        directory that is not cached are summed with a second command. Like du -sLb, symbolic links are followed and
+        the size of each directory is included, but hard-linked files are counted once per link.
+        """
+        debug(f"Client.get_cached_remote_directory_size_in_bytes(): Listing the directories in {str(directory_path)}")
+        namespace = f"{self.username}@{self.hostname}:{self.ssh_port}"
+        command = f"find -L {quote(str(directory_path))} -type d -printf '%D\\t%i\\t%T@\\t%s\\t%p\\0'"
+        result: RemoteCommandResult = self.run_remote_command(command, "list_directories", warn=True)
+        if not result.stdout:
+            debug(f"Client.get_cached_remote_directory_size_in_bytes(): Received Exit Code {result.exited} when "
+                  f"listing {str(directory_path)}. Returning None as the byte size.")
+            return None
+
+        size_in_bytes = 0
+        seen_set = set()
+        changed_directory_list = []
+        for record in result.stdout.split("\0"):
+            if not record:
+                continue
+            device, inode, mtime, directory_size, path = record.split("\t", 4)
+            if (device, inode) in seen_set:
+                continue
+            seen_set.add((device, inode))
+            size_in_bytes += int(directory_size)
+
+            directory_key = (path, int(device), int(inode), int(round(float(mtime) * 1e9)))
+            cached_entry = self.directory_size_cache.get(namespace, *directory_key)
+            if cached_entry is not None:
+                size_in_bytes += cached_entry[0]
+            else:
+                changed_directory_list.append(directory_key)
+
+        debug(f"Client.get_cached_remote_directory_size_in_bytes(): {len(changed_directory_list)} of "
+              f"{len(seen_set)} directories changed since they were cached.")
+        if changed_directory_list:
+            command = """while IFS= read -r -d '' directory_path; do
+    find -L "$directory_path" -mindepth 1 -maxdepth 1 ! -type d -printf '%s\\t%T@\\t%Y\\n' 2>/dev/null | \\
+        awk -F '\\t' 'BEGIN { size = 0; count = 0; newest = 0 }
+                      $3 != "N" { size += $1; if ($3 == "f") { count++; if ($2 > newest) newest = $2 } }
+                      END { printf "%d\\t%d\\t%f\\n", size, count, newest }'
+done"""
+            path_stream = StringIO("".join(f"{directory_key[0]}\0" for directory_key in changed_directory_list))
+            result = self.run_remote_command(command, "changed_directory_size", warn=True, in_stream=path_stream)
+            line_list = result.stdout.splitlines()
+            if len(line_list) != len(changed_directory_list):
+                debug(f"Client.get_cached_remote_directory_size_in_bytes(): Expected {len(changed_directory_list)} "
+                      f"line(s) but received {len(line_list)}. Returning None as the byte size.")
+                return None
+
+            for directory_key, line in zip(changed_directory_list, line_list):
+                file_size, file_count, newest_mtime = line.split("\t")
+                size_in_bytes += int(file_size)
+                self.directory_size_cache.put(namespace, *directory_key, int(file_size), int(file_count),
+                                              float(newest_mtime))
+
+        self.save_directory_size_cache()
+        debug(f"Client.get_cached_remote_directory_size_in_bytes(): Size of {str(directory_path)} is "
+              f"{size_in_bytes} byte(s)")
+        return size_in_bytes
+
+    def save_directory_size_cache(self):
+        """Write the directory size cache, if there is one, logging any failure instead of raising it."""
+        if self.directory_size_cache is None:
+            return
+        try:
+            self.directory_size_cache.save()
+        except (OSError, sqlite3.Error) as exception:
+            error(f"Client.save_directory_size_cache(): Unable to save the directory size cache: {exception}")
+
+    def get_remote_directory_metadata(self, directory_path_list: list, existence_only=False):
+        """Retrieve the metadata of every directory in a list from the remote machine in a single command.
+
+        :param: existence_only If True, only check whether each directory exists; size_in_bytes, file_count and
+        newest_mtime are set to None.
+        :returns A dictionary mapping each directory path (as a string) to a dictionary containing exists,
+        size_in_bytes, file_count and newest_mtime keys, or None if the metadata could not be retrieved.
+        """
+        debug(f"Client.get_remote_directory_metadata(): Retrieving metadata for {len(directory_path_list)} "
+              f"directories.")
+        if self.remote_os_type != OSType.POSIX:
+            debug("Client.get_remote_directory_metadata(): Cannot retrieve directory metadata on a unsupported OS.")
+            return None
+
+        if len(directory_path_list) == 0:
+            return {}
+
+        response_list = self.run_remote_agent_request_list([
+            {"operation": "exists" if existence_only else "stat", "path": str(directory_path)}
+            for directory_path in directory_path_list
+        ])
+        if response_list is not None:
+            return self.get_remote_agent_metadata_dict(directory_path_list, response_list)
+
+        # Print one tab-separated line per directory, in the same order as the passed list. The byte size is
+        # taken from du -sLb so that it matches get_remote_directory_size_in_bytes(), and files reachable through
+        # several links are only counted once, like LocalDirectoryScanner does.
+        quoted_path_string = " ".join(quote(str(directory_path)) for directory_path in directory_path_list)
+        if existence_only:
+            command = f"""for directory_path in {quoted_path_string}; do
+    if [ -d "$directory_path" ]; then exists=1; else exists=0; fi
+    printf '%s\\t-\\t-\\t-\\n' "$exists"
+done"""
+        else:
+            command = f"""for directory_path in {quoted_path_string}; do
+    if [ -d "$directory_path" ]; then
+        size_in_bytes=$(du -sLb "$directory_path" 2>/dev/null | cut -f1)
+        file_statistics=$(find -L "$directory_path" -type f -printf '%D:%i %T@\\n' 2>/dev/null | \\
+            awk 'BEGIN {{ count = 0; newest = 0 }} !seen[$1]++ {{ count++; if ($2 > newest) newest = $2 }} \\
+                 END {{ printf "%d\\t%f", count, newest }}')
+        printf '1\\t%s\\t%s\\n' "${{size_in_bytes:-0}}" "$file_statistics"
+    else
+        printf '0\\t0\\t0\\t0\\n'
+    fi
+done"""
+
+        try:
+            result: RemoteCommandResult = self.run_remote_command(
+                command,
+                "directory_exists" if existence_only else "directory_metadata"
+            )
+        except RemoteCommandError as exception:
+            error_code = exception.result.exited
+
+            debug(f"Client.get_remote_directory_metadata(): Received Unexpected Exit Code {error_code}. "
+                  f"Returning None as the metadata.")
+            return None
+
+        line_list = result.stdout.splitlines()
+        if len(line_list) != len(directory_path_list):
+            debug(f"Client.get_remote_directory_metadata(): Expected {len(directory_path_list)} line(s) but received "
+                  f"{len(line_list)}. Returning None as the metadata.")
+            return None
+
+        metadata_dict = {}
+        for directory_path, line in zip(directory_path_list, line_list):
+            exists, size_in_bytes, file_count, newest_mtime = line.split("\t")
+            metadata_dict[str(directory_path)] = {
+                "exists": exists == "1",
+                "size_in_bytes": None if existence_only else int(size_in_bytes),
+                "file_count": None if existence_only else int(file_count),
+                "newest_mtime": None if existence_only else float(newest_mtime)
+            }
+
+        debug(f"Client.get_remote_directory_metadata(): Retrieved Exit Code {result.exited}.")
+        return metadata_dict
+
+    def get_remote_agent_metadata_dict(self, directory_path_list: list, response_list: list[dict]):
+        """Convert the responses of the remote agent to the exists or stat requests of get_remote_directory_metadata()
+        into its return value.
+        """
+        metadata_dict = {}
+        for directory_path, response in zip(directory_path_list, response_list):
+            if not response["ok"]:
+                debug(f"Client.get_remote_agent_metadata_dict(): Received {response['error']['code']} for "
+                      f"{str(directory_path)}. Returning None as the metadata.")
+                return None
+            metadata_dict[str(directory_path)] = {"size_in_bytes": None, "file_count": None, "newest_mtime": None,
+                                                  **response["result"]}
+        return metadata_dict
+
+    def get_local_directory_metadata(self, directory_path: Path):
+        """Retrieve the metadata of a local directory in a single pass.
+
+        :returns A dictionary containing exists, size_in_bytes, file_count and newest_mtime keys.
+        """
+        debug(f"Client.get_local_directory_metadata(): Scanning {str(directory_path)}")
+        scanner = LocalDirectoryScanner(self.local_scan_workers, self.directory_size_cache)
+        with self.metrics.time("local_scan_duration_seconds", {"directory": str(directory_path)}):
+            metadata = scanner.scan(directory_path)
+        self.metrics.increment("local_scan_files_visited_total", scanner.visited_file_count,
+                               {"directory": str(directory_path)})
+        self.metrics.increment("local_scan_directories_visited_total", scanner.visited_directory_count,
+                               {"directory": str(directory_path)})
+        self.save_directory_size_cache()
+        debug(f"Client.get_local_directory_metadata(): {str(directory_path)} contains {metadata['file_count']} "
+              f"file(s) and is {metadata['size_in_bytes']} byte(s)")
+        return metadata
+
     def get_local_directory_size_in_bytes(self, directory_path: Path):
-        """Determine the size of a directory in bytes."""
+        """Determine the size of a directory in bytes, following symbolic links the same way du -sLb does."""
         debug(f"Client.get_local_directory_size_in_bytes(): Getting the directory size of {str(directory_path)}")
 
-        size_in_bytes = int(sum(file.stat().st_size for file in directory_path.glob('**/*') if file.is_file()))
+        size_in_bytes = self.get_local_directory_metadata(directory_path)["size_in_bytes"]
         debug(f"Client.get_local_directory_size_in_bytes(): Size of {str(directory_path)} is {size_in_bytes}")
         return int(size_in_bytes)
 
+    def get_local_directory_manifest(self, directory_path: Path, enable_hash=False):
+        """Build the FileManifest of a local directory, or return None if it does not exist."""
+        debug(f"Client.get_local_directory_manifest(): Scanning {str(directory_path)}")
+        with self.metrics.time("manifest_scan_duration_seconds", {"directory": str(directory_path)}):
+            return scan_local_directory(directory_path, enable_hash)
+
+    def get_remote_directory_manifest(self, directory_path: Path):
+        """Build the FileManifest of a directory on the remote machine, without hashes, with a single request.
+
+        :returns The FileManifest, or None if the directory does not exist or could not be listed.
+        """
+        debug(f"Client.get_remote_directory_manifest(): Listing the files in {str(directory_path)}")
+        if self.remote_os_type != OSType.POSIX:
+            debug("Client.get_remote_directory_manifest(): Cannot list the files on a unsupported OS.")
+            return None
+
+        with self.metrics.time("manifest_scan_duration_seconds", {"directory": str(directory_path)}):
+            response_list = self.run_remote_agent_request_list([{"operation": "manifest",
+                                                                 "path": str(directory_path)}])
+            if response_list is not None:
+                if not response_list[0]["ok"]:
+                    debug(f"Client.get_remote_directory_manifest(): Received {response_list[0]['error']['code']} "
+                          f"for {str(directory_path)}. Returning None as the manifest.")
+                    return None
+                return FileManifest.from_entry_list(response_list[0]["result"]["entries"])
+
+            # Unreadable entries are left out instead of failing the listing; they show up as changed files:
+            command = (f"test -d {quote(str(directory_path))} && "
+                       f"{{ find -L {quote(str(directory_path))} -type f -printf '%P\\t%s\\t%T@\\0' 2>/dev/null "
+                       f"|| true; }}")
+            result: RemoteCommandResult = self.run_remote_command(command, "directory_manifest", warn=True)
+
+        if not result.ok:
+            debug(f"Client.get_remote_directory_manifest(): Received Exit Code {result.exited} when listing "
+                  f"{str(directory_path)}. Returning None as the manifest.")
+            return None
+
+        entry_list = []
+        for record in result.stdout.split("\0"):
+            if not record:
+                continue
+            relative_path, size_in_bytes, mtime = record.rsplit("\t", 2)
+            entry_list.append((relative_path, int(size_in_bytes), parse_find_mtime(mtime)))
+        return FileManifest.from_entry_list(entry_list)
+
+    def get_local_directory_hash_dict(self, directory_path: Path, algorithm: HashAlgorithm, path_list: list = None,
+                                      refresh=False):
+        """Hash the files below a local directory with up to hash_workers processes, or only the files in path_list
+        (relative to the directory) if it is passed. Unless refresh is True, files whose hash is in the file hash
+        cache are not read again.
+
+        :returns A dictionary mapping the path of each file relative to the directory to its hexadecimal digest, or
+        None if the directory does not exist.
+        """
+        debug(f"Client.get_local_directory_hash_dict(): Hashing the files in {str(directory_path)} with "
+              f"{algorithm.name}")
+        hasher = ParallelFileHasher(self.hash_workers, self.file_hash_cache)
+        with self.metrics.time("local_hash_duration_seconds", {"directory": str(directory_path)}):
+            hash_dict = hasher.hash_directory(directory_path, algorithm, path_list, refresh)
+        self.metrics.increment("local_hashed_files_total", hasher.hashed_file_count, {"directory": str(directory_path)})
+        self.metrics.increment("local_hashed_bytes_total", hasher.hashed_file_bytes, {"directory": str(directory_path)})
+        self.save_file_hash_cache()
+        return hash_dict
+
+    def save_file_hash_cache(self):
+        """Write the file hash cache, if there is one, logging any failure instead of raising it."""
+        if self.file_hash_cache is None:
+            return
+        try:
+            self.file_hash_cache.save()
+        except (OSError, sqlite3.Error) as exception:
+            error(f"Client.save_file_hash_cache(): Unable to save the file hash cache: {exception}")
+
+    def get_remote_hash_algorithm_set(self) -> set[HashAlgorithm]:
+        """Return the hash algorithms whose program (see HashAlgorithm.get_remote_program()) is installed on the
+        remote machine.
+        """
+        if self.remote_os_type != OSType.POSIX:
+            debug("Client.get_remote_hash_algorithm_set(): Cannot find the hash programs on a unsupported OS.")
+            return set()
+
+        program_dict = {algorithm.get_remote_program(): algorithm for algorithm in HashAlgorithm}
+        command = (f"for program in {' '.join(program_dict)}; do "
+                   f"command -v \"$program\" >/dev/null 2>&1 && echo \"$program\"; done; true")
+        result = self.run_remote_command(command, "hash_programs", warn=True)
+        algorithm_set = {program_dict[line.strip()] for line in result.stdout.splitlines()
+                         if line.strip() in program_dict}
+        debug(f"Client.get_remote_hash_algorithm_set(): Found {sorted(algorithm.name for algorithm in algorithm_set)}")
+        return algorithm_set
+
+    def get_remote_directory_hash_dict(self, directory_path: Path, algorithm: HashAlgorithm, path_list: list = None):
+        """Hash the files below a directory on the remote machine with a single command, following symbolic links
+        like rsync -L, or only the files in path_list (relative to the directory) if it is passed.
+
+        :returns A dictionary mapping the path of each file relative to the directory to its hexadecimal digest, or
+        None if the directory does not exist or could not be hashed. Files that could not be read are left out.
+        """
+        debug(f"Client.get_remote_directory_hash_dict(): Hashing the files in {str(directory_path)} with "
+              f"{algorithm.name}")
+        if self.remote_os_type != OSType.POSIX:
+            debug("Client.get_remote_directory_hash_dict(): Cannot hash the files on a unsupported OS.")
+            return None
+
+        program = algorithm.get_remote_program()
+        keyword_dict = {}
+        if path_list is None:
+            file_list_command = "find -L . -type f -print0 2>/dev/null"
+        else:
+            # The paths are read from standard input, so the command stays short no matter how many there are:
+            file_list_command = "cat"
+            keyword_dict["in_stream"] = StringIO("".join(f"./{relative_path}\0" for relative_path in path_list))
+        command = (f"cd {quote(str(directory_path))} && "
+                   f"{{ {file_list_command} | xargs -0 -r {program} -- 2>/dev/null || true; }}")
+        with self.metrics.time("remote_hash_duration_seconds", {"directory": str(directory_path)}):
+            result: RemoteCommandResult = self.run_remote_command(command, "directory_hash", warn=True,
+                                                                  **keyword_dict)
+        if not result.ok:
+            debug(f"Client.get_remote_directory_hash_dict(): Received Exit Code {result.exited} when hashing "
+                  f"{str(directory_path)}. Returning None as the hashes.")
+            return None
+        return parse_hash_program_output(result.stdout)
+
+    def get_local_file_sample(self, directory_path: Path, sample_size: int) -> list:
+        """Return the name and size of up to sample_size files below a local directory, following symbolic links
+        like rsync -L. Every directory is only walked once, even if it can be reached through several links.
+        """
+        file_sample_list = []
+        seen_set = set()
+        for current_directory, directory_name_list, file_name_list in os.walk(directory_path, followlinks=True):
+            try:
+                directory_stat = os.stat(current_directory)
+            except OSError:
+                directory_name_list.clear()
+                continue
+            if (directory_stat.st_dev, directory_stat.st_ino) in seen_set:
+                directory_name_list.clear()
+                continue
+            seen_set.add((directory_stat.st_dev, directory_stat.st_ino))
+
+            for file_name in file_name_list:
+                try:
+                    file_sample_list.append((file_name, os.stat(os.path.join(current_directory, file_name)).st_size))
+                except OSError:
+                    continue
+                if len(file_sample_list) >= sample_size:
+                    return file_sample_list
+        return file_sample_list
+
+    def get_remote_file_sample(self, directory_path: Path, sample_size: int):
+        """Return the name and size of up to sample_size files below a directory on the remote machine, following
+        symbolic links like rsync -L.
+
+        :returns The list of (file name, size) tuples, or None if the directory could not be listed.
+        """
+        if self.remote_os_type != OSType.POSIX:
+            debug("Client.get_remote_file_sample(): Cannot list the files on a unsupported OS.")
+            return None
+
+        command = (f"find -L {quote(str(directory_path))} -type f -printf '%f\\t%s\\0' 2>/dev/null "
+                   f"| head -z -n {int(sample_size)}")
+        result: RemoteCommandResult = self.run_remote_command(command, "file_sample", warn=True)
+        if not result.ok:
+            debug(f"Client.get_remote_file_sample(): Received Exit Code {result.exited} when listing "
+                  f"{str(directory_path)}.")
+            return None
+
+        file_sample_list = []
+        for record in result.stdout.split("\0"):
+            if record:
+                file_name, size_in_bytes = record.rsplit("\t", 1)
+                file_sample_list.append((file_name, int(size_in_bytes)))
+        return file_sample_list
+
+    def measure_link_throughput(self):
+        """Measure how fast data arrives from the remote machine through the SSH connection by reading zeros from
+        it, in bytes per second, and keep it in link_throughput. The time an empty read takes is subtracted, so the
+        latency of running a command does not count. The amount read starts at LINK_PROBE_START_SIZE and grows until
+        a read takes at least MIN_LINK_PROBE_DURATION seconds or reaches LINK_PROBE_MAX_SIZE, so a slow link is not
+        kept busy for long.
+        NOTE: Only the direction from the remote machine is measured, which is assumed to be as fast as the other.
+
+        :returns The throughput, or None if it could not be measured.
+        """
+        if self.remote_os_type != OSType.POSIX:
+            debug("Client.measure_link_throughput(): Cannot measure the link to a unsupported OS.")
+            return None
+
+        def time_read(probe_size: int):
+            start_time = monotonic()
+            result = self.run_remote_command(f"head -c {probe_size} /dev/zero", "link_probe", warn=True)
+            return monotonic() - start_time if result.ok else None
+
+        base_duration = time_read(0)
+        probe_size = LINK_PROBE_START_SIZE
+        while base_duration is not None:
+            duration = time_read(probe_size)
+            if duration is None:
+                break
+            duration = max(duration - base_duration, 1e-3)
+            if duration >= MIN_LINK_PROBE_DURATION or probe_size >= LINK_PROBE_MAX_SIZE:
+                throughput = probe_size / duration
+                debug(f"Client.measure_link_throughput(): Read {probe_size} bytes from {self.hostname} at "
+                      f"{round(throughput / (1 << 20), 3)}M/s")
+                self.metrics.set_gauge("link_throughput_bytes_per_second", throughput,
+                                       {"host": get_host_key(self.hostname, self.ssh_port)})
+                self.link_throughput = throughput
+                return throughput
+            probe_size *= 8
+
+        debug(f"Client.measure_link_throughput(): Unable to read from {self.hostname}.")
+        return None
+
+    def get_local_rsync_version(self) -> RsyncVersion:
+        """Return the version of the local rsync program, or None if it could not be run."""
+        try:
+            result = run(["rsync", "--version"], capture_output=True, text=True, timeout=RSYNC_VERSION_TIMEOUT)
+        except (OSError, TimeoutExpired) as exception:
+            debug(f"Client.get_local_rsync_version(): Unable to run rsync --version: {exception}")
+            return None
+        return parse_rsync_version(result.stdout) if result.returncode == 0 else None
+
+    def get_remote_rsync_version(self) -> RsyncVersion:
+        """Return the version of the rsync program on the remote machine, or None if it could not be run."""
+        if self.remote_os_type != OSType.POSIX:
+            return None
+        result: RemoteCommandResult = self.run_remote_command("rsync --version", "rsync_version", warn=True)
+        return parse_rsync_version(result.stdout) if result.ok else None
+
     def does_remote_directory_exist(self, directory_path: Path):
         """Check if a directory exists on the remote machine."""
         debug("Client.does_remote_directory_exist(): Starting function...")
@@ -171,6 +1077,10 @@ class Client(object):
             debug("Client.does_remote_directory_exist(): Cannot check the directory size on a unsupported OS.")
             return
 
+        response_list = self.run_remote_agent_request_list([{"operation": "exists", "path": str(directory_path)}])
+        if response_list is not None:
+            return response_list[0]["ok"] and response_list[0]["result"]["exists"]
+
         command = ""
         if self.remote_os_type == OSType.POSIX:
             command = f"test -d \"{str(directory_path)}\""
@@ -186,11 +1096,10 @@ class Client(object):
 
         # Now return the result.
         try:
-            result: Result = self.ssh_connection.run(command, shell=self.remote_shell_name, hide=True)
-        except UnexpectedExit as exception:
-            exception_argument_list = exception.__str__().split("\n\n")
-            invalid_command = exception_argument_list[1].split(":")[1]
-            error_code = exception_argument_list[2].split(":")[1]
+            result: RemoteCommandResult = self.run_remote_command(command, "directory_exists")
+        except RemoteCommandError as exception:
+            invalid_command = exception.result.command
+            error_code = exception.result.exited
 
             debug(f"Client.does_remote_directory_exist(): Received Unexpected Exit Code {error_code} when "
                   f"executing {invalid_command}. Returning False.")
@@ -212,6 +1121,15 @@ class Client(object):
             debug("Client.create_root_remote_directory(): Cannot check the directory size on a unsupported OS.")
             return False
 
+        response_list = self.run_remote_agent_request_list([{"operation": "mkdir", "path": str(directory_path)}])
+        if response_list is not None:
+            if not response_list[0]["ok"]:
+                error(f"Client.create_root_remote_directory(): Unable to create directory {str(directory_path)}: "
+                      f"{response_list[0]['error']['message']}")
+                return False
+            debug(f"Client.create_root_remote_directory(): Created remote directory {str(directory_path)}")
+            return True
+
         command = ""
         if self.remote_os_type == OSType.POSIX:
             command = f"mkdir -p \"{str(directory_path)}\""
@@ -219,11 +1137,10 @@ class Client(object):
             pass
 
         try:
-            self.ssh_connection.run(command, shell=self.remote_shell_name, hide=True)
-        except UnexpectedExit as exception:
-            exception_argument_list = exception.__str__().split("\n\n")
-            invalid_command = exception_argument_list[1].split(":")[1]
-            error_code = exception_argument_list[2].split(":")[1]
+            self.run_remote_command(command, "create_directory")
+        except RemoteCommandError as exception:
+            invalid_command = exception.result.command
+            error_code = exception.result.exited
 
             error(f"Client.create_root_remote_directory(): Unable to create directory {str(directory_path)}"
                   f"while executing {invalid_command} since it returned {error_code}")
@@ -0,0 +1,21 @@
+# -------------------------------------------------------------------------------
+# CompressionMode.py
+#
+# -------------------------------------------------------------------------------
+
+from enum import Enum
+
+
+class CompressionMode(Enum):
+    """Simple Enum for the compression rsync uses on the data it sends.
+
+    AUTO lets the CompressionSelector choose for each directory and link. NONE sends the data uncompressed, ZLIB uses
+    the zlib compression of rsync -z, and ZSTD and LZ4 pick those algorithms with --compress-choice, which needs
+    rsync 3.2.0 or later on both machines. ZSTD and LZ4 fall back to ZLIB when either end does not support them.
+    """
+
+    AUTO = 0
+    NONE = 1
+    ZLIB = 2
+    ZSTD = 3
+    LZ4 = 4
@@ -0,0 +1,204 @@
+# -------------------------------------------------------------------------------
+# CompressionSelector.py
+# Choose the rsync compression options of each directory from the throughput of
+# the link, the kind of files in the directory and the compression algorithms
+# supported by the rsync programs on both machines.
+# -------------------------------------------------------------------------------
+
+from typing import NamedTuple
+from logging import debug
+import re
+
+from RsyncPath.CompressionMode import CompressionMode
+
+# Links at least this fast (in bytes per second) are sent uncompressed, since compressing would slow them down:
+DEFAULT_FAST_LINK_THROUGHPUT = 32 << 20
+# Links at least this fast use lz4, which is cheaper on the CPU than zstd but compresses less:
+DEFAULT_MEDIUM_LINK_THROUGHPUT = 8 << 20
+# Directories whose sampled files are at least this much already-compressed data (by size) are sent uncompressed:
+DEFAULT_MAX_INCOMPRESSIBLE_FRACTION = 0.8
+DEFAULT_COMPRESSION_SAMPLE_SIZE = 256
+MIN_COMPRESS_CHOICE_VERSION = (3, 2, 0)
+RSYNC_VERSION_PATTERN = re.compile(r"rsync\s+version\s+v?(\d+)\.(\d+)(?:\.(\d+))?")
+# The suffixes rsync skips compressing by default, along with a few newer media and document formats:
+DEFAULT_SKIP_COMPRESS_LIST = [
+    "3g2", "3gp", "7z", "aac", "ace", "apk", "avi", "avif", "bz2", "deb", "dmg", "docx", "ear", "epub", "f4v", "flac",
+    "flv", "gpg", "gz", "heic", "heif", "iso", "jar", "jpeg", "jpg", "jxl", "lrz", "lz", "lz4", "lzma", "lzo", "m1a",
+    "m1v", "m2a", "m2ts", "m2v", "m4a", "m4b", "m4p", "m4r", "m4v", "mka", "mkv", "mov", "mp1", "mp2", "mp3", "mp4",
+    "mpa", "mpeg", "mpg", "mpv", "mts", "odb", "odf", "odg", "odi", "odm", "odp", "ods", "odt", "oga", "ogg", "ogm",
+    "ogv", "ogx", "opus", "otg", "oth", "otp", "ots", "ott", "oxt", "png", "pptx", "qt", "rar", "rpm", "rz", "rzip",
+    "spx", "squashfs", "sxc", "sxd", "sxg", "sxm", "sxw", "sz", "tbz", "tbz2", "tgz", "tlz", "ts", "txz", "tzo",
+    "vob", "war", "webm", "webp", "wma", "wmv", "xlsx", "xz", "z", "zip", "zst"
+]
+
+
+class RsyncVersion(NamedTuple):
+    """The version of an rsync program and the compression algorithms it supports, from rsync --version."""
+
+    version: tuple
+    compress_list: list[str]
+
+    def supports_compress_choice(self) -> bool:
+        return self.version >= MIN_COMPRESS_CHOICE_VERSION
+
+
+def parse_rsync_version(output: str):
+    """Parse the output of rsync --version.
+
+    :returns An RsyncVersion, or None if the output does not contain a version. rsync programs older than 3.2.0 do
+    not print a compression list and only support zlib.
+    """
+    match = RSYNC_VERSION_PATTERN.search(output)
+    if match is None:
+        return None
+    version = (int(match.group(1)), int(match.group(2)), int(match.group(3) or 0))
+
+    compress_list = []
+    is_compress_list = False
+    for line in output.splitlines():
+        if line.strip().lower() == "compress list:":
+            is_compress_list = True
+        elif is_compress_list and line[:1].isspace():
+            compress_list.extend(line.split())
+        elif is_compress_list:
+            break
+    if not compress_list:
+        compress_list = ["zlib", "none"]
+    return RsyncVersion(version, compress_list)
+
+
+class CompressionChoice(NamedTuple):
+    """The compression used for a directory, and why it was chosen."""
+
+    mode: CompressionMode
+    level: int = None
+    reason: str = ""
+
+    def get_option_list(self, skip_compress_list: list[str] = None, use_compress_choice=False) -> list[str]:
+        """Return the rsync options that apply this choice.
+
+        :param: use_compress_choice Whether both rsync programs support --compress-choice. It is needed to select
+        zlib itself, since -z alone lets rsync 3.2.0 and later negotiate any algorithm.
+        """
+        if self.mode == CompressionMode.NONE:
+            return []
+        option_list = ["-z"]
+        if self.mode != CompressionMode.ZLIB or use_compress_choice:
+            option_list.append(f"--compress-choice={self.mode.name.lower()}")
+        if self.level is not None:
+            option_list.append(f"--compress-level={self.level}")
+        if skip_compress_list:
+            option_list.append(f"--skip-compress={'/'.join(skip_compress_list)}")
+        return option_list
+
+    def __str__(self):
+        if self.level is None:
+            return self.mode.name.lower()
+        return f"{self.mode.name.lower()} (level {self.level})"
+
+
+def is_incompressible_file(file_name: str, skip_compress_set: set) -> bool:
+    """Check if a file is already compressed, judging by its suffix."""
+    _, separator, suffix = file_name.rpartition(".")
+    return bool(separator) and suffix.lower() in skip_compress_set
+
+
+class CompressionSelector(object):
+    """Choose the compression of each directory for a single link.
+
+    With CompressionMode.AUTO, a link at least fast_link_throughput bytes per second fast is sent uncompressed, as is
+    a directory whose sampled files are mostly already compressed (by the suffixes in skip_compress_list). Otherwise,
+    lz4 is used on links at least medium_link_throughput fast and zstd on slower ones, as long as both rsync programs
+    support them, and zlib if they do not. Any other mode is used as is, apart from that fallback.
+    compression_level_dict maps a CompressionMode to the --compress-level used with it; rsync's default is used for
+    modes that are not in it.
+    """
+
+    def __init__(self, compression_mode=CompressionMode.AUTO, compression_level_dict: dict = None,
+                 skip_compress_list: list[str] = None, fast_link_throughput=DEFAULT_FAST_LINK_THROUGHPUT,
+                 medium_link_throughput=DEFAULT_MEDIUM_LINK_THROUGHPUT,
+                 max_incompressible_fraction=DEFAULT_MAX_INCOMPRESSIBLE_FRACTION):
+        """Construct the object. Nothing is known about the link until set_link() is called."""
+        self.compression_mode = compression_mode
+        self.compression_level_dict: dict = compression_level_dict if compression_level_dict is not None else {}
+        self.skip_compress_list: list[str] = skip_compress_list if skip_compress_list is not None else \
+            DEFAULT_SKIP_COMPRESS_LIST
+        self.skip_compress_set = {suffix.lower() for suffix in self.skip_compress_list}
+        self.fast_link_throughput = fast_link_throughput
+        self.medium_link_throughput = medium_link_throughput
+        self.max_incompressible_fraction = max_incompressible_fraction
+        self.link_throughput = None
+        # The algorithms both rsync programs support, or None if either one does not support --compress-choice:
+        self.compress_set: set = None
+
+    def needs_link_information(self) -> bool:
+        """Check whether set_link() has anything to measure for the configured mode."""
+        return self.compression_mode != CompressionMode.NONE
+
+    def needs_link_throughput(self) -> bool:
+        return self.compression_mode == CompressionMode.AUTO
+
+    def set_link(self, link_throughput, local_version: RsyncVersion, remote_version: RsyncVersion):
+        """Record the measured throughput of the link in bytes per second (None if unknown) and the versions of the
+        rsync programs on both ends (None if unknown).
+        """
+        self.link_throughput = link_throughput
+        if local_version is None or remote_version is None or not local_version.supports_compress_choice() or \
+                not remote_version.supports_compress_choice():
+            self.compress_set = None
+        else:
+            self.compress_set = set(local_version.compress_list) & set(remote_version.compress_list)
+        debug(f"CompressionSelector.set_link(): Link throughput {link_throughput}, common compression algorithms "
+              f"{self.compress_set}.")
+
+    def needs_file_sample(self) -> bool:
+        """Check whether select() uses the sampled files of a directory, so they only have to be listed if so."""
+        return self.compression_mode == CompressionMode.AUTO and not self.is_fast_link()
+
+    def is_fast_link(self) -> bool:
+        return self.link_throughput is not None and self.link_throughput >= self.fast_link_throughput
+
+    def get_incompressible_fraction(self, file_sample_list: list):
+        """Return the fraction of the bytes in a list of (file name, size) tuples that are in already-compressed
+        files, or None if the list is empty. Empty files are counted as one byte, so a list of only empty files
+        still has a fraction.
+        """
+        total_size = 0
+        incompressible_size = 0
+        for file_name, size_in_bytes in file_sample_list:
+            size_in_bytes = max(1, size_in_bytes)
+            total_size += size_in_bytes
+            if is_incompressible_file(file_name, self.skip_compress_set):
+                incompressible_size += size_in_bytes
+        return incompressible_size / total_size if total_size else None
+
+    def select(self, file_sample_list: list = None) -> CompressionChoice:
+        """Choose the compression of a directory from a sample of its files, as (file name, size) tuples."""
+        if self.compression_mode == CompressionMode.NONE:
+            return CompressionChoice(CompressionMode.NONE, None, "compression is disabled")
+        if self.compression_mode != CompressionMode.AUTO:
+            return self.get_supported_choice(self.compression_mode, "it was selected")
+
+        if self.is_fast_link():
+            return CompressionChoice(CompressionMode.NONE, None,
+                                     f"the link is {round(self.link_throughput / (1 << 20), 1)}M/s fast")
+        incompressible_fraction = self.get_incompressible_fraction(file_sample_list or [])
+        if incompressible_fraction is not None and incompressible_fraction >= self.max_incompressible_fraction:
+            return CompressionChoice(CompressionMode.NONE, None,
+                                     f"{round(incompressible_fraction * 100)}% of the sampled data is already "
+                                     f"compressed")
+        if self.link_throughput is not None and self.link_throughput >= self.medium_link_throughput:
+            return self.get_supported_choice(CompressionMode.LZ4, "the link is fast and the data is compressible")
+        return self.get_supported_choice(CompressionMode.ZSTD, "the data is compressible")
+
+    def get_supported_choice(self, compression_mode: CompressionMode, reason: str) -> CompressionChoice:
+        """Return a choice of compression_mode, or of zlib if both rsync programs do not support it."""
+        name = compression_mode.name.lower()
+        if compression_mode != CompressionMode.ZLIB and (self.compress_set is None or name not in self.compress_set):
+            compression_mode = CompressionMode.ZLIB
+            reason = f"{reason}, but {name} is not supported by both rsync programs"
+        return CompressionChoice(compression_mode, self.compression_level_dict.get(compression_mode), reason)
+
+    def get_option_list(self, compression_choice: CompressionChoice) -> list[str]:
+        """Return the rsync options of a choice made by select()."""
+        return compression_choice.get_option_list(self.skip_compress_list, self.compress_set is not None)
@@ -0,0 +1,131 @@
+# -------------------------------------------------------------------------------
+# DirectorySizeCache.py
+# SQLite cache of the size of the files directly inside each directory, keyed by
+# the modification time of that directory.
+# -------------------------------------------------------------------------------
+
+from pathlib import Path
+from threading import Lock
+from time import time
+from logging import debug
+import json
+import sqlite3
+
+DEFAULT_DIRECTORY_SIZE_CACHE_PATH = Path.home() / ".cache" / "rsync_path" / "directory_size.sqlite3"
+DEFAULT_DIRECTORY_SIZE_CACHE_MAX_ENTRIES = 500000
+LOCAL_NAMESPACE = "localhost"
+
+
+class DirectorySizeCache(object):
+    """Remember the total size, number and newest modification time of the files directly inside a directory.
+
+    An entry is only used while the device, inode and modification time of its directory are unchanged. Adding,
+    removing or renaming an entry updates the modification time of its directory, so the directory is scanned again;
+    NOTE: a file that is rewritten in place does not, so its new size is only noticed once its directory changes.
+
+    Entries are kept in memory while a run is in progress and written back by save(). Once there are more than
+    max_entries entries, the least recently used ones are removed. Local and remote directories are kept apart by a
+    namespace (LOCAL_NAMESPACE or user@hostname:port).
+    """
+
+    def __init__(self, cache_path: Path = DEFAULT_DIRECTORY_SIZE_CACHE_PATH,
+                 max_entries=DEFAULT_DIRECTORY_SIZE_CACHE_MAX_ENTRIES):
+        """Construct the object and load any existing entries from cache_path."""
+        self.cache_path = Path(cache_path)
+        self.max_entries = max_entries
+        self.entry_dict: dict[tuple, tuple] = {}
+        self.used_dict: dict[tuple, float] = {}
+        self.changed_key_set: set[tuple] = set()
+        self.lock = Lock()
+        self.load()
+
+    def connect(self):
+        """Open the cache database, creating it if needed."""
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.cache_path)
+        connection.execute("""CREATE TABLE IF NOT EXISTS directory_size (
+                                  namespace TEXT NOT NULL,
+                                  path TEXT NOT NULL,
+                                  device INTEGER NOT NULL,
+                                  inode INTEGER NOT NULL,
+                                  mtime_ns INTEGER NOT NULL,
+                                  size_in_bytes INTEGER NOT NULL,
+                                  file_count INTEGER NOT NULL,
+                                  newest_mtime REAL NOT NULL,
+                                  subdirectory_list TEXT NOT NULL,
+                                  last_used REAL NOT NULL,
+                                  PRIMARY KEY (namespace, path))""")
+        return connection
+
+    def load(self):
+        """Read every entry from the cache database. An unreadable database results in an empty cache."""
+        try:
+            connection = self.connect()
+        except (OSError, sqlite3.Error) as exception:
+            debug(f"DirectorySizeCache.load(): Ignoring unreadable cache {str(self.cache_path)}: {exception}")
+            return
+
+        try:
+            for row in connection.execute("SELECT namespace, path, device, inode, mtime_ns, size_in_bytes, "
+                                          "file_count, newest_mtime, subdirectory_list, last_used "
+                                          "FROM directory_size"):
+                key = (row[0], row[1])
+                self.entry_dict[key] = (row[2], row[3], row[4], row[5], row[6], row[7], json.loads(row[8]))
+                self.used_dict[key] = row[9]
+        except (sqlite3.Error, ValueError) as exception:
+            debug(f"DirectorySizeCache.load(): Ignoring unreadable cache {str(self.cache_path)}: {exception}")
+            self.entry_dict = {}
+            self.used_dict = {}
+        finally:
+            connection.close()
+
+    def get(self, namespace: str, path: str, device: int, inode: int, mtime_ns: int):
+        """Return the cached (size_in_bytes, file_count, newest_mtime, subdirectory_list) of a directory, or None if
+        the directory is not cached or has changed since it was cached.
+        """
+        key = (namespace, path)
+        with self.lock:
+            entry = self.entry_dict.get(key)
+            if entry is None or entry[0] != device or entry[1] != inode or entry[2] != mtime_ns:
+                return None
+            self.used_dict[key] = time()
+            self.changed_key_set.add(key)
+        return entry[3], entry[4], entry[5], entry[6]
+
+    def put(self, namespace: str, path: str, device: int, inode: int, mtime_ns: int,
+            size_in_bytes: int, file_count: int, newest_mtime: float, subdirectory_list: list = None):
+        """Store the size of the files directly inside a directory."""
+        key = (namespace, path)
+        with self.lock:
+            self.entry_dict[key] = (device, inode, mtime_ns, size_in_bytes, file_count, newest_mtime,
+                                    subdirectory_list if subdirectory_list is not None else [])
+            self.used_dict[key] = time()
+            self.changed_key_set.add(key)
+
+    def save(self):
+        """Write the entries used or changed since the last save, then evict the least recently used entries."""
+        with self.lock:
+            row_list = [
+                (key[0], key[1], *self.entry_dict[key][:6], json.dumps(self.entry_dict[key][6]), self.used_dict[key])
+                for key in self.changed_key_set
+            ]
+            self.changed_key_set = set()
+
+            evicted_key_list = []
+            if len(self.entry_dict) > self.max_entries:
+                evicted_key_list = sorted(self.used_dict, key=self.used_dict.get)[:len(self.entry_dict) -
+                                                                                   self.max_entries]
+                for key in evicted_key_list:
+                    del self.entry_dict[key]
+                    del self.used_dict[key]
+
+        connection = self.connect()
+        try:
+            with connection:
+                connection.executemany("INSERT OR REPLACE INTO directory_size VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                       row_list)
+                connection.executemany("DELETE FROM directory_size WHERE namespace = ? AND path = ?",
+                                       evicted_key_list)
+        finally:
+            connection.close()
+        debug(f"DirectorySizeCache.save(): Wrote {len(row_list)} and evicted {len(evicted_key_list)} entries.")
@@ -0,0 +1,87 @@
+# -------------------------------------------------------------------------------
+# DirectorySplitter.py
+# Split a large directory into shards of its children of similar total size,
+# so that each shard can be copied by its own rsync process.
+# -------------------------------------------------------------------------------
+
+from collections import defaultdict
+from logging import debug
+import heapq
+
+from RsyncPath.FileManifest import FileManifest
+
+DEFAULT_SPLIT_DIRECTORY_MIN_SIZE = 16 << 30
+DEFAULT_SPLIT_SHARD_COUNT = 4
+DEFAULT_SPLIT_MAX_DEPTH = 3
+
+
+class DirectorySplitter(object):
+    """Split a directory of at least min_size bytes into up to shard_count shards.
+
+    The shards are made of the entries directly inside the directory. An entry that is larger than a shard should
+    be is replaced by the entries inside it, down to max_depth levels below the directory, so a directory holding
+    a few huge children is still split evenly. The entries are then given to the shards largest first, each to the
+    shard with the least data so far.
+    """
+
+    def __init__(self, min_size=DEFAULT_SPLIT_DIRECTORY_MIN_SIZE, shard_count=DEFAULT_SPLIT_SHARD_COUNT,
+                 max_depth=DEFAULT_SPLIT_MAX_DEPTH):
+        """Construct the object."""
+        self.min_size = min_size
+        self.shard_count = max(1, int(shard_count))
+        self.max_depth = max(1, int(max_depth))
+
+    def get_entry_list(self, manifest: FileManifest, target_size) -> list:
+        """Return the (relative path, size) entries that the shards are made of.
+
+        Only the files of the directory are known, so empty directories are not part of any entry.
+        """
+        size_dict = defaultdict(int)
+        child_dict = defaultdict(set)
+        directory_set = set()
+        for path, size_in_bytes in zip(manifest.path_list, manifest.size_list):
+            component_list = path.split("/")
+            parent = ""
+            for depth, component in enumerate(component_list[:self.max_depth]):
+                prefix = f"{parent}/{component}" if parent else component
+                size_dict[prefix] += size_in_bytes
+                child_dict[parent].add(prefix)
+                if depth < len(component_list) - 1:
+                    directory_set.add(prefix)
+                parent = prefix
+
+        entry_list = []
+        pending_list = list(child_dict[""])
+        while pending_list:
+            prefix = pending_list.pop()
+            depth = prefix.count("/") + 1
+            if prefix in directory_set and size_dict[prefix] > target_size and depth < self.max_depth:
+                pending_list.extend(child_dict[prefix])
+            else:
+                entry_list.append((prefix, size_dict[prefix]))
+        return entry_list
+
+    def split(self, manifest: FileManifest):
+        """Split the directory described by manifest into shards.
+
+        :returns A list of shards, each a list of paths relative to the directory, or None if the directory is
+        smaller than min_size or cannot be split into at least two shards.
+        """
+        total_size = sum(manifest.size_list)
+        if self.shard_count < 2 or total_size < self.min_size:
+            return None
+
+        entry_list = self.get_entry_list(manifest, total_size / self.shard_count)
+        entry_list.sort(key=lambda entry: entry[1], reverse=True)
+        shard_heap = [(0, index, []) for index in range(self.shard_count)]
+        for relative_path, size_in_bytes in entry_list:
+            shard_size, index, shard = heapq.heappop(shard_heap)
+            shard.append(relative_path)
+            heapq.heappush(shard_heap, (shard_size + size_in_bytes, index, shard))
+
+        shard_list = [shard for _, _, shard in sorted(shard_heap, key=lambda item: item[1]) if shard]
+        if len(shard_list) < 2:
+            return None
+        debug(f"DirectorySplitter.split(): Split {total_size} bytes into {len(shard_list)} shard(s) of "
+              f"{[len(shard) for shard in shard_list]} entries.")
+        return shard_list
@@ -0,0 +1,27 @@
+# -------------------------------------------------------------------------------
+# DirectoryState.py
+#
+# -------------------------------------------------------------------------------
+
+from enum import Enum
+
+
+class DirectoryState(Enum):
+    """Simple Enum for the state of a directory in a RunJournal.
+
+    PENDING directories were not started yet. VERIFIED directories passed the threshold check, and TRANSFERRING ones
+    have an rsync process running. DONE directories were copied successfully, FAILED ones were not (rsync returned a
+    non-zero exit code, or an error stopped the directory), and SKIPPED directories were deliberately not copied,
+    such as those that did not pass the threshold check. DONE and SKIPPED directories are complete; a resumed run
+    copies every other directory again.
+    """
+
+    PENDING = 0
+    VERIFIED = 1
+    TRANSFERRING = 2
+    DONE = 3
+    FAILED = 4
+    SKIPPED = 5
+
+    def is_complete(self) -> bool:
+        return self in (DirectoryState.DONE, DirectoryState.SKIPPED)
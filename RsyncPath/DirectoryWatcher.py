@@ -0,0 +1,310 @@
+# -------------------------------------------------------------------------------
+# DirectoryWatcher.py
+# Notice changes below a set of local directories, through inotify or by walking
+# them periodically, and report which directories changed once a burst of
+# changes has settled.
+# -------------------------------------------------------------------------------
+
+from abc import ABC, abstractmethod
+from pathlib import Path
+from logging import debug, warning
+from time import monotonic, sleep
+import errno
+import os
+import select
+import struct
+
+from RsyncPath.FileManifest import scan_local_directory
+from RsyncPath.WatchBackend import WatchBackend
+
+DEFAULT_WATCH_DEBOUNCE_TIME = 2.0
+DEFAULT_WATCH_MAX_DELAY = 60.0
+DEFAULT_WATCH_POLL_INTERVAL = 30.0
+# The longest a watcher waits before checking whether it was asked to stop:
+STOP_CHECK_INTERVAL = 1.0
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+INOTIFY_WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+                      IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+INOTIFY_EVENT_HEADER = struct.Struct("iIII")
+INOTIFY_BUFFER_SIZE = 64 * 1024
+
+
+class DirectoryWatcher(ABC):
+    """Base class for a watcher of local directories, each known by a key. Subclasses implement read_changes().
+
+    wait_for_changes() returns the keys of the directories that changed once no change arrived for debounce_time
+    seconds, or max_delay seconds after the first change, so a burst of changes leads to a single sync.
+    """
+
+    def __init__(self, path_dict: dict, debounce_time=DEFAULT_WATCH_DEBOUNCE_TIME, max_delay=DEFAULT_WATCH_MAX_DELAY):
+        """Construct the object from a dictionary mapping each key to the directory it stands for. Nothing is
+        watched until start() is called.
+        """
+        self.path_dict: dict = {key: Path(path) for key, path in path_dict.items()}
+        self.debounce_time = debounce_time
+        self.max_delay = max_delay
+
+    def start(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.close()
+
+    @abstractmethod
+    def read_changes(self, timeout: float) -> set:
+        """Wait up to timeout seconds for changes, and return the keys of the directories that changed (possibly
+        none).
+        """
+
+    def wait_for_changes(self, stop_event=None, pending_key_set: set = None):
+        """Wait until some directories changed and the changes settled.
+
+        :param: stop_event Optional threading.Event; once it is set, None is returned within STOP_CHECK_INTERVAL
+        seconds.
+        :param: pending_key_set Keys returned along with the next changes, or on their own after max_delay seconds,
+        such as the directories whose last sync failed.
+        :returns The sorted list of the keys that changed, or None if stop_event was set.
+        """
+        changed_key_set = set(pending_key_set) if pending_key_set else set()
+        first_change_time = monotonic() if changed_key_set else None
+        last_change_time = None
+        while stop_event is None or not stop_event.is_set():
+            timeout = STOP_CHECK_INTERVAL
+            if first_change_time is not None:
+                now = monotonic()
+                deadline = first_change_time + self.max_delay
+                if last_change_time is not None:
+                    deadline = min(deadline, last_change_time + self.debounce_time)
+                if now >= deadline:
+                    debug(f"DirectoryWatcher.wait_for_changes(): {sorted(changed_key_set)} changed.")
+                    return sorted(changed_key_set)
+                timeout = min(timeout, deadline - now)
+
+            key_set = self.read_changes(timeout)
+            if key_set:
+                last_change_time = monotonic()
+                if first_change_time is None:
+                    first_change_time = last_change_time
+                changed_key_set |= key_set
+        return None
+
+
+class InotifyDirectoryWatcher(DirectoryWatcher):
+    """Watch the directories through Linux inotify, with a watch on every directory below them.
+
+    Directories created or moved in while watching are watched as they appear. A directory that does not exist yet
+    is checked again on every read, and is reported as changed once it appears. If the kernel drops events because
+    its queue overflowed, every directory is reported as changed.
+    """
+
+    def __init__(self, path_dict: dict, debounce_time=DEFAULT_WATCH_DEBOUNCE_TIME, max_delay=DEFAULT_WATCH_MAX_DELAY):
+        """Construct the object."""
+        super().__init__(path_dict, debounce_time, max_delay)
+        self.libc = None
+        self.file_descriptor: int = None
+        # The (key, directory) pairs of each watch descriptor. Both can be several if a directory is reached through
+        # symbolic links:
+        self.watch_dict: dict[int, list] = {}
+        self.missing_key_set: set = set()
+
+    def start(self):
+        """Create the inotify instance and watch every directory.
+
+        :raises OSError if inotify is not available or the user ran out of inotify watches
+        (fs.inotify.max_user_watches).
+        """
+        # ctypes is only imported once inotify is used, since importing RsyncPath should stay cheap:
+        import ctypes
+
+        # The symbols of the running program include the C library:
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        if not hasattr(self.libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not available on this system")
+        self.file_descriptor = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.file_descriptor < 0:
+            error_number = self.get_errno()
+            raise OSError(error_number, os.strerror(error_number))
+
+        try:
+            for key, path in self.path_dict.items():
+                if not self.add_tree(key, path):
+                    self.missing_key_set.add(key)
+        except OSError:
+            self.close()
+            raise
+        debug(f"InotifyDirectoryWatcher.start(): Watching {len(self.watch_dict)} directories.")
+
+    @staticmethod
+    def get_errno() -> int:
+        import ctypes
+
+        return ctypes.get_errno()
+
+    def close(self):
+        if self.file_descriptor is not None:
+            os.close(self.file_descriptor)
+            self.file_descriptor = None
+        self.watch_dict = {}
+
+    def add_watch(self, key, directory_path: Path) -> bool:
+        """Watch a single directory, returning False if it does not exist (anymore).
+
+        :raises OSError if the watch could not be added for another reason.
+        """
+        watch_descriptor = self.libc.inotify_add_watch(self.file_descriptor, os.fsencode(directory_path),
+                                                       INOTIFY_WATCH_MASK)
+        if watch_descriptor < 0:
+            error_number = self.get_errno()
+            if error_number in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                return False
+            raise OSError(error_number, f"Unable to watch {str(directory_path)}: {os.strerror(error_number)}")
+        watch_list = self.watch_dict.setdefault(watch_descriptor, [])
+        if (key, directory_path) not in watch_list:
+            watch_list.append((key, directory_path))
+        return True
+
+    def add_tree(self, key, directory_path: Path) -> bool:
+        """Watch a directory and every directory below it, following symbolic links like rsync -L.
+
+        :returns False if directory_path is not a directory.
+        """
+        if not self.add_watch(key, directory_path):
+            return False
+        seen_set = set()
+        for current_directory, directory_name_list, _ in os.walk(directory_path, followlinks=True):
+            try:
+                current_stat = os.stat(current_directory)
+            except OSError:
+                directory_name_list.clear()
+                continue
+            if (current_stat.st_dev, current_stat.st_ino) in seen_set:
+                # A symbolic link loop:
+                directory_name_list.clear()
+                continue
+            seen_set.add((current_stat.st_dev, current_stat.st_ino))
+            for directory_name in directory_name_list:
+                self.add_watch(key, Path(current_directory) / directory_name)
+        return True
+
+    def read_changes(self, timeout: float) -> set:
+        changed_key_set = set()
+        for key in list(self.missing_key_set):
+            if self.add_tree(key, self.path_dict[key]):
+                self.missing_key_set.discard(key)
+                changed_key_set.add(key)
+
+        readable_list, _, _ = select.select([self.file_descriptor], [], [], max(0.0, timeout))
+        if not readable_list:
+            return changed_key_set
+        try:
+            buffer = os.read(self.file_descriptor, INOTIFY_BUFFER_SIZE)
+        except BlockingIOError:
+            return changed_key_set
+
+        offset = 0
+        while offset + INOTIFY_EVENT_HEADER.size <= len(buffer):
+            watch_descriptor, mask, _, name_length = INOTIFY_EVENT_HEADER.unpack_from(buffer, offset)
+            name = os.fsdecode(buffer[offset + INOTIFY_EVENT_HEADER.size:
+                                      offset + INOTIFY_EVENT_HEADER.size + name_length].rstrip(b"\0"))
+            offset += INOTIFY_EVENT_HEADER.size + name_length
+
+            if mask & IN_Q_OVERFLOW:
+                warning("InotifyDirectoryWatcher.read_changes(): The inotify queue overflowed; treating every "
+                        "directory as changed.")
+                changed_key_set |= set(self.path_dict)
+                continue
+            watch_list = self.watch_dict.get(watch_descriptor, [])
+            if mask & IN_IGNORED:
+                self.watch_dict.pop(watch_descriptor, None)
+            for key, directory_path in watch_list:
+                changed_key_set.add(key)
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    self.add_tree(key, directory_path / name)
+                elif mask & (IN_DELETE_SELF | IN_MOVE_SELF) and directory_path == self.path_dict[key]:
+                    # The source directory itself went away; watch for it to come back:
+                    self.missing_key_set.add(key)
+        return changed_key_set
+
+
+class PollingDirectoryWatcher(DirectoryWatcher):
+    """Watch the directories by walking each of them every poll_interval seconds and comparing the path, size and
+    modification time of their files with the previous walk. Empty directories are not noticed.
+    """
+
+    def __init__(self, path_dict: dict, debounce_time=DEFAULT_WATCH_DEBOUNCE_TIME, max_delay=DEFAULT_WATCH_MAX_DELAY,
+                 poll_interval=DEFAULT_WATCH_POLL_INTERVAL):
+        """Construct the object."""
+        super().__init__(path_dict, debounce_time, max_delay)
+        self.poll_interval = poll_interval
+        self.signature_dict: dict = {}
+        self.next_poll_time: float = None
+
+    def start(self):
+        """Walk every directory once, so the first poll has something to compare with."""
+        for key, path in self.path_dict.items():
+            self.signature_dict[key] = self.get_signature(path)
+        self.next_poll_time = monotonic() + self.poll_interval
+
+    @staticmethod
+    def get_signature(directory_path: Path):
+        """Return what is compared between walks of a directory, or None if it does not exist."""
+        manifest = scan_local_directory(directory_path)
+        if manifest is None:
+            return None
+        return manifest.path_list, manifest.size_list, manifest.mtime_ns_list
+
+    def read_changes(self, timeout: float) -> set:
+        now = monotonic()
+        if now < self.next_poll_time:
+            sleep(min(max(0.0, timeout), self.next_poll_time - now))
+            return set()
+
+        changed_key_set = set()
+        for key, path in self.path_dict.items():
+            signature = self.get_signature(path)
+            if signature != self.signature_dict.get(key):
+                changed_key_set.add(key)
+            self.signature_dict[key] = signature
+        self.next_poll_time = monotonic() + self.poll_interval
+        return changed_key_set
+
+
+def create_directory_watcher(path_dict: dict, watch_backend=WatchBackend.AUTO,
+                             debounce_time=DEFAULT_WATCH_DEBOUNCE_TIME, max_delay=DEFAULT_WATCH_MAX_DELAY,
+                             poll_interval=DEFAULT_WATCH_POLL_INTERVAL) -> DirectoryWatcher:
+    """Create and start the DirectoryWatcher of a WatchBackend. With WatchBackend.AUTO, a PollingDirectoryWatcher is
+    used if inotify cannot be started.
+    """
+    if watch_backend != WatchBackend.POLLING:
+        watcher = InotifyDirectoryWatcher(path_dict, debounce_time, max_delay)
+        try:
+            watcher.start()
+            return watcher
+        except (OSError, AttributeError) as exception:
+            if watch_backend == WatchBackend.INOTIFY:
+                raise
+            warning(f"DirectoryWatcher.create_directory_watcher(): Unable to use inotify ({exception}); polling "
+                    f"every {poll_interval} seconds instead.")
+
+    watcher = PollingDirectoryWatcher(path_dict, debounce_time, max_delay, poll_interval)
+    watcher.start()
+    return watcher
@@ -0,0 +1,117 @@
+# -------------------------------------------------------------------------------
+# FileHashCache.py
+# SQLite cache of the hash of each local file, keyed by its inode and only used
+# while its size and modification time are unchanged.
+# -------------------------------------------------------------------------------
+
+from pathlib import Path
+from threading import Lock
+from time import time
+from logging import debug
+import sqlite3
+
+DEFAULT_FILE_HASH_CACHE_PATH = Path.home() / ".cache" / "rsync_path" / "file_hash.sqlite3"
+DEFAULT_FILE_HASH_CACHE_MAX_ENTRIES = 2000000
+
+
+class FileHashCache(object):
+    """Remember the hash of a local file so that verifying an unchanged file again does not read it.
+
+    An entry is keyed by the device and inode of the file and is only used while the size, modification time and
+    hash algorithm are the same as when it was hashed. NOTE: a file rewritten in place with the same size whose
+    modification time was restored is not noticed.
+
+    Entries are kept in memory while a run is in progress and written back by save(). Once there are more than
+    max_entries entries, the least recently used ones are removed.
+    """
+
+    def __init__(self, cache_path: Path = DEFAULT_FILE_HASH_CACHE_PATH,
+                 max_entries=DEFAULT_FILE_HASH_CACHE_MAX_ENTRIES):
+        """Construct the object and load any existing entries from cache_path."""
+        self.cache_path = Path(cache_path)
+        self.max_entries = max_entries
+        self.entry_dict: dict[tuple, tuple] = {}
+        self.used_dict: dict[tuple, float] = {}
+        self.changed_key_set: set[tuple] = set()
+        self.lock = Lock()
+        self.load()
+
+    def connect(self):
+        """Open the cache database, creating it if needed."""
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.cache_path)
+        connection.execute("""CREATE TABLE IF NOT EXISTS file_hash (
+                                  device INTEGER NOT NULL,
+                                  inode INTEGER NOT NULL,
+                                  size_in_bytes INTEGER NOT NULL,
+                                  mtime_ns INTEGER NOT NULL,
+                                  algorithm TEXT NOT NULL,
+                                  digest TEXT NOT NULL,
+                                  last_used REAL NOT NULL,
+                                  PRIMARY KEY (device, inode))""")
+        return connection
+
+    def load(self):
+        """Read every entry from the cache database. An unreadable database results in an empty cache."""
+        try:
+            connection = self.connect()
+        except (OSError, sqlite3.Error) as exception:
+            debug(f"FileHashCache.load(): Ignoring unreadable cache {str(self.cache_path)}: {exception}")
+            return
+
+        try:
+            for row in connection.execute("SELECT device, inode, size_in_bytes, mtime_ns, algorithm, digest, "
+                                          "last_used FROM file_hash"):
+                key = (row[0], row[1])
+                self.entry_dict[key] = (row[2], row[3], row[4], row[5])
+                self.used_dict[key] = row[6]
+        except sqlite3.Error as exception:
+            debug(f"FileHashCache.load(): Ignoring unreadable cache {str(self.cache_path)}: {exception}")
+            self.entry_dict = {}
+            self.used_dict = {}
+        finally:
+            connection.close()
+
+    def get(self, device: int, inode: int, size_in_bytes: int, mtime_ns: int, algorithm: str):
+        """Return the cached hexadecimal digest of a file, or None if the file is not cached, has changed since it
+        was cached or was hashed with another algorithm.
+        """
+        key = (device, inode)
+        with self.lock:
+            entry = self.entry_dict.get(key)
+            if entry is None or entry[0] != size_in_bytes or entry[1] != mtime_ns or entry[2] != algorithm:
+                return None
+            self.used_dict[key] = time()
+            self.changed_key_set.add(key)
+        return entry[3]
+
+    def put(self, device: int, inode: int, size_in_bytes: int, mtime_ns: int, algorithm: str, digest: str):
+        """Store the hexadecimal digest of a file."""
+        key = (device, inode)
+        with self.lock:
+            self.entry_dict[key] = (size_in_bytes, mtime_ns, algorithm, digest)
+            self.used_dict[key] = time()
+            self.changed_key_set.add(key)
+
+    def save(self):
+        """Write the entries used or changed since the last save, then evict the least recently used entries."""
+        with self.lock:
+            row_list = [(*key, *self.entry_dict[key], self.used_dict[key]) for key in self.changed_key_set]
+            self.changed_key_set = set()
+
+            evicted_key_list = []
+            if len(self.entry_dict) > self.max_entries:
+                evicted_key_list = sorted(self.used_dict, key=self.used_dict.get)[:len(self.entry_dict) -
+                                                                                   self.max_entries]
+                for key in evicted_key_list:
+                    del self.entry_dict[key]
+                    del self.used_dict[key]
+
+        connection = self.connect()
+        try:
+            with connection:
+                connection.executemany("INSERT OR REPLACE INTO file_hash VALUES (?, ?, ?, ?, ?, ?, ?)", row_list)
+                connection.executemany("DELETE FROM file_hash WHERE device = ? AND inode = ?", evicted_key_list)
+        finally:
+            connection.close()
+        debug(f"FileHashCache.save(): Wrote {len(row_list)} and evicted {len(evicted_key_list)} entries.")
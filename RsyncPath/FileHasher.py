@@ -0,0 +1,228 @@
+# -------------------------------------------------------------------------------
+# FileHasher.py
+# Hash every file below a local directory with a pool of processes, reusing the
+# hashes of files that have not changed since they were last hashed.
+# -------------------------------------------------------------------------------
+
+from importlib.util import find_spec
+from logging import debug
+import hashlib
+import mmap
+import os
+import stat
+
+from RsyncPath.HashAlgorithm import HashAlgorithm
+from RsyncPath.FileHashCache import FileHashCache
+
+DEFAULT_HASH_WORKERS = 4
+HASH_READ_SIZE = 1 << 20
+# Files of at least this size are mapped into memory instead of read through a buffer:
+HASH_MMAP_MIN_SIZE = 64 << 20
+# Files are sent to the worker processes in batches of up to this many bytes or files:
+HASH_BATCH_SIZE = 64 << 20
+HASH_BATCH_FILE_COUNT = 256
+# Below this many bytes, files are hashed in the calling process since starting the workers would take longer:
+HASH_PARALLEL_MIN_SIZE = 32 << 20
+
+
+def get_local_hash_algorithm_set() -> set[HashAlgorithm]:
+    """Return the hash algorithms that can be computed on the local machine. XXH3_128 and BLAKE3 depend on the
+    optional xxhash and blake3 packages, which are only imported once a file is hashed with them.
+    """
+    algorithm_set = {HashAlgorithm.BLAKE2B, HashAlgorithm.SHA256}
+    if find_spec("xxhash") is not None:
+        algorithm_set.add(HashAlgorithm.XXH3_128)
+    if find_spec("blake3") is not None:
+        algorithm_set.add(HashAlgorithm.BLAKE3)
+    return algorithm_set
+
+
+def create_hash(algorithm: HashAlgorithm):
+    """Return a new hash object whose hexdigest() matches the output of algorithm.get_remote_program()."""
+    if algorithm == HashAlgorithm.XXH3_128:
+        import xxhash
+        return xxhash.xxh3_128()
+    if algorithm == HashAlgorithm.BLAKE3:
+        from blake3 import blake3
+        return blake3()
+    if algorithm == HashAlgorithm.BLAKE2B:
+        return hashlib.blake2b()
+    return hashlib.sha256()
+
+
+def hash_file(file_path, algorithm: HashAlgorithm) -> str:
+    """Return the hexadecimal digest of a file. Large files are mapped into memory, and every other file is read
+    into a single reused buffer.
+    """
+    file_hash = create_hash(algorithm)
+    with open(file_path, "rb", buffering=0) as input_file:
+        if os.fstat(input_file.fileno()).st_size >= HASH_MMAP_MIN_SIZE:
+            with mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+                file_hash.update(mapped_file)
+            return file_hash.hexdigest()
+
+        buffer = bytearray(HASH_READ_SIZE)
+        with memoryview(buffer) as view:
+            while True:
+                read_size = input_file.readinto(buffer)
+                if not read_size:
+                    break
+                file_hash.update(view[:read_size])
+    return file_hash.hexdigest()
+
+
+def hash_file_batch(file_path_list: list[str], algorithm: HashAlgorithm) -> list:
+    """Hash a batch of files in a worker process. Nothing is logged, since the logging lock may have been held by
+    another thread when the worker was forked.
+
+    :returns The hexadecimal digest of each file, or None for a file that could not be read.
+    """
+    digest_list = []
+    for file_path in file_path_list:
+        try:
+            digest_list.append(hash_file(file_path, algorithm))
+        except (OSError, ValueError):
+            digest_list.append(None)
+    return digest_list
+
+
+class ParallelFileHasher(object):
+    """Hash the regular files below a local directory, following symbolic links like rsync -L.
+
+    Files whose hash is in the FileHashCache are not read again. The others are split into batches of similar size
+    that are hashed by up to max_workers processes, so hashing is not limited by a single core or by the GIL.
+    """
+
+    def __init__(self, max_workers=DEFAULT_HASH_WORKERS, hash_cache: FileHashCache = None):
+        """Construct the object."""
+        self.max_workers = max(1, int(max_workers))
+        self.hash_cache = hash_cache
+        self.cached_file_count = 0
+        self.hashed_file_count = 0
+        self.hashed_file_bytes = 0
+
+    @staticmethod
+    def get_file_entry_list(directory_path, path_list: list[str] = None):
+        """Return a (relative path, stat) tuple for every regular file below a directory, or only for the files in
+        path_list if it is passed. Every directory is only walked once, even if it can be reached through several
+        links.
+
+        :returns The list of entries, or None if directory_path is not a directory.
+        """
+        try:
+            root_stat = os.stat(directory_path)
+        except OSError:
+            return None
+        if not stat.S_ISDIR(root_stat.st_mode):
+            return None
+
+        entry_list = []
+        if path_list is not None:
+            for relative_path in path_list:
+                try:
+                    file_stat = os.stat(os.path.join(directory_path, relative_path))
+                except OSError:
+                    continue
+                if stat.S_ISREG(file_stat.st_mode):
+                    entry_list.append((relative_path, file_stat))
+            return entry_list
+
+        seen_set = {(root_stat.st_dev, root_stat.st_ino)}
+        pending_directory_list = [(str(directory_path), "")]
+        while pending_directory_list:
+            current_directory, relative_directory = pending_directory_list.pop()
+            try:
+                entry_iterator = os.scandir(current_directory)
+            except OSError as exception:
+                debug(f"ParallelFileHasher.get_file_entry_list(): Skipping {current_directory}: {exception}")
+                continue
+
+            with entry_iterator:
+                for entry in entry_iterator:
+                    try:
+                        entry_stat = entry.stat(follow_symlinks=True)
+                    except OSError:
+                        continue
+
+                    relative_path = relative_directory + entry.name
+                    if stat.S_ISDIR(entry_stat.st_mode):
+                        key = (entry_stat.st_dev, entry_stat.st_ino)
+                        if key not in seen_set:
+                            seen_set.add(key)
+                            pending_directory_list.append((entry.path, relative_path + "/"))
+                    elif stat.S_ISREG(entry_stat.st_mode):
+                        entry_list.append((relative_path, entry_stat))
+        return entry_list
+
+    @staticmethod
+    def get_batch_list(entry_list: list) -> list[list]:
+        """Split (relative path, stat) entries into batches of up to HASH_BATCH_SIZE bytes or HASH_BATCH_FILE_COUNT
+        files. A file larger than a batch is a batch of its own.
+        """
+        batch_list = []
+        batch = []
+        batch_size = 0
+        for entry in entry_list:
+            if batch and (batch_size + entry[1].st_size > HASH_BATCH_SIZE or len(batch) >= HASH_BATCH_FILE_COUNT):
+                batch_list.append(batch)
+                batch = []
+                batch_size = 0
+            batch.append(entry)
+            batch_size += entry[1].st_size
+        if batch:
+            batch_list.append(batch)
+        return batch_list
+
+    def hash_directory(self, directory_path, algorithm: HashAlgorithm, path_list: list[str] = None, refresh=False):
+        """Hash the regular files below a local directory, or only the files in path_list if it is passed. If refresh
+        is True, every file is read again and its cached hash replaced, since a file rewritten in place can keep its
+        size and modification time.
+
+        :returns A dictionary mapping the path of each file relative to directory_path to its hexadecimal digest,
+        or None if directory_path is not a directory. Files that could not be read are left out.
+        """
+        entry_list = self.get_file_entry_list(directory_path, path_list)
+        if entry_list is None:
+            return None
+
+        hash_dict = {}
+        pending_entry_list = []
+        for relative_path, file_stat in entry_list:
+            digest = None
+            if self.hash_cache is not None and not refresh:
+                digest = self.hash_cache.get(file_stat.st_dev, file_stat.st_ino, file_stat.st_size,
+                                             file_stat.st_mtime_ns, algorithm.name)
+            if digest is not None:
+                hash_dict[relative_path] = digest
+            else:
+                pending_entry_list.append((relative_path, file_stat))
+        self.cached_file_count += len(hash_dict)
+
+        batch_list = self.get_batch_list(pending_entry_list)
+        path_batch_list = [[os.path.join(directory_path, relative_path) for relative_path, _ in batch]
+                           for batch in batch_list]
+        pending_size = sum(file_stat.st_size for _, file_stat in pending_entry_list)
+        if self.max_workers < 2 or len(batch_list) < 2 or pending_size < HASH_PARALLEL_MIN_SIZE:
+            digest_batch_list = [hash_file_batch(path_batch, algorithm) for path_batch in path_batch_list]
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=min(self.max_workers, len(batch_list))) as executor:
+                digest_batch_list = list(executor.map(hash_file_batch, path_batch_list,
+                                                      [algorithm] * len(path_batch_list)))
+
+        for batch, digest_list in zip(batch_list, digest_batch_list):
+            for (relative_path, file_stat), digest in zip(batch, digest_list):
+                if digest is None:
+                    debug(f"ParallelFileHasher.hash_directory(): Unable to hash {relative_path} in "
+                          f"{str(directory_path)}")
+                    continue
+                hash_dict[relative_path] = digest
+                self.hashed_file_count += 1
+                self.hashed_file_bytes += file_stat.st_size
+                if self.hash_cache is not None:
+                    self.hash_cache.put(file_stat.st_dev, file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns,
+                                        algorithm.name, digest)
+
+        debug(f"ParallelFileHasher.hash_directory(): Hashed {len(pending_entry_list)} and reused "
+              f"{len(entry_list) - len(pending_entry_list)} of {len(entry_list)} file(s) in {str(directory_path)}")
+        return hash_dict
@@ -0,0 +1,268 @@
+# -------------------------------------------------------------------------------
+# FileManifest.py
+# Per-directory index of the files in a source directory (relative path, size,
+# modification time and an optional hash), stored in a compact columnar file,
+# used to find the files that changed since the last successful transfer.
+# -------------------------------------------------------------------------------
+
+from typing import NamedTuple
+from pathlib import Path
+from array import array
+from logging import debug
+import hashlib
+import os
+import stat
+import struct
+import sys
+import zlib
+
+DEFAULT_FILE_MANIFEST_PATH = Path.home() / ".cache" / "rsync_path" / "manifests"
+FILE_MANIFEST_MAGIC = b"RSPM"
+FILE_MANIFEST_VERSION = 1
+FILE_MANIFEST_HEADER = struct.Struct("<4sHHI")
+FILE_MANIFEST_HASH_SIZE = 16
+FILE_MANIFEST_READ_SIZE = 1 << 20
+
+
+def parse_find_mtime(mtime_string: str) -> int:
+    """Convert a modification time printed by find -printf %T@, such as 1700000000.1234567890, into nanoseconds
+    without going through a float, so it matches os.stat_result.st_mtime_ns exactly.
+    """
+    second_string, _, fraction_string = mtime_string.partition(".")
+    return int(second_string) * 1000000000 + int((fraction_string + "000000000")[:9])
+
+
+def hash_file(file_path) -> bytes:
+    """Return the BLAKE2b digest of a file, FILE_MANIFEST_HASH_SIZE bytes long."""
+    file_hash = hashlib.blake2b(digest_size=FILE_MANIFEST_HASH_SIZE)
+    with open(file_path, "rb") as input_file:
+        while True:
+            chunk = input_file.read(FILE_MANIFEST_READ_SIZE)
+            if not chunk:
+                break
+            file_hash.update(chunk)
+    return file_hash.digest()
+
+
+class ManifestDifference(NamedTuple):
+    """The files that were created or modified and the files that were removed between two manifests."""
+
+    changed_path_list: list[str]
+    deleted_path_list: list[str]
+
+    def is_empty(self) -> bool:
+        return not self.changed_path_list and not self.deleted_path_list
+
+
+class FileManifest(object):
+    """The regular files below a directory, sorted by their path relative to it.
+
+    Each file has a size, a modification time in nanoseconds and, if the manifest was built with hashing enabled, a
+    BLAKE2b digest. On disk, every column is stored one after another and compressed, so a manifest of a large
+    directory stays small and is loaded without parsing each entry.
+    """
+
+    def __init__(self, path_list: list[str] = None, size_list: list[int] = None, mtime_ns_list: list[int] = None,
+                 hash_list: list[bytes] = None):
+        """Construct the object. The lists must already be sorted by path."""
+        self.path_list: list[str] = path_list if path_list is not None else []
+        self.size_list = array("Q", size_list if size_list is not None else [])
+        self.mtime_ns_list = array("q", mtime_ns_list if mtime_ns_list is not None else [])
+        self.hash_list: list[bytes] = hash_list
+
+    def __len__(self):
+        return len(self.path_list)
+
+    def has_hashes(self) -> bool:
+        return self.hash_list is not None
+
+    @classmethod
+    def from_entry_list(cls, entry_list: list, has_hashes=False):
+        """Build a manifest from (relative_path, size, mtime_ns[, hash]) entries in any order."""
+        entry_list = sorted(entry_list, key=lambda entry: entry[0])
+        return cls([entry[0] for entry in entry_list],
+                   [entry[1] for entry in entry_list],
+                   [entry[2] for entry in entry_list],
+                   [entry[3] for entry in entry_list] if has_hashes else None)
+
+    def compare(self, previous_manifest: "FileManifest") -> ManifestDifference:
+        """Compare this manifest with an older one of the same directory.
+
+        A file is changed if it is new, or if its size, modification time or (when both manifests have them) hash
+        differ. Both manifests are sorted, so they are merged in a single pass.
+        """
+        compare_hashes = self.has_hashes() and previous_manifest.has_hashes()
+        path_list = self.path_list
+        previous_path_list = previous_manifest.path_list
+        changed_path_list = []
+        deleted_path_list = []
+        index = 0
+        previous_index = 0
+        while index < len(path_list) or previous_index < len(previous_path_list):
+            if previous_index >= len(previous_path_list) or \
+                    (index < len(path_list) and path_list[index] < previous_path_list[previous_index]):
+                changed_path_list.append(path_list[index])
+                index += 1
+            elif index >= len(path_list) or path_list[index] > previous_path_list[previous_index]:
+                deleted_path_list.append(previous_path_list[previous_index])
+                previous_index += 1
+            else:
+                if self.size_list[index] != previous_manifest.size_list[previous_index] or \
+                        self.mtime_ns_list[index] != previous_manifest.mtime_ns_list[previous_index] or \
+                        (compare_hashes and self.hash_list[index] != previous_manifest.hash_list[previous_index]):
+                    changed_path_list.append(path_list[index])
+                index += 1
+                previous_index += 1
+        return ManifestDifference(changed_path_list, deleted_path_list)
+
+    def to_bytes(self) -> bytes:
+        """Serialize the manifest: a header followed by the compressed size, modification time, hash and path
+        columns.
+        """
+        size_list = array("Q", self.size_list)
+        mtime_ns_list = array("q", self.mtime_ns_list)
+        if sys.byteorder == "big":
+            size_list.byteswap()
+            mtime_ns_list.byteswap()
+        hash_size = FILE_MANIFEST_HASH_SIZE if self.has_hashes() else 0
+        path_bytes = b"\0".join(path.encode("utf-8", "surrogateescape") for path in self.path_list)
+        body = b"".join([size_list.tobytes(), mtime_ns_list.tobytes(),
+                         b"".join(self.hash_list) if self.has_hashes() else b"", path_bytes])
+        return FILE_MANIFEST_HEADER.pack(FILE_MANIFEST_MAGIC, FILE_MANIFEST_VERSION, hash_size,
+                                         len(self.path_list)) + zlib.compress(body)
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        """Deserialize a manifest written by to_bytes(), raising a ValueError if it is not valid."""
+        if len(data) < FILE_MANIFEST_HEADER.size:
+            raise ValueError("The manifest is truncated.")
+        magic, version, hash_size, entry_count = FILE_MANIFEST_HEADER.unpack_from(data)
+        if magic != FILE_MANIFEST_MAGIC or version != FILE_MANIFEST_VERSION:
+            raise ValueError(f"Unsupported manifest {magic!r} version {version}.")
+        try:
+            body = zlib.decompress(data[FILE_MANIFEST_HEADER.size:])
+        except zlib.error as exception:
+            raise ValueError(f"The manifest is corrupt: {exception}") from exception
+
+        column_size = 8 * entry_count
+        hash_offset = 2 * column_size
+        path_offset = hash_offset + hash_size * entry_count
+        if len(body) < path_offset:
+            raise ValueError("The manifest is truncated.")
+
+        size_list = array("Q")
+        size_list.frombytes(body[:column_size])
+        mtime_ns_list = array("q")
+        mtime_ns_list.frombytes(body[column_size:hash_offset])
+        if sys.byteorder == "big":
+            size_list.byteswap()
+            mtime_ns_list.byteswap()
+        hash_list = None
+        if hash_size:
+            hash_list = [body[offset:offset + hash_size] for offset in range(hash_offset, path_offset, hash_size)]
+        path_list = body[path_offset:].decode("utf-8", "surrogateescape").split("\0") if entry_count else []
+        if len(path_list) != entry_count:
+            raise ValueError(f"Expected {entry_count} path(s) but found {len(path_list)}.")
+
+        manifest = cls(path_list, None, None, hash_list)
+        manifest.size_list = size_list
+        manifest.mtime_ns_list = mtime_ns_list
+        return manifest
+
+
+def scan_local_directory(directory_path, enable_hash=False) -> FileManifest:
+    """Build the manifest of a local directory, following symbolic links like rsync -L.
+
+    Every directory is only walked once, even if it can be reached through several links, so symbolic link loops are
+    not walked forever. Returns None if directory_path is not a directory.
+    """
+    try:
+        root_stat = os.stat(directory_path)
+    except OSError:
+        return None
+    if not stat.S_ISDIR(root_stat.st_mode):
+        return None
+
+    entry_list = []
+    seen_set = {(root_stat.st_dev, root_stat.st_ino)}
+    pending_directory_list = [(str(directory_path), "")]
+    while pending_directory_list:
+        current_directory, relative_directory = pending_directory_list.pop()
+        try:
+            entry_iterator = os.scandir(current_directory)
+        except OSError as exception:
+            debug(f"FileManifest.scan_local_directory(): Skipping {current_directory}: {exception}")
+            continue
+
+        with entry_iterator:
+            for entry in entry_iterator:
+                try:
+                    entry_stat = entry.stat(follow_symlinks=True)
+                except OSError:
+                    # Broken symbolic link, or the entry disappeared while scanning.
+                    continue
+
+                relative_path = relative_directory + entry.name
+                if stat.S_ISDIR(entry_stat.st_mode):
+                    key = (entry_stat.st_dev, entry_stat.st_ino)
+                    if key not in seen_set:
+                        seen_set.add(key)
+                        pending_directory_list.append((entry.path, relative_path + "/"))
+                elif stat.S_ISREG(entry_stat.st_mode):
+                    entry_list.append((relative_path, entry_stat.st_size, entry_stat.st_mtime_ns))
+
+    if not enable_hash:
+        return FileManifest.from_entry_list(entry_list)
+
+    hashed_entry_list = []
+    for relative_path, size_in_bytes, mtime_ns in entry_list:
+        try:
+            file_hash = hash_file(os.path.join(directory_path, relative_path))
+        except OSError:
+            # Left out of the manifest, so the file is treated as changed next time.
+            continue
+        hashed_entry_list.append((relative_path, size_in_bytes, mtime_ns, file_hash))
+    return FileManifest.from_entry_list(hashed_entry_list, True)
+
+
+class FileManifestStore(object):
+    """Keep the manifest of every transferred directory in its own file under a store directory.
+
+    A manifest describes the source directory as it was when it was last copied successfully to a destination, so
+    its file name is derived from both: the same source copied to two destinations has two manifests.
+    """
+
+    def __init__(self, store_path: Path = DEFAULT_FILE_MANIFEST_PATH):
+        """Construct the object. Nothing is read until a manifest is loaded."""
+        self.store_path = Path(store_path)
+
+    def get_manifest_path(self, source_key: str, destination_key: str) -> Path:
+        """Return the file a manifest is stored in."""
+        digest = hashlib.sha256(f"{source_key}\0{destination_key}".encode("utf-8", "surrogateescape")).hexdigest()
+        return self.store_path / f"{digest}.manifest"
+
+    def load(self, source_key: str, destination_key: str):
+        """Return the stored manifest, or None if there is none or it cannot be read."""
+        manifest_path = self.get_manifest_path(source_key, destination_key)
+        try:
+            return FileManifest.from_bytes(manifest_path.read_bytes())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as exception:
+            debug(f"FileManifestStore.load(): Ignoring unreadable manifest {str(manifest_path)}: {exception}")
+            return None
+
+    def save(self, source_key: str, destination_key: str, manifest: FileManifest):
+        """Write a manifest, replacing the previous one atomically."""
+        manifest_path = self.get_manifest_path(source_key, destination_key)
+        manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = manifest_path.with_suffix(manifest_path.suffix + ".tmp")
+        temp_path.write_bytes(manifest.to_bytes())
+        temp_path.replace(manifest_path)
+
+    def remove(self, source_key: str, destination_key: str):
+        """Forget a manifest, so the next run copies the whole directory."""
+        try:
+            self.get_manifest_path(source_key, destination_key).unlink()
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,25 @@
+# -------------------------------------------------------------------------------
+# HashAlgorithm.py
+# Simple Enum of the hashes used to verify copied files.
+# -------------------------------------------------------------------------------
+
+from enum import Enum
+
+
+class HashAlgorithm(Enum):
+    """Simple Enum for the hash used to verify copied files, fastest first.
+
+    XXH3_128 needs the xxhash package on the local machine and xxh128sum on the remote machine, and BLAKE3 needs the
+    blake3 package and b3sum. BLAKE2B (BLAKE2b-512) and SHA256 only need hashlib and the coreutils b2sum and
+    sha256sum programs.
+    """
+
+    XXH3_128 = 0
+    BLAKE3 = 1
+    BLAKE2B = 2
+    SHA256 = 3
+
+    def get_remote_program(self) -> str:
+        """Return the program that prints the same hash on the remote machine."""
+        return {HashAlgorithm.XXH3_128: "xxh128sum", HashAlgorithm.BLAKE3: "b3sum", HashAlgorithm.BLAKE2B: "b2sum",
+                HashAlgorithm.SHA256: "sha256sum"}[self]
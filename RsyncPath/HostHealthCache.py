@@ -0,0 +1,85 @@
+# -------------------------------------------------------------------------------
+# HostHealthCache.py
+# Small on-disk cache of the measured latency and failures of remote machines.
+# -------------------------------------------------------------------------------
+
+from pathlib import Path
+from time import time
+from logging import debug
+import json
+
+DEFAULT_HOST_HEALTH_CACHE_PATH = Path.home() / ".cache" / "rsync_path" / "host_health.json"
+DEFAULT_HOST_HEALTH_CACHE_TTL = 15 * 60
+DEFAULT_BACKOFF_BASE = 60
+DEFAULT_BACKOFF_LIMIT = 24 * 60 * 60
+
+
+def get_host_key(hostname: str, ssh_port) -> str:
+    """Return the key used to store a remote machine in the cache."""
+    return f"{hostname}:{ssh_port}"
+
+
+class HostHealthCache(object):
+    """Keep the latency measured for each remote machine, along with how often it has failed to respond.
+
+    Latencies are only trusted for ttl seconds. Each consecutive failure doubles the time a remote machine is
+    skipped for, starting at backoff_base seconds and capped at backoff_limit seconds.
+    """
+
+    def __init__(self, cache_path: Path = DEFAULT_HOST_HEALTH_CACHE_PATH, ttl=DEFAULT_HOST_HEALTH_CACHE_TTL,
+                 backoff_base=DEFAULT_BACKOFF_BASE, backoff_limit=DEFAULT_BACKOFF_LIMIT):
+        """Construct the object and load any existing entries from cache_path."""
+        self.cache_path = Path(cache_path)
+        self.ttl = ttl
+        self.backoff_base = backoff_base
+        self.backoff_limit = backoff_limit
+        self.entry_dict: dict[str, dict] = {}
+        self.load()
+
+    def load(self):
+        """Read the cache file. A missing or unreadable file results in an empty cache."""
+        try:
+            with open(self.cache_path, "r") as cache_file:
+                self.entry_dict = json.load(cache_file)
+        except FileNotFoundError:
+            self.entry_dict = {}
+        except (OSError, ValueError) as exception:
+            debug(f"HostHealthCache.load(): Ignoring unreadable cache file {str(self.cache_path)}: {exception}")
+            self.entry_dict = {}
+
+    def save(self):
+        """Write the cache file, replacing it atomically."""
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.cache_path.with_suffix(self.cache_path.suffix + ".tmp")
+        with open(temp_path, "w") as cache_file:
+            json.dump(self.entry_dict, cache_file)
+        temp_path.replace(self.cache_path)
+
+    def get_fresh_latency(self, host_key: str):
+        """Return the latency of a remote machine if it was measured within the last ttl seconds. Otherwise, None."""
+        entry = self.entry_dict.get(host_key)
+        if entry is None or entry.get("latency") is None:
+            return None
+        if time() - entry.get("checked_at", 0) > self.ttl:
+            return None
+        return entry["latency"]
+
+    def is_backed_off(self, host_key: str) -> bool:
+        """Check if a remote machine failed recently enough that it should not be probed yet."""
+        entry = self.entry_dict.get(host_key)
+        return entry is not None and time() < entry.get("retry_after", 0)
+
+    def record_success(self, host_key: str, latency: float):
+        """Store the measured latency of a remote machine and reset its failure count."""
+        self.entry_dict[host_key] = {"latency": latency, "checked_at": time(), "failure_count": 0, "retry_after": 0}
+
+    def record_failure(self, host_key: str):
+        """Mark a remote machine as unavailable and push back the next time it will be probed."""
+        entry = self.entry_dict.get(host_key, {})
+        failure_count = entry.get("failure_count", 0) + 1
+        backoff = min(self.backoff_base * (2 ** (failure_count - 1)), self.backoff_limit)
+        current_time = time()
+        self.entry_dict[host_key] = {"latency": None, "checked_at": current_time, "failure_count": failure_count,
+                                     "retry_after": current_time + backoff}
+        debug(f"HostHealthCache.record_failure(): {host_key} has failed {failure_count} time(s); skipping it for "
+              f"{backoff} second(s).")
@@ -0,0 +1,187 @@
+# -------------------------------------------------------------------------------
+# LocalDirectoryScanner.py
+# Walk a local directory tree with os.scandir to determine its size, number of
+# files and newest modification time in a single pass.
+# -------------------------------------------------------------------------------
+
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from pathlib import Path
+from logging import debug
+import os
+import stat
+
+from RsyncPath.DirectorySizeCache import DirectorySizeCache, LOCAL_NAMESPACE
+
+DEFAULT_SCAN_WORKERS = 8
+
+
+class LocalDirectoryScanner(object):
+    """Determine the metadata of a local directory using the same rules as du -sLb and find -L on the remote side.
+
+    Symbolic links are followed, and every directory and file is counted once even if it can be reached through
+    several links, so symbolic link loops are not walked forever. Top-level subdirectories are scanned in parallel
+    by up to max_workers threads. If a DirectorySizeCache is passed, directories that have not changed since they
+    were cached are not scanned again; only their subdirectories are checked.
+    """
+
+    def __init__(self, max_workers=DEFAULT_SCAN_WORKERS, size_cache: DirectorySizeCache = None):
+        """Construct the object."""
+        self.max_workers = max(1, int(max_workers))
+        self.size_cache = size_cache
+        self.seen_set: set[tuple] = set()
+        self.seen_lock = Lock()
+        self.visited_directory_count = 0
+        self.visited_file_count = 0
+
+    def mark_as_seen(self, entry_stat: os.stat_result) -> bool:
+        """Record a directory or hard-linked file. Returns False if it was already counted."""
+        key = (entry_stat.st_dev, entry_stat.st_ino)
+        with self.seen_lock:
+            if key in self.seen_set:
+                return False
+            self.seen_set.add(key)
+            return True
+
+    def count_visit(self, file_count: int):
+        """Record that a directory was visited, and how many of its entries had to be examined."""
+        with self.seen_lock:
+            self.visited_directory_count += 1
+            self.visited_file_count += file_count
+
+    def scan_single_directory(self, directory_path: str, directory_stat: os.stat_result):
+        """Scan the entries directly inside a directory.
+
+        :returns A tuple containing the size, number and newest modification time of the files directly inside the
+        directory, and a list of (path, stat) tuples of its subdirectories that have not been counted yet. The size
+        includes the size of those subdirectories themselves.
+        """
+        cached_entry = None
+        if self.size_cache is not None:
+            cached_entry = self.size_cache.get(LOCAL_NAMESPACE, directory_path, directory_stat.st_dev,
+                                               directory_stat.st_ino, directory_stat.st_mtime_ns)
+
+        if cached_entry is not None:
+            size_in_bytes, file_count, newest_mtime, cached_subdirectory_list = cached_entry
+            subdirectory_list = []
+            for subdirectory_path in cached_subdirectory_list:
+                try:
+                    subdirectory_stat = os.stat(subdirectory_path)
+                except OSError:
+                    continue
+                if stat.S_ISDIR(subdirectory_stat.st_mode) and self.mark_as_seen(subdirectory_stat):
+                    size_in_bytes += subdirectory_stat.st_size
+                    subdirectory_list.append((subdirectory_path, subdirectory_stat))
+            self.count_visit(0)
+            return size_in_bytes, file_count, newest_mtime, subdirectory_list
+
+        file_size_in_bytes = 0
+        file_count = 0
+        newest_mtime = 0.0
+        subdirectory_size_in_bytes = 0
+        subdirectory_list = []
+        all_subdirectory_path_list = []
+        can_be_cached = True
+        visited_file_count = 0
+        try:
+            entry_iterator = os.scandir(directory_path)
+        except OSError as exception:
+            debug(f"LocalDirectoryScanner.scan_single_directory(): Skipping {directory_path}: {exception}")
+            return 0, 0, 0.0, []
+
+        with entry_iterator:
+            for entry in entry_iterator:
+                try:
+                    entry_stat = entry.stat(follow_symlinks=True)
+                except OSError:
+                    # Broken symbolic link, or the entry disappeared while scanning.
+                    continue
+
+                if stat.S_ISDIR(entry_stat.st_mode):
+                    all_subdirectory_path_list.append(entry.path)
+                    if self.mark_as_seen(entry_stat):
+                        subdirectory_size_in_bytes += entry_stat.st_size
+                        subdirectory_list.append((entry.path, entry_stat))
+                    continue
+
+                visited_file_count += 1
+                if entry_stat.st_nlink > 1:
+                    # Whether a hard-linked file is counted depends on the rest of the tree, so the directory
+                    # cannot be cached on its own.
+                    can_be_cached = False
+                    if not self.mark_as_seen(entry_stat):
+                        continue
+                file_size_in_bytes += entry_stat.st_size
+                if stat.S_ISREG(entry_stat.st_mode):
+                    file_count += 1
+                    if entry_stat.st_mtime > newest_mtime:
+                        newest_mtime = entry_stat.st_mtime
+
+        self.count_visit(visited_file_count)
+        if self.size_cache is not None and can_be_cached:
+            self.size_cache.put(LOCAL_NAMESPACE, directory_path, directory_stat.st_dev, directory_stat.st_ino,
+                                directory_stat.st_mtime_ns, file_size_in_bytes, file_count, newest_mtime,
+                                all_subdirectory_path_list)
+
+        return file_size_in_bytes + subdirectory_size_in_bytes, file_count, newest_mtime, subdirectory_list
+
+    def scan_entries(self, directory_path: str, directory_stat: os.stat_result, subdirectory_list: list = None):
+        """Scan a directory tree and return its (size_in_bytes, file_count, newest_mtime), not counting the size of
+        directory_path itself.
+
+        If subdirectory_list is passed, the (path, stat) tuples of the subdirectories directly inside directory_path
+        are appended to it instead of being scanned.
+        """
+        size_in_bytes = 0
+        file_count = 0
+        newest_mtime = 0.0
+        pending_directory_list = [(directory_path, directory_stat)]
+
+        while pending_directory_list:
+            current_directory, current_stat = pending_directory_list.pop()
+            directory_size, directory_file_count, directory_newest_mtime, found_subdirectory_list = \
+                self.scan_single_directory(current_directory, current_stat)
+            size_in_bytes += directory_size
+            file_count += directory_file_count
+            newest_mtime = max(newest_mtime, directory_newest_mtime)
+
+            if subdirectory_list is not None and current_directory == directory_path:
+                subdirectory_list.extend(found_subdirectory_list)
+            else:
+                pending_directory_list.extend(found_subdirectory_list)
+
+        return size_in_bytes, file_count, newest_mtime
+
+    def scan(self, directory_path: Path) -> dict:
+        """Scan a local directory.
+
+        :returns A dictionary containing exists, size_in_bytes, file_count and newest_mtime keys, in the same format
+        as Client.get_remote_directory_metadata().
+        """
+        try:
+            root_stat = os.stat(directory_path)
+        except OSError:
+            return {"exists": False, "size_in_bytes": 0, "file_count": 0, "newest_mtime": 0.0}
+        if not stat.S_ISDIR(root_stat.st_mode):
+            return {"exists": False, "size_in_bytes": 0, "file_count": 0, "newest_mtime": 0.0}
+
+        self.seen_set = set()
+        self.visited_directory_count = 0
+        self.visited_file_count = 0
+        self.mark_as_seen(root_stat)
+
+        subdirectory_list = [] if self.max_workers > 1 else None
+        size_in_bytes, file_count, newest_mtime = self.scan_entries(str(directory_path), root_stat, subdirectory_list)
+        size_in_bytes += root_stat.st_size
+
+        if subdirectory_list:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(subdirectory_list))) as executor:
+                for sub_size, sub_file_count, sub_newest_mtime in executor.map(lambda path_stat:
+                                                                               self.scan_entries(*path_stat),
+                                                                               subdirectory_list):
+                    size_in_bytes += sub_size
+                    file_count += sub_file_count
+                    newest_mtime = max(newest_mtime, sub_newest_mtime)
+
+        return {"exists": True, "size_in_bytes": size_in_bytes, "file_count": file_count,
+                "newest_mtime": newest_mtime}
@@ -0,0 +1,16 @@
+# -------------------------------------------------------------------------------
+# MetricType.py
+#
+# -------------------------------------------------------------------------------
+
+from enum import Enum
+
+
+class MetricType(Enum):
+    """Simple Enum to determine how a metric recorded by Metrics is updated and exported. A COUNTER only increases,
+    a GAUGE is set to its latest value, and a HISTOGRAM counts observations (usually durations in seconds) in buckets.
+    """
+
+    COUNTER = 0
+    GAUGE = 1
+    HISTOGRAM = 2
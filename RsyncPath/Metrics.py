@@ -0,0 +1,178 @@
+# -------------------------------------------------------------------------------
+# Metrics.py
+# Counters, gauges and histograms recorded by RsyncPath and Client for every
+# phase of a run, and an exporter for the Prometheus textfile collector.
+# -------------------------------------------------------------------------------
+
+from contextlib import contextmanager
+from threading import Lock
+from time import monotonic
+from pathlib import Path
+from bisect import bisect_left
+from logging import debug
+import os
+
+from RsyncPath.MetricType import MetricType
+
+DEFAULT_METRIC_PREFIX = "rsync_path"
+DEFAULT_BUCKET_LIST = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0,
+                       3600.0]
+
+
+class Metrics(object):
+    """Record counters, gauges and histograms, each identified by a name and an optional dictionary of labels.
+
+    If a callback is passed, it is called with the MetricType, name, value and label dictionary of every update, so
+    the measurements can be forwarded somewhere else as they happen. Every method is thread-safe.
+    """
+
+    def __init__(self, callback=None, bucket_list: list[float] = None):
+        """Construct the object."""
+        self.callback = callback
+        self.bucket_list = sorted(bucket_list) if bucket_list else DEFAULT_BUCKET_LIST
+        self.type_dict: dict[str, MetricType] = {}
+        self.value_dict: dict[tuple, object] = {}
+        self.lock = Lock()
+
+    def get_key(self, name: str, metric_type: MetricType, label_dict: dict = None):
+        """Return the key of a metric, registering its type the first time it is used."""
+        registered_type = self.type_dict.setdefault(name, metric_type)
+        if registered_type != metric_type:
+            raise ValueError(f"Metric {name} is a {registered_type.name}, not a {metric_type.name}.")
+        return name, tuple(sorted((str(key), str(value)) for key, value in (label_dict or {}).items()))
+
+    def increment(self, name: str, value=1, label_dict: dict = None):
+        """Increase a counter."""
+        with self.lock:
+            key = self.get_key(name, MetricType.COUNTER, label_dict)
+            self.value_dict[key] = self.value_dict.get(key, 0) + value
+        if self.callback is not None:
+            self.callback(MetricType.COUNTER, name, value, label_dict or {})
+
+    def set_gauge(self, name: str, value, label_dict: dict = None):
+        """Set a gauge to a value."""
+        with self.lock:
+            self.value_dict[self.get_key(name, MetricType.GAUGE, label_dict)] = value
+        if self.callback is not None:
+            self.callback(MetricType.GAUGE, name, value, label_dict or {})
+
+    def observe(self, name: str, value: float, label_dict: dict = None):
+        """Add an observation to a histogram."""
+        with self.lock:
+            key = self.get_key(name, MetricType.HISTOGRAM, label_dict)
+            bucket_count_list, total, count = self.value_dict.get(key, ([0] * len(self.bucket_list), 0.0, 0))
+            bucket_index = bisect_left(self.bucket_list, value)
+            if bucket_index < len(bucket_count_list):
+                bucket_count_list = list(bucket_count_list)
+                bucket_count_list[bucket_index] += 1
+            self.value_dict[key] = (bucket_count_list, total + value, count + 1)
+        if self.callback is not None:
+            self.callback(MetricType.HISTOGRAM, name, value, label_dict or {})
+
+    @contextmanager
+    def time(self, name: str, label_dict: dict = None):
+        """Observe how many seconds the body of a with statement takes, even if it raises an exception."""
+        start_time = monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, monotonic() - start_time, label_dict)
+
+    def get_value(self, name: str, label_dict: dict = None):
+        """Return the value of a counter or gauge, the (bucket_count_list, sum, count) of a histogram, or None if it
+        was never recorded.
+        """
+        with self.lock:
+            metric_type = self.type_dict.get(name)
+            if metric_type is None:
+                return None
+            return self.value_dict.get(self.get_key(name, metric_type, label_dict))
+
+    def get_sample_list(self):
+        """Return a sorted list of (name, MetricType, label tuple, value) tuples for every recorded metric."""
+        with self.lock:
+            return sorted(((name, self.type_dict[name], label_tuple, value)
+                           for (name, label_tuple), value in self.value_dict.items()),
+                          key=lambda sample: (sample[0], sample[2]))
+
+
+class NullMetrics(Metrics):
+    """Metrics that discards every update. Used when no metrics were requested, so callers never check for None."""
+
+    def increment(self, name: str, value=1, label_dict: dict = None):
+        pass
+
+    def set_gauge(self, name: str, value, label_dict: dict = None):
+        pass
+
+    def observe(self, name: str, value: float, label_dict: dict = None):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+def escape_label_value(value: str) -> str:
+    """Escape a label value for the Prometheus text format."""
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_label_string(label_tuple: tuple, extra_label_tuple: tuple = ()) -> str:
+    """Format labels as {key="value",...}, or an empty string if there are none."""
+    label_list = [f'{key}="{escape_label_value(value)}"' for key, value in label_tuple + extra_label_tuple]
+    return "{" + ",".join(label_list) + "}" if label_list else ""
+
+
+def format_number(value) -> str:
+    """Format a sample value the way Prometheus expects."""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class PrometheusTextfileExporter(object):
+    """Write Metrics to a file in the Prometheus text format, for the node_exporter textfile collector.
+
+    The file is written to a temporary file in the same directory and renamed, so the collector never reads a
+    partially written file. The file name must end in .prom for the collector to pick it up.
+    """
+
+    def __init__(self, textfile_path: Path, metric_prefix=DEFAULT_METRIC_PREFIX):
+        """Construct the object."""
+        self.textfile_path = Path(textfile_path)
+        self.metric_prefix = metric_prefix
+
+    def format(self, metrics: Metrics) -> str:
+        """Return the text format of every metric recorded by metrics."""
+        line_list = []
+        last_name = None
+        for name, metric_type, label_tuple, value in metrics.get_sample_list():
+            full_name = f"{self.metric_prefix}_{name}" if self.metric_prefix else name
+            if name != last_name:
+                line_list.append(f"# TYPE {full_name} {metric_type.name.lower()}")
+                last_name = name
+
+            if metric_type != MetricType.HISTOGRAM:
+                line_list.append(f"{full_name}{format_label_string(label_tuple)} {format_number(value)}")
+                continue
+
+            bucket_count_list, total, count = value
+            cumulative_count = 0
+            for upper_bound, bucket_count in zip(metrics.bucket_list, bucket_count_list):
+                cumulative_count += bucket_count
+                bucket_label_string = format_label_string(label_tuple, (("le", format_number(upper_bound)),))
+                line_list.append(f"{full_name}_bucket{bucket_label_string} {cumulative_count}")
+            line_list.append(f"{full_name}_bucket{format_label_string(label_tuple, (('le', '+Inf'),))} {count}")
+            line_list.append(f"{full_name}_sum{format_label_string(label_tuple)} {format_number(total)}")
+            line_list.append(f"{full_name}_count{format_label_string(label_tuple)} {count}")
+
+        return "\n".join(line_list) + "\n"
+
+    def write(self, metrics: Metrics):
+        """Atomically replace the textfile with the current metrics."""
+        self.textfile_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = self.textfile_path.with_name(f".{self.textfile_path.name}.{os.getpid()}.tmp")
+        with open(temporary_path, "w") as textfile:
+            textfile.write(self.format(metrics))
+        os.replace(temporary_path, self.textfile_path)
+        debug(f"PrometheusTextfileExporter.write(): Wrote the metrics to {str(self.textfile_path)}")
@@ -0,0 +1,18 @@
+# -------------------------------------------------------------------------------
+# ProbeStrategy.py
+#
+# -------------------------------------------------------------------------------
+
+from enum import Enum
+
+
+class ProbeStrategy(Enum):
+    """Simple Enum for the method used to check if a remote machine is available to connect to.
+
+    TCP opens a connection to the SSH port of the remote machine, SSH_BANNER does the same and also waits for the
+    SSH server to send its banner, and PING sends a single ICMP ping request through the ping program.
+    """
+
+    TCP = 0
+    SSH_BANNER = 1
+    PING = 2
@@ -0,0 +1,152 @@
+# -------------------------------------------------------------------------------
+# RemoteAgent.py
+# Start RemoteAgentServer.py on the remote machine once per session and send it
+# metadata requests over a single channel, instead of running a new shell
+# command for every query.
+# -------------------------------------------------------------------------------
+
+from pathlib import Path
+from threading import Lock, Thread
+from shlex import quote
+from time import monotonic
+from logging import debug, error
+import json
+
+from RsyncPath.RemoteConnection import RemoteConnection, RemoteProcess
+from RsyncPath.Metrics import Metrics, NULL_METRICS
+
+REMOTE_AGENT_PROTOCOL_VERSION = 1
+REMOTE_AGENT_SOURCE_PATH = Path(__file__).with_name("RemoteAgentServer.py")
+DEFAULT_REMOTE_AGENT_PYTHON = "python3"
+
+
+class RemoteAgentError(Exception):
+    """Raised when the remote agent cannot be started, stops answering or sends an invalid response."""
+
+
+class RemoteAgent(object):
+    """Talk to RemoteAgentServer.py running on the remote machine.
+
+    The source of the agent is passed to the remote python interpreter on its command line, so nothing is written to
+    the remote machine. Requests are dictionaries with an operation (exists, size, stat, mkdir or manifest) and a
+    path; see RemoteAgentServer.py for the format of the responses. request_list() writes every request before
+    reading the first response, so a batch of queries costs a single round trip. A failed request returns a response
+    with an error code instead of raising, while RemoteAgentError means the agent itself can no longer be used.
+    """
+
+    def __init__(self, connection: RemoteConnection, shell: str = None, python_path=DEFAULT_REMOTE_AGENT_PYTHON,
+                 metrics: Metrics = NULL_METRICS, label_dict: dict = None):
+        """Construct the object. The agent is not started until start() is called."""
+        self.connection = connection
+        self.shell = shell
+        self.python_path = python_path
+        self.metrics = metrics
+        self.label_dict = label_dict if label_dict else {}
+        self.process: RemoteProcess = None
+        self.next_request_id = 1
+        self.lock = Lock()
+
+    def get_command(self) -> str:
+        """Return the command that starts the agent on the remote machine."""
+        return f"exec {quote(self.python_path)} -c {quote(REMOTE_AGENT_SOURCE_PATH.read_text())}"
+
+    def start(self) -> bool:
+        """Start the agent and wait for it to answer.
+
+        :returns True if the agent is running, False otherwise.
+        """
+        if self.process is not None:
+            return True
+
+        start_time = monotonic()
+        try:
+            self.process = self.connection.start_process(self.get_command(), self.shell)
+            greeting = self.read_response()
+        except Exception as exception:
+            error(f"RemoteAgent.start(): Unable to start the remote agent: {exception}")
+            self.stop()
+            return False
+
+        version = greeting.get("result", {}).get("version") if greeting.get("ok") else None
+        if version != REMOTE_AGENT_PROTOCOL_VERSION:
+            error(f"RemoteAgent.start(): The remote agent speaks protocol version {version}, not "
+                  f"{REMOTE_AGENT_PROTOCOL_VERSION}.")
+            self.stop()
+            return False
+
+        self.metrics.observe("remote_agent_start_duration_seconds", monotonic() - start_time, self.label_dict)
+        debug(f"RemoteAgent.start(): Started the remote agent in {monotonic() - start_time:.3f}s")
+        return True
+
+    def stop(self):
+        """Stop the agent by closing its standard input."""
+        if self.process is None:
+            return
+        try:
+            self.process.close()
+        except OSError as exception:
+            debug(f"RemoteAgent.stop(): Unable to close the remote agent cleanly: {exception}")
+        self.process = None
+
+    def read_response(self) -> dict:
+        """Read a single response from the agent."""
+        line = self.process.stdout.readline()
+        if not line:
+            raise RemoteAgentError("The remote agent exited.")
+        try:
+            return json.loads(line)
+        except ValueError as exception:
+            raise RemoteAgentError(f"The remote agent sent an invalid response: {line[:200]!r}") from exception
+
+    def write_request_list(self, request_list: list[dict]):
+        """Write every request to the agent. Runs in its own thread, so the agent is never blocked on a full output
+        pipe while this side is still writing.
+        """
+        try:
+            for request in request_list:
+                self.process.stdin.write(json.dumps(request, separators=(",", ":")).encode("utf-8") + b"\n")
+            self.process.stdin.flush()
+        except OSError as exception:
+            # The agent exited; read_response() reports it.
+            debug(f"RemoteAgent.write_request_list(): Unable to write to the remote agent: {exception}")
+
+    def request_list(self, request_list: list[dict]) -> list[dict]:
+        """Send several requests to the agent at once.
+
+        :returns A list of the responses, in the same order as the requests.
+        """
+        with self.lock:
+            if self.process is None:
+                raise RemoteAgentError("The remote agent is not running.")
+
+            numbered_request_list = [{**request, "id": self.next_request_id + index}
+                                     for index, request in enumerate(request_list)]
+            self.next_request_id += len(request_list)
+
+            start_time = monotonic()
+            writer_thread = Thread(target=self.write_request_list, args=(numbered_request_list,), daemon=True)
+            writer_thread.start()
+            try:
+                response_list = []
+                for request in numbered_request_list:
+                    response = self.read_response()
+                    if response.get("id") != request["id"]:
+                        raise RemoteAgentError(f"The remote agent answered request {response.get('id')} instead of "
+                                               f"{request['id']}.")
+                    response_list.append(response)
+            except RemoteAgentError:
+                self.stop()
+                raise
+            finally:
+                writer_thread.join()
+
+        self.metrics.observe("remote_agent_batch_duration_seconds", monotonic() - start_time, self.label_dict)
+        for request, response in zip(request_list, response_list):
+            status = "ok" if response.get("ok") else response.get("error", {}).get("code", "unknown")
+            self.metrics.increment("remote_agent_requests_total", 1,
+                                   {**self.label_dict, "operation": request.get("operation"), "status": status})
+        return response_list
+
+    def request(self, operation: str, path) -> dict:
+        """Send a single request to the agent and return its response."""
+        return self.request_list([{"operation": operation, "path": str(path)}])[0]
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -------------------------------------------------------------------------------
+# RemoteAgentServer.py
+# Small helper started by RemoteAgent on the remote machine. It only uses the
+# standard library, since it is sent to the remote python3 as source code and
+# nothing else from RsyncPath is available there.
+#
+# Protocol: one JSON object per line. Once started, the agent writes
+# {"id": 0, "ok": true, "result": {"version": 1}}. Then, for every request
+# {"id": n, "operation": ..., "path": ...} read from stdin, it writes
+# {"id": n, "ok": true, "result": {...}} or
+# {"id": n, "ok": false, "error": {"code": "ENOENT", "errno": 2, "message": ...}}
+# in the order the requests were read, so requests can be pipelined.
+# -------------------------------------------------------------------------------
+
+import errno
+import json
+import os
+import stat
+import sys
+
+PROTOCOL_VERSION = 1
+
+
+class AgentError(Exception):
+    """An error returned to the client with a code that is not an errno value."""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+def walk_directory(directory_path):
+    """Yield the (path, stat, relative path) of every directory and file below directory_path, following symbolic
+    links like du -sLb and find -L. Every directory and file is yielded once, even if it can be reached through
+    several links.
+    """
+    seen_set = set()
+    pending_directory_list = [(directory_path, "")]
+    while pending_directory_list:
+        current_directory, relative_directory = pending_directory_list.pop()
+        try:
+            entry_iterator = os.scandir(current_directory)
+        except OSError:
+            continue
+
+        with entry_iterator:
+            for entry in entry_iterator:
+                try:
+                    entry_stat = entry.stat(follow_symlinks=True)
+                except OSError:
+                    continue
+                key = (entry_stat.st_dev, entry_stat.st_ino)
+                if key in seen_set:
+                    continue
+                seen_set.add(key)
+
+                relative_path = relative_directory + entry.name
+                if stat.S_ISDIR(entry_stat.st_mode):
+                    pending_directory_list.append((entry.path, relative_path + "/"))
+                yield entry.path, entry_stat, relative_path
+
+
+def get_directory_stat(path):
+    """Return the stat of path if it is a directory, following symbolic links, or raise an OSError."""
+    directory_stat = os.stat(path)
+    if not stat.S_ISDIR(directory_stat.st_mode):
+        raise NotADirectoryError(errno.ENOTDIR, os.strerror(errno.ENOTDIR), path)
+    return directory_stat
+
+
+def handle_exists(path):
+    return {"exists": os.path.isdir(path)}
+
+
+def handle_size(path):
+    size_in_bytes = get_directory_stat(path).st_size
+    for _, entry_stat, _ in walk_directory(path):
+        size_in_bytes += entry_stat.st_size
+    return {"size_in_bytes": size_in_bytes}
+
+
+def handle_stat(path):
+    try:
+        size_in_bytes = get_directory_stat(path).st_size
+    except OSError:
+        return {"exists": False, "size_in_bytes": 0, "file_count": 0, "newest_mtime": 0.0}
+
+    file_count = 0
+    newest_mtime = 0.0
+    for _, entry_stat, _ in walk_directory(path):
+        size_in_bytes += entry_stat.st_size
+        if stat.S_ISREG(entry_stat.st_mode):
+            file_count += 1
+            newest_mtime = max(newest_mtime, entry_stat.st_mtime)
+    return {"exists": True, "size_in_bytes": size_in_bytes, "file_count": file_count, "newest_mtime": newest_mtime}
+
+
+def handle_mkdir(path):
+    os.makedirs(path, exist_ok=True)
+    return {}
+
+
+def handle_manifest(path):
+    get_directory_stat(path)
+    entry_list = [[relative_path, entry_stat.st_size, entry_stat.st_mtime_ns]
+                  for _, entry_stat, relative_path in walk_directory(path) if stat.S_ISREG(entry_stat.st_mode)]
+    entry_list.sort()
+    return {"entries": entry_list}
+
+
+HANDLER_DICT = {
+    "exists": handle_exists,
+    "size": handle_size,
+    "stat": handle_stat,
+    "mkdir": handle_mkdir,
+    "manifest": handle_manifest
+}
+
+
+def handle_request(line):
+    """Handle a single request line and return the response dictionary."""
+    request_id = None
+    try:
+        request = json.loads(line)
+        request_id = request.get("id")
+        handler = HANDLER_DICT.get(request.get("operation"))
+        if handler is None:
+            raise AgentError("UNKNOWN_OPERATION", "Unknown operation {!r}".format(request.get("operation")))
+        return {"id": request_id, "ok": True, "result": handler(request["path"])}
+    except OSError as exception:
+        code = errno.errorcode.get(exception.errno, "EIO") if exception.errno is not None else "EIO"
+        return {"id": request_id, "ok": False,
+                "error": {"code": code, "errno": exception.errno, "message": str(exception)}}
+    except AgentError as exception:
+        return {"id": request_id, "ok": False,
+                "error": {"code": exception.code, "errno": None, "message": str(exception)}}
+    except (ValueError, KeyError, TypeError, AttributeError) as exception:
+        return {"id": request_id, "ok": False,
+                "error": {"code": "INVALID_REQUEST", "errno": None, "message": repr(exception)}}
+
+
+def write_response(output_stream, response):
+    output_stream.write(json.dumps(response, separators=(",", ":")).encode("utf-8") + b"\n")
+    output_stream.flush()
+
+
+def main():
+    input_stream = sys.stdin.buffer
+    output_stream = sys.stdout.buffer
+    write_response(output_stream, {"id": 0, "ok": True, "result": {"version": PROTOCOL_VERSION}})
+    for line in input_stream:
+        if line.strip():
+            write_response(output_stream, handle_request(line.decode("utf-8", "surrogateescape")))
+
+
+if __name__ == "__main__":
+    main()
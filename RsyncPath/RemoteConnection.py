@@ -0,0 +1,217 @@
+# -------------------------------------------------------------------------------
+# RemoteConnection.py
+# Run shell commands on a remote machine through either fabric or the OpenSSH
+# ssh program. fabric is only imported once a command actually has to be run.
+# -------------------------------------------------------------------------------
+
+from abc import ABC, abstractmethod
+from subprocess import run, Popen, DEVNULL, PIPE, TimeoutExpired
+from shlex import quote
+from logging import debug
+
+from RsyncPath.SSHBackend import SSHBackend
+
+DEFAULT_OPENSSH_CONNECT_TIMEOUT = 10
+OPENSSH_ERROR_EXIT_CODE = 255
+REMOTE_PROCESS_EXIT_TIMEOUT = 5
+
+
+class RemoteCommandResult(object):
+    """The output and exit code of a command run on the remote machine."""
+
+    def __init__(self, command: str, stdout="", stderr="", exited=None):
+        """Construct the object."""
+        self.command = command
+        self.stdout = stdout
+        self.stderr = stderr
+        self.exited = exited
+
+    @property
+    def ok(self):
+        return self.exited == 0
+
+    def __repr__(self):
+        return f"RemoteCommandResult(command={self.command!r}, exited={self.exited!r})"
+
+
+class RemoteCommandError(Exception):
+    """Raised by RemoteConnection.run() when a command returns a non-zero exit code and warn is False."""
+
+    def __init__(self, result: RemoteCommandResult):
+        """Construct the object."""
+        super().__init__(f"Command {result.command!r} returned exit code {result.exited}: {result.stderr.strip()}")
+        self.result = result
+
+
+class RemoteProcess(object):
+    """A long-running command on the remote machine, with binary stdin and stdout streams."""
+
+    def __init__(self, stdin, stdout, close_function):
+        """Construct the object. close_function is called once by close()."""
+        self.stdin = stdin
+        self.stdout = stdout
+        self.close_function = close_function
+
+    def close(self):
+        """Close standard input, which tells the command to exit, and release the channel or process."""
+        if self.close_function is None:
+            return
+        try:
+            self.stdin.close()
+        except OSError:
+            pass
+        self.close_function()
+        self.close_function = None
+
+
+class RemoteConnection(ABC):
+    """Base class for a connection to a remote machine. Subclasses implement run() and start_process().
+
+    ssh_option_list holds extra options passed to the ssh program, such as the ones needed to share an
+    SSHControlMaster connection. It is ignored by backends that do not run ssh.
+    """
+
+    def __init__(self, username, hostname, ssh_port):
+        """Construct the object. No connection is made until a command is run."""
+        self.username = username
+        self.hostname = hostname
+        self.ssh_port = ssh_port
+        self.ssh_option_list: list[str] = []
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def is_connected(self):
+        return False
+
+    @abstractmethod
+    def run(self, command: str, shell: str = None, hide=True, warn=False, in_stream=None) -> RemoteCommandResult:
+        """Run a command on the remote machine.
+
+        :param: shell The shell used to run the command, or None to use the login shell of the remote user.
+        :param: hide If False, the output of the command is also shown as it is received, or logged by backends that
+        capture it.
+        :param: warn If False, a RemoteCommandError is raised when the command returns a non-zero exit code.
+        :param: in_stream A file-like object whose contents are sent to the standard input of the command.
+        :returns A RemoteCommandResult.
+        """
+
+    @abstractmethod
+    def start_process(self, command: str, shell: str = None) -> RemoteProcess:
+        """Start a command on the remote machine without waiting for it, so it can be talked to through its
+        standard input and output. Its standard error is discarded.
+        """
+
+
+class FabricConnection(RemoteConnection):
+    """Run commands through a fabric Connection, which is created (and fabric imported) on first use."""
+
+    def __init__(self, username, hostname, ssh_port):
+        """Construct the object."""
+        super().__init__(username, hostname, ssh_port)
+        self.connection = None
+
+    def get_connection(self):
+        """Return the fabric Connection, creating it if needed."""
+        if self.connection is None:
+            from fabric import Connection
+            self.connection = Connection(host=self.hostname, user=self.username, port=self.ssh_port)
+        return self.connection
+
+    def open(self):
+        self.get_connection().open()
+
+    def close(self):
+        if self.connection is not None and self.connection.is_connected:
+            self.connection.close()
+
+    def is_connected(self):
+        return self.connection is not None and self.connection.is_connected
+
+    def run(self, command: str, shell: str = None, hide=True, warn=False, in_stream=None) -> RemoteCommandResult:
+        from invoke.exceptions import UnexpectedExit
+
+        keyword_dict = {"hide": hide, "warn": warn}
+        if shell is not None:
+            keyword_dict["shell"] = shell
+        if in_stream is not None:
+            keyword_dict["in_stream"] = in_stream
+
+        try:
+            result = self.get_connection().run(command, **keyword_dict)
+        except UnexpectedExit as exception:
+            raise RemoteCommandError(RemoteCommandResult(command, exception.result.stdout, exception.result.stderr,
+                                                         exception.result.exited)) from exception
+        return RemoteCommandResult(command, result.stdout, result.stderr, result.exited)
+
+    def start_process(self, command: str, shell: str = None) -> RemoteProcess:
+        connection = self.get_connection()
+        connection.open()
+        channel = connection.client.get_transport().open_session()
+        channel.exec_command(f"{quote(shell)} -c {quote(command)}" if shell is not None else command)
+        return RemoteProcess(channel.makefile_stdin("wb"), channel.makefile("rb"), channel.close)
+
+
+class OpenSSHConnection(RemoteConnection):
+    """Run each command as a separate ssh process, without importing fabric, invoke or paramiko.
+
+    ssh is run in batch mode, so key-based authentication (or an agent) has to be set up for the remote machine.
+    Every command pays for a new SSH handshake unless an SSHControlMaster is running and its options are in
+    ssh_option_list.
+    """
+
+    def __init__(self, username, hostname, ssh_port, connect_timeout=DEFAULT_OPENSSH_CONNECT_TIMEOUT):
+        """Construct the object."""
+        super().__init__(username, hostname, ssh_port)
+        self.connect_timeout = connect_timeout
+
+    def get_command_list(self, command: str, shell: str = None) -> list[str]:
+        """Return the ssh command list that runs a command on the remote machine."""
+        remote_command = f"{quote(shell)} -c {quote(command)}" if shell is not None else command
+        return ["ssh", "-o", "BatchMode=yes",
+                "-o", f"ConnectTimeout={self.connect_timeout}",
+                "-p", str(self.ssh_port),
+                *self.ssh_option_list,
+                f"{self.username}@{self.hostname}" if self.username else self.hostname,
+                remote_command]
+
+    def run(self, command: str, shell: str = None, hide=True, warn=False, in_stream=None) -> RemoteCommandResult:
+        command_list = self.get_command_list(command, shell)
+        debug(f"OpenSSHConnection.run(): Running {command_list[:-1]} with a {len(command)} character command.")
+        try:
+            process = run(command_list, capture_output=True, text=True,
+                          stdin=DEVNULL if in_stream is None else None,
+                          input=in_stream.read() if in_stream is not None else None)
+            result = RemoteCommandResult(command, process.stdout, process.stderr, process.returncode)
+        except (OSError, TimeoutExpired) as exception:
+            result = RemoteCommandResult(command, "", str(exception), OPENSSH_ERROR_EXIT_CODE)
+
+        if not hide:
+            debug(f"OpenSSHConnection.run(): Command returned exit code {result.exited}:\n{result.stdout}")
+        if not result.ok and not warn:
+            raise RemoteCommandError(result)
+        return result
+
+    def start_process(self, command: str, shell: str = None) -> RemoteProcess:
+        process = Popen(self.get_command_list(command, shell), stdin=PIPE, stdout=PIPE, stderr=DEVNULL)
+        return RemoteProcess(process.stdin, process.stdout, lambda: wait_for_process(process))
+
+
+def wait_for_process(process: Popen):
+    """Wait a few seconds for a process to exit after its standard input was closed, then kill it."""
+    try:
+        process.wait(REMOTE_PROCESS_EXIT_TIMEOUT)
+    except TimeoutExpired:
+        process.kill()
+        process.wait()
+    process.stdout.close()
+
+
+def create_connection(ssh_backend: SSHBackend, username, hostname, ssh_port) -> RemoteConnection:
+    """Return a RemoteConnection to a remote machine that uses the passed SSHBackend."""
+    if ssh_backend == SSHBackend.OPENSSH:
+        return OpenSSHConnection(username, hostname, ssh_port)
+    return FabricConnection(username, hostname, ssh_port)
@@ -0,0 +1,291 @@
+# -------------------------------------------------------------------------------
+# RsyncOutput.py
+# Incremental parser for the output of rsync when it is run with
+# --out-format and --info=progress2,stats2 (or --progress and --stats before
+# rsync 3.1.0), and the per-directory result built from the parsed events.
+# -------------------------------------------------------------------------------
+
+from typing import NamedTuple, Iterable, Iterator
+from time import monotonic
+import re
+
+OUT_FORMAT_PREFIX = "[rsync-path]"
+RSYNC_OUTPUT_OPTION_LIST = [f"--out-format={OUT_FORMAT_PREFIX} %i %l %n", "--info=progress2,stats2"]
+# rsync programs older than 3.1.0 do not support --info, so they print the progress of each file and the stats instead:
+MIN_INFO_OPTION_VERSION = (3, 1, 0)
+LEGACY_RSYNC_OUTPUT_OPTION_LIST = [f"--out-format={OUT_FORMAT_PREFIX} %i %l %n", "--progress", "--stats"]
+
+SIZE_SUFFIX_DICT = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40, "P": 1 << 50}
+NUMBER_PATTERN = r"([\d,.]+[KMGTP]?)"
+OUT_FORMAT_PATTERN = re.compile(r"^(\S+)\s+" + NUMBER_PATTERN + r" (.*)$")
+PROGRESS_PATTERN = re.compile(r"^\s*" + NUMBER_PATTERN + r"\s+(\d+)%\s+(\S+)\s+(\d+:\d{2}:\d{2})"
+                              r"(?:\s+\(xfe?r#(\d+), (?:ir|to)-(?:chk|check)=(\d+)/(\d+)\))?")
+STATS_PATTERN = re.compile(r"^(Number of files|Number of created files|Number of deleted files|"
+                           r"Number of regular files transferred|Number of files transferred|Total file size|"
+                           r"Total transferred file size|"
+                           r"Literal data|Matched data|File list size|File list generation time|"
+                           r"File list transfer time|Total bytes sent|Total bytes received): " + NUMBER_PATTERN)
+SUMMARY_SENT_PATTERN = re.compile(r"^sent " + NUMBER_PATTERN + r" bytes\s+received " + NUMBER_PATTERN +
+                                  r" bytes\s+" + NUMBER_PATTERN + r" bytes/sec")
+SUMMARY_SPEEDUP_PATTERN = re.compile(r"^total size is " + NUMBER_PATTERN + r"\s+speedup is " + NUMBER_PATTERN)
+# The stats that add up over the rsync processes copying parts of the same directory. The others, such as the number
+# and total size of the files, describe the whole directory:
+ADDITIVE_STATS_KEY_TUPLE = ("number_of_regular_files_transferred", "total_transferred_file_size", "literal_data",
+                            "matched_data", "total_bytes_sent", "total_bytes_received")
+# The stats printed under another name by rsync programs older than 3.1.0:
+LEGACY_STATS_KEY_DICT = {"number_of_files_transferred": "number_of_regular_files_transferred"}
+
+
+def get_rsync_output_option_list(rsync_version) -> list[str]:
+    """Return the options that make an rsync program print the output RsyncOutputParser reads, given its
+    RsyncVersion. The options of a recent rsync program are used if the version is not known.
+    """
+    if rsync_version is not None and rsync_version.version < MIN_INFO_OPTION_VERSION:
+        return list(LEGACY_RSYNC_OUTPUT_OPTION_LIST)
+    return list(RSYNC_OUTPUT_OPTION_LIST)
+
+
+def parse_rsync_number(number_string: str) -> float:
+    """Convert a number printed by rsync, such as 1,234,567 or 1.23M, into a float."""
+    suffix = number_string[-1] if number_string[-1] in SIZE_SUFFIX_DICT else ""
+    digit_string = number_string[:-1] if suffix else number_string
+    return float(digit_string.replace(",", "")) * SIZE_SUFFIX_DICT[suffix]
+
+
+class FileTransferEvent(NamedTuple):
+    """A file that rsync created, updated or deleted, as printed by --out-format."""
+
+    itemized_changes: str
+    length: int
+    name: str
+
+    def is_deletion(self) -> bool:
+        return self.itemized_changes.startswith("*deleting")
+
+    def is_data_transfer(self) -> bool:
+        return self.itemized_changes[:1] in ("<", ">")
+
+
+class ProgressEvent(NamedTuple):
+    """The overall progress of the transfer, as printed by --info=progress2. With --progress, it is the progress of
+    the file being transferred instead.
+    """
+
+    transferred_bytes: int
+    percentage: int
+    rate: str
+    elapsed_time: str
+    transfer_number: int
+    files_to_check: int
+    total_files: int
+
+
+class StatsEvent(NamedTuple):
+    """The final statistics of the transfer, as printed by --info=stats2 or --stats. Sizes are in bytes and times in
+    seconds.
+    """
+
+    stats_dict: dict
+
+
+class MessageEvent(NamedTuple):
+    """Any other line written by rsync, such as a warning or error."""
+
+    line: str
+
+    def is_error(self) -> bool:
+        return self.line.startswith("rsync:") or self.line.startswith("rsync error:")
+
+
+class RsyncOutputParser(object):
+    """Turn chunks of rsync output into events as they arrive.
+
+    Progress updates are separated by carriage returns instead of newlines, so both end a line. The statistics are
+    collected until the final "total size is" line and sent as a single StatsEvent.
+    """
+
+    def __init__(self):
+        """Construct the object."""
+        self.buffer = ""
+        self.stats_dict = {}
+
+    def feed(self, text: str) -> list:
+        """Parse a chunk of output and return the events for every line it completes."""
+        self.buffer += text
+        line_list = re.split(r"[\r\n]", self.buffer)
+        self.buffer = line_list.pop()
+        event_list = []
+        for line in line_list:
+            event = self.parse_line(line)
+            if event is not None:
+                event_list.append(event)
+        return event_list
+
+    def close(self) -> list:
+        """Parse whatever is left once rsync has exited, including statistics without a summary line."""
+        event_list = self.feed("\n") if self.buffer else []
+        if self.stats_dict:
+            event_list.append(StatsEvent(self.stats_dict))
+            self.stats_dict = {}
+        return event_list
+
+    def parse_line(self, line: str):
+        """Parse a single line of output. Returns an event, or None if the line is empty or part of the stats."""
+        if not line.strip():
+            return None
+
+        if line.startswith(OUT_FORMAT_PREFIX + " "):
+            match = OUT_FORMAT_PATTERN.match(line[len(OUT_FORMAT_PREFIX) + 1:])
+            if match is not None:
+                return FileTransferEvent(match.group(1), int(parse_rsync_number(match.group(2))), match.group(3))
+
+        match = PROGRESS_PATTERN.match(line)
+        if match is not None:
+            return ProgressEvent(int(parse_rsync_number(match.group(1))), int(match.group(2)), match.group(3),
+                                 match.group(4), int(match.group(5) or 0), int(match.group(6) or 0),
+                                 int(match.group(7) or 0))
+
+        match = STATS_PATTERN.match(line)
+        if match is not None:
+            key = match.group(1).lower().replace(" ", "_")
+            key = LEGACY_STATS_KEY_DICT.get(key, key)
+            self.stats_dict[key] = parse_rsync_number(match.group(2))
+            return None
+
+        match = SUMMARY_SENT_PATTERN.match(line)
+        if match is not None:
+            self.stats_dict["bytes_per_second"] = parse_rsync_number(match.group(3))
+            return None
+
+        match = SUMMARY_SPEEDUP_PATTERN.match(line)
+        if match is not None:
+            self.stats_dict["total_size"] = parse_rsync_number(match.group(1))
+            self.stats_dict["speedup"] = parse_rsync_number(match.group(2))
+            stats_event = StatsEvent(self.stats_dict)
+            self.stats_dict = {}
+            return stats_event
+
+        return MessageEvent(line)
+
+
+def parse_rsync_output(chunk_iterable: Iterable[str]) -> Iterator:
+    """Yield the events found in an iterable of rsync output chunks, as each chunk arrives."""
+    parser = RsyncOutputParser()
+    for chunk in chunk_iterable:
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+class VerificationResult(object):
+    """The outcome of comparing the hash of every source file of a copied directory with its copy.
+
+    mismatched_path_list holds the files that were missing or differed after the transfer, and remaining_path_list
+    those that still did after they were copied again. message is set if the directory could not be verified.
+    """
+
+    def __init__(self, algorithm, verified_file_count=0, mismatched_path_list: list = None, message=None):
+        """Construct the object."""
+        self.algorithm = algorithm
+        self.verified_file_count = verified_file_count
+        self.mismatched_path_list: list[str] = mismatched_path_list if mismatched_path_list is not None else []
+        self.remaining_path_list: list[str] = list(self.mismatched_path_list)
+        self.message = message
+
+    def is_successful(self) -> bool:
+        return self.message is None and not self.remaining_path_list
+
+    def __repr__(self):
+        return (f"VerificationResult(algorithm={self.algorithm!r}, verified_file_count={self.verified_file_count}, "
+                f"mismatched_file_count={len(self.mismatched_path_list)}, "
+                f"remaining_file_count={len(self.remaining_path_list)}, message={self.message!r})")
+
+
+class DirectoryTransferResult(object):
+    """The outcome of copying a single directory, built from the events of its rsync process.
+
+    exit_code is None if the directory was not copied, in which case message explains why. A directory copied with
+    checksum verification is only successful if its VerificationResult is.
+    """
+
+    def __init__(self, path, exit_code=None, message=None):
+        """Construct the object."""
+        self.path = path
+        self.exit_code = exit_code
+        self.message = message
+        self.transferred_file_count = 0
+        self.transferred_file_bytes = 0
+        self.deleted_file_count = 0
+        self.error_list: list[str] = []
+        self.last_progress: ProgressEvent = None
+        self.stats_dict: dict = {}
+        self.start_time = monotonic()
+        self.elapsed_time: float = None
+        # The CompressionChoice the directory was copied with:
+        self.compression_choice = None
+        # The VerificationResult of the copied files, if they were verified:
+        self.verification: VerificationResult = None
+
+    def add_event(self, event):
+        """Update the result with an event from the rsync process."""
+        if isinstance(event, FileTransferEvent):
+            if event.is_deletion():
+                self.deleted_file_count += 1
+            elif event.is_data_transfer():
+                self.transferred_file_count += 1
+                self.transferred_file_bytes += event.length
+        elif isinstance(event, ProgressEvent):
+            self.last_progress = event
+        elif isinstance(event, StatsEvent):
+            self.stats_dict.update(event.stats_dict)
+        elif isinstance(event, MessageEvent) and event.is_error():
+            self.error_list.append(event.line)
+
+    def finish(self, exit_code: int):
+        """Record the exit code of the rsync process and how long it ran for."""
+        self.exit_code = exit_code
+        self.elapsed_time = monotonic() - self.start_time
+
+    def add_shard_result(self, shard_result: "DirectoryTransferResult"):
+        """Add the files, errors and statistics of an rsync process that copied a shard of the same directory, or
+        copied the files that failed verification again.
+
+        The exit code stays the one of this result, which copied the whole directory after the shards, and the
+        elapsed time is extended back to when the earliest shard started. Only the statistics in
+        ADDITIVE_STATS_KEY_TUPLE are added up: the others, such as the number and total size of the files, stay the
+        ones of the whole directory. The speedup is computed again from the total size and the bytes sent and
+        received by every process.
+        """
+        self.transferred_file_count += shard_result.transferred_file_count
+        self.transferred_file_bytes += shard_result.transferred_file_bytes
+        self.deleted_file_count += shard_result.deleted_file_count
+        self.error_list.extend(shard_result.error_list)
+        for key in ADDITIVE_STATS_KEY_TUPLE:
+            if key in shard_result.stats_dict:
+                self.stats_dict[key] = self.stats_dict.get(key, 0) + shard_result.stats_dict[key]
+        total_bytes = self.stats_dict.get("total_bytes_sent", 0) + self.stats_dict.get("total_bytes_received", 0)
+        if "total_size" in self.stats_dict and total_bytes:
+            self.stats_dict["speedup"] = round(self.stats_dict["total_size"] / total_bytes, 2)
+
+        end_time = self.start_time + self.elapsed_time if self.elapsed_time is not None else None
+        self.start_time = min(self.start_time, shard_result.start_time)
+        if end_time is not None:
+            self.elapsed_time = end_time - self.start_time
+
+    def was_copied(self) -> bool:
+        return self.exit_code is not None
+
+    def is_successful(self) -> bool:
+        return self.exit_code == 0 and (self.verification is None or self.verification.is_successful())
+
+    def get_throughput(self):
+        """Return the number of bytes sent and received per second of elapsed time, or None if it is not known."""
+        if not self.elapsed_time or "total_bytes_sent" not in self.stats_dict:
+            return None
+        total_bytes = self.stats_dict["total_bytes_sent"] + self.stats_dict.get("total_bytes_received", 0)
+        return total_bytes / self.elapsed_time
+
+    def __repr__(self):
+        return (f"DirectoryTransferResult(path={self.path!r}, exit_code={self.exit_code!r}, "
+                f"transferred_file_count={self.transferred_file_count}, deleted_file_count={self.deleted_file_count}, "
+                f"literal_data={self.stats_dict.get('literal_data')}, "
+                f"matched_data={self.stats_dict.get('matched_data')}, speedup={self.stats_dict.get('speedup')})")
@@ -8,13 +8,57 @@
 
 import RsyncPath.Client as Client
 import RsyncPath.TransferDirection as TransferDirection
+from RsyncPath.ProbeStrategy import ProbeStrategy
+from RsyncPath.ThresholdStrategy import ThresholdStrategy
+from RsyncPath.SSHBackend import SSHBackend
+from RsyncPath.RsyncOutput import (RsyncOutputParser, DirectoryTransferResult, FileTransferEvent, ProgressEvent,
+                                   MessageEvent, VerificationResult, MIN_INFO_OPTION_VERSION,
+                                   get_rsync_output_option_list, parse_rsync_output)
+from RsyncPath.LocalDirectoryScanner import DEFAULT_SCAN_WORKERS
+from RsyncPath.SSHControlMaster import SSHControlMaster, DEFAULT_CONTROL_PERSIST
+from RsyncPath.DirectorySizeCache import (DirectorySizeCache, DEFAULT_DIRECTORY_SIZE_CACHE_PATH,
+                                          DEFAULT_DIRECTORY_SIZE_CACHE_MAX_ENTRIES, LOCAL_NAMESPACE)
+from RsyncPath.FileManifest import FileManifestStore, ManifestDifference, DEFAULT_FILE_MANIFEST_PATH
+from RsyncPath.HostHealthCache import (HostHealthCache, DEFAULT_HOST_HEALTH_CACHE_PATH, DEFAULT_HOST_HEALTH_CACHE_TTL,
+                                       get_host_key)
+from RsyncPath.Metrics import Metrics, NULL_METRICS, PrometheusTextfileExporter, DEFAULT_METRIC_PREFIX
+from RsyncPath.BandwidthScheduler import BandwidthScheduler, BandwidthWindow
+from RsyncPath.StripeScheduler import StripeScheduler
+from RsyncPath.WatchBackend import WatchBackend
+from RsyncPath.DirectoryWatcher import (create_directory_watcher, DEFAULT_WATCH_DEBOUNCE_TIME, DEFAULT_WATCH_MAX_DELAY,
+                                        DEFAULT_WATCH_POLL_INTERVAL)
+from RsyncPath.DirectorySplitter import (DirectorySplitter, DEFAULT_SPLIT_DIRECTORY_MIN_SIZE,
+                                         DEFAULT_SPLIT_SHARD_COUNT, DEFAULT_SPLIT_MAX_DEPTH)
+from RsyncPath.RunJournal import (RunJournal, DEFAULT_RUN_JOURNAL_PATH, DEFAULT_RUN_JOURNAL_MAX_RETRIES,
+                                  DEFAULT_RUN_JOURNAL_RETRY_DELAY)
+from RsyncPath.DirectoryState import DirectoryState
+from RsyncPath.HashAlgorithm import HashAlgorithm
+from RsyncPath.FileHasher import get_local_hash_algorithm_set, DEFAULT_HASH_WORKERS
+from RsyncPath.FileHashCache import FileHashCache, DEFAULT_FILE_HASH_CACHE_PATH, DEFAULT_FILE_HASH_CACHE_MAX_ENTRIES
+from RsyncPath.CompressionMode import CompressionMode
+from RsyncPath.CompressionSelector import (CompressionSelector, CompressionChoice, DEFAULT_FAST_LINK_THROUGHPUT,
+                                           DEFAULT_MEDIUM_LINK_THROUGHPUT, DEFAULT_MAX_INCOMPRESSIBLE_FRACTION,
+                                           DEFAULT_COMPRESSION_SAMPLE_SIZE)
+from RsyncPath.SnapshotManager import (SnapshotManager, DEFAULT_SNAPSHOT_KEEP_DAILY, DEFAULT_SNAPSHOT_KEEP_WEEKLY,
+                                       DEFAULT_LATEST_LINK_NAME)
 from pathlib import Path
 from shlex import split
+from concurrent.futures import ThreadPoolExecutor, Future
+from threading import Lock, Condition
+from time import monotonic, time, sleep
 import logging
+import copy
+import sqlite3
 import subprocess
 
 MIN_SUBDIRECTORY_THRESHOLD = 40
 MAX_SUBDIRECTORY_THRESHOLD = 101
+DEFAULT_MAX_DELETED_FILE_PERCENTAGE = 10.0
+RSYNC_OUTPUT_CHUNK_SIZE = 64 * 1024
+# Exit codes of rsync that mean the connection to the remote machine was lost, rather than a problem with the files:
+RSYNC_CONNECTION_ERROR_EXIT_CODE_SET = {5, 10, 12, 30, 35, 255}
+# Relative to each destination directory, so rsync keeps it out of --delete:
+DEFAULT_PARTIAL_DIR = ".rsync-partial"
 
 
 class RsyncPath(object):
@@ -30,7 +74,10 @@ class RsyncPath(object):
                  destination_dict: dict[str, object] = None,
                  threshold_dict: dict[str, object] = None,
                  transfer_direction: TransferDirection.TransferDirection = None,
-                 debug_mode=False):
+                 debug_mode=False,
+                 connection_dict: dict[str, object] = None,
+                 transfer_dict: dict[str, object] = None,
+                 metrics_dict: dict[str, object] = None):
         """Construct the object.
 
         :param: self pointer to current object
@@ -44,13 +91,92 @@ class RsyncPath(object):
         into percentage values to be compared to the subdir_copy_threshold. If the directory size is less than the
         subdir_copy_threshold percentage, then the changes done to a directory will NOT be copied over from local to
         remote machine OR remote machine to local machine to prevent accidental deletion if the directory is
-        truncated, does not exist, etc.
+        truncated, does not exist, etc. Optional keys:
+            local_scan_workers: Threads used to size a local directory (8 by default).
+            enable_directory_size_cache: Keep the size of the files directly inside each directory in a
+                DirectorySizeCache, so only directories that changed since the last run are walked again.
+            directory_size_cache_path, directory_size_cache_max_entries: Where the DirectorySizeCache is stored and
+                how many directories it holds.
+            threshold_strategy: The ThresholdStrategy used. With ThresholdStrategy.RSYNC_DELTA, rsync is run with
+                --dry-run for each directory that exists at the destination, and copy_threshold_limit is not used.
+            max_deleted_file_percentage, max_deleted_file_count, max_transferred_byte_percentage: The RSYNC_DELTA
+                limits on deleted destination files (10 percent by default) and transferred source data. A limit set
+                to None is not checked.
 
         :param: transfer_directory The direction of the Rsync Transfer from a remote machine to a local machine or
         from a local machine to a remote machine.
 
         :param: debug_mode Enable Debug Mode for Testing
 
+        :param: connection_dict Optional dictionary that controls how a machine is selected from the machine IP list
+        and how commands are run on it:
+            enable_concurrent_host_probing: Probe every machine at the same time instead of one after another.
+            host_probe_timeout, host_probe_deadline: Seconds to wait for each machine (2 by default) and for all of
+                them (5 by default).
+            host_probe_strategy: The ProbeStrategy used (a TCP connection to the SSH port by default).
+            prefer_host_list_priority: Select the responding machine closest to the front of the list (the default)
+                instead of the first to respond.
+            enable_latency_ranked_host_selection: Select the machine with the lowest latency, keeping the
+                measurements in a HostHealthCache.
+            host_health_cache_path, host_health_cache_ttl: Where the HostHealthCache is stored and how many seconds a
+                measurement is used for.
+            defer_host_selection: Select the machine when the transfer starts instead of in the constructor.
+            ssh_backend: The SSHBackend used. SSHBackend.FABRIC (the default) imports fabric on the first remote
+                command; SSHBackend.OPENSSH runs the ssh program and never imports it.
+            enable_remote_agent: Answer the directory queries of a run with a Python agent started on the machine,
+                falling back to shell commands if it cannot be started.
+            remote_agent_python_path: The interpreter the agent is started with ("python3" by default).
+
+        :param: transfer_dict Optional dictionary that controls how the directories are copied:
+            max_parallel_transfers: rsync processes run at the same time (1 by default), largest directory first.
+                With fan-out or striped pull, it applies to each machine. The files are logged as they are copied,
+                and the threshold check and summary of each directory in list order.
+            enable_ssh_multiplexing, ssh_control_persist: Share one OpenSSH ControlMaster connection between the
+                rsync processes of run(), kept alive for ssh_control_persist seconds after its last use.
+            enable_snapshot_mode: Copy each run into a new timestamped snapshot linked against the previous one with
+                --link-dest, instead of mirroring into the destination root path.
+            snapshot_latest_link_name, snapshot_keep_daily, snapshot_keep_weekly: The link to the newest snapshot
+                ("latest" by default), and the days (7) and weeks (4) whose newest snapshot is kept.
+            enable_file_manifest, file_manifest_path: Store a FileManifest of each copied source directory, so an
+                unchanged directory is skipped and one with only new or modified files is copied with --files-from.
+            enable_file_manifest_hash: Also hash local source files in the FileManifest.
+            enable_destination_fan_out, max_parallel_destinations: Copy to every destination machine that responds,
+                up to max_parallel_destinations at the same time (all of them by default).
+            bandwidth_limit, host_bandwidth_limit: KiB per second shared by every rsync process of the run, and by
+                the processes of each machine, handed out as --bwlimit.
+            bandwidth_window_list: Dictionaries with start, end, bandwidth_limit, host_bandwidth_limit and optional
+                weekday_list keys; the first window that applies replaces both limits (see BandwidthWindow).
+            compression_mode: The CompressionMode of the rsync processes (CompressionMode.AUTO by default).
+            fast_link_throughput, medium_link_throughput: The link speeds, in bytes per second, above which AUTO does
+                not compress or uses lz4 instead of zstd.
+            max_incompressible_fraction, compression_sample_size, skip_compress_list: AUTO does not compress a
+                directory where this fraction of the sampled data has a suffix in skip_compress_list.
+            compression_level_dict: Maps a CompressionMode to its --compress-level.
+            enable_striped_pull: Copy from every source machine that responds, spreading the directories by
+                throughput and moving the work of a failed machine to the others.
+            enable_directory_splitting: Copy a large directory as parallel --files-from shards, then once more whole.
+            split_directory_min_size, split_shard_count, split_max_depth: Directories of at least 16 GiB by default
+                are split into up to 4 shards, made of entries up to 3 levels deep.
+            watch_backend, watch_debounce_time, watch_max_delay, watch_poll_interval: Control watch() (see there).
+            enable_run_journal, run_journal_path: Record the DirectoryState of every directory in a RunJournal, so an
+                interrupted run can be resumed (see run()). Not used in snapshot mode, and not supported by run_async().
+            run_journal_max_retries, run_journal_retry_delay: Retry failed directories up to 3 times by default,
+                after 30 seconds doubled on every retry.
+            partial_dir: Where a journaled run keeps interrupted files (".rsync-partial" by default).
+            enable_checksum_verification: Hash every copied file on both machines and copy the mismatches again.
+            hash_algorithm: The HashAlgorithm used, or None (the default) for the fastest one both machines support.
+            hash_workers: Processes hashing local files (4 by default).
+            hash_cache_path, hash_cache_max_entries: Where the FileHashCache of local file hashes is stored and how
+                many files it holds.
+
+        :param: metrics_dict Optional dictionary that controls how the timings and counters of each phase are
+        recorded:
+            metrics: The Metrics object to record them in.
+            metrics_callback: A function called with every update instead.
+            prometheus_textfile_path: Write the metrics to this file in the Prometheus textfile format after every
+                run.
+            metric_prefix: The prefix of every metric name ("rsync_path" by default).
+
         """
         self.source_machine_dict: dict = source_dict
         self.source_username: str = self.source_machine_dict.get('source_username', None)
@@ -71,6 +197,149 @@ class RsyncPath(object):
 
         self.enable_copy_threshold: bool = threshold_dict.get("enable_copy_threshold", True)
         self.subdir_copy_threshold: float = float(threshold_dict.get("copy_threshold_limit", 0))
+        self.threshold_strategy: ThresholdStrategy = threshold_dict.get("threshold_strategy",
+                                                                        ThresholdStrategy.DIRECTORY_SIZE)
+        self.max_deleted_file_percentage: float = threshold_dict.get("max_deleted_file_percentage",
+                                                                     DEFAULT_MAX_DELETED_FILE_PERCENTAGE)
+        self.max_deleted_file_count: int = threshold_dict.get("max_deleted_file_count", None)
+        self.max_transferred_byte_percentage: float = threshold_dict.get("max_transferred_byte_percentage", None)
+        self.local_scan_workers: int = int(threshold_dict.get("local_scan_workers", DEFAULT_SCAN_WORKERS))
+        self.enable_directory_size_cache: bool = threshold_dict.get("enable_directory_size_cache", False)
+        self.directory_size_cache: DirectorySizeCache = None
+        if self.enable_directory_size_cache:
+            self.directory_size_cache = DirectorySizeCache(
+                threshold_dict.get("directory_size_cache_path", DEFAULT_DIRECTORY_SIZE_CACHE_PATH),
+                threshold_dict.get("directory_size_cache_max_entries", DEFAULT_DIRECTORY_SIZE_CACHE_MAX_ENTRIES)
+            )
+
+        self.connection_dict: dict = connection_dict if connection_dict else {}
+        self.enable_concurrent_host_probing: bool = self.connection_dict.get("enable_concurrent_host_probing", False)
+        self.host_probe_timeout: float = float(self.connection_dict.get("host_probe_timeout",
+                                                                        Client.DEFAULT_HOST_PROBE_TIMEOUT))
+        self.host_probe_deadline: float = float(self.connection_dict.get("host_probe_deadline",
+                                                                         Client.DEFAULT_HOST_PROBE_DEADLINE))
+        self.prefer_host_list_priority: bool = self.connection_dict.get("prefer_host_list_priority", True)
+        self.host_probe_strategy: ProbeStrategy = self.connection_dict.get("host_probe_strategy", ProbeStrategy.TCP)
+        self.enable_latency_ranked_host_selection: bool = self.connection_dict.get(
+            "enable_latency_ranked_host_selection",
+            False
+        )
+        self.defer_host_selection: bool = self.connection_dict.get("defer_host_selection", False)
+        self.ssh_backend: SSHBackend = self.connection_dict.get("ssh_backend", SSHBackend.FABRIC)
+        self.enable_remote_agent: bool = self.connection_dict.get("enable_remote_agent", False)
+        self.remote_agent_python_path: str = self.connection_dict.get("remote_agent_python_path",
+                                                                      Client.DEFAULT_REMOTE_AGENT_PYTHON)
+        self.host_health_cache: HostHealthCache = None
+        if self.enable_latency_ranked_host_selection:
+            self.host_health_cache = HostHealthCache(
+                self.connection_dict.get("host_health_cache_path", DEFAULT_HOST_HEALTH_CACHE_PATH),
+                self.connection_dict.get("host_health_cache_ttl", DEFAULT_HOST_HEALTH_CACHE_TTL)
+            )
+
+        self.transfer_dict: dict = transfer_dict if transfer_dict else {}
+        self.max_parallel_transfers: int = int(self.transfer_dict.get("max_parallel_transfers", 1))
+        self.enable_ssh_multiplexing: bool = self.transfer_dict.get("enable_ssh_multiplexing", False)
+        self.ssh_control_persist: int = int(self.transfer_dict.get("ssh_control_persist", DEFAULT_CONTROL_PERSIST))
+        self.ssh_control_master: SSHControlMaster = None
+        self.enable_snapshot_mode: bool = self.transfer_dict.get("enable_snapshot_mode", False)
+        self.snapshot_keep_daily: int = int(self.transfer_dict.get("snapshot_keep_daily", DEFAULT_SNAPSHOT_KEEP_DAILY))
+        self.snapshot_keep_weekly: int = int(self.transfer_dict.get("snapshot_keep_weekly",
+                                                                    DEFAULT_SNAPSHOT_KEEP_WEEKLY))
+        self.snapshot_latest_link_name: str = self.transfer_dict.get("snapshot_latest_link_name",
+                                                                     DEFAULT_LATEST_LINK_NAME)
+        self.snapshot_manager: SnapshotManager = None
+        self.enable_file_manifest: bool = self.transfer_dict.get("enable_file_manifest", False)
+        self.enable_file_manifest_hash: bool = self.transfer_dict.get("enable_file_manifest_hash", False)
+        self.file_manifest_store: FileManifestStore = None
+        if self.enable_file_manifest:
+            self.file_manifest_store = FileManifestStore(self.transfer_dict.get("file_manifest_path",
+                                                                                DEFAULT_FILE_MANIFEST_PATH))
+        # The manifest scanned for each directory and its --files-from list, kept until its transfer finishes:
+        self.pending_manifest_dict: dict = {}
+        self.enable_destination_fan_out: bool = self.transfer_dict.get("enable_destination_fan_out", False)
+        self.max_parallel_destinations: int = int(self.transfer_dict.get("max_parallel_destinations", 0))
+        # The RsyncPath object copying to each destination in fan-out mode, keyed by user@hostname:port:
+        self.destination_rsync_path_dict: dict[str, RsyncPath] = {}
+        self.enable_striped_pull: bool = self.transfer_dict.get("enable_striped_pull", False)
+        # The RsyncPath object copying from each source machine in striped pull mode, keyed by user@hostname:port:
+        self.source_rsync_path_dict: dict[str, RsyncPath] = {}
+        self.bandwidth_scheduler = BandwidthScheduler(
+            self.transfer_dict.get("bandwidth_limit", None),
+            self.transfer_dict.get("host_bandwidth_limit", None),
+            [BandwidthWindow.from_dict(window_dict) for window_dict in self.transfer_dict.get("bandwidth_window_list",
+                                                                                                [])]
+        )
+        self.compression_sample_size: int = int(self.transfer_dict.get("compression_sample_size",
+                                                                       DEFAULT_COMPRESSION_SAMPLE_SIZE))
+        self.compression_selector = CompressionSelector(
+            self.transfer_dict.get("compression_mode", CompressionMode.AUTO),
+            self.transfer_dict.get("compression_level_dict", None),
+            self.transfer_dict.get("skip_compress_list", None),
+            self.transfer_dict.get("fast_link_throughput", DEFAULT_FAST_LINK_THROUGHPUT),
+            self.transfer_dict.get("medium_link_throughput", DEFAULT_MEDIUM_LINK_THROUGHPUT),
+            self.transfer_dict.get("max_incompressible_fraction", DEFAULT_MAX_INCOMPRESSIBLE_FRACTION)
+        )
+        # The CompressionChoice of each directory, kept until its transfer result is created:
+        self.compression_choice_dict: dict = {}
+        # The (level, message) of the threshold check of each directory, kept until log_threshold_verdict() logs it:
+        self.threshold_verdict_dict: dict = {}
+        self.enable_directory_splitting: bool = self.transfer_dict.get("enable_directory_splitting", False)
+        self.directory_splitter: DirectorySplitter = None
+        if self.enable_directory_splitting:
+            self.directory_splitter = DirectorySplitter(
+                self.transfer_dict.get("split_directory_min_size", DEFAULT_SPLIT_DIRECTORY_MIN_SIZE),
+                self.transfer_dict.get("split_shard_count", DEFAULT_SPLIT_SHARD_COUNT),
+                self.transfer_dict.get("split_max_depth", DEFAULT_SPLIT_MAX_DEPTH)
+            )
+        self.watch_backend: WatchBackend = self.transfer_dict.get("watch_backend", WatchBackend.AUTO)
+        self.watch_debounce_time: float = float(self.transfer_dict.get("watch_debounce_time",
+                                                                       DEFAULT_WATCH_DEBOUNCE_TIME))
+        self.watch_max_delay: float = float(self.transfer_dict.get("watch_max_delay", DEFAULT_WATCH_MAX_DELAY))
+        self.watch_poll_interval: float = float(self.transfer_dict.get("watch_poll_interval",
+                                                                       DEFAULT_WATCH_POLL_INTERVAL))
+        self.enable_run_journal: bool = self.transfer_dict.get("enable_run_journal", False)
+        self.run_journal_path: Path = self.transfer_dict.get("run_journal_path", DEFAULT_RUN_JOURNAL_PATH)
+        self.run_journal_max_retries: int = int(self.transfer_dict.get("run_journal_max_retries",
+                                                                       DEFAULT_RUN_JOURNAL_MAX_RETRIES))
+        self.run_journal_retry_delay: float = float(self.transfer_dict.get("run_journal_retry_delay",
+                                                                           DEFAULT_RUN_JOURNAL_RETRY_DELAY))
+        self.partial_dir: str = self.transfer_dict.get("partial_dir", DEFAULT_PARTIAL_DIR)
+        self.run_journal: RunJournal = RunJournal(self.run_journal_path) if self.enable_run_journal else None
+        self.enable_checksum_verification: bool = self.transfer_dict.get("enable_checksum_verification", False)
+        self.hash_algorithm: HashAlgorithm = self.transfer_dict.get("hash_algorithm", None)
+        self.hash_workers: int = int(self.transfer_dict.get("hash_workers", DEFAULT_HASH_WORKERS))
+        self.file_hash_cache: FileHashCache = None
+        if self.enable_checksum_verification:
+            self.file_hash_cache = FileHashCache(
+                self.transfer_dict.get("hash_cache_path", DEFAULT_FILE_HASH_CACHE_PATH),
+                self.transfer_dict.get("hash_cache_max_entries", DEFAULT_FILE_HASH_CACHE_MAX_ENTRIES)
+            )
+        # The HashAlgorithm chosen by prepare_checksum_verification() for the selected machine:
+        self.verification_hash_algorithm: HashAlgorithm = None
+        # The output options of the local rsync program, set by get_rsync_output_option_list():
+        self.rsync_output_option_list: list[str] = None
+        # The key of the journaled run in progress, if any:
+        self.run_journal_key: str = None
+        # The (rsync command list, --files-from list) of each shard of a split directory, kept until it is copied:
+        self.pending_shard_dict: dict = {}
+        # Results computed from the source during a fan-out run, shared by every destination:
+        self.source_result_dict: dict[tuple, Future] = {}
+        self.source_result_lock = Lock()
+        self.transfer_result_dict: dict[str, DirectoryTransferResult] = {}
+
+        self.metrics_dict: dict = metrics_dict if metrics_dict else {}
+        self.metrics: Metrics = self.metrics_dict.get("metrics", None)
+        self.prometheus_textfile_exporter: PrometheusTextfileExporter = None
+        if self.metrics_dict.get("prometheus_textfile_path", None) is not None:
+            self.prometheus_textfile_exporter = PrometheusTextfileExporter(
+                self.metrics_dict["prometheus_textfile_path"],
+                self.metrics_dict.get("metric_prefix", DEFAULT_METRIC_PREFIX)
+            )
+        if self.metrics is None:
+            if self.prometheus_textfile_exporter is not None or self.metrics_dict.get("metrics_callback") is not None:
+                self.metrics = Metrics(self.metrics_dict.get("metrics_callback", None))
+            else:
+                self.metrics = NULL_METRICS
 
         self.debug_mode = debug_mode
 
@@ -86,6 +355,14 @@ class RsyncPath(object):
 
         self.is_rsync_data_invalid()
 
+        self.ssh_client: Client.Client = None
+        if not self.defer_host_selection and not self.enable_destination_fan_out and not self.enable_striped_pull:
+            self.ssh_client = self.select_client()
+
+    def get_host_selection_arguments(self):
+        """Return the username (or None) and machine IP list used to select the remote machine, along with the
+        keyword arguments passed to Client.find_available_hostname_index().
+        """
         if self.transfer_direction == TransferDirection.TransferDirection.COPY_FROM_REMOTE_TO_LOCAL:
             passed_username = self.source_username
             passed_machine_list = self.source_machine_ip_list
@@ -93,11 +370,141 @@ class RsyncPath(object):
             passed_username = self.destination_username
             passed_machine_list = self.destination_machine_ip_list
 
-        if passed_username is None:
-            self.ssh_client = Client.create_instance_from_available_hostnames(passed_machine_list)
-        else:
-            self.ssh_client = Client.create_instance_from_username_and_available_hostnames(passed_username,
-                                                                                           passed_machine_list)
+        probe_options = {
+            "concurrent_probing": self.enable_concurrent_host_probing,
+            "probe_timeout": self.host_probe_timeout,
+            "probe_deadline": self.host_probe_deadline,
+            "prefer_list_priority": self.prefer_host_list_priority,
+            "probe_strategy": self.host_probe_strategy,
+            "rank_by_latency": self.enable_latency_ranked_host_selection,
+            "host_health_cache": self.host_health_cache,
+            "metrics": self.metrics
+        }
+        return passed_username, passed_machine_list, probe_options
+
+    def select_client(self):
+        """Select an available machine from the machine IP list and return a Client connected to it."""
+        passed_username, passed_machine_list, probe_options = self.get_host_selection_arguments()
+        with self.metrics.time("host_selection_duration_seconds"):
+            if passed_username is None:
+                ssh_client = Client.create_instance_from_available_hostnames(passed_machine_list, **probe_options)
+            else:
+                ssh_client = Client.create_instance_from_username_and_available_hostnames(passed_username,
+                                                                                          passed_machine_list,
+                                                                                          **probe_options)
+        return self.configure_client(ssh_client)
+
+    async def select_client_async(self):
+        """Select an available machine from the machine IP list without blocking the event loop, and return a Client
+        connected to it.
+        """
+        passed_username, passed_machine_list, probe_options = self.get_host_selection_arguments()
+        if passed_username is not None and len(passed_username) == 0:
+            raise RuntimeError("Error: Cannot establish any connection to a machine on the IP List due to having a "
+                               "username is that is either empty or None.")
+
+        from RsyncPath import AsyncClient
+
+        del probe_options["concurrent_probing"]
+        with self.metrics.time("host_selection_duration_seconds"):
+            index = await AsyncClient.find_available_hostname_index_async(passed_machine_list, **probe_options)
+        if index is None:
+            raise RuntimeError("Could not establish any connection to any remote machine on the IP List. Please "
+                               "check your internet connection and make sure that at least one of the remote "
+                               "machines is available.")
+        return self.configure_client(Client.create_instance_from_hostname_dict(passed_machine_list[index],
+                                                                               passed_username))
+
+    def select_client_list(self):
+        """Return a Client connected to every machine in the machine IP list that responds, for fan-out and striped
+        pull mode.
+        """
+        passed_username, passed_machine_list, probe_options = self.get_host_selection_arguments()
+        if passed_username is not None and len(passed_username) == 0:
+            raise RuntimeError("Error: Cannot establish any connection to a machine on the IP List due to having a "
+                               "username is that is either empty or None.")
+
+        with self.metrics.time("host_selection_duration_seconds"):
+            index_list = Client.find_all_available_hostname_index_list(passed_machine_list,
+                                                                       probe_options["probe_timeout"],
+                                                                       probe_options["probe_strategy"],
+                                                                       self.metrics)
+        if not index_list:
+            raise RuntimeError("Could not establish any connection to any remote machine on the IP List. Please "
+                               "check your internet connection and make sure that at least one of the remote "
+                               "machines is available.")
+        return [self.configure_client(Client.create_instance_from_hostname_dict(passed_machine_list[index],
+                                                                                passed_username))
+                for index in index_list]
+
+    def create_host_rsync_path(self, ssh_client: Client.Client):
+        """Return a copy of this object that copies to or from the machine ssh_client is connected to, for fan-out
+        and striped pull mode. The copy shares the options, caches and source results of this object, but has its
+        own connection and results.
+        """
+        destination_rsync_path = copy.copy(self)
+        destination_rsync_path.ssh_client = ssh_client
+        destination_rsync_path.ssh_control_master = None
+        destination_rsync_path.snapshot_manager = None
+        destination_rsync_path.pending_manifest_dict = {}
+        # Every destination is a different link, so it measures its own:
+        destination_rsync_path.compression_selector = copy.copy(self.compression_selector)
+        destination_rsync_path.compression_choice_dict = {}
+        destination_rsync_path.threshold_verdict_dict = {}
+        destination_rsync_path.pending_shard_dict = {}
+        # Every machine may have different hash programs, so it chooses its own:
+        destination_rsync_path.verification_hash_algorithm = None
+        destination_rsync_path.run_journal_key = None
+        destination_rsync_path.transfer_result_dict = {}
+        destination_rsync_path.destination_rsync_path_dict = {}
+        destination_rsync_path.source_rsync_path_dict = {}
+        return destination_rsync_path
+
+    def create_destination_rsync_path_dict(self):
+        """Select every available destination and create the object that copies to each one, for fan-out mode."""
+        self.source_result_dict = {}
+        self.destination_rsync_path_dict = {
+            f"{ssh_client.username}@{ssh_client.hostname}:{ssh_client.ssh_port}":
+                self.create_host_rsync_path(ssh_client)
+            for ssh_client in self.select_client_list()
+        }
+        logging.info(f"self.create_destination_rsync_path_dict(): Copying to {len(self.destination_rsync_path_dict)} "
+                     f"destination(s): {list(self.destination_rsync_path_dict)}")
+        return self.destination_rsync_path_dict
+
+    def get_shared_source_result(self, key: tuple, function, *args):
+        """Return function(*args). In fan-out mode, it is only called once per run for each key, and every
+        destination waits for and shares its result.
+        """
+        if not self.enable_destination_fan_out:
+            return function(*args)
+
+        with self.source_result_lock:
+            future = self.source_result_dict.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self.source_result_dict[key] = future
+
+        if is_owner:
+            try:
+                future.set_result(function(*args))
+            except BaseException as exception:
+                future.set_exception(exception)
+                raise
+        return future.result()
+
+    def configure_client(self, ssh_client: Client.Client):
+        """Pass the options that the Client needs from this object on to it."""
+        ssh_client.local_scan_workers = self.local_scan_workers
+        ssh_client.directory_size_cache = self.directory_size_cache
+        ssh_client.hash_workers = self.hash_workers
+        ssh_client.file_hash_cache = self.file_hash_cache
+        ssh_client.metrics = self.metrics
+        ssh_client.change_ssh_backend(self.ssh_backend)
+        ssh_client.enable_remote_agent = self.enable_remote_agent
+        ssh_client.remote_agent_python_path = self.remote_agent_python_path
+        return ssh_client
 
     def check_if_machine_list_contains_valid_key(self, machine_ip_list: list[dict], key_name):
         """Check if the machine list contains a valid key name."""
@@ -118,12 +525,20 @@ class RsyncPath(object):
             if self.transfer_direction == TransferDirection.TransferDirection.ERROR:
                 raise RuntimeError("Error: Cannot determine Transfer Direction.")
 
-        if self.enable_copy_threshold is True:
+        if self.enable_copy_threshold is True and self.threshold_strategy == ThresholdStrategy.DIRECTORY_SIZE:
             # Throw exception if threshold is not in range [MIN_SUBDIR_THRESHOLD, MAX_SUBDIR_THRESHOLD]:
             if int(self.subdir_copy_threshold) not in range(MIN_SUBDIRECTORY_THRESHOLD, MAX_SUBDIRECTORY_THRESHOLD):
                 raise Exception(f"Error: {self.subdir_copy_threshold} is outside the valid threshold of "
                                 f"[{MIN_SUBDIRECTORY_THRESHOLD}, {MAX_SUBDIRECTORY_THRESHOLD - 1}]")
 
+        if self.enable_destination_fan_out and \
+                self.transfer_direction != TransferDirection.TransferDirection.COPY_FROM_LOCAL_TO_REMOTE:
+            raise RuntimeError("Error: Destination fan-out can only copy from the local machine to remote machines.")
+
+        if self.enable_striped_pull and \
+                self.transfer_direction != TransferDirection.TransferDirection.COPY_FROM_REMOTE_TO_LOCAL:
+            raise RuntimeError("Error: Striped pull can only copy from remote machines to the local machine.")
+
         if self.transfer_direction == TransferDirection.TransferDirection.COPY_FROM_REMOTE_TO_LOCAL:
             source_machine_name = "Remote"
             remote_machine_name = "Local"
@@ -160,95 +575,1656 @@ class RsyncPath(object):
         if self.destination_machine_root_path is None:
             raise RuntimeError(f"The {remote_machine_name} directory root path should be defined.")
 
-    def __rsync_directories(self, DEBUG_MODE=False, TEST_RUN=False):
-        """Copy local directories to a remote path OR Copy remote directories to a local path"""
-        logging.debug("self.rsync_directories(): Starting Rsync.")
+    def __rsync_directories(self, DEBUG_MODE=False, TEST_RUN=False, directory_list: list = None):
+        """Copy local directories to a remote path OR Copy remote directories to a local path
 
-        dry_run_string = "--dry-run" if DEBUG_MODE else ""
+        :param: directory_list The directories of the source directory list to copy, all of them by default.
+        :returns A dictionary mapping each copied directory to its DirectoryTransferResult.
+        """
+        if directory_list is None:
+            directory_list = self.source_machine_directory_list
+        logging.debug("self.rsync_directories(): Starting Rsync.")
 
         # First, what list are we using here?
         # If we're copying from a list of remote machines to a local machine, We use a list of remote directories
         # to copy over to a local machine. Otherwise, we use a list of local directories to copy over to
         # a remote machine.
 
+        self.create_destination_root_directory()
+        self.begin_snapshot(not TEST_RUN)
+
+        if not TEST_RUN:
+            self.start_ssh_control_master()
+
+        try:
+            if not TEST_RUN:
+                self.prepare_compression()
+                self.prepare_checksum_verification()
+            remote_metadata_dict = self.get_remote_metadata_dict(directory_list)
+            result_dict = self.__rsync_directory_list(directory_list, remote_metadata_dict, DEBUG_MODE, TEST_RUN)
+        finally:
+            self.stop_ssh_control_master()
+
+        if not TEST_RUN:
+            self.complete_snapshot(result_dict)
+        self.transfer_result_dict = result_dict
+        logging.info("self.rsync_directories(): Finished function call.")
+        return result_dict
+
+    def start_ssh_control_master(self, control_persist=None):
+        """Start the ControlMaster connection shared by every rsync process if SSH multiplexing is enabled.
+
+        :param: control_persist The ControlPersist option of the connection, ssh_control_persist by default.
+        """
+        if not self.enable_ssh_multiplexing:
+            return
+        self.ssh_control_master = SSHControlMaster(self.ssh_client.username, self.ssh_client.hostname,
+                                                   self.ssh_client.ssh_port,
+                                                   control_persist if control_persist is not None else
+                                                   self.ssh_control_persist)
+        if self.ssh_control_master.start():
+            self.ssh_client.ssh_connection.ssh_option_list = self.ssh_control_master.get_ssh_option_list()
+
+    def stop_ssh_control_master(self):
+        """Stop the ControlMaster connection started by start_ssh_control_master(), if any."""
+        if self.ssh_control_master is not None:
+            self.ssh_client.ssh_connection.ssh_option_list = []
+            self.ssh_control_master.stop()
+            self.ssh_control_master = None
+
+    def __rsync_destinations(self, DEBUG_MODE=False, TEST_RUN=False):
+        """Copy the source directories to every available destination in fan-out mode, running up to
+        max_parallel_destinations destinations at once. A destination that fails does not stop the others.
+
+        :returns A dictionary mapping each destination (user@hostname:port) to its dictionary of
+        DirectoryTransferResult objects.
+        """
+        destination_rsync_path_dict = self.create_destination_rsync_path_dict()
+        max_workers = self.max_parallel_destinations if self.max_parallel_destinations > 0 else \
+            len(destination_rsync_path_dict)
+        self.bandwidth_scheduler.set_slot_count(
+            min(max_workers, len(destination_rsync_path_dict)) * self.max_parallel_transfers,
+            self.max_parallel_transfers
+        )
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            future_dict = {
+                destination: executor.submit(destination_rsync_path.__rsync_directories, DEBUG_MODE, TEST_RUN)
+                for destination, destination_rsync_path in destination_rsync_path_dict.items()
+            }
+
+        result_dict = {}
+        failed_destination_list = []
+        for destination, future in future_dict.items():
+            try:
+                result_dict[destination] = future.result()
+            except Exception as exception:
+                logging.error(f"self.rsync_destinations(): Unable to copy to {destination}: {exception}")
+                failed_destination_list.append(destination)
+
+        self.transfer_result_dict = result_dict
+        if failed_destination_list:
+            raise RuntimeError(f"Unable to copy to {len(failed_destination_list)} of "
+                               f"{len(destination_rsync_path_dict)} destination(s): {failed_destination_list}")
+        return result_dict
+
+    async def __rsync_destinations_async(self, max_concurrent_transfers: int, event_callback=None):
+        """Copy the source directories to every available destination in fan-out mode from an asyncio event loop,
+        like __rsync_destinations().
+        """
+        import asyncio
+
+        destination_rsync_path_dict = await asyncio.to_thread(self.create_destination_rsync_path_dict)
+        max_parallel_destinations = self.max_parallel_destinations if self.max_parallel_destinations > 0 else \
+            len(destination_rsync_path_dict)
+        semaphore = asyncio.Semaphore(max_parallel_destinations)
+        self.bandwidth_scheduler.set_slot_count(
+            min(max_parallel_destinations, len(destination_rsync_path_dict)) * max_concurrent_transfers,
+            max_concurrent_transfers
+        )
+
+        async def rsync_destination(destination_rsync_path):
+            async with semaphore:
+                return await destination_rsync_path.__rsync_directories_async(max_concurrent_transfers, event_callback)
+
+        destination_list = list(destination_rsync_path_dict)
+        outcome_list = await asyncio.gather(*(rsync_destination(destination_rsync_path_dict[destination])
+                                              for destination in destination_list), return_exceptions=True)
+
+        result_dict = {}
+        failed_destination_list = []
+        for destination, outcome in zip(destination_list, outcome_list):
+            if isinstance(outcome, Exception):
+                logging.error(f"self.rsync_destinations_async(): Unable to copy to {destination}: {outcome}")
+                failed_destination_list.append(destination)
+            else:
+                result_dict[destination] = outcome
+
+        self.transfer_result_dict = result_dict
+        if failed_destination_list:
+            raise RuntimeError(f"Unable to copy to {len(failed_destination_list)} of "
+                               f"{len(destination_rsync_path_dict)} destination(s): {failed_destination_list}")
+        return result_dict
+
+    def create_source_rsync_path_dict(self):
+        """Select every available source machine and create the object that copies from each one, for striped pull
+        mode.
+        """
+        self.source_result_dict = {}
+        self.source_rsync_path_dict = {
+            f"{ssh_client.username}@{ssh_client.hostname}:{ssh_client.ssh_port}":
+                self.create_host_rsync_path(ssh_client)
+            for ssh_client in self.select_client_list()
+        }
+        logging.info(f"self.create_source_rsync_path_dict(): Copying from {len(self.source_rsync_path_dict)} "
+                     f"source(s): {list(self.source_rsync_path_dict)}")
+        return self.source_rsync_path_dict
+
+    def get_source_metadata_dict(self):
+        """Retrieve whether each remote source directory exists, along with its size if the threshold check needs
+        it, with a single remote command.
+
+        :returns A dictionary mapping each remote source directory path (as a string) to its metadata, or None if it
+        could not be retrieved.
+        """
+        remote_metadata_arguments = self.get_remote_metadata_arguments()
+        existence_only = remote_metadata_arguments is None or remote_metadata_arguments[1]
+        remote_path_list = [self.source_machine_root_path / path for path in self.source_machine_directory_list]
+        with self.metrics.time("remote_metadata_duration_seconds"):
+            return self.ssh_client.get_remote_directory_metadata(remote_path_list, existence_only)
+
+    def prepare_striped_pull(self, TEST_RUN=False):
+        """Select the source machines of a striped pull, find out how fast each one is and which directories it
+        holds, and queue every directory on one of them. A machine that cannot be inspected is left out.
+
+        :returns The StripeScheduler, a dictionary mapping each source machine to its remote metadata dictionary, and
+        the list of directories that no machine holds.
+        """
+        source_rsync_path_dict = self.create_source_rsync_path_dict()
+        # Every machine copies into the same local destination, and in snapshot mode, the same snapshot:
+        first_source_rsync_path = next(iter(source_rsync_path_dict.values()))
+        first_source_rsync_path.create_destination_root_directory()
+        first_source_rsync_path.begin_snapshot(not TEST_RUN)
+        for source_rsync_path in source_rsync_path_dict.values():
+            source_rsync_path.snapshot_manager = first_source_rsync_path.snapshot_manager
+
+        def inspect_source(source, source_rsync_path):
+            try:
+                if not TEST_RUN:
+                    source_rsync_path.ssh_client.measure_link_throughput()
+                remote_metadata_dict = source_rsync_path.get_source_metadata_dict()
+                return remote_metadata_dict if remote_metadata_dict is not None else {}
+            except Exception as exception:
+                logging.error(f"self.prepare_striped_pull(): Leaving out {source}: {exception}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=len(source_rsync_path_dict)) as executor:
+            future_dict = {source: executor.submit(inspect_source, source, source_rsync_path)
+                           for source, source_rsync_path in source_rsync_path_dict.items()}
+        remote_metadata_dict_dict = {source: future.result() for source, future in future_dict.items()
+                                     if future.result() is not None}
+
+        def get_remote_metadata(path):
+            remote_path = str(self.source_machine_root_path / path)
+            return [remote_metadata_dict[remote_path] for remote_metadata_dict in remote_metadata_dict_dict.values()
+                    if remote_path in remote_metadata_dict]
+
+        path_size_dict = {}
+        for path in self.source_machine_directory_list:
+            size_list = [remote_metadata["size_in_bytes"] for remote_metadata in get_remote_metadata(path)
+                         if remote_metadata.get("size_in_bytes") is not None]
+            path_size_dict[path] = size_list[0] if size_list else None
+
+        scheduler = StripeScheduler(path_size_dict)
+        for source, remote_metadata_dict in remote_metadata_dict_dict.items():
+            # A directory is assumed to be held by a machine whose metadata could not be retrieved:
+            path_list = [path for path in self.source_machine_directory_list
+                         if remote_metadata_dict.get(str(self.source_machine_root_path / path),
+                                                     {"exists": True})["exists"]]
+            scheduler.add_host(source, source_rsync_path_dict[source].ssh_client.link_throughput, path_list)
+        return scheduler, remote_metadata_dict_dict, scheduler.assign()
+
+    def handle_striped_pull_failure(self, scheduler: StripeScheduler, source: str, path,
+                                    result: DirectoryTransferResult, failed_path_list: list):
+        """Stop using a source machine that lost its connection while copying a directory, and move its directories
+        to the other machines. Directories that no other machine holds are added to failed_path_list.
+        """
+        exit_code_string = f"exit code {result.exit_code}" if result is not None else "an error"
+        logging.warning(f"self.rsync_sources(): {source} failed with {exit_code_string} while copying {str(path)}; "
+                        f"copying its directories from the other source machines.")
+        self.metrics.increment("striped_pull_source_failures_total", 1, {"source": source})
+        unassigned_path_list = scheduler.fail_host(source, path)
+        failed_path_list.extend(unassigned_path_list)
+
+    def finish_striped_pull_directory(self, scheduler: StripeScheduler, source: str, path,
+                                      result: DirectoryTransferResult, result_dict: dict, failed_path_list: list):
+        """Record the result of a directory copied by a striped pull worker, and give its slot back to the
+        StripeScheduler, moving the directories of its machine to the others if the connection was lost.
+        """
+        if result is not None and result.exit_code not in RSYNC_CONNECTION_ERROR_EXIT_CODE_SET:
+            scheduler.finish(source, path)
+        else:
+            self.handle_striped_pull_failure(scheduler, source, path, result, failed_path_list)
+        if result is not None:
+            result_dict[path] = result
+
+    def handle_striped_pull_worker_crash(self, scheduler: StripeScheduler, source: str, path,
+                                         failed_path_list: list):
+        """Stop using the source machine of a striped pull worker that raised an exception, releasing the directory
+        it was copying (if any) and moving the directories of its machine to the others. Otherwise the other workers
+        would wait forever for directories that nobody copies.
+        """
+        logging.error(f"self.rsync_sources(): A worker copying from {source} stopped unexpectedly.")
+        if scheduler.is_host_failed(source):
+            if path is not None:
+                scheduler.finish(source, path)
+            return
+        failed_path_list.extend(scheduler.fail_host(source, path))
+
+    def finish_striped_pull(self, result_dict: dict, failed_path_list: list, TEST_RUN=False):
+        """Complete the snapshot of a striped pull, order its results by the source directory list and raise a
+        RuntimeError if any directory could not be copied from any source machine.
+        """
+        for path in failed_path_list:
+            if path not in result_dict:
+                result_dict[path] = DirectoryTransferResult(path, message="No available source machine holds the "
+                                                                          "directory.")
+        result_dict = {path: result_dict[path] for path in self.source_machine_directory_list if path in result_dict}
+        if not TEST_RUN and self.source_rsync_path_dict:
+            next(iter(self.source_rsync_path_dict.values())).complete_snapshot(result_dict)
+        self.transfer_result_dict = result_dict
+        if failed_path_list:
+            raise RuntimeError(f"Unable to copy {len(failed_path_list)} of {len(self.source_machine_directory_list)} "
+                               f"directories from any source machine: {[str(path) for path in failed_path_list]}")
+        return result_dict
+
+    def __rsync_sources(self, DEBUG_MODE=False, TEST_RUN=False):
+        """Copy the source directories from every available source machine in striped pull mode, running up to
+        max_parallel_transfers rsync processes on each machine. Each worker takes the next directory queued for its
+        machine from the StripeScheduler, and waits while other machines may still fail and hand their directories
+        over.
+
+        :returns A dictionary mapping each source directory to its DirectoryTransferResult.
+        """
+        scheduler, remote_metadata_dict_dict, failed_path_list = self.prepare_striped_pull(TEST_RUN)
+        if not remote_metadata_dict_dict:
+            raise RuntimeError("Unable to inspect any of the available source machines.")
+        self.bandwidth_scheduler.set_slot_count(len(remote_metadata_dict_dict) * self.max_parallel_transfers,
+                                                self.max_parallel_transfers)
+        condition = Condition()
+        result_dict = {}
+
+        def run_worker(source, source_rsync_path):
+            # The directory this worker took from the scheduler and has not finished yet:
+            path = None
+            try:
+                while True:
+                    with condition:
+                        path = scheduler.take(source)
+                        while path is None and not scheduler.is_finished() and not scheduler.is_host_failed(source):
+                            condition.wait()
+                            path = scheduler.take(source)
+                        if path is None:
+                            return
+
+                    result = None
+                    try:
+                        result = source_rsync_path.__rsync_single_directory(path, remote_metadata_dict_dict[source],
+                                                                            DEBUG_MODE, TEST_RUN)
+                    except Exception as exception:
+                        logging.error(f"self.rsync_sources(): Unable to copy {str(path)} from {source}: {exception}")
+
+                    with condition:
+                        self.finish_striped_pull_directory(scheduler, source, path, result, result_dict,
+                                                           failed_path_list)
+                        path = None
+                        condition.notify_all()
+            except Exception:
+                with condition:
+                    self.handle_striped_pull_worker_crash(scheduler, source, path, failed_path_list)
+                    condition.notify_all()
+                raise
+
+        source_list = list(remote_metadata_dict_dict)
+        for source in source_list:
+            if not TEST_RUN:
+                self.source_rsync_path_dict[source].start_ssh_control_master()
+                self.source_rsync_path_dict[source].prepare_compression()
+                self.source_rsync_path_dict[source].prepare_checksum_verification()
+        try:
+            with ThreadPoolExecutor(max_workers=len(source_list) * max(1, self.max_parallel_transfers)) as executor:
+                future_list = [executor.submit(run_worker, source, self.source_rsync_path_dict[source])
+                               for source in source_list for _ in range(max(1, self.max_parallel_transfers))]
+                for future in future_list:
+                    future.result()
+        finally:
+            for source in source_list:
+                self.source_rsync_path_dict[source].stop_ssh_control_master()
+
+        logging.info(f"self.rsync_sources(): Moved {scheduler.reassignment_count} directories between source "
+                     f"machines.")
+        return self.finish_striped_pull(result_dict, failed_path_list, TEST_RUN)
+
+    async def __rsync_sources_async(self, max_concurrent_transfers: int, event_callback=None):
+        """Copy the source directories from every available source machine in striped pull mode from an asyncio
+        event loop, like __rsync_sources().
+        """
+        import asyncio
+
+        scheduler, remote_metadata_dict_dict, failed_path_list = await asyncio.to_thread(self.prepare_striped_pull)
+        if not remote_metadata_dict_dict:
+            raise RuntimeError("Unable to inspect any of the available source machines.")
+        self.bandwidth_scheduler.set_slot_count(len(remote_metadata_dict_dict) * max_concurrent_transfers,
+                                                max_concurrent_transfers)
+        condition = asyncio.Condition()
+        result_dict = {}
+
+        async def run_worker(source, source_rsync_path, semaphore):
+            # The directory this worker took from the scheduler and has not finished yet:
+            path = None
+            try:
+                while True:
+                    async with condition:
+                        path = scheduler.take(source)
+                        while path is None and not scheduler.is_finished() and not scheduler.is_host_failed(source):
+                            await condition.wait()
+                            path = scheduler.take(source)
+                        if path is None:
+                            return
+
+                    result = None
+                    try:
+                        result = await source_rsync_path.__rsync_single_directory_async(
+                            path, remote_metadata_dict_dict[source], semaphore, event_callback
+                        )
+                    except Exception as exception:
+                        logging.error(f"self.rsync_sources_async(): Unable to copy {str(path)} from {source}: "
+                                      f"{exception}")
+
+                    async with condition:
+                        self.finish_striped_pull_directory(scheduler, source, path, result, result_dict,
+                                                           failed_path_list)
+                        path = None
+                        condition.notify_all()
+            except Exception:
+                async with condition:
+                    self.handle_striped_pull_worker_crash(scheduler, source, path, failed_path_list)
+                    condition.notify_all()
+                raise
+
+        source_list = list(remote_metadata_dict_dict)
+        worker_list = []
+        for source in source_list:
+            source_rsync_path = self.source_rsync_path_dict[source]
+            await asyncio.to_thread(source_rsync_path.start_ssh_control_master)
+            await asyncio.to_thread(source_rsync_path.prepare_compression)
+            await asyncio.to_thread(source_rsync_path.prepare_checksum_verification)
+            semaphore = asyncio.Semaphore(max(1, max_concurrent_transfers))
+            worker_list.extend(run_worker(source, source_rsync_path, semaphore)
+                               for _ in range(max(1, max_concurrent_transfers)))
+        try:
+            await asyncio.gather(*worker_list)
+        finally:
+            for source in source_list:
+                await asyncio.to_thread(self.source_rsync_path_dict[source].stop_ssh_control_master)
+
+        logging.info(f"self.rsync_sources_async(): Moved {scheduler.reassignment_count} directories between source "
+                     f"machines.")
+        return await asyncio.to_thread(self.finish_striped_pull, result_dict, failed_path_list)
+
+    def __rsync_directory_list(self, directory_list: list, remote_metadata_dict: dict, DEBUG_MODE=False,
+                               TEST_RUN=False):
+        """Copy every directory in a list, running up to max_parallel_transfers rsync processes at once.
+
+        :returns A dictionary mapping each directory to its DirectoryTransferResult.
+        """
+        result_dict = {}
+        if self.max_parallel_transfers <= 1 or len(directory_list) <= 1:
+            for path in directory_list:
+                result_dict[path] = self.__rsync_single_directory(path, remote_metadata_dict, DEBUG_MODE, TEST_RUN)
+            return result_dict
+
+        logging.debug(f"self.rsync_directories(): Running up to {self.max_parallel_transfers} transfers at once.")
+        if self.enable_copy_threshold:
+            # Open the SSH connection up front so that the transfers do not race to open it:
+            self.ssh_client.ssh_connection.open()
+
+        with ThreadPoolExecutor(max_workers=self.max_parallel_transfers) as executor:
+            future_dict = {path: executor.submit(self.__rsync_single_directory, path, remote_metadata_dict, DEBUG_MODE,
+                                                 TEST_RUN, False)
+                           for path in self.get_transfer_order(directory_list, remote_metadata_dict)}
+            # The messages of each file are logged as they arrive, starting with the path of their directory. The
+            # verdict and summary of each directory are logged in list order, no matter which transfer finishes first:
+            for path in directory_list:
+                try:
+                    result_dict[path] = future_dict[path].result()
+                finally:
+                    self.log_threshold_verdict(path)
+                if result_dict[path].was_copied():
+                    self.log_transfer_result(result_dict[path])
+
+        return result_dict
+
+    def __rsync_single_directory(self, path, remote_metadata_dict: dict, DEBUG_MODE=False, TEST_RUN=False,
+                                 log_summary=True):
+        """Copy a single directory from the source directory list, if it passes the threshold check.
+
+        :param: log_summary If False, the threshold verdict and the summary of the directory are not logged, so the
+        caller can log them with log_threshold_verdict() and log_transfer_result().
+        :returns The DirectoryTransferResult of the directory.
+        """
+        try:
+            rsync_command_list = self.__prepare_directory_transfer(path, remote_metadata_dict, DEBUG_MODE)
+            if log_summary:
+                self.log_threshold_verdict(path)
+            if isinstance(rsync_command_list, DirectoryTransferResult):
+                self.journal_directory(path, DirectoryState.SKIPPED, message=rsync_command_list.message)
+                return self.record_transfer_result(rsync_command_list)
+            if TEST_RUN:
+                return self.record_transfer_result(
+                    DirectoryTransferResult(path, message="The directory was not copied during a test run.")
+                )
+            self.journal_directory(path, DirectoryState.VERIFIED)
+
+            self.journal_directory(path, DirectoryState.TRANSFERRING)
+            shard_result_list = []
+            shard_list = self.pending_shard_dict.get(path, [])
+            if shard_list:
+                with ThreadPoolExecutor(max_workers=len(shard_list)) as executor:
+                    shard_result_list = list(executor.map(
+                        lambda shard: self.run_rsync_process(path, shard[0]), shard_list
+                    ))
+
+            # The whole directory is copied after its shards, which deletes extra files and creates empty directories:
+            result = self.run_rsync_process(path, rsync_command_list)
+            for shard_result in shard_result_list:
+                result.add_shard_result(shard_result)
+            if self.enable_checksum_verification and result.is_successful() and not DEBUG_MODE:
+                self.verify_directory_transfer(path, result)
+            self.journal_directory(path, DirectoryState.DONE if result.is_successful() else DirectoryState.FAILED,
+                                   result.exit_code)
+            if log_summary:
+                self.log_transfer_result(result)
+            self.finish_file_manifest(path, result.is_successful() and not DEBUG_MODE)
+            return self.record_transfer_result(result)
+        except Exception as exception:
+            self.journal_directory(path, DirectoryState.FAILED, message=str(exception))
+            raise
+        finally:
+            if log_summary:
+                self.log_threshold_verdict(path)
+            self.finish_file_manifest(path, False)
+            self.finish_directory_split(path)
+            self.compression_choice_dict.pop(path, None)
+
+    def journal_directory(self, path, state: DirectoryState, exit_code: int = None, message: str = None):
+        """Record the state of a directory in the RunJournal, if a journaled run is in progress. A journal that
+        cannot be written is logged, but does not stop the transfer.
+        """
+        if self.run_journal_key is None:
+            return
+        try:
+            self.run_journal.set_state(self.run_journal_key, path, state, exit_code,
+                                       get_host_key(self.ssh_client.hostname, self.ssh_client.ssh_port), message)
+        except sqlite3.Error as exception:
+            logging.error(f"{str(path)}: Unable to record the directory as {state.name} in the run journal: "
+                          f"{exception}")
+
+    def run_rsync_process(self, path, rsync_command_list: list) -> DirectoryTransferResult:
+        """Run an rsync process copying a directory (or a shard of it) and return its DirectoryTransferResult."""
+        bandwidth_limit = self.acquire_bandwidth_limit(path, rsync_command_list)
+        try:
+            result = DirectoryTransferResult(path)
+            result.compression_choice = self.compression_choice_dict.get(path, None)
+            process = subprocess.Popen(rsync_command_list, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            parser = RsyncOutputParser()
+            while True:
+                chunk = process.stdout.read1(RSYNC_OUTPUT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                for event in parser.feed(chunk.decode(errors="replace")):
+                    self.handle_transfer_event(result, event)
+            for event in parser.close():
+                self.handle_transfer_event(result, event)
+
+            result.finish(process.wait())
+        finally:
+            self.release_bandwidth_limit(bandwidth_limit)
+        return result
+
+    def acquire_bandwidth_limit(self, path, rsync_command_list: list):
+        """Reserve a share of the bandwidth budgets for the rsync process of a directory, and add it to its command
+        as --bwlimit.
+
+        :returns The reserved limit, which is passed to release_bandwidth_limit() once the process exits.
+        """
+        if not self.bandwidth_scheduler.is_enabled():
+            return None
+        host_key = get_host_key(self.ssh_client.hostname, self.ssh_client.ssh_port)
+        bandwidth_limit = self.bandwidth_scheduler.acquire(host_key)
+        if bandwidth_limit is not None:
+            rsync_command_list.insert(1, f"--bwlimit={bandwidth_limit}")
+            label_dict = {"directory": str(path)}
+            if self.enable_destination_fan_out:
+                label_dict["destination"] = host_key
+            self.metrics.set_gauge("rsync_bandwidth_limit_kib_per_second", bandwidth_limit, label_dict)
+        return bandwidth_limit
+
+    def release_bandwidth_limit(self, bandwidth_limit):
+        """Return the share reserved by acquire_bandwidth_limit() to the bandwidth budgets."""
+        if self.bandwidth_scheduler.is_enabled():
+            self.bandwidth_scheduler.release(get_host_key(self.ssh_client.hostname, self.ssh_client.ssh_port),
+                                             bandwidth_limit)
+
+    def handle_transfer_event(self, result: DirectoryTransferResult, event):
+        """Add an event from an rsync process to the result of its directory, and log it."""
+        result.add_event(event)
+        if isinstance(event, FileTransferEvent):
+            logging.info(f"{str(result.path)}: {event.itemized_changes} {event.name}")
+        elif isinstance(event, ProgressEvent):
+            logging.debug(f"{str(result.path)}: {event.percentage}% ({event.transferred_bytes} bytes, {event.rate})")
+        elif isinstance(event, MessageEvent):
+            logging.log(logging.WARNING if event.is_error() else logging.INFO, f"{str(result.path)}: {event.line}")
+
+    def record_transfer_result(self, result: DirectoryTransferResult):
+        """Record the outcome of a directory in metrics, and return the result."""
+        label_dict = {"directory": str(result.path)}
+        if self.enable_destination_fan_out:
+            label_dict["destination"] = get_host_key(self.ssh_client.hostname, self.ssh_client.ssh_port)
+        elif self.enable_striped_pull:
+            label_dict["source"] = get_host_key(self.ssh_client.hostname, self.ssh_client.ssh_port)
+        if not result.was_copied():
+            self.metrics.increment("rsync_skipped_directories_total", 1, label_dict)
+            return result
+
+        self.metrics.observe("rsync_duration_seconds", result.elapsed_time, label_dict)
+        self.metrics.set_gauge("rsync_exit_code", result.exit_code, label_dict)
+        self.metrics.increment("rsync_transferred_files_total", result.transferred_file_count, label_dict)
+        self.metrics.increment("rsync_transferred_bytes_total", result.transferred_file_bytes, label_dict)
+        self.metrics.increment("rsync_deleted_files_total", result.deleted_file_count, label_dict)
+        if "total_bytes_sent" in result.stats_dict:
+            self.metrics.increment("rsync_sent_bytes_total", int(result.stats_dict["total_bytes_sent"]), label_dict)
+        if result.compression_choice is not None:
+            self.metrics.increment("rsync_compression_choices_total", 1,
+                                   {**label_dict, "compression": result.compression_choice.mode.name.lower()})
+        if result.verification is not None:
+            self.metrics.increment("rsync_verified_files_total", result.verification.verified_file_count, label_dict)
+            self.metrics.increment("rsync_checksum_mismatches_total", len(result.verification.mismatched_path_list),
+                                   label_dict)
+        return result
+
+    def log_transfer_result(self, result: DirectoryTransferResult):
+        """Log a summary of a finished rsync process."""
+        throughput = result.get_throughput()
+        throughput_string = f"{round(throughput / (1 << 20), 3)}M/s" if throughput is not None else "unknown"
+        destination_string = ""
+        if self.enable_destination_fan_out:
+            destination_string = f" to {self.ssh_client.hostname}"
+        elif self.enable_striped_pull:
+            destination_string = f" from {self.ssh_client.hostname}"
+        logging.log(logging.INFO if result.is_successful() else logging.WARNING,
+                    f"{str(result.path)}{destination_string}: rsync exited with {result.exit_code} after "
+                    f"{round(result.elapsed_time, 3)}s; "
+                    f"{result.transferred_file_count} file(s) transferred, {result.deleted_file_count} deleted, "
+                    f"throughput {throughput_string}, speedup {result.stats_dict.get('speedup')}, "
+                    f"compression {str(result.compression_choice)}")
+
+    def log_threshold_verdict(self, path):
+        """Log the outcome of the threshold check of a directory, if it has not been logged yet."""
+        verdict = self.threshold_verdict_dict.pop(path, None)
+        if verdict is not None:
+            logging.log(*verdict)
+
+    def prepare_compression(self):
+        """Measure the throughput of the link and ask both rsync programs which compression algorithms they
+        support, so the CompressionSelector can choose the compression of each directory.
+        """
+        if not self.compression_selector.needs_link_information():
+            return
+        link_throughput = None
+        if self.compression_selector.needs_link_throughput():
+            with self.metrics.time("link_probe_duration_seconds",
+                                   {"host": get_host_key(self.ssh_client.hostname, self.ssh_client.ssh_port)}):
+                link_throughput = self.ssh_client.link_throughput
+                if link_throughput is None:
+                    link_throughput = self.ssh_client.measure_link_throughput()
+        self.compression_selector.set_link(link_throughput, self.ssh_client.get_local_rsync_version(),
+                                           self.ssh_client.get_remote_rsync_version())
+
+    def get_rsync_output_option_list(self) -> list[str]:
+        """Return the options that make the local rsync program print the output RsyncOutputParser reads. The
+        program is asked for its version the first time, since rsync programs older than 3.1.0 do not support --info.
+        """
+        if self.rsync_output_option_list is None:
+            local_version = self.ssh_client.get_local_rsync_version()
+            if local_version is not None and local_version.version < MIN_INFO_OPTION_VERSION:
+                logging.warning(f"self.get_rsync_output_option_list(): rsync "
+                                f"{'.'.join(str(number) for number in local_version.version)} does not support "
+                                f"--info, so only the progress of each file is reported.")
+            self.rsync_output_option_list = get_rsync_output_option_list(local_version)
+        return self.rsync_output_option_list
+
+    def select_directory_compression(self, path, source_path: Path) -> CompressionChoice:
+        """Choose the compression of a directory, sampling its source files if the CompressionSelector needs them."""
+        file_sample_list = None
+        if self.compression_selector.needs_file_sample():
+            if self.transfer_direction == TransferDirection.TransferDirection.COPY_FROM_REMOTE_TO_LOCAL:
+                file_sample_list = self.ssh_client.get_remote_file_sample(source_path, self.compression_sample_size)
+            else:
+                file_sample_list = self.get_shared_source_result(("file_sample", str(source_path)),
+                                                                 self.ssh_client.get_local_file_sample,
+                                                                 source_path, self.compression_sample_size)
+        return self.compression_selector.select(file_sample_list)
+
+    def prepare_checksum_verification(self):
+        """Choose the HashAlgorithm used to verify the copied files on the selected machine: hash_algorithm if it is
+        set, or the fastest one that both machines can compute otherwise.
+        """
+        if not self.enable_checksum_verification:
+            return
+        local_algorithm_set = get_local_hash_algorithm_set()
+        remote_algorithm_set = self.ssh_client.get_remote_hash_algorithm_set()
+        algorithm_list = [algorithm for algorithm in HashAlgorithm
+                          if algorithm in local_algorithm_set and algorithm in remote_algorithm_set and
+                          (self.hash_algorithm is None or algorithm == self.hash_algorithm)]
+        if not algorithm_list:
+            requested_string = self.hash_algorithm.name if self.hash_algorithm is not None else "any hash algorithm"
+            raise RuntimeError(f"Error: Cannot verify the copied files with {requested_string} since it cannot be "
+                               f"computed on both the local machine and {self.ssh_client.hostname}.")
+        self.verification_hash_algorithm = algorithm_list[0]
+        logging.debug(f"self.prepare_checksum_verification(): Verifying the copied files with "
+                      f"{self.verification_hash_algorithm.name}")
+
+    def get_directory_hash_dict(self, directory_path: Path, is_source: bool, path_list: list = None):
+        """Hash the files below a source or destination directory on the machine it is on, or only the files in
+        path_list if it is passed. The hashes of a whole local source directory are shared by every destination. The
+        files in path_list are those copied again after failing verification, so their cached hashes are not used.
+        """
+        is_remote_source = self.transfer_direction == TransferDirection.TransferDirection.COPY_FROM_REMOTE_TO_LOCAL
+        algorithm = self.verification_hash_algorithm
+        if is_source == is_remote_source:
+            return self.ssh_client.get_remote_directory_hash_dict(directory_path, algorithm, path_list)
+        if is_source and path_list is None:
+            return self.get_shared_source_result(("hash", str(directory_path), algorithm),
+                                                 self.ssh_client.get_local_directory_hash_dict, directory_path,
+                                                 algorithm)
+        return self.ssh_client.get_local_directory_hash_dict(directory_path, algorithm, path_list,
+                                                             refresh=path_list is not None)
+
+    def compare_directory_hashes(self, path, path_list: list = None):
+        """Hash the source and destination copies of a directory at the same time, one on each machine.
+
+        :returns The (number of source files, list of source files that are missing or differ at the destination),
+        or None if either directory could not be hashed.
+        """
+        source_path = self.source_machine_root_path / path
+        destination_path = self.get_transfer_destination_root_path() / path
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            source_future = executor.submit(self.get_directory_hash_dict, source_path, True, path_list)
+            destination_future = executor.submit(self.get_directory_hash_dict, destination_path, False, path_list)
+            source_hash_dict = source_future.result()
+            destination_hash_dict = destination_future.result()
+        if source_hash_dict is None or destination_hash_dict is None:
+            return None
+        return len(source_hash_dict), sorted(relative_path for relative_path, digest in source_hash_dict.items()
+                                             if destination_hash_dict.get(relative_path) != digest)
+
+    def verify_directory_transfer(self, path, result: DirectoryTransferResult):
+        """Compare every file of a copied directory with its source, copy the files that are missing or differ again
+        with --ignore-times, and compare those once more. The outcome is stored in result.verification.
+        """
+        algorithm = self.verification_hash_algorithm
+        with self.metrics.time("checksum_verification_duration_seconds", {"directory": str(path)}):
+            comparison = self.compare_directory_hashes(path)
+            if comparison is None:
+                result.verification = VerificationResult(algorithm, message="The directory could not be hashed.")
+                logging.warning(f"{str(path)}: Unable to hash the files to verify them with {algorithm.name}")
+                return
+            result.verification = VerificationResult(algorithm, *comparison)
+            mismatched_path_list = result.verification.mismatched_path_list
+            if mismatched_path_list:
+                logging.warning(f"{str(path)}: {len(mismatched_path_list)} of {comparison[0]} file(s) differ from the "
+                                f"source after the transfer; copying them again.")
+                resync_result = self.run_rsync_process(path, self.get_resync_command_list(path, mismatched_path_list))
+                result.add_shard_result(resync_result)
+                if resync_result.exit_code == 0:
+                    comparison = self.compare_directory_hashes(path, mismatched_path_list)
+                    if comparison is not None:
+                        result.verification.remaining_path_list = comparison[1]
+
+        for relative_path in result.verification.remaining_path_list:
+            logging.warning(f"{str(path)}: {relative_path} still differs from the source.")
+        logging.log(logging.INFO if result.verification.is_successful() else logging.WARNING,
+                    f"{str(path)}: Verified {result.verification.verified_file_count} file(s) with {algorithm.name}; "
+                    f"{len(mismatched_path_list)} differed and {len(result.verification.remaining_path_list)} still "
+                    f"differ.")
+
+    def get_resync_command_list(self, path, path_list: list) -> list:
+        """Build the rsync command that copies the files of a directory that failed verification again. The files
+        are compared by content, since rsync's quick check skips a file whose size and modification time match. The
+        --files-from list is removed by finish_directory_split().
+        """
+        source_path = self.source_machine_root_path / path
+        destination_root_path = self.get_transfer_destination_root_path()
         if self.transfer_direction == TransferDirection.TransferDirection.COPY_FROM_REMOTE_TO_LOCAL:
-            # Make sure that destination path exists:
-            self.ssh_client.create_local_root_directory(self.destination_machine_root_path)
-        else:  # if self.transfer_direction == TransferDirection.TransferDirection.COPY_FROM_LOCAL_TO_REMOTE:
-            self.ssh_client.create_remote_root_directory(self.destination_machine_root_path)
+            full_source_parent_path = f"{self.ssh_client.username}@{self.ssh_client.hostname}:\"{source_path.parent}\""
+            full_dest_path = f"\"{destination_root_path}\""
+        else:
+            full_source_parent_path = f"\"{source_path.parent}\""
+            full_dest_path = f"{self.ssh_client.username}@{self.ssh_client.hostname}:\"{destination_root_path}\""
+
+        files_from_path = self.write_shard_files_from_list(path, source_path, path_list)
+        rsync_command = (f"rsync -aL {self.get_rsync_remote_shell_string()} --ignore-times --safe-links --from0 "
+                         f"--files-from=\"{files_from_path}\" {full_source_parent_path} {full_dest_path}")
+        transfer_option_list = []
+        compression_choice = self.compression_choice_dict.get(path, None)
+        if compression_choice is not None:
+            transfer_option_list = self.compression_selector.get_option_list(compression_choice)
+        if self.run_journal is not None:
+            transfer_option_list.append(f"--partial-dir={self.partial_dir}")
+        rsync_command_list = split(rsync_command)
+        rsync_command_list[1:1] = self.get_rsync_output_option_list() + transfer_option_list
+        logging.debug(f"{str(path)}: Split command to copy again: {rsync_command_list}")
+        return rsync_command_list
 
+    def __prepare_directory_transfer(self, path, remote_metadata_dict: dict, DEBUG_MODE=False):
+        """Check whether a directory from the source directory list can be copied, and build its rsync command.
+
+        :returns The rsync command as a list of arguments, or a DirectoryTransferResult explaining why the directory
+        is not copied.
+        """
+        dry_run_string = "--dry-run" if DEBUG_MODE else ""
         hostname = self.ssh_client.hostname
         username = self.ssh_client.username
-        host_ssh_port = self.ssh_client.ssh_port
 
-        # What list are we using here?
-        for path in self.source_machine_directory_list:
-            source_path = self.source_machine_root_path / path
-            destination_root_path = self.destination_machine_root_path
-            destination_sub_path = destination_root_path / path
+        source_path = self.source_machine_root_path / path
+        destination_root_path = self.get_transfer_destination_root_path()
+        # The existing copy that the threshold is checked against. In snapshot mode, it is in the previous snapshot:
+        comparison_root_path = self.get_comparison_destination_root_path()
+        if comparison_root_path is None:
+            comparison_root_path = destination_root_path
+            does_comparison_root_path_exist = False
+        else:
+            does_comparison_root_path_exist = True
+        destination_sub_path = comparison_root_path / path
 
-            if self.transfer_direction == TransferDirection.TransferDirection.COPY_FROM_REMOTE_TO_LOCAL:
-                full_source_path = f"{str(username)}@{str(hostname)}:\"{source_path}\""
-                full_dest_path = f"\"{self.destination_machine_root_path}\""
-                does_dest_sub_path_exist = self.ssh_client.does_local_directory_exist(destination_sub_path)
+        if self.transfer_direction == TransferDirection.TransferDirection.COPY_FROM_REMOTE_TO_LOCAL:
+            full_source_path = f"{str(username)}@{str(hostname)}:\"{source_path}\""
+            full_source_parent_path = f"{str(username)}@{str(hostname)}:\"{source_path.parent}\""
+            full_dest_path = f"\"{destination_root_path}\""
+            full_comparison_path = f"\"{comparison_root_path}\""
+            does_dest_sub_path_exist = does_comparison_root_path_exist and \
+                self.ssh_client.does_local_directory_exist(destination_sub_path)
+            remote_metadata = remote_metadata_dict.get(str(source_path))
 
-            else:  # if self.transfer_direction == TransferDirection.COPY_FROM_LOCAL_TO_REMOTE:
-                full_source_path = f"\"{source_path}\""
-                full_dest_path = f"{str(username)}@{str(hostname)}:\"{destination_root_path}\""
+        else:  # if self.transfer_direction == TransferDirection.COPY_FROM_LOCAL_TO_REMOTE:
+            full_source_path = f"\"{source_path}\""
+            full_source_parent_path = f"\"{source_path.parent}\""
+            full_dest_path = f"{str(username)}@{str(hostname)}:\"{destination_root_path}\""
+            full_comparison_path = f"{str(username)}@{str(hostname)}:\"{comparison_root_path}\""
+            remote_metadata = remote_metadata_dict.get(str(destination_sub_path))
+            if not does_comparison_root_path_exist:
+                does_dest_sub_path_exist = False
+            elif remote_metadata is not None:
+                does_dest_sub_path_exist = remote_metadata["exists"]
+            else:
                 does_dest_sub_path_exist = self.ssh_client.does_remote_directory_exist(destination_sub_path)
 
-            ssh_port_string = "" if host_ssh_port == Client.DEFAULT_SSH_PORT else f" -e \"ssh -p {host_ssh_port}\""
-            rsync_command = f"rsync -aLvzh {ssh_port_string} --delete {dry_run_string} --safe-links {full_source_path} {full_dest_path}"
+        files_from_path = None
+        if self.file_manifest_store is not None:
+            manifest_difference = self.check_file_manifest(path, source_path, does_dest_sub_path_exist)
+            if manifest_difference is not None and manifest_difference.is_empty():
+                self.threshold_verdict_dict[path] = (logging.INFO, f"{str(path)} did not change since it was last "
+                                                                   f"copied.")
+                return DirectoryTransferResult(path, message="The directory did not change since the last run.")
+            if manifest_difference is not None and not manifest_difference.deleted_path_list and \
+                    self.snapshot_manager is None:
+                files_from_path = self.write_files_from_list(path, source_path, manifest_difference)
+                logging.info(f"{str(path)}: {len(manifest_difference.changed_path_list)} file(s) changed since it "
+                             f"was last copied.")
 
-            # Copy automatically if destination path does not exist
-            # or Copy threshold is Disabled.
-            if (not does_dest_sub_path_exist) or not self.enable_copy_threshold:
-                logging.debug(f"self.rsync_directories(): Preparing to call {rsync_command}")
-                if not TEST_RUN:
-                    subprocess.run(split(rsync_command))
-            else:
-                # Compare source and destination directories
+        ssh_port_string = self.get_rsync_remote_shell_string()
+        link_dest_string = self.get_rsync_link_dest_string()
+        if files_from_path is not None:
+            # --files-from implies --relative, so the listed paths start with the name of the directory and are
+            # copied from its parent, which puts them in the same place as a full copy. --delete needs a recursive
+            # copy, so this is only used when no file was removed. A file found by its hash alone has the same size
+            # and modification time, which rsync's quick check would skip without --ignore-times:
+            ignore_times_string = "--ignore-times" if self.enable_file_manifest_hash else ""
+            rsync_command = (f"rsync -aL {ssh_port_string} {dry_run_string} {ignore_times_string} --safe-links "
+                             f"--from0 --files-from=\"{files_from_path}\" {full_source_parent_path} {full_dest_path}")
+        else:
+            rsync_command = (f"rsync -aL {ssh_port_string} --delete {dry_run_string} --safe-links {full_source_path} "
+                             f"{full_dest_path}")
+        if link_dest_string:
+            rsync_command = f"{rsync_command} {link_dest_string}"
+
+        # Copy automatically if destination path does not exist
+        # or Copy threshold is Disabled.
+        if does_dest_sub_path_exist and self.enable_copy_threshold and \
+                self.threshold_strategy == ThresholdStrategy.RSYNC_DELTA:
+            # The dry run compares against the existing copy, which is not the new snapshot in snapshot mode:
+            delta_command = (f"rsync -aL {ssh_port_string} --delete --safe-links {full_source_path} "
+                             f"{full_comparison_path}")
+            with self.metrics.time("threshold_check_duration_seconds", {"directory": str(path)}):
+                delta_result = self.get_rsync_delta(path, delta_command)
+            violation = self.get_rsync_delta_violation(delta_result)
+            if violation is not None:
+                self.threshold_verdict_dict[path] = (logging.INFO, f"{str(path)}: Warning: Cannot move it to "
+                                                                   f"{str(destination_sub_path)} since {violation}")
+                return DirectoryTransferResult(path, message="The directory did not pass the threshold check.")
+            self.threshold_verdict_dict[path] = (logging.INFO, f"{str(path)} would transfer "
+                                                               f"{delta_result.transferred_file_count} file(s) "
+                                                               f"({delta_result.transferred_file_bytes} bytes) and "
+                                                               f"delete {delta_result.deleted_file_count} file(s)")
+        elif does_dest_sub_path_exist and self.enable_copy_threshold:
+            # Compare source and destination directories
+            remote_directory_size = remote_metadata.get("size_in_bytes") if remote_metadata is not None else None
+            with self.metrics.time("threshold_check_duration_seconds", {"directory": str(path)}):
                 check, backup_size, temp_size = self.verify_directory(source_path,
                                                                       destination_sub_path,
-                                                                      self.debug_mode)
-                mb_temp_size = round((temp_size / (1 << 20)), 3)
-                mb_backup_size = round((backup_size / (1 << 20)), 3)
-                if not check:
-                    logging.info(f"Warning: Cannot move {str(path)} to {str(destination_sub_path)} Since it is "
-                                 f"not at least {str(mb_backup_size)}M (Source Size is {str(mb_temp_size)}M)")
-                else:
-                    logging.info(f"{str(path)} is at least {str(mb_backup_size)}M "
-                                 f"(Source Size is {str(mb_temp_size)}M)")
-
-                    logging.debug(f"self.rsync_directories(): Preparing to call {rsync_command}")
-                    logging.debug(f"Split command: {split(rsync_command)}")
-                    if not TEST_RUN:
-                        subprocess.run(split(rsync_command))
+                                                                      self.debug_mode,
+                                                                      remote_directory_size)
+            mb_temp_size = round((temp_size / (1 << 20)), 3)
+            mb_backup_size = round((backup_size / (1 << 20)), 3)
+            if not check:
+                self.threshold_verdict_dict[path] = (logging.INFO, f"{str(path)}: Warning: Cannot move it to "
+                                                                   f"{str(destination_sub_path)} Since it is not at "
+                                                                   f"least {str(mb_backup_size)}M (Source Size is "
+                                                                   f"{str(mb_temp_size)}M)")
+                return DirectoryTransferResult(path, message="The directory did not pass the threshold check.")
 
-        logging.info("self.rsync_directories(): Finished function call.")
+            self.threshold_verdict_dict[path] = (logging.INFO, f"{str(path)} is at least {str(mb_backup_size)}M "
+                                                               f"(Source Size is {str(mb_temp_size)}M)")
+
+        # The compression is only chosen once the directory is known to be copied, since it may sample its files:
+        compression_choice = self.select_directory_compression(path, source_path)
+        self.compression_choice_dict[path] = compression_choice
+        logging.debug(f"{str(path)}: Using {str(compression_choice)} compression since {compression_choice.reason}")
+
+        # The output options contain spaces, so they are added after splitting the command:
+        transfer_option_list = self.compression_selector.get_option_list(compression_choice)
+        if self.run_journal is not None:
+            transfer_option_list.append(f"--partial-dir={self.partial_dir}")
+        rsync_command_list = split(rsync_command)
+        rsync_command_list[1:1] = self.get_rsync_output_option_list() + transfer_option_list
+        logging.debug(f"{str(path)}: Preparing to call {rsync_command}")
+        logging.debug(f"{str(path)}: Split command: {rsync_command_list}")
+
+        if self.directory_splitter is not None and files_from_path is None:
+            shard_list = self.split_directory(path, source_path, remote_metadata)
+            for shard in shard_list if shard_list is not None else []:
+                shard_files_from_path = self.write_shard_files_from_list(path, source_path, shard)
+                # -r is added since --files-from turns it off, so a listed directory is copied with its contents:
+                shard_command = (f"rsync -aLr {ssh_port_string} {dry_run_string} --safe-links --from0 "
+                                 f"--files-from=\"{shard_files_from_path}\" {full_source_parent_path} "
+                                 f"{full_dest_path}")
+                if link_dest_string:
+                    shard_command = f"{shard_command} {link_dest_string}"
+                shard_command_list = split(shard_command)
+                shard_command_list[1:1] = self.get_rsync_output_option_list() + transfer_option_list
+                self.pending_shard_dict[path][-1] = (shard_command_list, shard_files_from_path)
+            if shard_list is not None:
+                logging.info(f"{str(path)}: Copying {len(shard_list)} shards at the same time before the whole "
+                             f"directory.")
+        return rsync_command_list
+
+    async def __rsync_directories_async(self, max_concurrent_transfers: int, event_callback=None):
+        """Copy the directories in the source directory list from an asyncio event loop, running up to
+        max_concurrent_transfers rsync processes at once.
+
+        :returns A dictionary mapping each directory in the source directory list to its DirectoryTransferResult.
+        """
+        import asyncio
+        from RsyncPath import AsyncClient
+
+        logging.debug("self.rsync_directories_async(): Starting Rsync.")
+        await asyncio.to_thread(self.create_destination_root_directory)
+        await asyncio.to_thread(self.begin_snapshot)
+
+        await asyncio.to_thread(self.start_ssh_control_master)
+
+        try:
+            await asyncio.to_thread(self.prepare_compression)
+            await asyncio.to_thread(self.prepare_checksum_verification)
+            remote_metadata_dict = {}
+            remote_metadata_arguments = self.get_remote_metadata_arguments()
+            if remote_metadata_arguments is not None:
+                remote_metadata_dict = await AsyncClient.get_remote_directory_metadata_async(
+                    self.ssh_client,
+                    *remote_metadata_arguments
+                )
+                remote_metadata_dict = remote_metadata_dict if remote_metadata_dict is not None else {}
+
+            if self.enable_copy_threshold:
+                # Open the SSH connection up front so that the transfers do not race to open it:
+                await asyncio.to_thread(self.ssh_client.ssh_connection.open)
+
+            semaphore = asyncio.Semaphore(max(1, max_concurrent_transfers))
+            task_dict = {
+                path: asyncio.ensure_future(self.__rsync_single_directory_async(path, remote_metadata_dict, semaphore,
+                                                                                event_callback))
+                for path in self.get_transfer_order(self.source_machine_directory_list, remote_metadata_dict)
+            }
+            await asyncio.gather(*task_dict.values())
+            result_dict = {path: task_dict[path].result() for path in self.source_machine_directory_list}
+        finally:
+            await asyncio.to_thread(self.stop_ssh_control_master)
+
+        await asyncio.to_thread(self.complete_snapshot, result_dict)
+        self.transfer_result_dict = result_dict
+        logging.info("self.rsync_directories_async(): Finished function call.")
+        return result_dict
+
+    async def __rsync_single_directory_async(self, path, remote_metadata_dict: dict, semaphore: "asyncio.Semaphore",
+                                             event_callback=None):
+        """Copy a single directory from the source directory list with asyncio, if it passes the threshold check.
+
+        :returns The DirectoryTransferResult of the directory.
+        """
+        import asyncio
+
+        async with semaphore:
+            try:
+                rsync_command_list = await asyncio.to_thread(self.__prepare_directory_transfer, path,
+                                                             remote_metadata_dict)
+                self.log_threshold_verdict(path)
+                if isinstance(rsync_command_list, DirectoryTransferResult):
+                    return self.record_transfer_result(rsync_command_list)
+
+                shard_result_list = await asyncio.gather(*[
+                    self.run_rsync_process_async(path, shard_command_list, event_callback)
+                    for shard_command_list, _ in self.pending_shard_dict.get(path, [])
+                ])
+                result = await self.run_rsync_process_async(path, rsync_command_list, event_callback)
+                for shard_result in shard_result_list:
+                    result.add_shard_result(shard_result)
+                if self.enable_checksum_verification and result.is_successful():
+                    await asyncio.to_thread(self.verify_directory_transfer, path, result)
+                self.log_transfer_result(result)
+                await asyncio.to_thread(self.finish_file_manifest, path, result.is_successful())
+                return self.record_transfer_result(result)
+            finally:
+                self.log_threshold_verdict(path)
+                self.finish_file_manifest(path, False)
+                self.finish_directory_split(path)
+                self.compression_choice_dict.pop(path, None)
+
+    async def run_rsync_process_async(self, path, rsync_command_list: list,
+                                      event_callback=None) -> DirectoryTransferResult:
+        """Run an rsync process copying a directory (or a shard of it) with asyncio and return its
+        DirectoryTransferResult.
+        """
+        import asyncio
+
+        bandwidth_limit = self.acquire_bandwidth_limit(path, rsync_command_list)
+        try:
+            result = DirectoryTransferResult(path)
+            result.compression_choice = self.compression_choice_dict.get(path, None)
+            process = await asyncio.create_subprocess_exec(*rsync_command_list,
+                                                           stdout=asyncio.subprocess.PIPE,
+                                                           stderr=asyncio.subprocess.STDOUT)
+            parser = RsyncOutputParser()
+            while True:
+                chunk = await process.stdout.read(RSYNC_OUTPUT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                for event in parser.feed(chunk.decode(errors="replace")):
+                    self.handle_async_transfer_event(result, event, event_callback)
+            for event in parser.close():
+                self.handle_async_transfer_event(result, event, event_callback)
+
+            result.finish(await process.wait())
+        finally:
+            self.release_bandwidth_limit(bandwidth_limit)
+        return result
+
+    def handle_async_transfer_event(self, result: DirectoryTransferResult, event, event_callback=None):
+        """Pass an event from an rsync process to event_callback(path, event) as it arrives, or log it if there is no
+        callback.
+        """
+        if event_callback is None:
+            self.handle_transfer_event(result, event)
+            return
+        result.add_event(event)
+        event_callback(result.path, event)
+
+    def create_destination_root_directory(self):
+        """Make sure that the destination root path exists."""
+        if self.transfer_direction == TransferDirection.TransferDirection.COPY_FROM_REMOTE_TO_LOCAL:
+            self.ssh_client.create_local_root_directory(self.destination_machine_root_path)
+        else:  # if self.transfer_direction == TransferDirection.TransferDirection.COPY_FROM_LOCAL_TO_REMOTE:
+            self.ssh_client.create_remote_root_directory(self.destination_machine_root_path)
+
+    def get_rsync_delta(self, path, rsync_command: str) -> DirectoryTransferResult:
+        """Run an rsync command with --dry-run and return what it would do, as a DirectoryTransferResult."""
+        rsync_command_list = split(rsync_command)
+        rsync_command_list[1:1] = self.get_rsync_output_option_list() + ["--dry-run", "--stats", "--itemize-changes"]
+        logging.debug(f"{str(path)}: Calling {rsync_command_list} to check the threshold")
+        result = DirectoryTransferResult(path)
+        process = subprocess.run(rsync_command_list, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        for event in parse_rsync_output([process.stdout.decode(errors="replace")]):
+            result.add_event(event)
+        result.finish(process.returncode)
+        return result
+
+    def get_rsync_delta_violation(self, delta_result: DirectoryTransferResult):
+        """Check the result of an rsync dry run against the delta threshold limits.
+
+        :returns A message describing the first limit that was exceeded, or None if the directory is safe to copy.
+        """
+        if not delta_result.is_successful():
+            return f"the rsync dry run failed with exit code {delta_result.exit_code}"
+
+        stats_dict = delta_result.stats_dict
+        deleted_file_count = delta_result.deleted_file_count
+        # The files at the destination are the ones rsync lists, minus the ones it would create, plus the ones it
+        # would delete:
+        destination_file_count = (stats_dict.get("number_of_files", 0) - stats_dict.get("number_of_created_files", 0)
+                                  + deleted_file_count)
+        deleted_file_percentage = 100 * deleted_file_count / max(1, destination_file_count)
+        if self.max_deleted_file_percentage is not None and \
+                deleted_file_percentage > float(self.max_deleted_file_percentage):
+            return (f"{deleted_file_count} of {int(destination_file_count)} file(s) ({deleted_file_percentage:.1f}%) "
+                    f"would be deleted, which is more than {self.max_deleted_file_percentage}%")
+
+        if self.max_deleted_file_count is not None and deleted_file_count > int(self.max_deleted_file_count):
+            return f"{deleted_file_count} file(s) would be deleted, which is more than {self.max_deleted_file_count}"
+
+        total_size = stats_dict.get("total_file_size", 0)
+        transferred_size = stats_dict.get("total_transferred_file_size", delta_result.transferred_file_bytes)
+        transferred_byte_percentage = 100 * transferred_size / max(1, total_size)
+        if self.max_transferred_byte_percentage is not None and \
+                transferred_byte_percentage > float(self.max_transferred_byte_percentage):
+            return (f"{int(transferred_size)} of {int(total_size)} byte(s) ({transferred_byte_percentage:.1f}%) "
+                    f"would be transferred, which is more than {self.max_transferred_byte_percentage}%")
+        return None
+
+    def begin_snapshot(self, create_directory=True):
+        """Start a new snapshot in snapshot mode. If create_directory is False (during a dry run), the previous
+        snapshot is found but nothing is created.
+        """
+        if not self.enable_snapshot_mode:
+            return
+
+        self.snapshot_manager = SnapshotManager(
+            self.destination_machine_root_path,
+            self.ssh_client,
+            self.transfer_direction == TransferDirection.TransferDirection.COPY_FROM_LOCAL_TO_REMOTE,
+            self.snapshot_keep_daily,
+            self.snapshot_keep_weekly,
+            self.snapshot_latest_link_name
+        )
+        if not self.snapshot_manager.begin(create_directory):
+            self.snapshot_manager = None
+            raise RuntimeError(f"Unable to create a snapshot in {str(self.destination_machine_root_path)}.")
+        logging.info(f"self.begin_snapshot(): Copying into snapshot {self.snapshot_manager.snapshot_name}, linked "
+                     f"against {self.snapshot_manager.latest_snapshot_name}")
+
+    def complete_snapshot(self, result_dict: dict):
+        """Finish the snapshot of a run in snapshot mode.
+
+        Directories that were not copied are linked from the previous snapshot. The snapshot only becomes the latest
+        one if every rsync process succeeded; otherwise it is left incomplete and resumed by the next run.
+        """
+        if self.snapshot_manager is None:
+            return
+
+        for path, result in result_dict.items():
+            if not result.was_copied():
+                self.snapshot_manager.link_previous_directory(path)
 
-    def run(self):
-        """Select an available connection and copies over specified source directories to the destination directory."""
-        self.__rsync_directories()
+        if all(result.exit_code in (None, 0) for result in result_dict.values()):
+            self.snapshot_manager.complete()
+        else:
+            logging.warning(f"self.complete_snapshot(): Leaving snapshot {self.snapshot_manager.snapshot_name} "
+                            f"incomplete since a transfer failed.")
+        self.snapshot_manager = None
+
+    def get_file_manifest_keys(self, source_path: Path, path):
+        """Return the source and destination keys a directory's manifest is stored under in the FileManifestStore.
+
+        The destination is the destination root path even in snapshot mode, since every snapshot has a new path.
+        """
+        if self.transfer_direction == TransferDirection.TransferDirection.COPY_FROM_REMOTE_TO_LOCAL:
+            source_namespace = f"{self.ssh_client.username}@{self.ssh_client.hostname}:{self.ssh_client.ssh_port}"
+            destination_namespace = LOCAL_NAMESPACE
+        else:
+            source_namespace = LOCAL_NAMESPACE
+            destination_namespace = f"{self.ssh_client.username}@{self.ssh_client.hostname}:{self.ssh_client.ssh_port}"
+        return (f"{source_namespace}:{str(source_path)}",
+                f"{destination_namespace}:{str(self.destination_machine_root_path / path)}")
+
+    def check_file_manifest(self, path, source_path: Path, does_dest_sub_path_exist: bool):
+        """Scan a source directory into a FileManifest and compare it with the manifest stored after its last
+        successful transfer. The new manifest is kept until the transfer finishes (see finish_file_manifest()).
+
+        :returns The ManifestDifference, or None if the whole directory has to be copied: the source could not be
+        scanned, the destination directory does not exist or there is no stored manifest yet.
+        """
+        if self.transfer_direction == TransferDirection.TransferDirection.COPY_FROM_REMOTE_TO_LOCAL:
+            manifest = self.ssh_client.get_remote_directory_manifest(source_path)
+        else:
+            manifest = self.get_shared_source_result(("manifest", str(source_path)),
+                                                     self.ssh_client.get_local_directory_manifest, source_path,
+                                                     self.enable_file_manifest_hash)
+        if manifest is None:
+            return None
+
+        source_key, destination_key = self.get_file_manifest_keys(source_path, path)
+        self.pending_manifest_dict[path] = (source_key, destination_key, manifest, None)
+        if not does_dest_sub_path_exist:
+            return None
+        previous_manifest = self.file_manifest_store.load(source_key, destination_key)
+        if previous_manifest is None:
+            return None
+
+        manifest_difference = manifest.compare(previous_manifest)
+        label_dict = {"directory": str(path)}
+        self.metrics.increment("manifest_changed_files_total", len(manifest_difference.changed_path_list), label_dict)
+        self.metrics.increment("manifest_deleted_files_total", len(manifest_difference.deleted_path_list), label_dict)
+        return manifest_difference
+
+    def write_files_from_list(self, path, source_path: Path, manifest_difference: ManifestDifference):
+        """Write the changed files of a directory to a temporary --files-from list, separated by NUL characters for
+        --from0, and return its path. The list is removed by finish_file_manifest().
+        """
+        from tempfile import mkstemp
+
+        file_descriptor, files_from_path = mkstemp(prefix="rsync_path_", suffix=".files-from")
+        with open(file_descriptor, "wb") as files_from_file:
+            for relative_path in manifest_difference.changed_path_list:
+                files_from_file.write(f"{source_path.name}/{relative_path}\0".encode("utf-8", "surrogateescape"))
+        source_key, destination_key, manifest, _ = self.pending_manifest_dict[path]
+        self.pending_manifest_dict[path] = (source_key, destination_key, manifest, files_from_path)
+        return files_from_path
+
+    def finish_file_manifest(self, path, save: bool):
+        """Remove the --files-from list of a directory, and store its new manifest if save is True (the transfer
+        succeeded). Does nothing if the directory has no pending manifest.
+        """
+        pending_manifest = self.pending_manifest_dict.pop(path, None)
+        if pending_manifest is None:
+            return
+        source_key, destination_key, manifest, files_from_path = pending_manifest
+        if files_from_path is not None:
+            Path(files_from_path).unlink(missing_ok=True)
+        if not save:
+            return
+        try:
+            self.file_manifest_store.save(source_key, destination_key, manifest)
+        except OSError as exception:
+            logging.error(f"{str(path)}: Unable to save the file manifest of the directory: {exception}")
+
+    def split_directory(self, path, source_path: Path, remote_metadata: dict = None):
+        """Split a source directory into shards with the DirectorySplitter, using the manifest scanned for the file
+        manifest if there is one.
+
+        :returns A list of shards, each a list of paths relative to the directory, or None if it is not split.
+        """
+        is_remote_source = self.transfer_direction == TransferDirection.TransferDirection.COPY_FROM_REMOTE_TO_LOCAL
+        if is_remote_source and remote_metadata is not None and \
+                remote_metadata.get("size_in_bytes", self.directory_splitter.min_size) < \
+                self.directory_splitter.min_size:
+            return None
+
+        pending_manifest = self.pending_manifest_dict.get(path)
+        if pending_manifest is not None:
+            manifest = pending_manifest[2]
+        elif is_remote_source:
+            manifest = self.ssh_client.get_remote_directory_manifest(source_path)
+        else:
+            manifest = self.get_shared_source_result(("manifest", str(source_path)),
+                                                     self.ssh_client.get_local_directory_manifest, source_path,
+                                                     self.enable_file_manifest_hash)
+        if manifest is None:
+            return None
+        return self.directory_splitter.split(manifest)
+
+    def write_shard_files_from_list(self, path, source_path: Path, shard: list):
+        """Write the entries of a shard to a temporary --files-from list, separated by NUL characters for --from0,
+        and return its path. The list is removed by finish_directory_split().
+        """
+        from tempfile import mkstemp
+
+        file_descriptor, files_from_path = mkstemp(prefix="rsync_path_", suffix=".shard")
+        self.pending_shard_dict.setdefault(path, []).append((None, files_from_path))
+        with open(file_descriptor, "wb") as files_from_file:
+            for relative_path in shard:
+                files_from_file.write(f"{source_path.name}/{relative_path}\0".encode("utf-8", "surrogateescape"))
+        return files_from_path
+
+    def finish_directory_split(self, path):
+        """Remove the --files-from lists of the shards of a directory. Does nothing if the directory was not split."""
+        for _, files_from_path in self.pending_shard_dict.pop(path, []):
+            Path(files_from_path).unlink(missing_ok=True)
+
+    def get_transfer_destination_root_path(self) -> Path:
+        """Return the path rsync copies the directories into: the new snapshot in snapshot mode, or the
+        destination root path otherwise.
+        """
+        if self.snapshot_manager is not None:
+            return self.snapshot_manager.get_snapshot_path()
+        return self.destination_machine_root_path
+
+    def get_comparison_destination_root_path(self):
+        """Return the path holding the existing copy of the directories: the previous snapshot in snapshot mode
+        (None if there is none yet), or the destination root path otherwise.
+        """
+        if self.snapshot_manager is not None:
+            return self.snapshot_manager.get_previous_snapshot_path()
+        return self.destination_machine_root_path
+
+    def get_rsync_link_dest_string(self):
+        """Return the --link-dest option pointing at the previous snapshot, or an empty string if there is none."""
+        if self.snapshot_manager is None or self.snapshot_manager.get_previous_snapshot_path() is None:
+            return ""
+        return f"--link-dest=\"{self.snapshot_manager.get_previous_snapshot_path()}\""
+
+    def get_rsync_remote_shell_string(self):
+        """Return the -e option passed to rsync, or an empty string if rsync can use its default remote shell."""
+        ssh_option_list = []
+        if self.ssh_client.ssh_port != Client.DEFAULT_SSH_PORT:
+            ssh_option_list.extend(["-p", str(self.ssh_client.ssh_port)])
+        if self.ssh_control_master is not None:
+            ssh_option_list.extend(self.ssh_control_master.get_ssh_option_list())
+
+        if not ssh_option_list:
+            return ""
+        return f" -e \"ssh {' '.join(ssh_option_list)}\""
+
+    def get_transfer_order(self, directory_list: list, remote_metadata_dict: dict):
+        """Return a directory list sorted so that the largest directories are transferred first.
+
+        The sizes are taken from the remote metadata, so directories without a known size keep their list order
+        after the ones that have one.
+        """
+        def get_size(path):
+            if self.transfer_direction == TransferDirection.TransferDirection.COPY_FROM_REMOTE_TO_LOCAL:
+                remote_path = self.source_machine_root_path / path
+            else:
+                comparison_root_path = self.get_comparison_destination_root_path()
+                if comparison_root_path is None:
+                    return -1
+                remote_path = comparison_root_path / path
+            remote_metadata = remote_metadata_dict.get(str(remote_path))
+            size_in_bytes = remote_metadata.get("size_in_bytes") if remote_metadata is not None else None
+            return size_in_bytes if size_in_bytes is not None else -1
+
+        return sorted(directory_list, key=get_size, reverse=True)
+
+    def get_remote_metadata_arguments(self, directory_list: list = None):
+        """Return the arguments passed to Client.get_remote_directory_metadata() for the remote directories used in
+        the transfer, or None if their metadata is not needed.
+
+        :param: directory_list The directories of the source directory list that are copied, all of them by default.
+        """
+        if directory_list is None:
+            directory_list = self.source_machine_directory_list
+        # The rsync dry run replaces the directory sizes, so only the existence of the directories is needed:
+        existence_only = self.enable_directory_size_cache or self.threshold_strategy == ThresholdStrategy.RSYNC_DELTA
+        if self.transfer_direction == TransferDirection.TransferDirection.COPY_FROM_REMOTE_TO_LOCAL:
+            # Only the threshold check needs to know about the remote source directories, and the directory size
+            # cache computes their sizes more cheaply than du:
+            if not self.enable_copy_threshold or existence_only:
+                return None
+            remote_path_list = [self.source_machine_root_path / path for path in directory_list]
+        else:
+            comparison_root_path = self.get_comparison_destination_root_path()
+            if comparison_root_path is None:
+                return None
+            remote_path_list = [comparison_root_path / path for path in directory_list]
+        return remote_path_list, existence_only
+
+    def get_remote_metadata_dict(self, directory_list: list = None):
+        """Retrieve the metadata of every remote directory used in the transfer with a single remote command.
+
+        :param: directory_list The directories of the source directory list that are copied, all of them by default.
+        :returns A dictionary mapping each remote directory path (as a string) to its metadata. The dictionary is
+        empty if the metadata is not needed or could not be retrieved.
+        """
+        remote_metadata_arguments = self.get_remote_metadata_arguments(directory_list)
+        if remote_metadata_arguments is None:
+            return {}
+
+        with self.metrics.time("remote_metadata_duration_seconds"):
+            remote_metadata_dict = self.ssh_client.get_remote_directory_metadata(*remote_metadata_arguments)
+        return remote_metadata_dict if remote_metadata_dict is not None else {}
+
+    def run(self, resume=False):
+        """Select an available connection and copies over specified source directories to the destination directory.
+
+        :param: resume If True, the unfinished run recorded in the RunJournal for the same directories is resumed:
+        the directories it completed are not copied again, and every other one is. A RunJournal is stored at
+        run_journal_path if the enable_run_journal key is not set. Resuming is not supported in fan-out, striped pull
+        or snapshot mode.
+        :returns A dictionary mapping each source directory to its DirectoryTransferResult, or in fan-out mode, each
+        destination to such a dictionary.
+        """
+        start_time = monotonic()
+        result_dict = None
+        try:
+            if resume and (self.enable_destination_fan_out or self.enable_striped_pull or self.enable_snapshot_mode):
+                raise RuntimeError("Resuming a run is not supported in fan-out, striped pull or snapshot mode.")
+            if resume and self.run_journal is None:
+                self.run_journal = RunJournal(self.run_journal_path)
+            if self.enable_destination_fan_out:
+                result_dict = self.__rsync_destinations()
+                return result_dict
+            if self.enable_striped_pull:
+                result_dict = self.__rsync_sources()
+                return result_dict
+            if self.ssh_client is None:
+                self.ssh_client = self.select_client()
+            self.bandwidth_scheduler.set_slot_count(self.max_parallel_transfers, self.max_parallel_transfers)
+            if self.run_journal is not None and not self.enable_snapshot_mode:
+                result_dict = self.__rsync_journaled_directories(resume)
+            else:
+                result_dict = self.__rsync_directories()
+            return result_dict
+        finally:
+            self.finish_run(start_time, result_dict)
+
+    def get_run_journal_key(self) -> str:
+        """Return the key of this run in the RunJournal. It does not include the remote machine, so a run resumed
+        from another machine of the machine IP list continues the same run.
+        """
+        return (f"{self.transfer_direction.name}:{str(self.source_machine_root_path)}:"
+                f"{str(self.destination_machine_root_path)}")
+
+    def __rsync_journaled_directories(self, resume=False):
+        """Copy the directories of the source directory list, recording the state of each one in the RunJournal, and
+        copy the ones that failed again up to run_journal_max_retries times with a growing delay. If the connection
+        was lost, the next machine that responds is used for the retry.
+
+        :param: resume If True, the directories completed by the unfinished run with the same key are skipped.
+        :returns A dictionary mapping each directory in the source directory list to its DirectoryTransferResult.
+        """
+        run_key = self.get_run_journal_key()
+        path_dict = {str(path): path for path in self.source_machine_directory_list}
+        state_dict = self.run_journal.begin(run_key, self.source_machine_directory_list, resume)
+        result_dict = {path_dict[path_string]: DirectoryTransferResult(path_dict[path_string],
+                                                                       message="The directory was completed by the "
+                                                                               "interrupted run.")
+                       for path_string, state in state_dict.items() if state.is_complete()}
+        if result_dict:
+            logging.info(f"self.rsync_journaled_directories(): Resuming the run; {len(result_dict)} of "
+                         f"{len(path_dict)} directories are already complete.")
+
+        self.run_journal_key = run_key
+        needs_reconnect = False
+        try:
+            for attempt in range(self.run_journal_max_retries + 1):
+                directory_list = [path_dict[path_string]
+                                  for path_string in self.run_journal.get_incomplete_path_list(run_key)]
+                if not directory_list:
+                    break
+                if attempt > 0:
+                    delay = self.run_journal_retry_delay * (2 ** (attempt - 1))
+                    logging.warning(f"self.rsync_journaled_directories(): Copying {len(directory_list)} failed "
+                                    f"directories again in {delay} seconds (retry {attempt} of "
+                                    f"{self.run_journal_max_retries}).")
+                    self.metrics.increment("run_journal_retries_total")
+                    sleep(delay)
+                    if needs_reconnect:
+                        self.reconnect_to_next_host()
+
+                try:
+                    pass_result_dict = self.__rsync_directories(directory_list=directory_list)
+                except Exception as exception:
+                    if attempt == self.run_journal_max_retries:
+                        raise
+                    logging.error(f"self.rsync_journaled_directories(): The run stopped with {exception!r}")
+                    needs_reconnect = True
+                    continue
+                result_dict.update(pass_result_dict)
+                needs_reconnect = any(result.exit_code in RSYNC_CONNECTION_ERROR_EXIT_CODE_SET
+                                      for result in pass_result_dict.values())
+        finally:
+            self.run_journal_key = None
+
+        entry_dict = self.run_journal.get_entry_dict(run_key)
+        if all(entry[0].is_complete() for entry in entry_dict.values()):
+            self.run_journal.finish(run_key)
+        else:
+            logging.warning(f"self.rsync_journaled_directories(): "
+                            f"{sum(not entry[0].is_complete() for entry in entry_dict.values())} directories are not "
+                            f"complete; run again with resume=True to copy them.")
+
+        # Directories that were copied by a pass that stopped early only have their state in the journal:
+        self.transfer_result_dict = {
+            path: result_dict.get(path, DirectoryTransferResult(
+                path, message=f"The directory is {entry_dict[str(path)][0].name.lower()} in the run journal."
+            ))
+            for path in self.source_machine_directory_list
+        }
+        return self.transfer_result_dict
+
+    def reconnect_to_next_host(self):
+        """Connect the Client to the first machine after the current one in the machine IP list that responds,
+        going back to the start of the list after its end, so the current machine is only used again if no other
+        machine responds.
+
+        :returns True if a machine responded.
+        """
+        passed_username, passed_machine_list, probe_options = self.get_host_selection_arguments()
+        with self.metrics.time("host_selection_duration_seconds"):
+            index_list = Client.find_all_available_hostname_index_list(passed_machine_list,
+                                                                       probe_options["probe_timeout"],
+                                                                       probe_options["probe_strategy"],
+                                                                       self.metrics)
+        if not index_list:
+            logging.error("self.reconnect_to_next_host(): No machine on the IP List responded.")
+            return False
+
+        current_host_key = get_host_key(self.ssh_client.hostname, self.ssh_client.ssh_port)
+        current_index = next((index for index, hostname_dict in enumerate(passed_machine_list)
+                              if get_host_key(hostname_dict.get("hostname", ""),
+                                              hostname_dict.get("ssh_port", Client.DEFAULT_SSH_PORT)) ==
+                              current_host_key), -1)
+        index = min(index_list, key=lambda candidate: (candidate - current_index - 1) % len(passed_machine_list))
+        hostname_dict = passed_machine_list[index]
+        self.ssh_client.change_connection(passed_username if passed_username is not None else
+                                          hostname_dict.get("username", ""),
+                                          hostname_dict.get("hostname", ""),
+                                          hostname_dict.get("ssh_port", Client.DEFAULT_SSH_PORT),
+                                          hostname_dict.get("os_type") or None)
+        logging.info(f"self.reconnect_to_next_host(): Connected to {self.ssh_client.hostname} instead of "
+                     f"{current_host_key}.")
+        return True
+
+    async def run_async(self, max_concurrent_transfers: int = None, event_callback=None):
+        """Select an available connection and copy over the source directories from an asyncio event loop.
+
+        Host selection, remote metadata queries and rsync processes do not block the event loop, so several
+        RsyncPath objects can run from the same loop.
+
+        :param: max_concurrent_transfers Number of rsync processes that can run at the same time. Defaults to the
+        max_parallel_transfers key of transfer_dict.
+        :param: event_callback Optional function called with the directory and the event for each event parsed
+        from the output of rsync (see RsyncOutput). By default, each event is logged.
+        :returns A dictionary mapping each source directory to its DirectoryTransferResult, or in fan-out mode, each
+        destination to such a dictionary.
+        :raises ValueError If the enable_run_journal key is set, since the directories are not recorded in the
+        RunJournal and the run could not be resumed. Use run() instead.
+        """
+        # asyncio and AsyncClient are only imported by the async methods, so that run() does not pay for them:
+        import asyncio
+
+        if self.run_journal is not None:
+            raise ValueError("The run journal is not supported by run_async(). Use run() to record and resume runs.")
+
+        start_time = monotonic()
+        result_dict = None
+        try:
+            if max_concurrent_transfers is None:
+                max_concurrent_transfers = self.max_parallel_transfers
+            if self.enable_destination_fan_out:
+                result_dict = await self.__rsync_destinations_async(max_concurrent_transfers, event_callback)
+                return result_dict
+            if self.enable_striped_pull:
+                result_dict = await self.__rsync_sources_async(max_concurrent_transfers, event_callback)
+                return result_dict
+            if self.ssh_client is None:
+                self.ssh_client = await self.select_client_async()
+            self.bandwidth_scheduler.set_slot_count(max_concurrent_transfers, max_concurrent_transfers)
+            result_dict = await self.__rsync_directories_async(max_concurrent_transfers, event_callback)
+            return result_dict
+        finally:
+            await asyncio.to_thread(self.finish_run, start_time, result_dict)
 
     def dry_run(self):
         """Test each source directory with the destination directory, comparing the size. This DOES NOT copy the
         directory.
         """
-        self.__rsync_directories(self.debug_mode, True)
+        start_time = monotonic()
+        result_dict = None
+        try:
+            if self.enable_destination_fan_out:
+                result_dict = self.__rsync_destinations(self.debug_mode, True)
+                return result_dict
+            if self.enable_striped_pull:
+                result_dict = self.__rsync_sources(self.debug_mode, True)
+                return result_dict
+            if self.ssh_client is None:
+                self.ssh_client = self.select_client()
+            result_dict = self.__rsync_directories(self.debug_mode, True)
+            return result_dict
+        finally:
+            self.finish_run(start_time, result_dict)
+
+    def watch(self, stop_event=None, sync_callback=None):
+        """Copy the local source directories to the destination, then keep copying the ones that change until
+        stop_event is set.
+
+        The machine is selected once, and with SSH multiplexing, the ControlMaster connection stays open for the
+        whole watch. Changes are noticed with the WatchBackend of the watch_backend key: inotify by default, or
+        walking every source directory each watch_poll_interval seconds (30 by default). Once no change arrived for
+        watch_debounce_time seconds (2 by default), or watch_max_delay seconds (60 by default) after the first one,
+        the directories that changed are copied the same way as by run(), each with its own threshold check. A
+        directory whose copy failed is copied again with the next changes, or after watch_max_delay seconds.
+
+        Only copying from the local machine to a single remote machine without snapshots is supported.
+
+        :param: stop_event Optional threading.Event that stops the watch once it is set. Without it, the watch runs
+        until it is interrupted.
+        :param: sync_callback Optional function called with the result dictionary of every copy.
+        :returns A dictionary mapping each source directory to the DirectoryTransferResult of its last copy.
+        """
+        if self.transfer_direction != TransferDirection.TransferDirection.COPY_FROM_LOCAL_TO_REMOTE:
+            raise RuntimeError("Watching is only supported when copying from the local machine to a remote machine.")
+        if self.enable_destination_fan_out or self.enable_striped_pull or self.enable_snapshot_mode:
+            raise RuntimeError("Watching is not supported in fan-out, striped pull or snapshot mode.")
+
+        if self.ssh_client is None:
+            self.ssh_client = self.select_client()
+        self.bandwidth_scheduler.set_slot_count(self.max_parallel_transfers, self.max_parallel_transfers)
+        self.transfer_result_dict = {}
+        path_dict = {path: self.source_machine_root_path / path for path in self.source_machine_directory_list}
+
+        self.create_destination_root_directory()
+        # The connection is kept until the watch stops, however long nothing changes:
+        self.start_ssh_control_master("yes")
+        try:
+            self.prepare_compression()
+            self.prepare_checksum_verification()
+            # The watcher is started before the first copy, so changes made during it are copied afterwards:
+            with create_directory_watcher(path_dict, self.watch_backend, self.watch_debounce_time,
+                                          self.watch_max_delay, self.watch_poll_interval) as watcher:
+                logging.info(f"self.watch(): Watching {len(path_dict)} directories with "
+                             f"{type(watcher).__name__}.")
+                changed_path_list = list(self.source_machine_directory_list)
+                while changed_path_list is not None:
+                    result_dict = self.sync_watched_directories(changed_path_list)
+                    if sync_callback is not None:
+                        sync_callback(result_dict)
+                    failed_path_set = {path for path, result in result_dict.items()
+                                       if result.exit_code not in (None, 0)}
+                    changed_path_list = watcher.wait_for_changes(stop_event, failed_path_set)
+        finally:
+            self.stop_ssh_control_master()
+            self.ssh_client.stop_remote_agent()
+        logging.info("self.watch(): Stopped watching.")
+        return self.transfer_result_dict
+
+    def sync_watched_directories(self, directory_list: list):
+        """Copy the directories that changed during watch(), each with its own threshold check, and record the copy
+        as a run in metrics.
+
+        :returns A dictionary mapping each directory in directory_list to its DirectoryTransferResult.
+        """
+        start_time = monotonic()
+        result_dict = None
+        logging.info(f"self.sync_watched_directories(): Copying {len(directory_list)} changed directories.")
+        self.metrics.increment("watch_synced_directories_total", len(directory_list))
+        try:
+            if self.ssh_control_master is not None and not self.ssh_control_master.check():
+                logging.warning("self.sync_watched_directories(): The SSH master connection was lost; starting it "
+                                "again.")
+                self.stop_ssh_control_master()
+                self.start_ssh_control_master("yes")
+            remote_metadata_dict = self.get_remote_metadata_dict(directory_list)
+            result_dict = self.__rsync_directory_list(directory_list, remote_metadata_dict)
+            self.transfer_result_dict.update(result_dict)
+            return result_dict
+        finally:
+            self.record_run(start_time, result_dict)
 
-    def verify_directory(self, source_dir, dest_dir, DEBUG_MODE=False):
+    def finish_run(self, start_time: float, result_dict: dict = None):
+        """Stop the remote agent, record the duration and outcome of a run in metrics, and write the Prometheus
+        textfile if one was requested. A run without a result dictionary raised an exception, and is recorded as
+        failed.
+        """
+        if self.ssh_client is not None:
+            self.ssh_client.stop_remote_agent()
+        for host_rsync_path in [*self.destination_rsync_path_dict.values(), *self.source_rsync_path_dict.values()]:
+            host_rsync_path.ssh_client.stop_remote_agent()
+        self.record_run(start_time, result_dict)
+
+    def record_run(self, start_time: float, result_dict: dict = None):
+        """Record the duration and outcome of a run in metrics, and write the Prometheus textfile if one was
+        requested.
+        """
+        result_list = []
+        if result_dict is not None and self.enable_destination_fan_out:
+            result_list = [result for destination_result_dict in result_dict.values()
+                           for result in destination_result_dict.values()]
+        elif result_dict is not None:
+            result_list = list(result_dict.values())
+        is_successful = result_dict is not None and all(result.exit_code in (None, 0) for result in result_list)
+        self.metrics.set_gauge("run_duration_seconds", monotonic() - start_time)
+        self.metrics.set_gauge("run_success", 1 if is_successful else 0)
+        self.metrics.set_gauge("last_run_timestamp_seconds", time())
+        if is_successful:
+            self.metrics.set_gauge("last_successful_run_timestamp_seconds", time())
+
+        if self.prometheus_textfile_exporter is not None:
+            try:
+                self.prometheus_textfile_exporter.write(self.metrics)
+            except OSError as exception:
+                logging.error(f"self.finish_run(): Unable to write the Prometheus textfile: {exception}")
+
+    def verify_directory(self, source_dir, dest_dir, DEBUG_MODE=False, remote_directory_size=None):
         """Determine if the contents of the temp directory is empty or smaller than the threshold defined in
-        subdir_copy_threshold.
+        subdir_copy_threshold. If remote_directory_size is passed, it is used instead of asking the remote machine
+        for the size of the remote directory.
         """
         logging.debug(f"self.verify_directory(): Verifying {str(source_dir)} and {str(dest_dir)}")
         threshold_percentage = self.subdir_copy_threshold / 100
         if self.transfer_direction == TransferDirection.TransferDirection.COPY_FROM_REMOTE_TO_LOCAL:
             minimum_source_size = threshold_percentage * self.ssh_client.get_local_directory_size_in_bytes(dest_dir)
-            destination_directory_size = self.ssh_client.get_remote_directory_size_in_bytes(source_dir)
+            remote_dir = source_dir
+        else:
+            minimum_source_size = threshold_percentage * self.get_shared_source_result(
+                ("size", str(source_dir)),
+                self.ssh_client.get_local_directory_size_in_bytes,
+                source_dir
+            )
+            remote_dir = dest_dir
+
+        if remote_directory_size is not None:
+            destination_directory_size = remote_directory_size
         else:
-            minimum_source_size = threshold_percentage * self.ssh_client.get_local_directory_size_in_bytes(source_dir)
-            destination_directory_size = self.ssh_client.get_remote_directory_size_in_bytes(dest_dir)
+            destination_directory_size = self.ssh_client.get_remote_directory_size_in_bytes(remote_dir)
 
         if DEBUG_MODE:
             logging.debug(f"self.verify_directory(): Backup Size: {minimum_source_size} bytes")
@@ -0,0 +1,114 @@
+# -------------------------------------------------------------------------------
+# RunJournal.py
+# SQLite journal of the state of every directory of a run, written as each state
+# changes so that a run interrupted by a crash or a lost connection can resume.
+# -------------------------------------------------------------------------------
+
+from pathlib import Path
+from threading import Lock
+from time import time
+from logging import debug
+import sqlite3
+
+from RsyncPath.DirectoryState import DirectoryState
+
+DEFAULT_RUN_JOURNAL_PATH = Path.home() / ".cache" / "rsync_path" / "run_journal.sqlite3"
+DEFAULT_RUN_JOURNAL_MAX_RETRIES = 3
+# Seconds before the first retry of a run's failed directories, doubled for every following retry:
+DEFAULT_RUN_JOURNAL_RETRY_DELAY = 30
+
+
+class RunJournal(object):
+    """Record the DirectoryState and rsync exit code of every directory of a run.
+
+    A run is known by a key describing what is copied where (see RsyncPath.get_run_journal_key()), so a run copying
+    the same directories from another machine of the machine IP list still resumes it. Every change is committed
+    before the method returns, so the journal is up to date whenever the process stops. A run stays unfinished
+    until finish() is called once every directory is complete.
+    """
+
+    def __init__(self, journal_path: Path = DEFAULT_RUN_JOURNAL_PATH):
+        """Construct the object and open the journal database, creating it if needed."""
+        self.journal_path = Path(journal_path)
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = Lock()
+        self.connection = sqlite3.connect(self.journal_path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS run (
+                                           run_key TEXT PRIMARY KEY,
+                                           started REAL NOT NULL,
+                                           finished REAL)""")
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS directory (
+                                           run_key TEXT NOT NULL,
+                                           path TEXT NOT NULL,
+                                           state INTEGER NOT NULL,
+                                           exit_code INTEGER,
+                                           attempt_count INTEGER NOT NULL,
+                                           host TEXT,
+                                           message TEXT,
+                                           updated REAL NOT NULL,
+                                           PRIMARY KEY (run_key, path))""")
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def begin(self, run_key: str, path_list: list, resume=False) -> dict:
+        """Start a run of the directories in path_list, or resume the unfinished run with the same key if resume is
+        True. A resumed run keeps the state of its directories; directories that were not part of it are added as
+        PENDING, and those that are no longer in path_list are forgotten.
+
+        :returns A dictionary mapping each path (as a string) to its DirectoryState.
+        """
+        now = time()
+        with self.lock, self.connection:
+            row = self.connection.execute("SELECT finished FROM run WHERE run_key = ?", (run_key,)).fetchone()
+            is_resumed = resume and row is not None and row[0] is None
+            if not is_resumed:
+                self.connection.execute("INSERT OR REPLACE INTO run VALUES (?, ?, NULL)", (run_key, now))
+                self.connection.execute("DELETE FROM directory WHERE run_key = ?", (run_key,))
+
+            state_dict = {path: DirectoryState(state) for path, state in self.connection.execute(
+                "SELECT path, state FROM directory WHERE run_key = ?", (run_key,)
+            )}
+            for path in set(state_dict) - {str(path) for path in path_list}:
+                self.connection.execute("DELETE FROM directory WHERE run_key = ? AND path = ?", (run_key, path))
+                del state_dict[path]
+            for path in path_list:
+                if str(path) not in state_dict:
+                    self.connection.execute("INSERT INTO directory VALUES (?, ?, ?, NULL, 0, NULL, NULL, ?)",
+                                            (run_key, str(path), DirectoryState.PENDING.value, now))
+                    state_dict[str(path)] = DirectoryState.PENDING
+        debug(f"RunJournal.begin(): {'Resuming' if is_resumed else 'Starting'} run {run_key} with "
+              f"{sum(state.is_complete() for state in state_dict.values())} of {len(state_dict)} directories "
+              f"complete.")
+        return state_dict
+
+    def set_state(self, run_key: str, path, state: DirectoryState, exit_code: int = None, host: str = None,
+                  message: str = None):
+        """Record the state of a directory. Entering TRANSFERRING counts as a new attempt."""
+        with self.lock, self.connection:
+            self.connection.execute("UPDATE directory SET state = ?, exit_code = ?, "
+                                    "attempt_count = attempt_count + ?, host = COALESCE(?, host), message = ?, "
+                                    "updated = ? WHERE run_key = ? AND path = ?",
+                                    (state.value, exit_code, 1 if state == DirectoryState.TRANSFERRING else 0, host,
+                                     message, time(), run_key, str(path)))
+
+    def get_entry_dict(self, run_key: str) -> dict:
+        """Return a dictionary mapping each path (as a string) of a run to its (DirectoryState, exit code, attempt
+        count, host, message).
+        """
+        with self.lock:
+            return {row[0]: (DirectoryState(row[1]), *row[2:]) for row in self.connection.execute(
+                "SELECT path, state, exit_code, attempt_count, host, message FROM directory WHERE run_key = ?",
+                (run_key,)
+            )}
+
+    def get_incomplete_path_list(self, run_key: str) -> list[str]:
+        """Return the paths of the directories of a run that are neither DONE nor SKIPPED."""
+        return [path for path, entry in self.get_entry_dict(run_key).items() if not entry[0].is_complete()]
+
+    def finish(self, run_key: str):
+        """Mark a run as finished, so the next run with the same key starts over."""
+        with self.lock, self.connection:
+            self.connection.execute("UPDATE run SET finished = ? WHERE run_key = ?", (time(), run_key))
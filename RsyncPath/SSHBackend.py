@@ -0,0 +1,18 @@
+# -------------------------------------------------------------------------------
+# SSHBackend.py
+#
+# -------------------------------------------------------------------------------
+
+from enum import Enum
+
+
+class SSHBackend(Enum):
+    """Simple Enum for the library used to run commands on the remote machine.
+
+    FABRIC runs them through a fabric Connection, which is only imported (along with invoke, paramiko and
+    cryptography) the first time a command is run. OPENSSH runs each command through the ssh program instead, so
+    none of those packages are imported, and shares the ControlMaster connection when SSH multiplexing is enabled.
+    """
+
+    FABRIC = 0
+    OPENSSH = 1
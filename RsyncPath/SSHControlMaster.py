@@ -0,0 +1,124 @@
+# -------------------------------------------------------------------------------
+# SSHControlMaster.py
+# Keep a single OpenSSH master connection open so that every rsync process can
+# reuse it instead of authenticating again.
+# -------------------------------------------------------------------------------
+
+from subprocess import run, DEVNULL, TimeoutExpired
+from tempfile import mkdtemp
+from pathlib import Path
+from logging import debug, error
+import shutil
+
+DEFAULT_CONTROL_PERSIST = 60
+DEFAULT_CONTROL_MASTER_TIMEOUT = 30
+
+
+class SSHControlMaster(object):
+    """Start an OpenSSH ControlMaster connection to a remote machine and generate the ssh options needed to share it.
+
+    The control socket is created in a private temporary directory, which is removed by stop().
+    """
+
+    def __init__(self, username, hostname, ssh_port, control_persist=DEFAULT_CONTROL_PERSIST):
+        """Construct the object. No connection is made until start() is called."""
+        self.username = username
+        self.hostname = hostname
+        self.ssh_port = ssh_port
+        self.control_persist = control_persist
+        self.control_directory: Path = None
+        self.is_running = False
+
+    def get_control_path(self) -> str:
+        """Return the ControlPath option used for the control socket. %C is expanded by ssh to a hash of the
+        connection.
+        """
+        return str(self.control_directory / "%C")
+
+    def get_ssh_option_list(self) -> list[str]:
+        """Return the options an ssh command needs to reuse the master connection."""
+        if not self.is_running:
+            return []
+        return ["-o", f"ControlPath={self.get_control_path()}", "-o", "ControlMaster=no"]
+
+    def get_destination(self) -> str:
+        """Return the user@hostname destination passed to ssh."""
+        return f"{self.username}@{self.hostname}"
+
+    def start(self) -> bool:
+        """Start the master connection in the background.
+
+        :returns True if the master connection is running. False otherwise, in which case ssh commands should
+        connect on their own.
+        """
+        if self.is_running:
+            return True
+
+        self.control_directory = Path(mkdtemp(prefix="rsync_path_"))
+        command_list = ["ssh", "-M", "-N", "-f",
+                        "-o", f"ControlPath={self.get_control_path()}",
+                        "-o", f"ControlPersist={self.control_persist}",
+                        "-o", "BatchMode=yes",
+                        "-p", str(self.ssh_port),
+                        self.get_destination()]
+        debug(f"SSHControlMaster.start(): Passing the following command list: {command_list}")
+        try:
+            result = run(command_list, stdin=DEVNULL, stdout=DEVNULL, stderr=DEVNULL,
+                         timeout=DEFAULT_CONTROL_MASTER_TIMEOUT)
+        except (OSError, TimeoutExpired) as exception:
+            error(f"SSHControlMaster.start(): Unable to start the master connection to {self.get_destination()}: "
+                  f"{exception}")
+            self.remove_control_directory()
+            return False
+
+        if result.returncode != 0:
+            error(f"SSHControlMaster.start(): Unable to start the master connection to {self.get_destination()}; "
+                  f"ssh returned {result.returncode}.")
+            self.remove_control_directory()
+            return False
+
+        self.is_running = True
+        debug(f"SSHControlMaster.start(): Started the master connection to {self.get_destination()}")
+        return True
+
+    def check(self) -> bool:
+        """Check whether the master connection is still running, since it exits once it was idle for
+        control_persist seconds or the connection was lost.
+        """
+        if not self.is_running:
+            return False
+
+        command_list = ["ssh", "-O", "check",
+                        "-o", f"ControlPath={self.get_control_path()}",
+                        "-p", str(self.ssh_port),
+                        self.get_destination()]
+        try:
+            result = run(command_list, stdin=DEVNULL, stdout=DEVNULL, stderr=DEVNULL,
+                         timeout=DEFAULT_CONTROL_MASTER_TIMEOUT)
+        except (OSError, TimeoutExpired):
+            return False
+        return result.returncode == 0
+
+    def stop(self):
+        """Close the master connection and remove its control socket."""
+        if not self.is_running:
+            return
+
+        command_list = ["ssh", "-O", "exit",
+                        "-o", f"ControlPath={self.get_control_path()}",
+                        "-p", str(self.ssh_port),
+                        self.get_destination()]
+        debug(f"SSHControlMaster.stop(): Passing the following command list: {command_list}")
+        try:
+            run(command_list, stdin=DEVNULL, stdout=DEVNULL, stderr=DEVNULL, timeout=DEFAULT_CONTROL_MASTER_TIMEOUT)
+        except (OSError, TimeoutExpired) as exception:
+            error(f"SSHControlMaster.stop(): Unable to stop the master connection to {self.get_destination()}: "
+                  f"{exception}")
+        self.is_running = False
+        self.remove_control_directory()
+
+    def remove_control_directory(self):
+        """Remove the temporary directory holding the control socket."""
+        if self.control_directory is not None:
+            shutil.rmtree(self.control_directory, ignore_errors=True)
+            self.control_directory = None
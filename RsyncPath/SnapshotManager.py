@@ -0,0 +1,220 @@
+# -------------------------------------------------------------------------------
+# SnapshotManager.py
+# Keep timestamped snapshots of the destination directories, hard-linked against
+# the previous snapshot with rsync --link-dest, along with a "latest" pointer and
+# a daily/weekly retention policy.
+# -------------------------------------------------------------------------------
+
+from datetime import datetime, timedelta
+from pathlib import Path
+from shlex import quote
+from logging import debug, error, info
+import subprocess
+
+from RsyncPath.Client import Client
+
+SNAPSHOT_NAME_FORMAT = "%Y-%m-%d_%H-%M-%S"
+INCOMPLETE_SNAPSHOT_SUFFIX = ".incomplete"
+DEFAULT_LATEST_LINK_NAME = "latest"
+DEFAULT_SNAPSHOT_KEEP_DAILY = 7
+DEFAULT_SNAPSHOT_KEEP_WEEKLY = 4
+
+
+def parse_snapshot_name(name: str):
+    """Return the time a snapshot was started from its directory name, or None if the name is not a snapshot."""
+    try:
+        return datetime.strptime(name, SNAPSHOT_NAME_FORMAT)
+    except ValueError:
+        return None
+
+
+def select_snapshots_to_keep(snapshot_name_list: list[str], keep_daily=DEFAULT_SNAPSHOT_KEEP_DAILY,
+                             keep_weekly=DEFAULT_SNAPSHOT_KEEP_WEEKLY):
+    """Apply the retention policy to a list of snapshot names.
+
+    The newest snapshot is always kept. Otherwise, the newest snapshot of each of the keep_daily most recent days
+    that have a snapshot is kept, along with the newest snapshot of each of the keep_weekly most recent ISO weeks.
+
+    :returns The set of snapshot names to keep.
+    """
+    snapshot_list = sorted(((parse_snapshot_name(name), name) for name in snapshot_name_list
+                            if parse_snapshot_name(name) is not None), reverse=True)
+    if not snapshot_list:
+        return set()
+
+    keep_set = {snapshot_list[0][1]}
+    seen_day_set = set()
+    seen_week_set = set()
+    for snapshot_time, name in snapshot_list:
+        day = snapshot_time.date()
+        if day not in seen_day_set and len(seen_day_set) < keep_daily:
+            keep_set.add(name)
+        seen_day_set.add(day)
+
+        week = snapshot_time.isocalendar()[:2]
+        if week not in seen_week_set and len(seen_week_set) < keep_weekly:
+            keep_set.add(name)
+        seen_week_set.add(week)
+    return keep_set
+
+
+class SnapshotManager(object):
+    """Manage the snapshots stored under a destination root path, on either the local or the remote machine.
+
+    Each run is copied into a new <timestamp>.incomplete directory, using the previous snapshot as rsync's
+    --link-dest so unchanged files are hard links instead of new copies. Once every directory has been copied,
+    complete() renames it to <timestamp>, points the latest symbolic link at it and removes the snapshots that the
+    retention policy does not keep. If a run fails, its incomplete snapshot is reused by the next run instead of
+    starting over.
+    """
+
+    def __init__(self, root_path: Path, client: Client, is_remote: bool,
+                 keep_daily=DEFAULT_SNAPSHOT_KEEP_DAILY,
+                 keep_weekly=DEFAULT_SNAPSHOT_KEEP_WEEKLY,
+                 latest_link_name=DEFAULT_LATEST_LINK_NAME):
+        """Construct the object. Nothing is read or changed until load() is called."""
+        self.root_path = Path(root_path)
+        self.client = client
+        self.is_remote = is_remote
+        self.keep_daily = keep_daily
+        self.keep_weekly = keep_weekly
+        self.latest_link_name = latest_link_name
+        self.snapshot_name_list: list[str] = []
+        self.incomplete_name_list: list[str] = []
+        self.latest_snapshot_name: str = None
+        self.snapshot_name: str = None
+
+    def run_command(self, command: str, operation: str):
+        """Run a shell command on the machine holding the snapshots.
+
+        :returns A tuple containing whether the command succeeded and its output.
+        """
+        if self.is_remote:
+            result = self.client.run_remote_command(command, operation, warn=True)
+            return result.ok, result.stdout
+
+        debug(f"SnapshotManager.run_command(): Running {command}")
+        result = subprocess.run([self.client.local_shell_name, "-c", command], capture_output=True, text=True)
+        if result.returncode != 0:
+            debug(f"SnapshotManager.run_command(): {command} returned {result.returncode}: {result.stderr}")
+        return result.returncode == 0, result.stdout
+
+    def load(self):
+        """Read the existing snapshots and the target of the latest link."""
+        command = (f"find {quote(str(self.root_path))} -mindepth 1 -maxdepth 1 "
+                   f"\\( -type d -o -type l \\) -printf '%f\\t%y\\t%l\\n' 2>/dev/null")
+        _, output = self.run_command(command, "list_snapshots")
+
+        self.snapshot_name_list = []
+        self.incomplete_name_list = []
+        self.latest_snapshot_name = None
+        for line in output.splitlines():
+            name, file_type, link_target = line.split("\t", 2)
+            if file_type == "l" and name == self.latest_link_name:
+                self.latest_snapshot_name = Path(link_target).name
+            elif file_type == "d" and parse_snapshot_name(name) is not None:
+                self.snapshot_name_list.append(name)
+            elif file_type == "d" and name.endswith(INCOMPLETE_SNAPSHOT_SUFFIX) and \
+                    parse_snapshot_name(name[:-len(INCOMPLETE_SNAPSHOT_SUFFIX)]) is not None:
+                self.incomplete_name_list.append(name)
+
+        self.snapshot_name_list.sort()
+        self.incomplete_name_list.sort()
+        if self.latest_snapshot_name not in self.snapshot_name_list:
+            self.latest_snapshot_name = self.snapshot_name_list[-1] if self.snapshot_name_list else None
+        debug(f"SnapshotManager.load(): Found {len(self.snapshot_name_list)} snapshot(s); the latest is "
+              f"{self.latest_snapshot_name}.")
+
+    def get_previous_snapshot_path(self):
+        """Return the path of the snapshot the new one is linked against, or None if there is none yet."""
+        return self.root_path / self.latest_snapshot_name if self.latest_snapshot_name is not None else None
+
+    def get_snapshot_path(self):
+        """Return the path of the snapshot being written."""
+        return self.root_path / f"{self.snapshot_name}{INCOMPLETE_SNAPSHOT_SUFFIX}"
+
+    def begin(self, create_directory=True):
+        """Choose the name of a new snapshot and, if create_directory is True, create its directory. The newest
+        incomplete snapshot left by a failed run is renamed and reused, since most of it is already copied.
+        """
+        self.load()
+        snapshot_time = datetime.now().replace(microsecond=0)
+        # Snapshot names have a resolution of one second, so a run started right after another one moves forward:
+        if self.snapshot_name_list:
+            snapshot_time = max(snapshot_time,
+                                parse_snapshot_name(self.snapshot_name_list[-1]) + timedelta(seconds=1))
+        self.snapshot_name = snapshot_time.strftime(SNAPSHOT_NAME_FORMAT)
+        if not create_directory:
+            return True
+
+        snapshot_path = quote(str(self.get_snapshot_path()))
+        if self.incomplete_name_list:
+            incomplete_path = quote(str(self.root_path / self.incomplete_name_list[-1]))
+            info(f"SnapshotManager.begin(): Resuming the incomplete snapshot {self.incomplete_name_list[-1]}")
+            is_successful, _ = self.run_command(f"mv -T {incomplete_path} {snapshot_path}", "resume_snapshot")
+        else:
+            is_successful, _ = self.run_command(f"mkdir -p {snapshot_path}", "create_snapshot")
+
+        if not is_successful:
+            error(f"SnapshotManager.begin(): Unable to create the snapshot directory {str(self.get_snapshot_path())}")
+        return is_successful
+
+    def link_previous_directory(self, path):
+        """Hard link a directory from the previous snapshot into the new one, for a directory that was not copied
+        this time, so that every snapshot stays complete.
+        """
+        previous_snapshot_path = self.get_previous_snapshot_path()
+        if previous_snapshot_path is None:
+            return False
+
+        source_path = quote(str(previous_snapshot_path / path))
+        destination_path = quote(str(self.get_snapshot_path() / path))
+        command = (f"if [ -d {source_path} ]; then rm -rf {destination_path} && "
+                   f"mkdir -p \"$(dirname {destination_path})\" && cp -al {source_path} {destination_path}; fi")
+        is_successful, _ = self.run_command(command, "link_snapshot_directory")
+        if not is_successful:
+            error(f"SnapshotManager.link_previous_directory(): Unable to link {str(path)} from "
+                  f"{str(previous_snapshot_path)}")
+        return is_successful
+
+    def complete(self):
+        """Rename the new snapshot to its final name, point the latest link at it and apply the retention policy.
+
+        :returns A list of the snapshots that were removed, or None if the snapshot could not be completed.
+        """
+        snapshot_path = quote(str(self.root_path / self.snapshot_name))
+        temporary_link_path = quote(str(self.root_path / f".{self.latest_link_name}.tmp"))
+        latest_link_path = quote(str(self.root_path / self.latest_link_name))
+        command = (f"mv -T {quote(str(self.get_snapshot_path()))} {snapshot_path} && "
+                   f"ln -sfn {quote(self.snapshot_name)} {temporary_link_path} && "
+                   f"mv -Tf {temporary_link_path} {latest_link_path}")
+        is_successful, _ = self.run_command(command, "complete_snapshot")
+        if not is_successful:
+            error(f"SnapshotManager.complete(): Unable to complete the snapshot {self.snapshot_name}")
+            return None
+
+        self.snapshot_name_list.append(self.snapshot_name)
+        self.latest_snapshot_name = self.snapshot_name
+        info(f"SnapshotManager.complete(): Completed the snapshot {self.snapshot_name}")
+        return self.prune()
+
+    def prune(self):
+        """Remove the snapshots that the retention policy does not keep.
+
+        :returns A list of the removed snapshot names.
+        """
+        keep_set = select_snapshots_to_keep(self.snapshot_name_list, self.keep_daily, self.keep_weekly)
+        keep_set.add(self.latest_snapshot_name)
+        removed_name_list = [name for name in self.snapshot_name_list if name not in keep_set]
+        if not removed_name_list:
+            return []
+
+        path_string = " ".join(quote(str(self.root_path / name)) for name in removed_name_list)
+        is_successful, _ = self.run_command(f"rm -rf -- {path_string}", "prune_snapshots")
+        if not is_successful:
+            error(f"SnapshotManager.prune(): Unable to remove every snapshot in {removed_name_list}")
+            return []
+
+        self.snapshot_name_list = [name for name in self.snapshot_name_list if name in keep_set]
+        info(f"SnapshotManager.prune(): Removed {len(removed_name_list)} snapshot(s): {removed_name_list}")
+        return removed_name_list
@@ -0,0 +1,141 @@
+# -------------------------------------------------------------------------------
+# StripeScheduler.py
+# Spread the directories of a striped pull across the source machines that hold
+# them, weighted by the throughput of each machine, and move the directories of
+# a machine that fails to the others.
+# -------------------------------------------------------------------------------
+
+from logging import debug
+
+
+class StripeHost(object):
+    """A source machine of a striped pull: the directories it holds, the ones queued on it and its estimated load."""
+
+    def __init__(self, host_key: str, throughput, path_set: set):
+        """Construct the object."""
+        self.host_key = host_key
+        self.throughput = throughput
+        self.path_set = path_set
+        self.queue_list: list = []
+        self.running_count = 0
+        # Estimated seconds of work queued on or running on the machine:
+        self.load = 0.0
+        self.is_failed = False
+
+
+class StripeScheduler(object):
+    """Decide which source machine copies each directory of a striped pull.
+
+    Every directory is first queued on the machine holding it that would finish it earliest, given the directories
+    already queued there, its size and the throughput of the machine, starting with the largest directories. A
+    machine that runs out of work takes the last queued directory of the most loaded machine that it also holds, so
+    that wrong estimates even out. When a machine fails, its queued directories and the one that failed are queued on
+    the remaining machines the same way.
+
+    Unknown sizes and throughputs are replaced by the average of the known ones. The object is not thread-safe; the
+    caller holds a lock (or runs on an event loop) around each call.
+    """
+
+    def __init__(self, path_size_dict: dict):
+        """Construct the object from the size in bytes of each directory, None if it is not known."""
+        known_size_list = [size for size in path_size_dict.values() if size is not None]
+        default_size = sum(known_size_list) / len(known_size_list) if known_size_list else 1
+        self.path_size_dict = {path: max(1, size if size is not None else default_size)
+                               for path, size in path_size_dict.items()}
+        self.host_dict: dict[str, StripeHost] = {}
+        self.reassignment_count = 0
+
+    def add_host(self, host_key: str, throughput, path_list: list):
+        """Add a source machine, its throughput in bytes per second (None if unknown) and the directories it holds."""
+        self.host_dict[host_key] = StripeHost(host_key, throughput, set(path_list))
+
+    def assign(self) -> list:
+        """Queue every directory on a machine, largest first.
+
+        :returns The directories that no machine holds.
+        """
+        known_throughput_list = [host.throughput for host in self.host_dict.values() if host.throughput]
+        default_throughput = sum(known_throughput_list) / len(known_throughput_list) if known_throughput_list else 1
+        for host in self.host_dict.values():
+            if not host.throughput:
+                host.throughput = default_throughput
+
+        path_list = sorted(self.path_size_dict, key=lambda path: self.path_size_dict[path], reverse=True)
+        return [path for path in path_list if not self.queue_path(path)]
+
+    def queue_path(self, path) -> bool:
+        """Queue a directory on the machine that would finish it earliest, returning False if no machine can."""
+        host_list = [host for host in self.host_dict.values() if not host.is_failed and path in host.path_set]
+        if not host_list:
+            return False
+        host = min(host_list, key=lambda candidate: (candidate.load + self.get_duration(candidate, path)))
+        host.queue_list.append(path)
+        host.load += self.get_duration(host, path)
+        debug(f"StripeScheduler.queue_path(): Queued {str(path)} on {host.host_key}.")
+        return True
+
+    def get_duration(self, host: StripeHost, path) -> float:
+        return self.path_size_dict[path] / host.throughput
+
+    def take(self, host_key: str):
+        """Return the next directory a machine should copy, or None if it has nothing to do right now."""
+        host = self.host_dict[host_key]
+        if host.is_failed:
+            return None
+        if host.queue_list:
+            path = host.queue_list.pop(0)
+        else:
+            path = self.steal(host)
+            if path is None:
+                return None
+        host.running_count += 1
+        return path
+
+    def steal(self, host: StripeHost):
+        """Move the last queued directory of the most loaded machine that host also holds onto host."""
+        candidate_list = [candidate for candidate in self.host_dict.values()
+                          if candidate is not host and any(path in host.path_set for path in candidate.queue_list)]
+        if not candidate_list:
+            return None
+        victim = max(candidate_list, key=lambda candidate: candidate.load)
+        path = next(path for path in reversed(victim.queue_list) if path in host.path_set)
+        victim.queue_list.remove(path)
+        victim.load = max(0.0, victim.load - self.get_duration(victim, path))
+        host.load += self.get_duration(host, path)
+        debug(f"StripeScheduler.steal(): {host.host_key} took {str(path)} from {victim.host_key}.")
+        return path
+
+    def finish(self, host_key: str, path):
+        """Record that a machine finished copying a directory, successfully or not."""
+        host = self.host_dict[host_key]
+        host.running_count = max(0, host.running_count - 1)
+        host.load = max(0.0, host.load - self.get_duration(host, path))
+
+    def fail_host(self, host_key: str, path=None) -> list:
+        """Stop using a machine that failed while copying path (if passed), and queue that directory and the ones
+        queued on the machine on the others.
+
+        :returns The directories that no remaining machine holds.
+        """
+        host = self.host_dict[host_key]
+        if path is not None:
+            host.running_count = max(0, host.running_count - 1)
+        pending_path_list = ([path] if path is not None else []) + host.queue_list
+        host.queue_list = []
+        host.load = 0.0
+        host.is_failed = True
+
+        unassigned_path_list = []
+        for pending_path in pending_path_list:
+            if self.queue_path(pending_path):
+                self.reassignment_count += 1
+            else:
+                unassigned_path_list.append(pending_path)
+        return unassigned_path_list
+
+    def is_host_failed(self, host_key: str) -> bool:
+        return self.host_dict[host_key].is_failed
+
+    def is_finished(self) -> bool:
+        """Check whether every directory was copied, so no machine will get any more work."""
+        return all(not host.queue_list and host.running_count == 0 for host in self.host_dict.values())
@@ -0,0 +1,18 @@
+# -------------------------------------------------------------------------------
+# ThresholdStrategy.py
+#
+# -------------------------------------------------------------------------------
+
+from enum import Enum
+
+
+class ThresholdStrategy(Enum):
+    """Simple Enum for the method used to decide whether a directory is safe to copy.
+
+    DIRECTORY_SIZE compares the total size of the source and destination directories against the copy threshold
+    limit. RSYNC_DELTA runs rsync with --dry-run once and checks how many files it would delete and how much data it
+    would transfer against the configured limits.
+    """
+
+    DIRECTORY_SIZE = 0
+    RSYNC_DELTA = 1
@@ -0,0 +1,19 @@
+# -------------------------------------------------------------------------------
+# WatchBackend.py
+#
+# -------------------------------------------------------------------------------
+
+from enum import Enum
+
+
+class WatchBackend(Enum):
+    """Simple Enum for how RsyncPath.watch() notices changes to the local source directories.
+
+    INOTIFY asks the Linux kernel to report every change as it happens, which needs one inotify watch per directory.
+    POLLING walks every source directory each poll interval and compares it with the previous walk. AUTO uses
+    INOTIFY, and POLLING if inotify is not available or runs out of watches.
+    """
+
+    AUTO = 0
+    INOTIFY = 1
+    POLLING = 2
@@ -3,9 +3,6 @@
 # Created by Ulysses Carlos on 10/05/2023 at 11:13 PM
 #
 # __init__.py
-# Hopefully this helps the relative import mess:
+# Every module imports the others through the RsyncPath package, so importing
+# the package does nothing on its own.
 # -------------------------------------------------------------------------------
-
-import os
-import sys
-sys.path.append(os.path.dirname(os.path.realpath(__file__)))
@@ -0,0 +1,618 @@
+#!/usr/bin/env python3
+# -------------------------------------------------------------------------------
+# BenchmarkRsyncPath.py
+# Time RsyncPath against synthetic directory trees, either with a localhost sshd
+# or with in-process stand-ins for the SSH connection and the rsync binary, and
+# write the timings of each phase to a JSON file.
+# -------------------------------------------------------------------------------
+from pathlib import Path
+from time import monotonic, time
+from tempfile import mkdtemp
+from threading import Thread, Lock
+from io import StringIO
+from RsyncPath.RsyncPath import RsyncPath
+from RsyncPath.RemoteConnection import RemoteConnection, RemoteCommandResult, RemoteCommandError, RemoteProcess
+from RsyncPath.OSType import OSType
+from RsyncPath.ProbeStrategy import ProbeStrategy
+from RsyncPath.ThresholdStrategy import ThresholdStrategy
+from RsyncPath.TransferDirection import TransferDirection
+import argparse
+import getpass
+import json
+import logging
+import os
+import platform
+import random
+import re
+import shutil
+import socket
+import stat
+import subprocess
+import sys
+
+FAKE_RSYNC_ARGUMENT = "--fake-rsync"
+FAKE_SSH_BANNER = b"SSH-2.0-BenchmarkRsyncPath\r\n"
+TREE_NAME_LIST = ["many_small_files", "few_large_files", "deep_nesting"]
+REMOTE_HOST_PATTERN = re.compile(r"^[^/:]+@[^/:]+:")
+FAKE_RSYNC_VERSION_OUTPUT = ("rsync  version 3.2.7  protocol version 31\n"
+                             "Compress list:\n"
+                             "    zstd lz4 zlibx zlib none\n")
+
+
+class LocalConnection(RemoteConnection):
+    """Stand-in for a RemoteConnection that runs every command on this machine with the requested shell.
+
+    It records the number of commands and the time spent running them, and raises RemoteCommandError on a non-zero
+    exit code unless warn is True, like RemoteConnection.run().
+    """
+
+    def __init__(self):
+        """Construct the object."""
+        super().__init__(getpass.getuser(), "localhost", 22)
+        self.command_count = 0
+        self.command_time = 0.0
+        self.lock = Lock()
+
+    def is_connected(self):
+        return True
+
+    def run(self, command, shell="/bin/bash", hide=True, warn=False, in_stream=None):
+        """Run a command locally and return a RemoteCommandResult."""
+        start_time = monotonic()
+        process = subprocess.run([shell, "-c", command], capture_output=True, text=True,
+                                 input=in_stream.read() if isinstance(in_stream, StringIO) else None)
+        with self.lock:
+            self.command_count += 1
+            self.command_time += monotonic() - start_time
+
+        result = RemoteCommandResult(command, process.stdout, process.stderr, process.returncode)
+        if process.returncode != 0 and not warn:
+            raise RemoteCommandError(result)
+        return result
+
+    def start_process(self, command, shell="/bin/bash"):
+        """Start a command locally, counting it as a single command."""
+        with self.lock:
+            self.command_count += 1
+        process = subprocess.Popen([shell, "-c", command], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL)
+        return RemoteProcess(process.stdin, process.stdout, process.wait)
+
+
+class FakeSSHServer(object):
+    """A TCP listener on localhost that sends an SSH banner to every connection, so host probing has a real target."""
+
+    def __init__(self):
+        """Construct the object and start listening on a free port."""
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.bind(("127.0.0.1", 0))
+        self.server_socket.listen(64)
+        self.port = self.server_socket.getsockname()[1]
+        self.thread = Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def serve(self):
+        while True:
+            try:
+                connection, _ = self.server_socket.accept()
+            except OSError:
+                return
+            try:
+                connection.sendall(FAKE_SSH_BANNER)
+            except OSError:
+                pass
+            finally:
+                connection.close()
+
+    def close(self):
+        self.server_socket.close()
+
+
+def get_unused_port():
+    """Return a localhost port that nothing is listening on, so it refuses connections."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as unused_socket:
+        unused_socket.bind(("127.0.0.1", 0))
+        return unused_socket.getsockname()[1]
+
+
+def write_random_file(file_path: Path, size_in_bytes: int, random_generator: random.Random):
+    """Write a file of the given size with random contents, so rsync's compression has real work to do."""
+    chunk_size = 1 << 20
+    with open(file_path, "wb") as output_file:
+        remaining_size = size_in_bytes
+        while remaining_size > 0:
+            current_size = min(chunk_size, remaining_size)
+            output_file.write(random_generator.randbytes(current_size))
+            remaining_size -= current_size
+
+
+def create_synthetic_trees(root_path: Path, scale: float, seed: int):
+    """Create the benchmark trees under root_path.
+
+    :returns A dictionary mapping each tree name to its number of files and size in bytes.
+    """
+    random_generator = random.Random(seed)
+    tree_dict = {}
+
+    # Many small files spread over a few directories:
+    tree_path = root_path / "many_small_files"
+    file_count = max(1, int(5000 * scale))
+    total_size = 0
+    for index in range(file_count):
+        directory_path = tree_path / f"directory_{index % 50:02d}"
+        directory_path.mkdir(parents=True, exist_ok=True)
+        size_in_bytes = random_generator.randint(512, 8192)
+        write_random_file(directory_path / f"file_{index:05d}.bin", size_in_bytes, random_generator)
+        total_size += size_in_bytes
+    tree_dict["many_small_files"] = {"file_count": file_count, "size_in_bytes": total_size}
+
+    # A few large files:
+    tree_path = root_path / "few_large_files"
+    tree_path.mkdir(parents=True, exist_ok=True)
+    file_count = 4
+    size_in_bytes = max(1 << 20, int((32 << 20) * scale))
+    for index in range(file_count):
+        write_random_file(tree_path / f"large_{index}.bin", size_in_bytes, random_generator)
+    tree_dict["few_large_files"] = {"file_count": file_count, "size_in_bytes": file_count * size_in_bytes}
+
+    # A single deep chain of directories with a few files at each level:
+    directory_path = root_path / "deep_nesting"
+    depth = max(1, int(128 * scale))
+    total_size = 0
+    for level in range(depth):
+        directory_path = directory_path / f"level_{level:03d}"
+        directory_path.mkdir(parents=True, exist_ok=True)
+        for index in range(3):
+            size_in_bytes = random_generator.randint(256, 4096)
+            write_random_file(directory_path / f"file_{index}.bin", size_in_bytes, random_generator)
+            total_size += size_in_bytes
+    tree_dict["deep_nesting"] = {"file_count": depth * 3, "size_in_bytes": total_size}
+
+    return tree_dict
+
+
+def modify_synthetic_trees(root_path: Path, seed: int):
+    """Change a small part of every tree between iterations, so later runs transfer a realistic delta."""
+    random_generator = random.Random(seed)
+    for tree_name in TREE_NAME_LIST:
+        file_path_list = sorted(path for path in (root_path / tree_name).rglob("*") if path.is_file())
+        for file_path in random_generator.sample(file_path_list, max(1, len(file_path_list) // 100)):
+            write_random_file(file_path, file_path.stat().st_size, random_generator)
+
+
+def create_fake_rsync(bin_path: Path):
+    """Create an rsync executable in bin_path that runs this file as the rsync stand-in."""
+    bin_path.mkdir(parents=True, exist_ok=True)
+    rsync_path = bin_path / "rsync"
+    rsync_path.write_text(f"#!/bin/sh\nexec \"{sys.executable}\" \"{os.path.realpath(__file__)}\" "
+                          f"{FAKE_RSYNC_ARGUMENT} \"$@\"\n")
+    rsync_path.chmod(rsync_path.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+
+def run_fake_rsync(argument_list: list[str]):
+    """Mirror a directory the way rsync -aL --delete would, on this machine, and print the output that RsyncPath
+    asks rsync for (--out-format and --info=progress2,stats2).
+
+    The user@hostname: prefix of a remote path is removed, so both sides are local directories. Unchanged files
+    found in a --link-dest directory are hard-linked instead of copied. With --files-from, only the listed files
+    and directories are copied, keeping their relative paths. --version prints the version of a recent rsync, and the compression
+    options are ignored.
+    """
+    if "--version" in argument_list:
+        print(FAKE_RSYNC_VERSION_OUTPUT, end="")
+        return 0
+
+    out_format_prefix = ""
+    link_dest_path = None
+    files_from_path = None
+    is_from0 = False
+    is_dry_run = False
+    enable_delete = False
+    path_list = []
+    index = 0
+    while index < len(argument_list):
+        argument = argument_list[index]
+        if argument == "-e":
+            index += 1
+        elif argument.startswith("--out-format="):
+            out_format_prefix = argument[len("--out-format="):].split("%i")[0]
+        elif argument in ("--dry-run", "-n"):
+            is_dry_run = True
+        elif argument == "--delete":
+            enable_delete = True
+        elif argument.startswith("--link-dest="):
+            link_dest_path = Path(argument[len("--link-dest="):])
+        elif argument.startswith("--files-from="):
+            files_from_path = Path(argument[len("--files-from="):])
+        elif argument == "--from0":
+            is_from0 = True
+        elif not argument.startswith("-"):
+            path_list.append(REMOTE_HOST_PATTERN.sub("", argument))
+        index += 1
+
+    source_path, destination_path = Path(path_list[-2]), Path(path_list[-1])
+    if files_from_path is not None:
+        return run_fake_rsync_files_from(files_from_path, is_from0, source_path, destination_path, out_format_prefix,
+                                         is_dry_run)
+    if not str(path_list[-2]).endswith("/"):
+        destination_path = destination_path / source_path.name
+        if link_dest_path is not None:
+            link_dest_path = link_dest_path / source_path.name
+
+    start_time = monotonic()
+    file_count = 0
+    total_size = 0
+    transferred_count = 0
+    transferred_size = 0
+    created_count = 0
+    deleted_count = 0
+    source_name_set = set()
+    for directory_path, directory_name_list, file_name_list in os.walk(source_path, followlinks=True):
+        relative_directory = Path(directory_path).relative_to(source_path)
+        source_name_set.add(str(relative_directory))
+        if not is_dry_run:
+            (destination_path / relative_directory).mkdir(parents=True, exist_ok=True)
+        for file_name in file_name_list:
+            relative_path = relative_directory / file_name
+            source_name_set.add(str(relative_path))
+            source_stat = os.stat(source_path / relative_path)
+            file_count += 1
+            total_size += source_stat.st_size
+            try:
+                destination_stat = os.stat(destination_path / relative_path)
+                itemized_changes = ">f.st......"
+            except FileNotFoundError:
+                destination_stat = None
+                itemized_changes = ">f+++++++++"
+                created_count += 1
+            if destination_stat is not None and destination_stat.st_size == source_stat.st_size and \
+                    int(destination_stat.st_mtime) == int(source_stat.st_mtime):
+                continue
+            if destination_stat is None and link_dest_path is not None:
+                try:
+                    link_stat = os.stat(link_dest_path / relative_path)
+                except FileNotFoundError:
+                    link_stat = None
+                if link_stat is not None and link_stat.st_size == source_stat.st_size and \
+                        int(link_stat.st_mtime) == int(source_stat.st_mtime):
+                    if not is_dry_run:
+                        os.link(link_dest_path / relative_path, destination_path / relative_path)
+                    continue
+            if not is_dry_run:
+                shutil.copy2(source_path / relative_path, destination_path / relative_path)
+            transferred_count += 1
+            transferred_size += source_stat.st_size
+            print(f"{out_format_prefix}{itemized_changes} {source_stat.st_size} {str(relative_path)}")
+
+    if enable_delete and destination_path.is_dir():
+        for directory_path, directory_name_list, file_name_list in os.walk(destination_path, topdown=False):
+            relative_directory = Path(directory_path).relative_to(destination_path)
+            for name in file_name_list + directory_name_list:
+                relative_path = relative_directory / name
+                if str(relative_path) in source_name_set:
+                    continue
+                print(f"{out_format_prefix}*deleting 0 {str(relative_path)}")
+                deleted_count += 1
+                if not is_dry_run:
+                    full_path = destination_path / relative_path
+                    if full_path.is_dir() and not full_path.is_symlink():
+                        shutil.rmtree(full_path)
+                    else:
+                        full_path.unlink()
+
+    elapsed_time = max(monotonic() - start_time, 1e-6)
+    print(f"{transferred_size:>15,} 100%    0.00kB/s    0:00:00 (xfr#{transferred_count}, to-chk=0/{file_count})",
+          end="\r")
+    print()
+    print(f"Number of files: {file_count:,}")
+    print(f"Number of created files: {created_count:,}")
+    print(f"Number of deleted files: {deleted_count:,}")
+    print(f"Number of regular files transferred: {transferred_count:,}")
+    print(f"Total file size: {total_size:,} bytes")
+    print(f"Total transferred file size: {transferred_size:,} bytes")
+    print(f"Literal data: {transferred_size:,} bytes")
+    print("Matched data: 0 bytes")
+    print(f"Total bytes sent: {transferred_size:,}")
+    print("Total bytes received: 0")
+    print()
+    print(f"sent {transferred_size:,} bytes  received 0 bytes  {transferred_size / elapsed_time:,.2f} bytes/sec")
+    print(f"total size is {total_size:,}  speedup is {total_size / max(transferred_size, 1):,.2f}")
+    return 0
+
+
+def run_fake_rsync_files_from(files_from_path: Path, is_from0: bool, source_path: Path, destination_path: Path,
+                              out_format_prefix: str, is_dry_run: bool):
+    """Copy the files listed in a --files-from list from source_path to the same relative path under
+    destination_path, printing the same output as run_fake_rsync().
+    """
+    relative_path_list = []
+    for relative_path in files_from_path.read_text().split("\0" if is_from0 else "\n"):
+        if not relative_path:
+            continue
+        if not (source_path / relative_path).is_dir():
+            relative_path_list.append(relative_path)
+            continue
+        # A listed directory is copied with its contents, as with -r:
+        for directory_path, _, file_name_list in os.walk(source_path / relative_path, followlinks=True):
+            relative_directory = Path(directory_path).relative_to(source_path)
+            relative_path_list.extend(str(relative_directory / file_name) for file_name in file_name_list)
+    total_size = 0
+    for relative_path in relative_path_list:
+        source_stat = os.stat(source_path / relative_path)
+        total_size += source_stat.st_size
+        if not is_dry_run:
+            (destination_path / relative_path).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(source_path / relative_path, destination_path / relative_path)
+        print(f"{out_format_prefix}>f.st...... {source_stat.st_size} {relative_path}")
+
+    print(f"{total_size:>15,} 100%    0.00kB/s    0:00:00 (xfr#{len(relative_path_list)}, "
+          f"to-chk=0/{len(relative_path_list)})", end="\r")
+    print()
+    print(f"Number of files: {len(relative_path_list):,}")
+    print(f"Number of regular files transferred: {len(relative_path_list):,}")
+    print(f"Total file size: {total_size:,} bytes")
+    print(f"Total transferred file size: {total_size:,} bytes")
+    print(f"Total bytes sent: {total_size:,}")
+    print("Total bytes received: 0")
+    print()
+    print(f"total size is {total_size:,}  speedup is 1.00")
+    return 0
+
+
+class PhaseTimer(object):
+    """Accumulate the time spent in the metadata and threshold phase of a RsyncPath object, by wrapping the methods
+    that run it.
+    """
+
+    def __init__(self, rsync_path: RsyncPath):
+        """Construct the object and wrap the methods of rsync_path."""
+        self.metadata_time = 0.0
+        self.lock = Lock()
+        self.wrap_method(rsync_path, "get_remote_metadata_dict")
+        self.wrap_method(rsync_path, "verify_directory")
+
+    def wrap_method(self, rsync_path: RsyncPath, method_name: str):
+        method = getattr(rsync_path, method_name)
+
+        def timed_method(*args, **kwargs):
+            start_time = monotonic()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self.metadata_time += monotonic() - start_time
+
+        setattr(rsync_path, method_name, timed_method)
+
+
+def create_rsync_path(argument_dict: dict, source_root_path: Path, destination_root_path: Path,
+                      hostname_list: list[dict]):
+    """Create the RsyncPath object that is benchmarked. Host selection is deferred so that it can be timed."""
+    username = argument_dict["ssh_username"]
+    is_local_to_remote = argument_dict["direction"] == "local-to-remote"
+    source_dict = {
+        "source_username": None if is_local_to_remote else username,
+        "source_machine_ip_list": None if is_local_to_remote else hostname_list,
+        "source_machine_root_path": source_root_path,
+        "source_machine_directory_list": TREE_NAME_LIST
+    }
+    destination_dict = {
+        "destination_username": username if is_local_to_remote else None,
+        "destination_machine_ip_list": hostname_list if is_local_to_remote else None,
+        "destination_machine_root_path": destination_root_path,
+        "destination_machine_directory_list": None
+    }
+    threshold_dict = {
+        "enable_copy_threshold": True,
+        "copy_threshold_limit": 85.0,
+        "enable_directory_size_cache": argument_dict["enable_directory_size_cache"],
+        "directory_size_cache_path": argument_dict["work_path"] / "directory_size.sqlite3",
+        "threshold_strategy": ThresholdStrategy[argument_dict.get("threshold_strategy", "directory-size")
+                                                .replace("-", "_").upper()]
+    }
+    connection_dict = {
+        "enable_concurrent_host_probing": True,
+        "host_probe_strategy": ProbeStrategy.SSH_BANNER,
+        "defer_host_selection": True,
+        "enable_remote_agent": argument_dict.get("enable_remote_agent", False),
+        "remote_agent_python_path": sys.executable if not argument_dict["use_sshd"] else "python3"
+    }
+    transfer_dict = {
+        "max_parallel_transfers": argument_dict["max_parallel_transfers"],
+        "enable_ssh_multiplexing": argument_dict["use_sshd"],
+        "enable_snapshot_mode": argument_dict.get("enable_snapshot_mode", False),
+        "enable_file_manifest": argument_dict.get("enable_file_manifest", False),
+        "file_manifest_path": argument_dict["work_path"] / "manifests",
+        "bandwidth_limit": argument_dict.get("bandwidth_limit", None),
+        "enable_directory_splitting": argument_dict.get("split_directory_min_size") is not None,
+        "split_directory_min_size": argument_dict.get("split_directory_min_size")
+    }
+    transfer_direction = (TransferDirection.COPY_FROM_LOCAL_TO_REMOTE if is_local_to_remote
+                          else TransferDirection.COPY_FROM_REMOTE_TO_LOCAL)
+    return RsyncPath(source_dict, destination_dict, threshold_dict, transfer_direction, False, connection_dict,
+                     transfer_dict)
+
+
+def run_iteration(argument_dict: dict, source_root_path: Path, destination_root_path: Path,
+                  hostname_list: list[dict]):
+    """Run RsyncPath once and return the timings of each phase in seconds."""
+    rsync_path = create_rsync_path(argument_dict, source_root_path, destination_root_path, hostname_list)
+    phase_timer = PhaseTimer(rsync_path)
+
+    start_time = monotonic()
+    rsync_path.ssh_client = rsync_path.select_client()
+    host_selection_time = monotonic() - start_time
+
+    connection = None
+    if not argument_dict["use_sshd"]:
+        connection = LocalConnection()
+        rsync_path.ssh_client.ssh_connection = connection
+
+    start_time = monotonic()
+    result_dict = rsync_path.run()
+    run_time = monotonic() - start_time
+
+    directory_dict = {
+        str(path): {
+            "exit_code": result.exit_code,
+            "elapsed_time": result.elapsed_time,
+            "transferred_file_count": result.transferred_file_count,
+            "transferred_file_bytes": result.transferred_file_bytes,
+            "deleted_file_count": result.deleted_file_count,
+            "compression": str(result.compression_choice) if result.compression_choice is not None else None
+        }
+        for path, result in result_dict.items()
+    }
+    return {
+        "host_selection_time": host_selection_time,
+        "metadata_and_threshold_time": phase_timer.metadata_time,
+        "transfer_time": sum(result.elapsed_time or 0.0 for result in result_dict.values()),
+        "run_time": run_time,
+        "total_time": host_selection_time + run_time,
+        "remote_command_count": connection.command_count if connection else None,
+        "remote_command_time": connection.command_time if connection else None,
+        "directory_dict": directory_dict
+    }
+
+
+def get_git_revision():
+    """Return the commit of the checkout being benchmarked, or None if it is not a git checkout."""
+    try:
+        result = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=Path(__file__).resolve().parent)
+    except OSError:
+        return None
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def run_benchmark(argument_dict: dict):
+    """Create the synthetic trees, run every iteration and return the report."""
+    work_path: Path = argument_dict["work_path"]
+    local_root_path = work_path / "local"
+    remote_root_path = work_path / "remote"
+    source_root_path = local_root_path if argument_dict["direction"] == "local-to-remote" else remote_root_path
+    destination_root_path = remote_root_path if argument_dict["direction"] == "local-to-remote" else local_root_path
+    source_root_path.mkdir(parents=True, exist_ok=True)
+    destination_root_path.mkdir(parents=True, exist_ok=True)
+
+    start_time = monotonic()
+    tree_dict = create_synthetic_trees(source_root_path, argument_dict["scale"], argument_dict["seed"])
+    tree_creation_time = monotonic() - start_time
+
+    fake_ssh_server = None
+    if argument_dict["use_sshd"]:
+        hostname_list = [{"username": argument_dict["ssh_username"], "hostname": argument_dict["ssh_hostname"],
+                          "ssh_port": argument_dict["ssh_port"], "os_type": OSType.POSIX}]
+    else:
+        fake_ssh_server = FakeSSHServer()
+        create_fake_rsync(work_path / "bin")
+        os.environ["PATH"] = f"{str(work_path / 'bin')}{os.pathsep}{os.environ.get('PATH', '')}"
+        # The first machine refuses connections, so host selection has to fall through to the second one:
+        hostname_list = [{"username": argument_dict["ssh_username"], "hostname": "127.0.0.1",
+                          "ssh_port": get_unused_port(), "os_type": OSType.POSIX},
+                         {"username": argument_dict["ssh_username"], "hostname": "127.0.0.1",
+                          "ssh_port": fake_ssh_server.port, "os_type": OSType.POSIX}]
+
+    iteration_list = []
+    try:
+        for iteration in range(argument_dict["iterations"]):
+            if iteration > 0:
+                modify_synthetic_trees(source_root_path, argument_dict["seed"] + iteration)
+            iteration_result = run_iteration(argument_dict, source_root_path, destination_root_path, hostname_list)
+            iteration_result["iteration"] = iteration
+            iteration_list.append(iteration_result)
+            logging.info(f"Iteration {iteration}: total {iteration_result['total_time']:.3f}s, "
+                         f"host selection {iteration_result['host_selection_time']:.3f}s, "
+                         f"metadata/threshold {iteration_result['metadata_and_threshold_time']:.3f}s, "
+                         f"transfer {iteration_result['transfer_time']:.3f}s")
+    finally:
+        if fake_ssh_server is not None:
+            fake_ssh_server.close()
+
+    return {
+        "format_version": 1,
+        "timestamp": time(),
+        "git_revision": get_git_revision(),
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "parameter_dict": {key: str(value) if isinstance(value, Path) else value
+                           for key, value in argument_dict.items()},
+        "tree_dict": tree_dict,
+        "tree_creation_time": tree_creation_time,
+        "iteration_list": iteration_list
+    }
+
+
+# Now run the damn thing.
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == FAKE_RSYNC_ARGUMENT:
+        sys.exit(run_fake_rsync(sys.argv[2:]))
+
+    parser = argparse.ArgumentParser(description="Benchmark RsyncPath against synthetic directory trees.")
+    parser.add_argument("--output", help="JSON file the results are written to.", default="bench_output.json")
+    parser.add_argument("--iterations", help="Number of runs. Every run after the first copies a small delta.",
+                        type=int, default=3)
+    parser.add_argument("--scale", help="Multiplier for the number and size of the synthetic files.", type=float,
+                        default=1.0)
+    parser.add_argument("--seed", help="Seed for the synthetic file contents.", type=int, default=0)
+    parser.add_argument("--direction", choices=["local-to-remote", "remote-to-local"], default="local-to-remote")
+    parser.add_argument("--max-parallel-transfers", type=int, default=1)
+    parser.add_argument("--enable-directory-size-cache", action="store_true")
+    parser.add_argument("--enable-snapshot-mode", action="store_true")
+    parser.add_argument("--enable-file-manifest", help="Skip unchanged directories and copy only the changed files "
+                                                       "of the others, using the file manifest of the last run.",
+                        action="store_true")
+    parser.add_argument("--bandwidth-limit", help="Total bandwidth of the rsync processes in KiB per second.",
+                        type=int, default=None)
+    parser.add_argument("--split-directory-min-size", help="Copy the directories of at least this many bytes with "
+                                                           "several rsync processes each.", type=int, default=None)
+    parser.add_argument("--threshold-strategy", choices=["directory-size", "rsync-delta"], default="directory-size")
+    parser.add_argument("--enable-remote-agent", help="Answer the metadata queries with the remote agent.",
+                        action="store_true")
+    parser.add_argument("--work-directory", help="Directory the trees are created in. A temporary directory is "
+                                                 "created and removed by default.")
+    parser.add_argument("--ssh-hostname", help="Benchmark against a real sshd and rsync on this host (such as "
+                                               "localhost) instead of the in-process stand-ins.")
+    parser.add_argument("--ssh-port", type=int, default=22)
+    parser.add_argument("--ssh-username", default=getpass.getuser())
+    parser.add_argument("--debug-mode", help="Enable Debug Mode.", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug_mode else logging.WARNING)
+
+    work_path = Path(args.work_directory) if args.work_directory else Path(mkdtemp(prefix="rsync_path_benchmark_"))
+    argument_dict = {
+        "iterations": args.iterations,
+        "scale": args.scale,
+        "seed": args.seed,
+        "direction": args.direction,
+        "max_parallel_transfers": args.max_parallel_transfers,
+        "enable_directory_size_cache": args.enable_directory_size_cache,
+        "enable_snapshot_mode": args.enable_snapshot_mode,
+        "enable_file_manifest": args.enable_file_manifest,
+        "bandwidth_limit": args.bandwidth_limit,
+        "split_directory_min_size": args.split_directory_min_size,
+        "threshold_strategy": args.threshold_strategy,
+        "enable_remote_agent": args.enable_remote_agent,
+        "work_path": work_path,
+        "use_sshd": args.ssh_hostname is not None,
+        "ssh_hostname": args.ssh_hostname,
+        "ssh_port": args.ssh_port,
+        "ssh_username": args.ssh_username
+    }
+
+    try:
+        report = run_benchmark(argument_dict)
+    finally:
+        if args.work_directory is None:
+            shutil.rmtree(work_path, ignore_errors=True)
+
+    with open(args.output, "w") as output_file:
+        json.dump(report, output_file, indent=4)
+
+    for iteration_result in report["iteration_list"]:
+        print(f"Iteration {iteration_result['iteration']}: total {iteration_result['total_time']:.3f}s, "
+              f"host selection {iteration_result['host_selection_time']:.3f}s, "
+              f"metadata/threshold {iteration_result['metadata_and_threshold_time']:.3f}s, "
+              f"transfer {iteration_result['transfer_time']:.3f}s")
+    print(f"Wrote the results to {args.output}")
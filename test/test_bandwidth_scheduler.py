@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -------------------------------------------------------------------------------
+# test_bandwidth_scheduler.py
+# Check the --bwlimit BandwidthScheduler gives each rsync process under global,
+# per-host and time-of-day budgets.
+# -------------------------------------------------------------------------------
+from datetime import datetime
+
+from RsyncPath.BandwidthScheduler import BandwidthScheduler, BandwidthWindow, MIN_BANDWIDTH_LIMIT
+
+# A Monday:
+DAY_TIME = datetime(2026, 10, 12, 14, 0)
+NIGHT_TIME = datetime(2026, 10, 12, 23, 30)
+AFTER_MIDNIGHT_TIME = datetime(2026, 10, 13, 2, 0)
+
+
+def test_no_budget_means_no_limit():
+    scheduler = BandwidthScheduler()
+    assert not scheduler.is_enabled()
+    assert scheduler.acquire("host:22") is None
+
+
+def test_global_budget_is_split_between_free_slots():
+    scheduler = BandwidthScheduler(bandwidth_limit=1000)
+    scheduler.set_slot_count(4, 4)
+    assert scheduler.is_enabled()
+    limit_list = [scheduler.acquire(f"host{index}:22") for index in range(4)]
+    assert limit_list == [250, 250, 250, 250]
+    assert scheduler.allocated_limit == 1000
+
+
+def test_released_share_goes_to_the_next_process():
+    scheduler = BandwidthScheduler(bandwidth_limit=900)
+    scheduler.set_slot_count(3, 3)
+    first_limit = scheduler.acquire("host:22")
+    second_limit = scheduler.acquire("host:22")
+    scheduler.release("host:22", first_limit)
+    # The 600 KiB/s not used by the second process is split between the two free slots:
+    assert scheduler.acquire("host:22") == 300
+    scheduler.release("host:22", second_limit)
+    assert scheduler.acquire("host:22") == 300
+    assert scheduler.allocated_limit == 600
+
+
+def test_host_budget_is_kept_per_host():
+    scheduler = BandwidthScheduler(bandwidth_limit=10000, host_bandwidth_limit=200)
+    scheduler.set_slot_count(4, 2)
+    assert scheduler.acquire("first:22") == 100
+    assert scheduler.acquire("first:22") == 100
+    # The budget of the first host is used up, but not the one of the second:
+    assert scheduler.acquire("first:22") == MIN_BANDWIDTH_LIMIT
+    assert scheduler.acquire("second:22") == 100
+    assert scheduler.host_allocated_dict == {"first:22": 200 + MIN_BANDWIDTH_LIMIT, "second:22": 100}
+
+
+def test_exhausted_budget_gives_the_minimum_limit():
+    scheduler = BandwidthScheduler(bandwidth_limit=100)
+    scheduler.set_slot_count(1, 1)
+    assert scheduler.acquire("host:22") == 100
+    assert scheduler.acquire("host:22") == MIN_BANDWIDTH_LIMIT
+
+
+def test_window_budget_applies_inside_the_window():
+    current_time_list = [DAY_TIME]
+    window = BandwidthWindow("09:00", "17:00", bandwidth_limit=100, weekday_list=[0, 1, 2, 3, 4])
+    scheduler = BandwidthScheduler(bandwidth_limit=1000, window_list=[window], clock=lambda: current_time_list[0])
+    limit = scheduler.acquire("host:22")
+    assert limit == 100
+    scheduler.release("host:22", limit)
+
+    current_time_list[0] = NIGHT_TIME
+    assert scheduler.acquire("host:22") == 1000
+
+
+def test_window_without_limit_lifts_the_budget():
+    window = BandwidthWindow("22:00", "06:00")
+    scheduler = BandwidthScheduler(bandwidth_limit=1000, window_list=[window], clock=lambda: NIGHT_TIME)
+    assert scheduler.acquire("host:22") is None
+
+
+def test_window_past_midnight_counts_from_the_day_it_starts():
+    monday_night_window = BandwidthWindow("22:00", "06:00", weekday_list=[0])
+    assert monday_night_window.contains(NIGHT_TIME)
+    assert monday_night_window.contains(AFTER_MIDNIGHT_TIME)
+    assert not monday_night_window.contains(DAY_TIME)
+    assert not BandwidthWindow("22:00", "06:00", weekday_list=[1]).contains(AFTER_MIDNIGHT_TIME)
+
+
+def test_window_from_dict():
+    window = BandwidthWindow.from_dict({"start": "08:30", "end": "18:00", "host_bandwidth_limit": 50})
+    assert window.bandwidth_limit is None
+    assert window.host_bandwidth_limit == 50
+    assert window.contains(DAY_TIME)
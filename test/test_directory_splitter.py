@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -------------------------------------------------------------------------------
+# test_directory_splitter.py
+# Check how DirectorySplitter partitions a large directory into shards of
+# similar size that together cover every file exactly once.
+# -------------------------------------------------------------------------------
+from RsyncPath.DirectorySplitter import DirectorySplitter
+from RsyncPath.FileManifest import FileManifest
+
+
+def create_manifest(size_dict: dict) -> FileManifest:
+    """Create a manifest from the size of each file, keyed by its relative path."""
+    return FileManifest.from_entry_list([(path, size, 0) for path, size in size_dict.items()])
+
+
+def get_covering_entry_list(shard_list: list, path: str) -> list:
+    """Return the shard entries that a file is copied by: the file itself or a directory above it."""
+    return [entry for shard in shard_list for entry in shard if path == entry or path.startswith(entry + "/")]
+
+
+def test_small_directory_is_not_split():
+    splitter = DirectorySplitter(min_size=1000, shard_count=4)
+    assert splitter.split(create_manifest({"a": 400, "b": 400})) is None
+
+
+def test_single_shard_count_is_not_split():
+    splitter = DirectorySplitter(min_size=0, shard_count=1)
+    assert splitter.split(create_manifest({"a": 400, "b": 400})) is None
+
+
+def test_single_entry_is_not_split():
+    splitter = DirectorySplitter(min_size=0, shard_count=4)
+    assert splitter.split(create_manifest({"only/file": 1000})) is None
+
+
+def test_entries_go_to_the_smallest_shard_largest_first():
+    splitter = DirectorySplitter(min_size=0, shard_count=2)
+    shard_list = splitter.split(create_manifest({"a": 40, "b": 30, "c": 20, "d": 10}))
+    assert shard_list == [["a", "d"], ["b", "c"]]
+
+
+def test_large_child_is_replaced_by_its_entries():
+    splitter = DirectorySplitter(min_size=0, shard_count=2)
+    shard_list = splitter.split(create_manifest({"big/x": 60, "big/y": 40, "small": 10}))
+    assert shard_list == [["big/x"], ["big/y", "small"]]
+
+
+def test_max_depth_limits_how_far_children_are_split():
+    splitter = DirectorySplitter(min_size=0, shard_count=2, max_depth=1)
+    shard_list = splitter.split(create_manifest({"big/x": 60, "big/y": 40, "small": 10}))
+    assert shard_list == [["big"], ["small"]]
+
+
+def test_files_below_max_depth_are_grouped_under_it():
+    splitter = DirectorySplitter(min_size=0, shard_count=2, max_depth=2)
+    shard_list = splitter.split(create_manifest({"a/b/c/one": 50, "a/b/d/two": 50, "a/e": 60, "f": 10}))
+    assert sorted(entry for shard in shard_list for entry in shard) == ["a/b", "a/e", "f"]
+
+
+def test_every_file_is_in_exactly_one_shard():
+    size_dict = {f"year{year}/month{month}/photo{index}.jpg": (year * 31 + month * 7 + index) % 97 + 1
+                 for year in range(4) for month in range(12) for index in range(5)}
+    size_dict.update({f"loose{index}.txt": index + 1 for index in range(10)})
+    splitter = DirectorySplitter(min_size=0, shard_count=4)
+    shard_list = splitter.split(create_manifest(size_dict))
+
+    assert len(shard_list) == 4
+    for path in size_dict:
+        assert len(get_covering_entry_list(shard_list, path)) == 1, path
+
+    shard_size_list = [sum(size for path, size in size_dict.items()
+                           if any(path == entry or path.startswith(entry + "/") for entry in shard))
+                       for shard in shard_list]
+    assert max(shard_size_list) - min(shard_size_list) <= max(size_dict.values())
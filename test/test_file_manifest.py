@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -------------------------------------------------------------------------------
+# test_file_manifest.py
+# Check how FileManifest finds the changed and deleted files between two
+# manifests, and how manifests are scanned, serialized and stored.
+# -------------------------------------------------------------------------------
+import os
+
+import pytest
+
+from RsyncPath.FileManifest import (FileManifest, FileManifestStore, ManifestDifference, parse_find_mtime,
+                                    scan_local_directory)
+
+HASH_A = b"a" * 16
+HASH_B = b"b" * 16
+
+
+def test_identical_manifests_have_no_difference():
+    manifest = FileManifest.from_entry_list([("b.txt", 2, 20), ("a.txt", 1, 10)])
+    difference = manifest.compare(FileManifest.from_entry_list([("a.txt", 1, 10), ("b.txt", 2, 20)]))
+    assert difference == ManifestDifference([], [])
+    assert difference.is_empty()
+
+
+def test_compare_finds_new_modified_and_deleted_files():
+    previous_manifest = FileManifest.from_entry_list([("same", 1, 10), ("resized", 2, 20), ("touched", 3, 30),
+                                                      ("removed", 4, 40), ("z/removed_last", 5, 50)])
+    manifest = FileManifest.from_entry_list([("same", 1, 10), ("resized", 9, 20), ("touched", 3, 31),
+                                             ("a/new_first", 6, 60), ("new", 7, 70)])
+    difference = manifest.compare(previous_manifest)
+    assert difference.changed_path_list == ["a/new_first", "new", "resized", "touched"]
+    assert difference.deleted_path_list == ["removed", "z/removed_last"]
+    assert not difference.is_empty()
+
+
+def test_compare_with_an_empty_manifest():
+    manifest = FileManifest.from_entry_list([("a", 1, 10), ("b", 2, 20)])
+    assert manifest.compare(FileManifest()) == ManifestDifference(["a", "b"], [])
+    assert FileManifest().compare(manifest) == ManifestDifference([], ["a", "b"])
+
+
+def test_hashes_are_only_compared_when_both_manifests_have_them():
+    previous_manifest = FileManifest.from_entry_list([("file", 1, 10, HASH_A)], True)
+    manifest = FileManifest.from_entry_list([("file", 1, 10, HASH_B)], True)
+    assert manifest.compare(previous_manifest).changed_path_list == ["file"]
+    assert manifest.compare(FileManifest.from_entry_list([("file", 1, 10)])).is_empty()
+
+
+def test_parse_find_mtime_keeps_every_nanosecond():
+    assert parse_find_mtime("1700000000.1234567890") == 1700000000123456789
+    assert parse_find_mtime("1700000000.5") == 1700000000500000000
+    assert parse_find_mtime("1700000000") == 1700000000000000000
+
+
+@pytest.mark.parametrize("has_hashes", [False, True])
+def test_serialization_round_trip(has_hashes):
+    entry_list = [("café/menu.pdf", 1 << 40, -5, HASH_A), ("plain.txt", 0, 1700000000123456789, HASH_B),
+                  ("bad\udcffname", 3, 30, HASH_A)]
+    manifest = FileManifest.from_entry_list([entry if has_hashes else entry[:3] for entry in entry_list], has_hashes)
+    loaded_manifest = FileManifest.from_bytes(manifest.to_bytes())
+    assert loaded_manifest.path_list == manifest.path_list
+    assert loaded_manifest.size_list == manifest.size_list
+    assert loaded_manifest.mtime_ns_list == manifest.mtime_ns_list
+    assert loaded_manifest.hash_list == manifest.hash_list
+    assert loaded_manifest.compare(manifest).is_empty()
+
+
+def test_empty_manifest_round_trip():
+    assert len(FileManifest.from_bytes(FileManifest().to_bytes())) == 0
+
+
+@pytest.mark.parametrize("data", [b"", b"RSPM", b"XXXX\x01\x00\x00\x00\x00\x00\x00\x00",
+                                  FileManifest.from_entry_list([("a", 1, 1)]).to_bytes()[:-4]])
+def test_invalid_manifest_raises_value_error(data):
+    with pytest.raises(ValueError):
+        FileManifest.from_bytes(data)
+
+
+def test_scan_local_directory(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "top.txt").write_bytes(b"top")
+    (tmp_path / "sub" / "inner.txt").write_bytes(b"inner file")
+    os.symlink(tmp_path, tmp_path / "sub" / "loop")
+    os.symlink(tmp_path / "missing", tmp_path / "broken")
+
+    manifest = scan_local_directory(tmp_path, enable_hash=True)
+    assert manifest.path_list == ["sub/inner.txt", "top.txt"]
+    assert list(manifest.size_list) == [10, 3]
+    assert manifest.has_hashes()
+    assert scan_local_directory(tmp_path / "top.txt") is None
+
+    os.utime(tmp_path / "top.txt", ns=(0, 1))
+    (tmp_path / "sub" / "inner.txt").unlink()
+    difference = scan_local_directory(tmp_path).compare(manifest)
+    assert difference == ManifestDifference(["top.txt"], ["sub/inner.txt"])
+
+
+def test_manifest_store(tmp_path):
+    store = FileManifestStore(tmp_path / "manifests")
+    manifest = FileManifest.from_entry_list([("a", 1, 10)])
+    assert store.load("source", "destination") is None
+
+    store.save("source", "destination", manifest)
+    assert store.load("source", "destination").path_list == ["a"]
+    assert store.load("source", "other destination") is None
+
+    store.get_manifest_path("source", "destination").write_bytes(b"garbage")
+    assert store.load("source", "destination") is None
+    store.remove("source", "destination")
+    store.remove("source", "destination")
+    assert not store.get_manifest_path("source", "destination").exists()
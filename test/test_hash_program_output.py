@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -------------------------------------------------------------------------------
+# test_hash_program_output.py
+# Check that parse_hash_program_output() reads the output of sha256sum and the
+# programs that copy its format, including escaped file names, and that it
+# matches the hashes computed locally by FileHasher.
+# -------------------------------------------------------------------------------
+from shutil import which
+import subprocess
+
+import pytest
+
+from RsyncPath.Client import parse_hash_program_output
+from RsyncPath.FileHasher import hash_file
+from RsyncPath.HashAlgorithm import HashAlgorithm
+
+DIGEST_A = "a" * 64
+DIGEST_B = "b" * 64
+
+
+def test_text_and_binary_mode_lines():
+    output = f"{DIGEST_A}  ./photo.jpg\n{DIGEST_B} *./sub dir/two  spaces.txt\n"
+    assert parse_hash_program_output(output) == {"photo.jpg": DIGEST_A, "sub dir/two  spaces.txt": DIGEST_B}
+
+
+def test_paths_without_dot_prefix_and_uppercase_digests():
+    assert parse_hash_program_output(f"{DIGEST_A.upper()}  plain/path\n") == {"plain/path": DIGEST_A}
+
+
+def test_escaped_file_names():
+    output = (f"\\{DIGEST_A}  ./new\\nline.txt\n"
+              f"\\{DIGEST_B}  ./back\\\\slash\\rreturn\n"
+              f"{DIGEST_A}  ./not\\nescaped\n")
+    assert parse_hash_program_output(output) == {"new\nline.txt": DIGEST_A, "back\\slash\rreturn": DIGEST_B,
+                                                 "not\\nescaped": DIGEST_A}
+
+
+def test_blank_lines_and_lines_without_a_path_are_ignored():
+    output = f"\n{DIGEST_A}\n{DIGEST_A} \n{DIGEST_B}  ./kept\n"
+    assert parse_hash_program_output(output) == {"kept": DIGEST_B}
+
+
+@pytest.mark.parametrize("algorithm", [HashAlgorithm.SHA256, HashAlgorithm.BLAKE2B])
+def test_output_of_the_real_program_matches_local_hashes(tmp_path, algorithm):
+    program = algorithm.get_remote_program()
+    if which(program) is None:
+        pytest.skip(f"{program} is not installed.")
+
+    content_dict = {"plain.txt": b"plain", "with space.txt": b"space", "new\nline.txt": b"newline",
+                    "back\\slash.txt": b"backslash", "empty": b""}
+    for name, content in content_dict.items():
+        (tmp_path / name).write_bytes(content)
+    output = subprocess.run(f"find . -type f -print0 | xargs -0 {program}", shell=True, cwd=tmp_path,
+                            capture_output=True, text=True, check=True).stdout
+
+    assert parse_hash_program_output(output) == {name: hash_file(tmp_path / name, algorithm)
+                                                 for name in content_dict}
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -------------------------------------------------------------------------------
+# test_import_time.py
+# Check that importing RsyncPath stays within its import time budget and never
+# imports the SSH stack (fabric, invoke, paramiko, cryptography) up front.
+#
+# The budget is the cumulative time python -X importtime reports for
+# RsyncPath.RsyncPath, taking the best of a few runs. It defaults to
+# IMPORT_TIME_BUDGET_MS and can be raised on a slow machine with the
+# RSYNC_PATH_IMPORT_TIME_BUDGET_MS environment variable. fabric alone takes
+# well over the budget to import, so moving it back to module level fails this.
+# -------------------------------------------------------------------------------
+from pathlib import Path
+import os
+import subprocess
+import sys
+
+IMPORT_TIME_BUDGET_MS = 150
+IMPORT_TIME_RUN_COUNT = 3
+HEAVY_MODULE_LIST = ["fabric", "invoke", "paramiko", "cryptography"]
+REPOSITORY_PATH = Path(__file__).resolve().parent.parent
+
+
+def run_python(code: str, *option_list: str) -> subprocess.CompletedProcess:
+    """Run code in a new interpreter from the repository root, so nothing is already imported."""
+    return subprocess.run([sys.executable, *option_list, "-c", code], cwd=REPOSITORY_PATH, capture_output=True,
+                          text=True, check=True)
+
+
+def get_heavy_module_list(code: str) -> list[str]:
+    """Run code in a new interpreter and return the heavy modules it imported."""
+    result = run_python(f"{code}\nimport sys\n"
+                        f"print(' '.join(sorted({{name.split('.')[0] for name in sys.modules}} & "
+                        f"{set(HEAVY_MODULE_LIST)!r})))")
+    return result.stdout.split()
+
+
+def get_import_time_ms(module_name: str) -> float:
+    """Return the cumulative import time of a module in milliseconds, as reported by python -X importtime."""
+    result = run_python(f"import {module_name}", "-X", "importtime")
+    for line in result.stderr.splitlines():
+        field_list = line.split("|")
+        if len(field_list) == 3 and field_list[2].strip() == module_name:
+            return int(field_list[1]) / 1000
+    raise AssertionError(f"python -X importtime did not report {module_name}:\n{result.stderr}")
+
+
+def test_import_does_not_load_ssh_stack():
+    assert get_heavy_module_list("import RsyncPath.RsyncPath") == []
+
+
+def test_client_does_not_load_ssh_stack_until_a_command_is_run():
+    code = ("from RsyncPath.Client import Client\n"
+            "from RsyncPath.OSType import OSType\n"
+            "from RsyncPath.SSHBackend import SSHBackend\n"
+            "client = Client('user', 'localhost', 22, OSType.POSIX)\n"
+            "client.change_ssh_backend(SSHBackend.OPENSSH)\n"
+            "client.change_connection('user', '127.0.0.1', 2222)")
+    assert get_heavy_module_list(code) == []
+
+
+def test_import_time_budget():
+    budget_ms = float(os.environ.get("RSYNC_PATH_IMPORT_TIME_BUDGET_MS", IMPORT_TIME_BUDGET_MS))
+    import_time_ms = min(get_import_time_ms("RsyncPath.RsyncPath") for _ in range(IMPORT_TIME_RUN_COUNT))
+    assert import_time_ms <= budget_ms, (f"Importing RsyncPath.RsyncPath took {import_time_ms:.1f} ms, over the "
+                                         f"{budget_ms:.0f} ms budget.")
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -------------------------------------------------------------------------------
+# test_rsync_output.py
+# Feed captured rsync output to RsyncOutputParser and check the events, stats
+# and transfer results built from it.
+# -------------------------------------------------------------------------------
+from RsyncPath.CompressionSelector import RsyncVersion
+from RsyncPath.RsyncOutput import (RsyncOutputParser, DirectoryTransferResult, FileTransferEvent, ProgressEvent,
+                                   StatsEvent, MessageEvent, OUT_FORMAT_PREFIX, RSYNC_OUTPUT_OPTION_LIST,
+                                   LEGACY_RSYNC_OUTPUT_OPTION_LIST, get_rsync_output_option_list, parse_rsync_number,
+                                   parse_rsync_output)
+
+# The output of rsync 3.2.7 run with --out-format and --info=progress2,stats2, progress updates included:
+PROGRESS2_OUTPUT = (
+    f"{OUT_FORMAT_PREFIX} cd+++++++++ 4096 Photos/\n"
+    f"{OUT_FORMAT_PREFIX} >f+++++++++ 1048576 Photos/beach.jpg\n"
+    "        524,288  33%    1.23MB/s    0:00:01 (xfr#1, ir-chk=1002/1005)\r"
+    "      1,572,864 100%    1.50MB/s    0:00:01 (xfr#2, to-chk=0/1005)\n"
+    f"{OUT_FORMAT_PREFIX} >f.st...... 524288 Photos/old.jpg\n"
+    f"{OUT_FORMAT_PREFIX} *deleting   0 Photos/removed.jpg\n"
+    "\n"
+    "Number of files: 1,005 (reg: 1,000, dir: 5)\n"
+    "Number of created files: 2 (reg: 1, dir: 1)\n"
+    "Number of deleted files: 1 (reg: 1)\n"
+    "Number of regular files transferred: 2\n"
+    "Total file size: 1.23G bytes\n"
+    "Total transferred file size: 1,572,864 bytes\n"
+    "Literal data: 1,048,576 bytes\n"
+    "Matched data: 524,288 bytes\n"
+    "File list size: 32,768\n"
+    "File list generation time: 0.003 seconds\n"
+    "File list transfer time: 0.000 seconds\n"
+    "Total bytes sent: 1,050,000\n"
+    "Total bytes received: 4,321\n"
+    "\n"
+    "sent 1,050,000 bytes  received 4,321 bytes  702,880.67 bytes/sec\n"
+    "total size is 1,320,702,443  speedup is 1,252.66\n"
+)
+
+# The output of rsync 3.0.9 run with --out-format, --progress and --stats:
+LEGACY_OUTPUT = (
+    f"{OUT_FORMAT_PREFIX} >f+++++++++ 2048 notes.txt\n"
+    "        2048 100%    0.00kB/s    0:00:00 (xfer#1, to-check=0/2)\n"
+    "\n"
+    "Number of files: 2\n"
+    "Number of files transferred: 1\n"
+    "Total file size: 2048 bytes\n"
+    "Total bytes sent: 2150\n"
+    "Total bytes received: 31\n"
+    "\n"
+    "sent 2150 bytes  received 31 bytes  4362.00 bytes/sec\n"
+    "total size is 2048  speedup is 0.94\n"
+)
+
+
+def get_event_list(output: str, chunk_size: int = None) -> list:
+    """Parse output, fed to the parser all at once or in chunks of chunk_size characters."""
+    if chunk_size is None:
+        return list(parse_rsync_output([output]))
+    return list(parse_rsync_output(output[index:index + chunk_size] for index in range(0, len(output), chunk_size)))
+
+
+def test_parse_rsync_number():
+    assert parse_rsync_number("1,234,567") == 1234567
+    assert parse_rsync_number("0.003") == 0.003
+    assert parse_rsync_number("1.5K") == 1536
+    assert parse_rsync_number("2M") == 2 << 20
+
+
+def test_itemize_lines():
+    event_list = [event for event in get_event_list(PROGRESS2_OUTPUT) if isinstance(event, FileTransferEvent)]
+    assert event_list == [FileTransferEvent("cd+++++++++", 4096, "Photos/"),
+                          FileTransferEvent(">f+++++++++", 1048576, "Photos/beach.jpg"),
+                          FileTransferEvent(">f.st......", 524288, "Photos/old.jpg"),
+                          FileTransferEvent("*deleting", 0, "Photos/removed.jpg")]
+    assert [event.is_data_transfer() for event in event_list] == [False, True, True, False]
+    assert [event.is_deletion() for event in event_list] == [False, False, False, True]
+
+
+def test_escaped_and_spaced_names_are_kept_verbatim():
+    # rsync escapes unprintable characters in names as \#ooo, and leaves spaces as they are:
+    event_list = get_event_list(f"{OUT_FORMAT_PREFIX} >f+++++++++ 10 My Files/tab\\#011name.txt\n"
+                                f"{OUT_FORMAT_PREFIX} >f+++++++++ 20 caf\\#303\\#251 menu.pdf\n")
+    assert event_list == [FileTransferEvent(">f+++++++++", 10, "My Files/tab\\#011name.txt"),
+                          FileTransferEvent(">f+++++++++", 20, "caf\\#303\\#251 menu.pdf")]
+
+
+def test_progress2_lines_split_by_carriage_returns():
+    event_list = [event for event in get_event_list(PROGRESS2_OUTPUT) if isinstance(event, ProgressEvent)]
+    assert event_list == [ProgressEvent(524288, 33, "1.23MB/s", "0:00:01", 1, 1002, 1005),
+                          ProgressEvent(1572864, 100, "1.50MB/s", "0:00:01", 2, 0, 1005)]
+
+
+def test_stats2_output():
+    event_list = [event for event in get_event_list(PROGRESS2_OUTPUT) if isinstance(event, StatsEvent)]
+    assert len(event_list) == 1
+    stats_dict = event_list[0].stats_dict
+    assert stats_dict["number_of_files"] == 1005
+    assert stats_dict["number_of_created_files"] == 2
+    assert stats_dict["number_of_deleted_files"] == 1
+    assert stats_dict["number_of_regular_files_transferred"] == 2
+    assert stats_dict["total_file_size"] == 1.23 * (1 << 30)
+    assert stats_dict["total_transferred_file_size"] == 1572864
+    assert stats_dict["literal_data"] == 1048576
+    assert stats_dict["matched_data"] == 524288
+    assert stats_dict["file_list_generation_time"] == 0.003
+    assert stats_dict["total_bytes_sent"] == 1050000
+    assert stats_dict["total_bytes_received"] == 4321
+    assert stats_dict["bytes_per_second"] == 702880.67
+    assert stats_dict["total_size"] == 1320702443
+    assert stats_dict["speedup"] == 1252.66
+
+
+def test_output_split_across_chunks():
+    assert get_event_list(PROGRESS2_OUTPUT, 7) == get_event_list(PROGRESS2_OUTPUT)
+
+
+def test_stats_without_summary_line_are_sent_on_close():
+    parser = RsyncOutputParser()
+    assert parser.feed("Total bytes sent: 100\nTotal bytes received: 20") == []
+    assert parser.close() == [StatsEvent({"total_bytes_sent": 100, "total_bytes_received": 20})]
+
+
+def test_messages_and_errors():
+    event_list = get_event_list("skipping non-regular file \"link\"\n"
+                                "rsync: [sender] send_files failed to open \"/data/secret\": Permission denied (13)\n"
+                                "rsync error: some files/attrs were not transferred (code 23) at main.c(1338)\n")
+    assert all(isinstance(event, MessageEvent) for event in event_list)
+    assert [event.is_error() for event in event_list] == [False, True, True]
+
+
+def test_legacy_progress_and_stats_output():
+    event_list = get_event_list(LEGACY_OUTPUT)
+    assert event_list[:2] == [FileTransferEvent(">f+++++++++", 2048, "notes.txt"),
+                              ProgressEvent(2048, 100, "0.00kB/s", "0:00:00", 1, 0, 2)]
+    stats_dict = event_list[2].stats_dict
+    assert stats_dict["number_of_regular_files_transferred"] == 1
+    assert stats_dict["total_bytes_sent"] == 2150
+    assert stats_dict["speedup"] == 0.94
+
+
+def test_output_option_list_depends_on_rsync_version():
+    assert get_rsync_output_option_list(RsyncVersion((3, 2, 7), ["zstd"])) == RSYNC_OUTPUT_OPTION_LIST
+    assert get_rsync_output_option_list(RsyncVersion((3, 0, 9), ["zlib"])) == LEGACY_RSYNC_OUTPUT_OPTION_LIST
+    assert get_rsync_output_option_list(None) == RSYNC_OUTPUT_OPTION_LIST
+
+
+def test_directory_transfer_result():
+    result = DirectoryTransferResult("Photos")
+    for event in get_event_list(PROGRESS2_OUTPUT):
+        result.add_event(event)
+    result.add_event(MessageEvent("rsync: connection unexpectedly closed"))
+    result.finish(23)
+    assert result.transferred_file_count == 2
+    assert result.transferred_file_bytes == 1572864
+    assert result.deleted_file_count == 1
+    assert result.last_progress.percentage == 100
+    assert result.error_list == ["rsync: connection unexpectedly closed"]
+    assert result.was_copied() and not result.is_successful()
+
+
+
+def test_add_shard_result_only_adds_up_additive_stats():
+    result = DirectoryTransferResult("Photos")
+    result.add_event(StatsEvent({"number_of_files": 1005, "total_file_size": 4000, "total_size": 4000,
+                                 "number_of_regular_files_transferred": 1, "literal_data": 100,
+                                 "total_bytes_sent": 150, "total_bytes_received": 50}))
+    result.finish(0)
+    shard_result = DirectoryTransferResult("Photos")
+    shard_result.add_event(StatsEvent({"number_of_files": 500, "total_file_size": 2000, "total_size": 2000,
+                                       "number_of_regular_files_transferred": 300, "literal_data": 1800,
+                                       "total_bytes_sent": 1800}))
+    shard_result.finish(0)
+
+    result.add_shard_result(shard_result)
+    assert result.stats_dict["number_of_files"] == 1005
+    assert result.stats_dict["total_file_size"] == 4000
+    assert result.stats_dict["number_of_regular_files_transferred"] == 301
+    assert result.stats_dict["literal_data"] == 1900
+    assert result.stats_dict["total_bytes_sent"] == 1950
+    assert result.stats_dict["speedup"] == 2.0
+    assert result.exit_code == 0
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -------------------------------------------------------------------------------
+# test_run_journal.py
+# Check how RunJournal starts, resumes and finishes runs, and records the state
+# of each directory.
+# -------------------------------------------------------------------------------
+from pathlib import Path
+
+import pytest
+
+from RsyncPath.DirectoryState import DirectoryState
+from RsyncPath.RunJournal import RunJournal
+
+RUN_KEY = "user@host:/data -> /backup"
+
+
+@pytest.fixture
+def journal(tmp_path):
+    run_journal = RunJournal(tmp_path / "run_journal.sqlite3")
+    yield run_journal
+    run_journal.close()
+
+
+def test_begin_adds_every_directory_as_pending(journal):
+    state_dict = journal.begin(RUN_KEY, [Path("Photos"), Path("Music")])
+    assert state_dict == {"Photos": DirectoryState.PENDING, "Music": DirectoryState.PENDING}
+    assert journal.get_entry_dict(RUN_KEY)["Photos"] == (DirectoryState.PENDING, None, 0, None, None)
+
+
+def test_set_state_transitions(journal):
+    journal.begin(RUN_KEY, ["Photos"])
+    journal.set_state(RUN_KEY, "Photos", DirectoryState.VERIFIED)
+    assert journal.get_entry_dict(RUN_KEY)["Photos"] == (DirectoryState.VERIFIED, None, 0, None, None)
+
+    journal.set_state(RUN_KEY, "Photos", DirectoryState.TRANSFERRING, host="first:22")
+    journal.set_state(RUN_KEY, "Photos", DirectoryState.FAILED, 12, message="connection closed")
+    assert journal.get_entry_dict(RUN_KEY)["Photos"] == (DirectoryState.FAILED, 12, 1, "first:22",
+                                                         "connection closed")
+
+    # A retry on another machine counts as a second attempt and clears the previous error:
+    journal.set_state(RUN_KEY, Path("Photos"), DirectoryState.TRANSFERRING, host="second:22")
+    journal.set_state(RUN_KEY, Path("Photos"), DirectoryState.DONE, 0)
+    assert journal.get_entry_dict(RUN_KEY)["Photos"] == (DirectoryState.DONE, 0, 2, "second:22", None)
+    assert journal.get_incomplete_path_list(RUN_KEY) == []
+
+
+def test_resume_keeps_states_and_follows_the_directory_list(journal):
+    journal.begin(RUN_KEY, ["Photos", "Music", "Old"])
+    journal.set_state(RUN_KEY, "Photos", DirectoryState.DONE, 0)
+    journal.set_state(RUN_KEY, "Music", DirectoryState.FAILED, 23)
+
+    state_dict = journal.begin(RUN_KEY, ["Photos", "Music", "New"], resume=True)
+    assert state_dict == {"Photos": DirectoryState.DONE, "Music": DirectoryState.FAILED,
+                          "New": DirectoryState.PENDING}
+    assert set(journal.get_entry_dict(RUN_KEY)) == {"Photos", "Music", "New"}
+    assert sorted(journal.get_incomplete_path_list(RUN_KEY)) == ["Music", "New"]
+
+
+def test_begin_without_resume_starts_over(journal):
+    journal.begin(RUN_KEY, ["Photos"])
+    journal.set_state(RUN_KEY, "Photos", DirectoryState.DONE, 0)
+    assert journal.begin(RUN_KEY, ["Photos"]) == {"Photos": DirectoryState.PENDING}
+
+
+def test_finished_run_is_not_resumed(journal):
+    journal.begin(RUN_KEY, ["Photos"])
+    journal.set_state(RUN_KEY, "Photos", DirectoryState.DONE, 0)
+    journal.finish(RUN_KEY)
+    assert journal.begin(RUN_KEY, ["Photos"], resume=True) == {"Photos": DirectoryState.PENDING}
+
+
+def test_runs_are_kept_apart(journal):
+    journal.begin(RUN_KEY, ["Photos"])
+    journal.set_state(RUN_KEY, "Photos", DirectoryState.DONE, 0)
+    assert journal.begin("other run", ["Photos"]) == {"Photos": DirectoryState.PENDING}
+    assert journal.begin(RUN_KEY, ["Photos"], resume=True) == {"Photos": DirectoryState.DONE}
+
+
+def test_journal_survives_reopening(tmp_path):
+    journal_path = tmp_path / "run_journal.sqlite3"
+    journal = RunJournal(journal_path)
+    journal.begin(RUN_KEY, ["Photos", "Music"])
+    journal.set_state(RUN_KEY, "Photos", DirectoryState.SKIPPED)
+    journal.close()
+
+    journal = RunJournal(journal_path)
+    try:
+        assert journal.begin(RUN_KEY, ["Photos", "Music"], resume=True) == {"Photos": DirectoryState.SKIPPED,
+                                                                             "Music": DirectoryState.PENDING}
+    finally:
+        journal.close()
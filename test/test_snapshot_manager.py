@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -------------------------------------------------------------------------------
+# test_snapshot_manager.py
+# Check the daily and weekly retention policy of SnapshotManager, and a full
+# snapshot cycle in a local destination directory.
+# -------------------------------------------------------------------------------
+from datetime import datetime, timedelta
+
+from RsyncPath.Client import Client
+from RsyncPath.OSType import OSType
+from RsyncPath.SnapshotManager import (SnapshotManager, SNAPSHOT_NAME_FORMAT, INCOMPLETE_SNAPSHOT_SUFFIX,
+                                       parse_snapshot_name, select_snapshots_to_keep)
+
+# A Monday, the first day of ISO week 42:
+MONDAY = datetime(2026, 10, 12)
+
+
+def get_snapshot_name(snapshot_time: datetime) -> str:
+    return snapshot_time.strftime(SNAPSHOT_NAME_FORMAT)
+
+
+def test_parse_snapshot_name():
+    assert parse_snapshot_name("2026-10-12_03-15-00") == datetime(2026, 10, 12, 3, 15)
+    assert parse_snapshot_name("latest") is None
+    assert parse_snapshot_name("2026-10-12_03-15-00" + INCOMPLETE_SNAPSHOT_SUFFIX) is None
+
+
+def test_no_snapshots_keeps_nothing():
+    assert select_snapshots_to_keep([]) == set()
+    assert select_snapshots_to_keep(["latest", "notes.txt"]) == set()
+
+
+def test_newest_snapshot_is_always_kept():
+    name_list = [get_snapshot_name(MONDAY + timedelta(days=day)) for day in range(3)]
+    assert select_snapshots_to_keep(name_list, keep_daily=0, keep_weekly=0) == {name_list[-1]}
+
+
+def test_daily_retention_keeps_the_newest_snapshot_of_each_recent_day():
+    # Two snapshots a day, in the morning and the evening, for ten days:
+    name_list = [get_snapshot_name(MONDAY + timedelta(days=day, hours=hour)) for day in range(10) for hour in (6, 18)]
+    keep_set = select_snapshots_to_keep(name_list, keep_daily=3, keep_weekly=0)
+    assert keep_set == {get_snapshot_name(MONDAY + timedelta(days=day, hours=18)) for day in (7, 8, 9)}
+
+
+def test_daily_retention_counts_days_with_a_snapshot():
+    name_list = [get_snapshot_name(MONDAY + timedelta(days=day)) for day in (0, 5, 20)]
+    assert select_snapshots_to_keep(name_list, keep_daily=2, keep_weekly=0) == set(name_list[1:])
+
+
+def test_weekly_retention_keeps_the_newest_snapshot_of_each_recent_week():
+    # A snapshot every day for six weeks, starting on a Monday:
+    name_list = [get_snapshot_name(MONDAY + timedelta(days=day)) for day in range(42)]
+    keep_set = select_snapshots_to_keep(name_list, keep_daily=1, keep_weekly=3)
+    # The newest snapshot is the Sunday ending the sixth week, and the two weeks before it end on Sundays too:
+    assert keep_set == {get_snapshot_name(MONDAY + timedelta(days=day)) for day in (41, 34, 27)}
+
+
+def test_daily_and_weekly_retention_are_combined():
+    name_list = [get_snapshot_name(MONDAY + timedelta(days=day)) for day in range(21)]
+    keep_set = select_snapshots_to_keep(name_list + ["latest"], keep_daily=2, keep_weekly=2)
+    assert keep_set == {get_snapshot_name(MONDAY + timedelta(days=day)) for day in (20, 19, 13)}
+
+
+def test_snapshot_cycle_in_a_local_directory(tmp_path):
+    for day in range(3):
+        (tmp_path / get_snapshot_name(MONDAY + timedelta(days=day))).mkdir()
+    (tmp_path / "unrelated").mkdir()
+    client = Client("user", "localhost", 22, OSType.POSIX)
+    snapshot_manager = SnapshotManager(tmp_path, client, False, keep_daily=2, keep_weekly=0)
+
+    assert snapshot_manager.begin()
+    assert snapshot_manager.get_previous_snapshot_path() == tmp_path / get_snapshot_name(MONDAY + timedelta(days=2))
+    assert snapshot_manager.get_snapshot_path().is_dir()
+    (snapshot_manager.get_snapshot_path() / "file.txt").write_text("copied")
+
+    removed_name_list = snapshot_manager.complete()
+    new_name = snapshot_manager.snapshot_name
+    assert (tmp_path / "latest").resolve() == (tmp_path / new_name).resolve()
+    assert (tmp_path / "latest" / "file.txt").read_text() == "copied"
+    # Only the newest snapshot of the two most recent days is kept:
+    assert sorted(removed_name_list) == [get_snapshot_name(MONDAY + timedelta(days=day)) for day in (0, 1)]
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        [get_snapshot_name(MONDAY + timedelta(days=2)), new_name, "latest", "unrelated"])
+
+
+def test_incomplete_snapshot_is_resumed(tmp_path):
+    incomplete_path = tmp_path / (get_snapshot_name(MONDAY) + INCOMPLETE_SNAPSHOT_SUFFIX)
+    incomplete_path.mkdir()
+    (incomplete_path / "partial.txt").write_text("already copied")
+    snapshot_manager = SnapshotManager(tmp_path, Client("user", "localhost", 22, OSType.POSIX), False)
+
+    assert snapshot_manager.begin()
+    assert not incomplete_path.exists()
+    assert (snapshot_manager.get_snapshot_path() / "partial.txt").read_text() == "already copied"
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -------------------------------------------------------------------------------
+# test_stripe_scheduler.py
+# Check how StripeScheduler queues the directories of a striped pull on the
+# source machines, lets idle machines take work and requeues the work of a
+# failed machine.
+# -------------------------------------------------------------------------------
+from RsyncPath.StripeScheduler import StripeScheduler
+
+MIB = 1 << 20
+
+
+def create_scheduler(path_size_dict: dict, host_dict: dict) -> StripeScheduler:
+    """Create a scheduler from the size of each directory and the (throughput, directory list) of each machine."""
+    scheduler = StripeScheduler(path_size_dict)
+    for host_key, (throughput, path_list) in host_dict.items():
+        scheduler.add_host(host_key, throughput, path_list)
+    return scheduler
+
+
+def test_assign_balances_the_estimated_finish_time():
+    path_size_dict = {"a": 400 * MIB, "b": 300 * MIB, "c": 200 * MIB, "d": 100 * MIB}
+    scheduler = create_scheduler(path_size_dict, {"fast": (3 * MIB, list(path_size_dict)),
+                                                  "slow": (1 * MIB, list(path_size_dict))})
+    assert scheduler.assign() == []
+    # The fast machine finishes a, b and d after about 267 seconds, and the slow one finishes c after 200 seconds:
+    assert scheduler.host_dict["fast"].queue_list == ["a", "b", "d"]
+    assert scheduler.host_dict["slow"].queue_list == ["c"]
+
+
+def test_assign_returns_the_directories_no_machine_holds():
+    scheduler = create_scheduler({"a": MIB, "missing": MIB}, {"first": (MIB, ["a"])})
+    assert scheduler.assign() == ["missing"]
+
+
+def test_unknown_sizes_and_throughputs_use_the_average():
+    scheduler = create_scheduler({"a": 100, "b": 300, "c": None}, {"first": (None, ["a"]), "second": (10, ["a"])})
+    scheduler.assign()
+    assert scheduler.path_size_dict["c"] == 200
+    assert scheduler.host_dict["first"].throughput == 10
+
+
+def test_take_returns_the_queued_directories_in_order():
+    scheduler = create_scheduler({"a": 2 * MIB, "b": MIB}, {"only": (MIB, ["a", "b"])})
+    scheduler.assign()
+    assert scheduler.take("only") == "a"
+    assert scheduler.take("only") == "b"
+    assert not scheduler.is_finished()
+    scheduler.finish("only", "a")
+    scheduler.finish("only", "b")
+    assert scheduler.take("only") is None
+    assert scheduler.is_finished()
+
+
+def test_steal_takes_from_the_most_loaded_machine():
+    path_size_dict = {"a1": 5 * MIB, "a2": 5 * MIB, "b1": 2 * MIB, "b2": 2 * MIB}
+    scheduler = create_scheduler(path_size_dict, {"loaded": (MIB, ["a1", "a2", "b1"]),
+                                                  "light": (MIB, ["b2"]),
+                                                  "idle": (MIB, list(path_size_dict))})
+    scheduler.host_dict["loaded"].queue_list = ["a1", "a2"]
+    scheduler.host_dict["loaded"].load = 10.0
+    scheduler.host_dict["light"].queue_list = ["b2"]
+    scheduler.host_dict["light"].load = 2.0
+
+    assert scheduler.take("idle") == "a2"
+    assert scheduler.host_dict["loaded"].queue_list == ["a1"]
+    assert scheduler.host_dict["loaded"].load == 5.0
+    assert scheduler.host_dict["idle"].load == 5.0
+    assert scheduler.host_dict["idle"].running_count == 1
+
+
+def test_steal_only_takes_directories_the_machine_holds():
+    scheduler = create_scheduler({"a": MIB, "b": MIB}, {"first": (MIB, ["a", "b"]), "second": (MIB, ["b"])})
+    scheduler.host_dict["first"].queue_list = ["b", "a"]
+    assert scheduler.take("second") == "b"
+    assert scheduler.host_dict["first"].queue_list == ["a"]
+    assert scheduler.take("second") is None
+
+
+def test_fail_host_requeues_onto_the_remaining_holders():
+    path_size_dict = {"a": 4 * MIB, "b": 2 * MIB, "c": MIB, "only_failed": MIB}
+    scheduler = create_scheduler(path_size_dict, {"failed": (MIB, list(path_size_dict)),
+                                                  "first": (MIB, ["a", "b"]),
+                                                  "second": (MIB, ["a", "c"])})
+    scheduler.host_dict["failed"].queue_list = ["b", "c", "only_failed"]
+    scheduler.host_dict["failed"].running_count = 1
+
+    assert scheduler.fail_host("failed", "a") == ["only_failed"]
+    assert scheduler.is_host_failed("failed")
+    assert scheduler.host_dict["failed"].queue_list == []
+    assert scheduler.host_dict["failed"].running_count == 0
+    assert scheduler.take("failed") is None
+    # Both machines hold a and are idle, so it goes to the first, while b and c only have one holder each:
+    assert scheduler.host_dict["first"].queue_list == ["a", "b"]
+    assert scheduler.host_dict["second"].queue_list == ["c"]
+    assert scheduler.reassignment_count == 3
+
+
+def test_failed_machine_is_not_given_requeued_work():
+    scheduler = create_scheduler({"a": MIB, "b": MIB}, {"first": (MIB, ["a", "b"]), "second": (MIB, ["a", "b"])})
+    scheduler.assign()
+    assert scheduler.fail_host("first") == []
+    assert scheduler.host_dict["second"].queue_list == ["b", "a"]
+    assert scheduler.fail_host("second") == ["b", "a"]
+    assert all(not host.queue_list for host in scheduler.host_dict.values())